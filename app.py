@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
-import folium
-from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 from datetime import datetime
 from io import BytesIO
 
+from capas_mapa import ZOOM_DETALLE_DEFECTO, mapa_recorrido
+
 st.set_page_config(layout="wide")
 st.title("🛰️ Monitoreo de Vehículos por GPS")
 
@@ -57,15 +57,12 @@ if archivo is not None:
     # Mapa
     st.subheader("🗺️ Mapa del recorrido GPS")
     if df_v[['Latitud', 'Longitud']].dropna().shape[0] > 0:
-        centro = [df_v['Latitud'].mean(), df_v['Longitud'].mean()]
-        m = folium.Map(location=centro, zoom_start=12)
-        cluster = MarkerCluster().add_to(m)
-
-        for _, row in df_v.dropna(subset=['Latitud', 'Longitud']).iterrows():
-            folium.Marker(
-                location=[row['Latitud'], row['Longitud']],
-                popup=row['Tiempo de evento'].strftime("%Y-%m-%d %H:%M:%S")
-            ).add_to(cluster)
+        # Recorrido simplificado: tolerancia de un píxel en el zoom elegido
+        zoom_detalle = st.slider("🔍 Nivel de detalle del recorrido (zoom)", 10, 18, ZOOM_DETALLE_DEFECTO,
+                                 help="Más zoom conserva más puntos del recorrido. Las entradas/salidas de geocerca y las detenciones se conservan siempre.")
+        m, detalle = mapa_recorrido(df_v, zoom_detalle)
+        st.caption(f"{detalle['vertices']:,} de {detalle['registros']:,} puntos GPS dibujados "
+                   f"(tolerancia {detalle['tolerancia_m']:.1f} m) · {detalle['marcadores']:,} marcadores en entradas/salidas y detenciones")
 
         st_data = st_folium(m, width=1000)
     else:
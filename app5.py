@@ -18,6 +18,7 @@ import altair as alt
 import unicodedata
 from datetime import time
 from io import BytesIO
+from motor_vectorizado import turnos_vectorizado
 
 st.set_page_config(
     page_title="⛏️ T-Metal – BI Operacional",
@@ -217,7 +218,7 @@ if archivo:
     # Aplicar filtro de turno
     if turno_sel != "Todos":
         turno_filter = "dia" if turno_sel == "Día" else "noche"
-        df = df[df["Tiempo de evento"].apply(turno) == turno_filter]
+        df = df[turnos_vectorizado(df["Tiempo de evento"], SHIFT_DAY_START, SHIFT_NIGHT_START) == turno_filter]
 
     # ─── Procesamiento core ─────────────────────────────────
     trans   = extraer_transiciones(df)
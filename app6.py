@@ -19,6 +19,11 @@ import altair as alt
 import unicodedata
 from datetime import time
 from io import BytesIO
+from ejecucion_paralela import ejecutar_por_vehiculo
+from motor_vectorizado import (
+    UMBRAL_PERMANENCIA_REAL, clasificar_procesos_vectorizado, construir_transiciones, detectar_permanencias,
+    turnos_vectorizado
+)
 
 st.set_page_config(
     page_title="⛏️ T-Metal – BI Operacional + Tiempos de Viaje",
@@ -118,107 +123,27 @@ def extraer_transiciones(df: pd.DataFrame) -> pd.DataFrame:
     - Combina: Geocerca1 → [VIAJE] → Geocerca2 en Geocerca1 → Geocerca2
     - Filtra permanencias muy cortas (ruido GPS)
     - Usa un umbral más alto (60s) para permanencias reales
+    La detección de permanencias se hace de forma vectorizada en `motor_vectorizado`.
     """
-    UMBRAL_PERMANENCIA_REAL = 60  # Umbral alto para permanencias reales (no ruido GPS)
-    transiciones_completas = []
-    total_cambios = 0
-    transiciones_filtradas = 0
-
-    for veh, g in df.groupby("Nombre del Vehículo"):
-        g = g.copy().sort_values("Tiempo de evento")
-        
-        # 🔍 PASO 1: Detectar permanencias reales (filtrar ruido GPS)
-        geocercas_validas = []
-        tiempos_entrada = []
-        tiempos_salida = []
-        
-        geocerca_actual = None
-        tiempo_entrada_actual = None
-        
-        for i, row in g.iterrows():
-            geo = str(row["Geocerca"]).strip()
-            tiempo = row["Tiempo de evento"]
-            
-            if geo != "":  # Registro en geocerca
-                if geocerca_actual != geo:
-                    # Cambio de geocerca o primera geocerca
-                    if geocerca_actual is not None:
-                        # Finalizar geocerca anterior
-                        duracion = (tiempo - tiempo_entrada_actual).total_seconds()
-                        if duracion >= UMBRAL_PERMANENCIA_REAL:
-                            # Permanencia válida - registrar
-                            geocercas_validas.append(geocerca_actual)
-                            tiempos_entrada.append(tiempo_entrada_actual)
-                            tiempos_salida.append(tiempo)
-                        else:
-                            print(f"   ⚠️ Filtrado ruido GPS: {geocerca_actual} ({duracion:.0f}s < {UMBRAL_PERMANENCIA_REAL}s)")
-                    
-                    # Iniciar nueva geocerca
-                    geocerca_actual = geo
-                    tiempo_entrada_actual = tiempo
-            else:
-                # Registro en viaje
-                if geocerca_actual is not None:
-                    # Salida de geocerca hacia viaje
-                    duracion = (tiempo - tiempo_entrada_actual).total_seconds()
-                    if duracion >= UMBRAL_PERMANENCIA_REAL:
-                        # Permanencia válida - registrar
-                        geocercas_validas.append(geocerca_actual)
-                        tiempos_entrada.append(tiempo_entrada_actual)
-                        tiempos_salida.append(tiempo)
-                    else:
-                        print(f"   ⚠️ Filtrado ruido GPS: {geocerca_actual} ({duracion:.0f}s < {UMBRAL_PERMANENCIA_REAL}s)")
-                    
-                    geocerca_actual = None
-                    tiempo_entrada_actual = None
-        
-        # Procesar última geocerca si existe
-        if geocerca_actual is not None:
-            ultimo_tiempo = g["Tiempo de evento"].iloc[-1]
-            duracion = (ultimo_tiempo - tiempo_entrada_actual).total_seconds()
-            if duracion >= UMBRAL_PERMANENCIA_REAL:
-                geocercas_validas.append(geocerca_actual)
-                tiempos_entrada.append(tiempo_entrada_actual)
-                tiempos_salida.append(ultimo_tiempo)
-            else:
-                print(f"   ⚠️ Filtrado ruido GPS: {geocerca_actual} ({duracion:.0f}s < {UMBRAL_PERMANENCIA_REAL}s)")
-        
-        # 🔍 PASO 2: Crear transiciones entre permanencias válidas
-        for i in range(len(geocercas_validas) - 1):
-            origen = geocercas_validas[i]
-            destino = geocercas_validas[i + 1]
-            tiempo_salida_origen = tiempos_salida[i]
-            tiempo_entrada_destino = tiempos_entrada[i + 1]
-            
-            # Duración de permanencia en el origen
-            duracion_permanencia = (tiempo_salida_origen - tiempos_entrada[i]).total_seconds()
-            
-            total_cambios += 1
-            
-            transiciones_completas.append({
-                "Nombre del Vehículo": veh,
-                "Origen": origen,
-                "Destino": destino,
-                "Tiempo_entrada": tiempos_entrada[i],
-                "Tiempo_salida": tiempo_salida_origen,
-                "Duracion_s": duracion_permanencia,
-                "Turno": turno(tiempos_entrada[i])
-            })
+    permanencias = ejecutar_por_vehiculo(detectar_permanencias, df, "Geocerca", UMBRAL_PERMANENCIA_REAL)
+    transiciones = construir_transiciones(permanencias)
 
     # Logging para verificar el filtrado
-    if total_cambios > 0:
+    if not transiciones.empty:
         print(f"🔍 Detección de transiciones con filtrado inteligente:")
         print(f"   - Umbral de permanencia real: {UMBRAL_PERMANENCIA_REAL}s")
-        print(f"   - Total transiciones válidas registradas: {len(transiciones_completas)}")
+        print(f"   - Permanencias reales detectadas: {len(permanencias)}")
+        print(f"   - Total transiciones válidas registradas: {len(transiciones)}")
 
-    if transiciones_completas:
-        return pd.DataFrame(transiciones_completas)
-    else:
+    if transiciones.empty:
         return pd.DataFrame(columns=[
             "Nombre del Vehículo", "Origen", "Destino",
             "Tiempo_entrada", "Tiempo_salida", "Duracion_s", "Turno"
         ])
 
+    transiciones["Turno"] = turnos_vectorizado(transiciones["Tiempo_entrada"], SHIFT_DAY_START, SHIFT_NIGHT_START)
+    return transiciones
+
 
 # ─────────────────────────────────────────────────────────────
 # 🆕 2.1 | Análisis de tiempos de viaje (cuando Geocercas está vacío)
@@ -339,76 +264,19 @@ def clasificar_proceso_con_secuencia(df: pd.DataFrame) -> pd.DataFrame:
     - Retorno: Botadero → Módulo/Pila ROM (después de descarga)
     - Retorno: Módulo/Pila ROM → Stock (después de carga)
     - Otros: Cualquier otra combinación
+
+    Cada geocerca se traduce a su categoría de dominio una sola vez y la regla
+    de retorno usa el proceso anterior del vehículo desplazado (sin bucles por fila).
     """
     if df.empty:
         return df
-    
-    # Las transiciones ya vienen filtradas por extraer_transiciones()
-    # No es necesario filtrar nuevamente aquí
-    
-    df = df.sort_values(["Nombre del Vehículo", "Tiempo_entrada"]).copy()
-    df["Proceso"] = "otro"  # Inicializar todos como "otro"
-    
+
     # Obtener INSTALACIONES_FAENA del contexto global
     INSTALACIONES_FAENA = globals().get("INSTALACIONES_FAENA", set())
-    
-    # Procesar cada vehículo por separado y reconstruir el DataFrame
-    grupos_procesados = []
-    
-    for veh, grupo in df.groupby("Nombre del Vehículo"):
-        # Crear una copia del grupo y ordenar por tiempo
-        grupo = grupo.copy().sort_values("Tiempo_entrada").reset_index(drop=True)
-        
-        for i in range(len(grupo)):
-            origen = grupo.loc[i, "Origen"]
-            destino = grupo.loc[i, "Destino"]
-            
-            # 🏭 PRIORIDAD ALTA: Movimientos que involucran instalaciones de faena son "otros"
-            if origen in INSTALACIONES_FAENA or destino in INSTALACIONES_FAENA:
-                grupo.loc[i, "Proceso"] = "otro"
-                continue
-            
-            # 1. CARGA: Stock → Módulo/Pila ROM
-            if origen in STOCKS and (destino in MODULES or destino in PILAS_ROM):
-                grupo.loc[i, "Proceso"] = "carga"
-                continue
-            
-            # 2. DESCARGA: Módulo/Pila ROM → Botadero (sin secuencia previa requerida)
-            if (origen in MODULES or origen in PILAS_ROM) and destino in BOTADEROS:
-                grupo.loc[i, "Proceso"] = "descarga"
-                continue
-            
-            # 3. RETORNO: Botadero → Módulo/Pila ROM (después de descarga)
-            if origen in BOTADEROS and (destino in MODULES or destino in PILAS_ROM):
-                # Verificar si el viaje anterior fue una descarga
-                if i > 0:
-                    viaje_anterior = grupo.loc[i-1, "Proceso"]
-                    if viaje_anterior == "descarga":
-                        grupo.loc[i, "Proceso"] = "retorno"
-                        continue
-                # Si no hay secuencia válida, es "otro"
-                grupo.loc[i, "Proceso"] = "otro"
-                continue
-            
-            # 4. RETORNO: Módulo/Pila ROM → Stock (después de carga)
-            if (origen in MODULES or origen in PILAS_ROM) and destino in STOCKS:
-                # Verificar si el viaje anterior fue una carga
-                if i > 0:
-                    viaje_anterior = grupo.loc[i-1, "Proceso"]
-                    if viaje_anterior == "carga":
-                        grupo.loc[i, "Proceso"] = "retorno"
-                        continue
-                # Si no hay secuencia válida, es "otro"
-                grupo.loc[i, "Proceso"] = "otro"
-                continue
-        
-        grupos_procesados.append(grupo)
-    
-    # Reconstruir el DataFrame completo
-    if grupos_procesados:
-        return pd.concat(grupos_procesados, ignore_index=True)
-    else:
-        return df
+
+    return clasificar_procesos_vectorizado(
+        df, STOCKS, MODULES | PILAS_ROM, BOTADEROS, INSTALACIONES_FAENA
+    )
 
 
 def clasificar_proceso(row: pd.Series) -> str:
@@ -658,7 +526,7 @@ if archivo:
     # Aplicar filtro de turno
     if turno_sel != "Todos":
         turno_filter = "dia" if turno_sel == "Día" else "noche"
-        df = df[df["Tiempo de evento"].apply(turno) == turno_filter]
+        df = df[turnos_vectorizado(df["Tiempo de evento"], SHIFT_DAY_START, SHIFT_NIGHT_START) == turno_filter]
 
     # ─── Procesamiento core ─────────────────────────────────
     trans   = extraer_transiciones(df)
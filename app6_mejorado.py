@@ -10,15 +10,28 @@ Versión 2025-01-31 – Dashboard reorganizado con:
 
 import streamlit as st
 import pandas as pd
-import numpy as np
 import altair as alt
 import unicodedata
 from datetime import time
-from io import BytesIO
-import folium
 from streamlit_folium import st_folium
-from sklearn.cluster import DBSCAN
 import re
+from cache_pipeline import PRESUPUESTO_CACHE_MB, CachePipeline, huella_contenido
+from capas_mapa import MAX_ELEMENTOS_MAPA, crear_mapa_calor
+from datos_graficos import (
+    PASOS_TIEMPO, agregar_por_tiempo, agrupar_dispersion, describir_grafico, fusionar_intervalos, limitar_categorias
+)
+from ejecucion_paralela import ejecutar_por_vehiculo
+from geocercas_poligonos import con_geocercas_resueltas, registro_configurado
+from ingesta_columnar import MODO_ARCHIVO_GRANDE, cargar_exportacion, compactar_exportacion
+from instrumentacion import MEMORIA_INSTRUMENTACION, Instrumentacion
+from motor_vectorizado import (
+    PROCESOS_PRODUCCION, UMBRAL_PERMANENCIA_REAL, agrupar_zonas_cercanas, calendario_turnos,
+    clasificar_procesos_vectorizado, codificar_geocercas, construir_cubo_conteos, detectar_detenciones,
+    detectar_detenciones_anomalas, dias_activos, enrollar_cubo, extraer_transiciones_vectorizado,
+    extraer_viajes_vectorizado, filtrar_resultados, lineas_base_permanencia, solapa_rango_fechas, tabla_por_proceso,
+    turnos_vectorizado
+)
+from reporte_excel import MIME_XLSX, TrabajoReporte
 
 st.set_page_config(
     page_title="⛏️ T-Metal – BI Operacional + Tiempos de Viaje",
@@ -43,60 +56,28 @@ PILAS_ROM: set[str] = set()
 # ─────────────────────────────────────────────────────────────
 # Funciones copiadas de app6
 # ─────────────────────────────────────────────────────────────
-def turno(ts: pd.Timestamp) -> str:
-    """
-    Determina el turno basado en la hora.
-    - Día: 08:00 - 19:59
-    - Noche: 20:00 - 07:59 (del día siguiente)
-    """
-    h = ts.time()
-    return "dia" if SHIFT_DAY_START <= h < SHIFT_NIGHT_START else "noche"
-
-def turno_con_fecha(ts: pd.Timestamp) -> tuple[str, pd.Timestamp]:
-    """
-    Determina el turno y la fecha correspondiente.
-    Para turnos de noche (20:00-07:59), la fecha es del día que inició el turno.
-    
-    Returns:
-        tuple: (turno, fecha_turno)
-    """
-    h = ts.time()
-    if SHIFT_DAY_START <= h < SHIFT_NIGHT_START:
-        # Turno día: mismo día
-        return "dia", ts.normalize()
-    else:
-        # Turno noche: si es antes de las 8:00, pertenece al turno del día anterior
-        if h < SHIFT_DAY_START:
-            # Es madrugada (00:00-07:59), pertenece al turno de noche del día anterior
-            fecha_turno = ts.normalize() - pd.Timedelta(days=1)
-        else:
-            # Es noche (20:00-23:59), pertenece al turno de noche del mismo día
-            fecha_turno = ts.normalize()
-        return "noche", fecha_turno
-
-def obtener_descripcion_turno(turno_tipo: str, fecha_turno: pd.Timestamp) -> str:
-    """
-    Genera descripción detallada del turno.
-    """
-    fecha_str = fecha_turno.strftime("%d-%m-%Y")
-    if turno_tipo == "dia":
-        return f"Turno Día {fecha_str} (08:00-19:59)"
-    else:
-        fecha_siguiente = (fecha_turno + pd.Timedelta(days=1)).strftime("%d-%m-%Y")
-        return f"Turno Noche {fecha_str} (20:00 del {fecha_str} - 07:59 del {fecha_siguiente})"
-
 def normalizar(s: str) -> str:
     """Quita tildes y pasa a minúsculas para detección robusta."""
     return unicodedata.normalize("NFD", str(s).lower()).encode("ascii", "ignore").decode("ascii")
 
 def preparar_datos(df: pd.DataFrame) -> pd.DataFrame:
-    """Limpia y prepara el DataFrame de entrada."""
+    """
+    Limpia y prepara el DataFrame de entrada.
+    Agrega 'Geocerca_norm': geocerca normalizada (categórica), calculada una vez por valor único.
+    """
     df = df.copy()
     df["Tiempo de evento"] = pd.to_datetime(df["Tiempo de evento"])
     df["Geocercas"] = df["Geocercas"].fillna("").astype(str)
     df["Nombre del Vehículo"] = df["Nombre del Vehículo"].astype(str)
+    df["Geocerca_norm"] = codificar_geocercas(df["Geocercas"], normalizar_geocerca)
     return df.sort_values(["Nombre del Vehículo", "Tiempo de evento"])
 
+def geocercas_normalizadas(df: pd.DataFrame) -> pd.Series:
+    """Devuelve la columna 'Geocerca_norm' o la calcula si el DataFrame no pasó por preparar_datos."""
+    if "Geocerca_norm" in df.columns:
+        return df["Geocerca_norm"]
+    return codificar_geocercas(df["Geocercas"], normalizar_geocerca)
+
 def normalizar_geocerca(geocerca_original: str) -> str:
     """
     Normaliza las geocercas según las reglas específicas:
@@ -176,14 +157,8 @@ def poblar_dominios(df: pd.DataFrame) -> None:
     """Detecta automáticamente los dominios de geocercas con normalización mejorada."""
     global STOCKS, MODULES, BOTADEROS, PILAS_ROM
     
-    # Aplicar normalización a todas las geocercas
-    geocercas_originales = set(df["Geocercas"].unique()) - {""}
-    geos = set()
-    
-    for geo_orig in geocercas_originales:
-        geo_normalizada = normalizar_geocerca(geo_orig)
-        if geo_normalizada:  # Solo agregar si no es vacía
-            geos.add(geo_normalizada)
+    # Geocercas normalizadas (una vez por valor único)
+    geos = set(geocercas_normalizadas(df).unique()) - {""}
     
     STOCKS = {g for g in geos if "stock" in normalizar(g)}
     MODULES = {g for g in geos if "modulo" in normalizar(g) or "módulo" in normalizar(g)}
@@ -206,98 +181,22 @@ def extraer_transiciones(df: pd.DataFrame) -> pd.DataFrame:
     - Combina: Geocerca1 → [VIAJE] → Geocerca2 en Geocerca1 → Geocerca2
     - Filtra permanencias muy cortas (ruido GPS)
     - Usa un umbral más alto (60s) para permanencias reales
+    La detección de permanencias se hace de forma vectorizada en `motor_vectorizado`.
     """
-    UMBRAL_PERMANENCIA_REAL = 60  # Umbral alto para permanencias reales (no ruido GPS)
-    transiciones_completas = []
-    total_cambios = 0
-
-    for veh, g in df.groupby("Nombre del Vehículo"):
-        g = g.copy().sort_values("Tiempo de evento")
-        
-        # 🔍 PASO 1: Detectar permanencias reales (filtrar ruido GPS)
-        geocercas_validas = []
-        tiempos_entrada = []
-        tiempos_salida = []
-        
-        geocerca_actual = None
-        tiempo_entrada_actual = None
-        
-        for i, row in g.iterrows():
-            geo_original = str(row["Geocercas"]).strip()
-            geo = normalizar_geocerca(geo_original)  # Aplicar normalización
-            tiempo = row["Tiempo de evento"]
-            
-            if geo != "":  # Registro en geocerca (después de normalización)
-                if geocerca_actual != geo:
-                    # Cambio de geocerca o primera geocerca
-                    if geocerca_actual is not None:
-                        # Finalizar geocerca anterior
-                        duracion = (tiempo - tiempo_entrada_actual).total_seconds()
-                        if duracion >= UMBRAL_PERMANENCIA_REAL:
-                            # Permanencia válida - registrar
-                            geocercas_validas.append(geocerca_actual)
-                            tiempos_entrada.append(tiempo_entrada_actual)
-                            tiempos_salida.append(tiempo)
-                    
-                    # Iniciar nueva geocerca
-                    geocerca_actual = geo
-                    tiempo_entrada_actual = tiempo
-            else:
-                # Registro en viaje
-                if geocerca_actual is not None:
-                    # Salida de geocerca hacia viaje
-                    duracion = (tiempo - tiempo_entrada_actual).total_seconds()
-                    if duracion >= UMBRAL_PERMANENCIA_REAL:
-                        # Permanencia válida - registrar
-                        geocercas_validas.append(geocerca_actual)
-                        tiempos_entrada.append(tiempo_entrada_actual)
-                        tiempos_salida.append(tiempo)
-                    
-                    geocerca_actual = None
-                    tiempo_entrada_actual = None
-        
-        # Procesar última geocerca si existe
-        if geocerca_actual is not None:
-            ultimo_tiempo = g["Tiempo de evento"].iloc[-1]
-            duracion = (ultimo_tiempo - tiempo_entrada_actual).total_seconds()
-            if duracion >= UMBRAL_PERMANENCIA_REAL:
-                geocercas_validas.append(geocerca_actual)
-                tiempos_entrada.append(tiempo_entrada_actual)
-                tiempos_salida.append(ultimo_tiempo)
-        
-        # 🔍 PASO 2: Crear transiciones entre permanencias válidas
-        for i in range(len(geocercas_validas) - 1):
-            origen = geocercas_validas[i]
-            destino = geocercas_validas[i + 1]
-            tiempo_salida_origen = tiempos_salida[i]
-            tiempo_entrada_destino = tiempos_entrada[i + 1]
-            
-            # Duración de permanencia en el origen
-            duracion_permanencia = (tiempo_salida_origen - tiempos_entrada[i]).total_seconds()
-            
-            total_cambios += 1
-            
-            turno_tipo, fecha_turno = turno_con_fecha(tiempos_entrada[i])
-            transiciones_completas.append({
-                "Nombre del Vehículo": veh,
-                "Origen": origen,
-                "Destino": destino,
-                "Tiempo_entrada": tiempos_entrada[i],
-                "Tiempo_salida": tiempo_salida_origen,
-                "Duracion_s": duracion_permanencia,
-                "Turno": turno_tipo,
-                "Fecha_Turno": fecha_turno,
-                "Descripcion_Turno": obtener_descripcion_turno(turno_tipo, fecha_turno)
-            })
+    trans = ejecutar_por_vehiculo(
+        extraer_transiciones_vectorizado,
+        df.assign(Geocerca_norm=geocercas_normalizadas(df)), "Geocerca_norm", UMBRAL_PERMANENCIA_REAL
+    )
 
-    if transiciones_completas:
-        return pd.DataFrame(transiciones_completas)
-    else:
+    if trans.empty:
         return pd.DataFrame(columns=[
             "Nombre del Vehículo", "Origen", "Destino",
             "Tiempo_entrada", "Tiempo_salida", "Duracion_s", "Turno", "Fecha_Turno", "Descripcion_Turno"
         ])
 
+    trans = trans.join(calendario_turnos(trans["Tiempo_entrada"], SHIFT_DAY_START, SHIFT_NIGHT_START))
+    return trans
+
 def clasificar_proceso_con_secuencia(df: pd.DataFrame) -> pd.DataFrame:
     """
     Clasifica procesos considerando secuencias temporales:
@@ -306,67 +205,19 @@ def clasificar_proceso_con_secuencia(df: pd.DataFrame) -> pd.DataFrame:
     - Retorno: Botadero → Módulo/Pila ROM (después de descarga)
     - Retorno: Módulo/Pila ROM → Stock (después de carga)
     - Otros: Cualquier otra combinación
+
+    Cada geocerca se traduce a su categoría de dominio una sola vez y la regla
+    de retorno usa el proceso anterior del vehículo desplazado (sin bucles por fila).
     """
     if df.empty:
         return df
 
-    df = df.sort_values(["Nombre del Vehículo", "Tiempo_entrada"]).copy()
-    df["Proceso"] = "otro"  # Inicializar todos como "otro"
-
     # Obtener geocercas no operacionales del contexto global
     GEOCERCAS_NO_OPERACIONALES = globals().get("GEOCERCAS_NO_OPERACIONALES", set())
 
-    # Procesar cada vehículo por separado
-    grupos_procesados = []
-
-    for veh, grupo in df.groupby("Nombre del Vehículo"):
-        grupo = grupo.copy().sort_values("Tiempo_entrada").reset_index(drop=True)
-
-        for i in range(len(grupo)):
-            origen = grupo.loc[i, "Origen"]
-            destino = grupo.loc[i, "Destino"]
-
-            # 🏭 PRIORIDAD ALTA: Movimientos que involucran geocercas no operacionales son "otros"
-            if origen in GEOCERCAS_NO_OPERACIONALES or destino in GEOCERCAS_NO_OPERACIONALES:
-                grupo.loc[i, "Proceso"] = "otro"
-                continue
-
-            # 1. CARGA: Stock → Módulo/Pila ROM
-            if origen in STOCKS and (destino in MODULES or destino in PILAS_ROM):
-                grupo.loc[i, "Proceso"] = "carga"
-                continue
-
-            # 2. DESCARGA: Módulo/Pila ROM → Botadero
-            if (origen in MODULES or origen in PILAS_ROM) and destino in BOTADEROS:
-                grupo.loc[i, "Proceso"] = "descarga"
-                continue
-
-            # 3. RETORNO: Botadero → Módulo/Pila ROM (después de descarga)
-            if origen in BOTADEROS and (destino in MODULES or destino in PILAS_ROM):
-                if i > 0:
-                    viaje_anterior = grupo.loc[i-1, "Proceso"]
-                    if viaje_anterior == "descarga":
-                        grupo.loc[i, "Proceso"] = "retorno"
-                        continue
-                grupo.loc[i, "Proceso"] = "otro"
-                continue
-
-            # 4. RETORNO: Módulo/Pila ROM → Stock (después de carga)
-            if (origen in MODULES or origen in PILAS_ROM) and destino in STOCKS:
-                if i > 0:
-                    viaje_anterior = grupo.loc[i-1, "Proceso"]
-                    if viaje_anterior == "carga":
-                        grupo.loc[i, "Proceso"] = "retorno"
-                        continue
-                grupo.loc[i, "Proceso"] = "otro"
-                continue
-
-        grupos_procesados.append(grupo)
-
-    if grupos_procesados:
-        return pd.concat(grupos_procesados, ignore_index=True)
-    else:
-        return df
+    return clasificar_procesos_vectorizado(
+        df, STOCKS, MODULES | PILAS_ROM, BOTADEROS, GEOCERCAS_NO_OPERACIONALES
+    )
 
 def analizar_detenciones_anomalas(df: pd.DataFrame, trans: pd.DataFrame) -> pd.DataFrame:
     """
@@ -380,12 +231,11 @@ def analizar_detenciones_anomalas(df: pd.DataFrame, trans: pd.DataFrame) -> pd.D
     2. Anómala = duración > promedio + 2σ de la geocerca específica
     3. Solo se analizan geocercas operacionales (stocks, modules, pilas_rom, botaderos)
     4. Se excluyen detenciones normales de carga/descarga (< 30 min)
+    La evaluación de estadías se hace de forma vectorizada en `motor_vectorizado`.
     """
     if df.empty or trans.empty:
         return pd.DataFrame()
     
-    detenciones_anomalas = []
-    
     # Obtener dominios globales
     STOCKS = globals().get("STOCKS", set())
     MODULES = globals().get("MODULES", set()) 
@@ -397,227 +247,23 @@ def analizar_detenciones_anomalas(df: pd.DataFrame, trans: pd.DataFrame) -> pd.D
         return pd.DataFrame()
     
     # Calcular estadísticas de permanencia por geocerca
-    trans_operacionales = trans[trans["Origen"].isin(geocercas_operacionales)].copy()
-    if trans_operacionales.empty:
+    lineas_base = lineas_base_permanencia(trans, geocercas_operacionales)
+    if lineas_base.empty:
         return pd.DataFrame()
     
-    estadisticas_geocercas = trans_operacionales.groupby("Origen")["Duracion_s"].agg([
-        "mean", "std", "count", "median"
-    ]).reset_index()
-    estadisticas_geocercas["umbral_anomalo"] = (
-        estadisticas_geocercas["mean"] + 2 * estadisticas_geocercas["std"]
+    return ejecutar_por_vehiculo(
+        detectar_detenciones_anomalas,
+        df.assign(Geocercas_norm=geocercas_normalizadas(df)), lineas_base, geocercas_operacionales, "Geocercas_norm"
     )
-    
-    # Procesar cada vehículo
-    for veh, g in df.groupby("Nombre del Vehículo"):
-        g = g.copy().sort_values("Tiempo de evento")
-        
-        # Aplicar normalización de geocercas
-        g["Geocercas_norm"] = g["Geocercas"].apply(normalizar_geocerca)
-        
-        # Verificar si hay columna de velocidad
-        velocidad_disponible = "Velocidad [km/h]" in g.columns
-        
-        # Identificar períodos en geocercas operacionales
-        geocerca_actual = None
-        tiempo_entrada_actual = None
-        registros_geocerca = []
-        
-        for i, row in g.iterrows():
-            geo = row["Geocercas_norm"]
-            tiempo = row["Tiempo de evento"]
-            velocidad = row.get("Velocidad [km/h]", 0) if velocidad_disponible else 0
-            
-            if geo != "" and geo in geocercas_operacionales:
-                if geocerca_actual != geo:
-                    # Procesar geocerca anterior si existe
-                    if geocerca_actual is not None and registros_geocerca:
-                        detenciones_anomalas.extend(
-                            _analizar_detenciones_en_geocerca(
-                                veh, geocerca_actual, tiempo_entrada_actual,
-                                registros_geocerca, estadisticas_geocercas, velocidad_disponible
-                            )
-                        )
-                    
-                    # Iniciar nueva geocerca
-                    geocerca_actual = geo
-                    tiempo_entrada_actual = tiempo
-                    registros_geocerca = [(tiempo, velocidad)]
-                else:
-                    # Continuar en la misma geocerca
-                    registros_geocerca.append((tiempo, velocidad))
-            else:
-                # Salida de geocerca o en viaje
-                if geocerca_actual is not None and registros_geocerca:
-                    detenciones_anomalas.extend(
-                        _analizar_detenciones_en_geocerca(
-                            veh, geocerca_actual, tiempo_entrada_actual,
-                            registros_geocerca, estadisticas_geocercas, velocidad_disponible
-                        )
-                    )
-                    geocerca_actual = None
-                    registros_geocerca = []
-        
-        # Procesar última geocerca si existe
-        if geocerca_actual is not None and registros_geocerca:
-            detenciones_anomalas.extend(
-                _analizar_detenciones_en_geocerca(
-                    veh, geocerca_actual, tiempo_entrada_actual,
-                    registros_geocerca, estadisticas_geocercas, velocidad_disponible
-                )
-            )
-    
-    if detenciones_anomalas:
-        return pd.DataFrame(detenciones_anomalas)
-    else:
-        return pd.DataFrame(columns=[
-            "Nombre del Vehículo", "Geocerca", "Tiempo_inicio", "Tiempo_fin",
-            "Duracion_total_min", "Duracion_detenido_min", "Velocidad_promedio",
-            "Tipo_anomalia", "Severidad", "Umbral_normal_min", "Exceso_min"
-        ])
-
-def _analizar_detenciones_en_geocerca(vehiculo: str, geocerca: str, tiempo_inicio: pd.Timestamp,
-                                     registros: list, estadisticas: pd.DataFrame, velocidad_disponible: bool) -> list:
-    """Analiza detenciones dentro de una geocerca específica."""
-    if len(registros) < 2:
-        return []
-    
-    tiempo_fin = registros[-1][0]
-    duracion_total_s = (tiempo_fin - tiempo_inicio).total_seconds()
-    duracion_total_min = duracion_total_s / 60
-    
-    # Filtrar permanencias muy cortas
-    if duracion_total_min < 10:  # Menos de 10 minutos
-        return []
-    
-    detenciones = []
-    
-    # Obtener umbral normal para esta geocerca
-    umbral_info = estadisticas[estadisticas["Origen"] == geocerca]
-    if umbral_info.empty:
-        umbral_normal_min = 30  # Default 30 minutos
-        umbral_anomalo_min = 60  # Default 60 minutos
-    else:
-        umbral_normal_min = umbral_info["mean"].iloc[0] / 60
-        umbral_anomalo_min = umbral_info["umbral_anomalo"].iloc[0] / 60
-    
-    # Análisis de velocidad si está disponible
-    if velocidad_disponible:
-        velocidades = [v for _, v in registros]
-        velocidad_promedio = sum(velocidades) / len(velocidades) if velocidades else 0
-        
-        # Contar tiempo detenido (velocidad < 2 km/h)
-        tiempos_detenido = []
-        for i in range(len(registros) - 1):
-            if registros[i][1] < 2:  # Velocidad < 2 km/h
-                duracion_segmento = (registros[i+1][0] - registros[i][0]).total_seconds() / 60
-                tiempos_detenido.append(duracion_segmento)
-        
-        duracion_detenido_min = sum(tiempos_detenido)
-    else:
-        velocidad_promedio = 0
-        duracion_detenido_min = duracion_total_min  # Asumir todo el tiempo detenido si no hay datos de velocidad
-    
-    # Determinar si es anómalo
-    tipo_anomalia = None
-    severidad = "Normal"
-    
-    if duracion_total_min > umbral_anomalo_min:
-        if duracion_detenido_min > umbral_normal_min * 1.5:
-            tipo_anomalia = "Detención Prolongada"
-            severidad = "Alta" if duracion_total_min > umbral_anomalo_min * 1.5 else "Media"
-        elif velocidad_promedio < 1 and duracion_total_min > umbral_normal_min * 1.2:
-            tipo_anomalia = "Velocidad Anómala"
-            severidad = "Media"
-    
-    if tipo_anomalia:
-        detenciones.append({
-            "Nombre del Vehículo": vehiculo,
-            "Geocerca": geocerca,
-            "Tiempo_inicio": tiempo_inicio,
-            "Tiempo_fin": tiempo_fin,
-            "Duracion_total_min": round(duracion_total_min, 1),
-            "Duracion_detenido_min": round(duracion_detenido_min, 1),
-            "Velocidad_promedio": round(velocidad_promedio, 2),
-            "Tipo_anomalia": tipo_anomalia,
-            "Severidad": severidad,
-            "Umbral_normal_min": round(umbral_normal_min, 1),
-            "Exceso_min": round(duracion_total_min - umbral_normal_min, 1)
-        })
-    
-    return detenciones
 
 def extraer_tiempos_viaje(df: pd.DataFrame) -> pd.DataFrame:
-    """Extrae tiempos de viaje cuando la geocerca está vacía."""
-    viajes = []
-    casos_desconocidos = {"origen": 0, "destino": 0, "ambos": 0}
-    
-    for veh, g in df.groupby("Nombre del Vehículo"):
-        g = g.copy().sort_values("Tiempo de evento").reset_index(drop=True)
-        
-        # Aplicar normalización de geocercas y identificar grupos de registros consecutivos en viaje
-        g["Geocercas_norm"] = g["Geocercas"].apply(normalizar_geocerca)
-        g["es_viaje"] = g["Geocercas_norm"] == ""
-        g["grupo_viaje"] = (g["es_viaje"] != g["es_viaje"].shift()).cumsum()
-        
-        # Procesar solo grupos que son viajes
-        grupos_viaje = g[g["es_viaje"]].groupby("grupo_viaje")
-        
-        for grupo_id, grupo in grupos_viaje:
-            if len(grupo) < 2:  # Necesitamos al menos 2 registros para calcular duración
-                continue
-                
-            inicio = grupo["Tiempo de evento"].iloc[0]
-            fin = grupo["Tiempo de evento"].iloc[-1]
-            duracion_s = (fin - inicio).total_seconds()
-            
-            if duracion_s < 30:  # Filtrar viajes muy cortos
-                continue
-            
-            # Encontrar origen y destino con búsqueda mejorada
-            idx_inicio_grupo = grupo.index[0]
-            idx_fin_grupo = grupo.index[-1]
-            
-            # Buscar geocerca anterior (origen) - búsqueda más amplia
-            origen = "DESCONOCIDO"
-            # Buscar hacia atrás en todo el DataFrame del vehículo
-            registros_anteriores = g[g.index < idx_inicio_grupo]
-            if not registros_anteriores.empty:
-                # Buscar el último registro con geocerca no vacía (después de normalización)
-                geocercas_anteriores = registros_anteriores[registros_anteriores["Geocercas_norm"] != ""]
-                if not geocercas_anteriores.empty:
-                    origen = geocercas_anteriores["Geocercas_norm"].iloc[-1]
-            
-            # Buscar geocerca posterior (destino) - búsqueda más amplia  
-            destino = "DESCONOCIDO"
-            # Buscar hacia adelante en todo el DataFrame del vehículo
-            registros_posteriores = g[g.index > idx_fin_grupo]
-            if not registros_posteriores.empty:
-                # Buscar el primer registro con geocerca no vacía (después de normalización)
-                geocercas_posteriores = registros_posteriores[registros_posteriores["Geocercas_norm"] != ""]
-                if not geocercas_posteriores.empty:
-                    destino = geocercas_posteriores["Geocercas_norm"].iloc[0]
-            
-            # Contar casos desconocidos para diagnóstico
-            if origen == "DESCONOCIDO" and destino == "DESCONOCIDO":
-                casos_desconocidos["ambos"] += 1
-            elif origen == "DESCONOCIDO":
-                casos_desconocidos["origen"] += 1
-            elif destino == "DESCONOCIDO":
-                casos_desconocidos["destino"] += 1
-            
-            turno_tipo, fecha_turno = turno_con_fecha(inicio)
-            viajes.append({
-                "Nombre del Vehículo": veh,
-                "Origen": origen,
-                "Destino": destino,
-                "Inicio_viaje": inicio,
-                "Fin_viaje": fin,
-                "Duracion_viaje_s": duracion_s,
-                "Turno": turno_tipo,
-                "Fecha_Turno": fecha_turno,
-                "Descripcion_Turno": obtener_descripcion_turno(turno_tipo, fecha_turno)
-            })
+    """
+    Extrae tiempos de viaje cuando la geocerca está vacía.
+    Los contadores de casos DESCONOCIDO quedan en `viajes.attrs["casos_desconocidos"]`.
+    """
+    viajes, casos_desconocidos = ejecutar_por_vehiculo(
+        extraer_viajes_vectorizado, df.assign(Geocerca_norm=geocercas_normalizadas(df)), "Geocerca_norm"
+    )
     
     # Logging para diagnóstico
     if casos_desconocidos["origen"] > 0 or casos_desconocidos["destino"] > 0 or casos_desconocidos["ambos"] > 0:
@@ -627,13 +273,16 @@ def extraer_tiempos_viaje(df: pd.DataFrame) -> pd.DataFrame:
         print(f"   - Ambos desconocidos: {casos_desconocidos['ambos']} viajes")
         print(f"   - Total viajes válidos: {len(viajes)}")
     
-    if viajes:
-        return pd.DataFrame(viajes)
-    else:
-        return pd.DataFrame(columns=[
+    if viajes.empty:
+        viajes = pd.DataFrame(columns=[
             "Nombre del Vehículo", "Origen", "Destino",
             "Inicio_viaje", "Fin_viaje", "Duracion_viaje_s", "Turno", "Fecha_Turno", "Descripcion_Turno"
         ])
+    else:
+        viajes = viajes.join(calendario_turnos(viajes["Inicio_viaje"], SHIFT_DAY_START, SHIFT_NIGHT_START))
+    
+    viajes.attrs["casos_desconocidos"] = casos_desconocidos
+    return viajes
 
 def construir_analisis_horario(trans_filtradas: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
@@ -745,252 +394,137 @@ def extraer_coordenadas_url(url_mapa: str) -> tuple:
     
     return None, None
 
-def calcular_distancia_haversine(lat1, lon1, lat2, lon2):
-    """Calcula la distancia entre dos puntos GPS usando la fórmula de Haversine."""
-    R = 6371000  # Radio de la Tierra en metros
-    
-    lat1_rad = np.radians(lat1)
-    lat2_rad = np.radians(lat2)
-    delta_lat = np.radians(lat2 - lat1)
-    delta_lon = np.radians(lon2 - lon1)
-    
-    a = np.sin(delta_lat/2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon/2)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-    
-    return R * c
-
-def agrupar_zonas_cercanas(zonas_df: pd.DataFrame, radio_metros: float = 10.0) -> pd.DataFrame:
-    """
-    Agrupa zonas candidatas que están dentro de un radio específico usando clustering.
-    """
-    if zonas_df.empty:
-        return zonas_df
-    
-    # Preparar coordenadas para clustering
-    coordenadas = zonas_df[["Latitud_Centro", "Longitud_Centro"]].values
-    
-    # Convertir radio de metros a grados aproximadamente
-    # 1 grado ≈ 111,000 metros
-    radio_grados = radio_metros / 111000
-    
-    # Usar DBSCAN para clustering basado en distancia
-    clustering = DBSCAN(eps=radio_grados, min_samples=1, metric='haversine')
-    clusters = clustering.fit_predict(np.radians(coordenadas))
-    
-    # Agrupar zonas por cluster
-    zonas_agrupadas = []
-    
-    for cluster_id in np.unique(clusters):
-        if cluster_id == -1:  # Ruido (no debería ocurrir con min_samples=1)
-            continue
-            
-        zonas_cluster = zonas_df[clusters == cluster_id]
-        
-        if len(zonas_cluster) == 1:
-            # Solo una zona en el cluster, mantener original
-            zona = zonas_cluster.iloc[0].to_dict()
-            zona["Zonas_Agrupadas"] = 1
-            zona["Vehiculos_Involucrados"] = [zona["Nombre del Vehículo"]]
-            zonas_agrupadas.append(zona)
-        else:
-            # Múltiples zonas, crear zona agrupada
-            # Calcular centro ponderado por duración
-            pesos = zonas_cluster["Duracion_Minutos"].values
-            lat_centro = np.average(zonas_cluster["Latitud_Centro"], weights=pesos)
-            lon_centro = np.average(zonas_cluster["Longitud_Centro"], weights=pesos)
-            
-            # Calcular radio máximo del cluster
-            distancias = []
-            for _, zona in zonas_cluster.iterrows():
-                dist = calcular_distancia_haversine(lat_centro, lon_centro, 
-                                                  zona["Latitud_Centro"], zona["Longitud_Centro"])
-                distancias.append(dist)
-            radio_cluster = max(distancias) if distancias else 0
-            
-            zona_agrupada = {
-                "Nombre del Vehículo": f"AGRUPADA ({len(zonas_cluster)} zonas)",
-                "Latitud_Centro": lat_centro,
-                "Longitud_Centro": lon_centro,
-                "Duracion_Minutos": zonas_cluster["Duracion_Minutos"].sum(),
-                "Registros": zonas_cluster["Registros"].sum(),
-                "Radio_Aprox_m": max(radio_cluster, zonas_cluster["Radio_Aprox_m"].max()),
-                "Inicio": zonas_cluster["Inicio"].min(),
-                "Fin": zonas_cluster["Fin"].max(),
-                "Velocidad_Promedio": zonas_cluster["Velocidad_Promedio"].mean(),
-                "Zonas_Agrupadas": len(zonas_cluster),
-                "Vehiculos_Involucrados": zonas_cluster["Nombre del Vehículo"].tolist()
-            }
-            zonas_agrupadas.append(zona_agrupada)
-    
-    if zonas_agrupadas:
-        resultado = pd.DataFrame(zonas_agrupadas)
-        # Ordenar por duración descendente
-        resultado = resultado.sort_values("Duracion_Minutos", ascending=False).reset_index(drop=True)
-        return resultado
-    else:
-        return pd.DataFrame()
-
 def analizar_zonas_no_mapeadas(df: pd.DataFrame, velocidad_max: float = 5.0, tiempo_min_minutos: int = 10, radio_agrupacion: float = 10.0) -> pd.DataFrame:
     """
     Identifica zonas donde los vehículos permanecen mucho tiempo fuera de geocercas
     con baja velocidad, sugiriendo posibles geocercas no mapeadas.
     Incluye agrupación de zonas cercanas.
+    La segmentación de detenciones se hace de forma vectorizada en `motor_vectorizado`.
     """
-    # Filtrar registros fuera de geocercas
-    fuera_geocercas = df[df["Geocercas"] == ""].copy()
-    
-    if fuera_geocercas.empty:
-        return pd.DataFrame()
-    
-    # Filtrar por velocidad baja (o NaN que indica parado)
-    fuera_geocercas["Velocidad [km/h]"] = pd.to_numeric(fuera_geocercas["Velocidad [km/h]"], errors='coerce')
-    baja_velocidad = fuera_geocercas[
-        (fuera_geocercas["Velocidad [km/h]"].isna()) | 
-        (fuera_geocercas["Velocidad [km/h]"] <= velocidad_max)
-    ].copy()
-    
-    if baja_velocidad.empty:
-        return pd.DataFrame()
-    
-    # Extraer coordenadas de latitud/longitud directamente
-    baja_velocidad = baja_velocidad.dropna(subset=["Latitud", "Longitud"])
-    
-    if baja_velocidad.empty:
-        return pd.DataFrame()
-    
-    # Convertir a numérico
-    baja_velocidad["Latitud"] = pd.to_numeric(baja_velocidad["Latitud"], errors='coerce')
-    baja_velocidad["Longitud"] = pd.to_numeric(baja_velocidad["Longitud"], errors='coerce')
-    baja_velocidad = baja_velocidad.dropna(subset=["Latitud", "Longitud"])
-    
-    if len(baja_velocidad) < 10:  # Necesitamos suficientes puntos
-        return pd.DataFrame()
-    
-    # Agrupar por vehículo y analizar permanencias
-    zonas_candidatas = []
-    
-    for veh, grupo in baja_velocidad.groupby("Nombre del Vehículo"):
-        grupo = grupo.sort_values("Tiempo de evento").reset_index(drop=True)
-        
-        # Identificar grupos temporales consecutivos (permanencias)
-        grupo["tiempo_diff"] = grupo["Tiempo de evento"].diff().dt.total_seconds().fillna(0)
-        grupo["nuevo_grupo"] = (grupo["tiempo_diff"] > 300).cumsum()  # 5 minutos de separación
-        
-        for grupo_id, subgrupo in grupo.groupby("nuevo_grupo"):
-            if len(subgrupo) < 3:  # Mínimo 3 registros
-                continue
-                
-            duracion_minutos = (subgrupo["Tiempo de evento"].max() - subgrupo["Tiempo de evento"].min()).total_seconds() / 60
-            
-            if duracion_minutos >= tiempo_min_minutos:
-                # Calcular centro de la zona
-                lat_centro = subgrupo["Latitud"].mean()
-                lon_centro = subgrupo["Longitud"].mean()
-                
-                # Calcular dispersión (radio aproximado)
-                lat_std = subgrupo["Latitud"].std()
-                lon_std = subgrupo["Longitud"].std()
-                radio_aprox = np.sqrt(lat_std**2 + lon_std**2) * 111000  # Conversión aproximada a metros
-                
-                zonas_candidatas.append({
-                    "Nombre del Vehículo": veh,
-                    "Latitud_Centro": lat_centro,
-                    "Longitud_Centro": lon_centro,
-                    "Duracion_Minutos": duracion_minutos,
-                    "Registros": len(subgrupo),
-                    "Radio_Aprox_m": radio_aprox,
-                    "Inicio": subgrupo["Tiempo de evento"].min(),
-                    "Fin": subgrupo["Tiempo de evento"].max(),
-                    "Velocidad_Promedio": subgrupo["Velocidad [km/h]"].mean()
-                })
-    
-    if not zonas_candidatas:
+    zonas_df = ejecutar_por_vehiculo(detectar_detenciones, df, velocidad_max, tiempo_min_minutos)
+
+    if zonas_df.empty:
         return pd.DataFrame()
-    
-    # Crear DataFrame inicial
-    zonas_df = pd.DataFrame(zonas_candidatas)
-    
+
     # Agrupar zonas cercanas
-    zonas_agrupadas = agrupar_zonas_cercanas(zonas_df, radio_agrupacion)
-    
-    return zonas_agrupadas
+    return agrupar_zonas_cercanas(zonas_df, radio_agrupacion)
 
-def crear_mapa_calor(df: pd.DataFrame, zonas_candidatas: pd.DataFrame) -> folium.Map:
-    """Crea un mapa de calor con las zonas candidatas y geocercas existentes."""
-    
-    # Calcular centro del mapa
-    if not df.empty and "Latitud" in df.columns and "Longitud" in df.columns:
-        df_coords = df.dropna(subset=["Latitud", "Longitud"])
-        if not df_coords.empty:
-            centro_lat = df_coords["Latitud"].mean()
-            centro_lon = df_coords["Longitud"].mean()
-        else:
-            centro_lat, centro_lon = -22.59, -69.86  # Coordenadas por defecto
+def mostrar_grafico(grafico: alt.Chart, detalle: dict):
+    """Muestra un gráfico con sus datos ya reducidos y el tamaño que envía al navegador."""
+    st.altair_chart(grafico, use_container_width=True)
+    st.caption(describir_grafico(grafico, detalle))
+
+def panel_reporte_excel(clave: tuple, hojas: dict, instrumentacion: Instrumentacion | None = None):
+    """
+    Reporte Excel bajo demanda: se genera en segundo plano solo al pedirlo y se
+    descarta si cambian los datos o filtros (`clave`).
+    """
+    trabajo = st.session_state.get("reporte_excel")
+    if trabajo is not None and trabajo.clave != clave:
+        trabajo.descartar()
+        trabajo = st.session_state["reporte_excel"] = None
+
+    if trabajo is None:
+        if not st.button("📊 Generar reporte Excel"):
+            return
+        trabajo = st.session_state["reporte_excel"] = TrabajoReporte(hojas, clave, instrumentacion=instrumentacion)
+
+    if not trabajo.listo:
+        avance_reporte_excel()
+    elif trabajo.error is not None:
+        st.error(f"No se pudo generar el reporte Excel: {trabajo.error}")
+        if st.button("🔄 Reintentar reporte Excel"):
+            st.session_state["reporte_excel"] = TrabajoReporte(hojas, clave, instrumentacion=instrumentacion)
+            st.rerun()
     else:
-        centro_lat, centro_lon = -22.59, -69.86
-    
-    # Crear mapa base
-    mapa = folium.Map(
-        location=[centro_lat, centro_lon],
-        zoom_start=13,
-        tiles='OpenStreetMap'
-    )
-    
-    # Añadir geocercas conocidas
-    geocercas_conocidas = df[df["Geocercas"] != ""].dropna(subset=["Latitud", "Longitud"])
-    if not geocercas_conocidas.empty:
-        for geocerca in geocercas_conocidas["Geocercas"].unique():
-            puntos_geocerca = geocercas_conocidas[geocercas_conocidas["Geocercas"] == geocerca]
-            if not puntos_geocerca.empty:
-                lat_media = puntos_geocerca["Latitud"].mean()
-                lon_media = puntos_geocerca["Longitud"].mean()
-                
-                folium.Marker(
-                    [lat_media, lon_media],
-                    popup=f"Geocerca: {geocerca}",
-                    icon=folium.Icon(color='green', icon='info-sign')
-                ).add_to(mapa)
-    
-    # Añadir zonas candidatas
-    if not zonas_candidatas.empty:
-        for idx, zona in zonas_candidatas.iterrows():
-            # Determinar si es zona agrupada
-            es_agrupada = zona.get("Zonas_Agrupadas", 1) > 1
-            color = 'orange' if es_agrupada else 'red'
-            
-            # Preparar información del popup
-            if es_agrupada:
-                vehiculos_info = ", ".join(zona.get("Vehiculos_Involucrados", [zona["Nombre del Vehículo"]]))
-                popup_text = f"""
-                <b>Zona Agrupada</b><br>
-                Zonas combinadas: {zona.get("Zonas_Agrupadas", 1)}<br>
-                Vehículos: {vehiculos_info}<br>
-                Duración Total: {zona["Duracion_Minutos"]:.1f} min<br>
-                Registros: {zona["Registros"]}<br>
-                Velocidad Prom: {zona["Velocidad_Promedio"]:.1f} km/h<br>
-                Radio: {zona["Radio_Aprox_m"]:.0f} m
-                """
-            else:
-                popup_text = f"""
-                <b>Zona Individual</b><br>
-                Vehículo: {zona["Nombre del Vehículo"]}<br>
-                Duración: {zona["Duracion_Minutos"]:.1f} min<br>
-                Registros: {zona["Registros"]}<br>
-                Velocidad Prom: {zona["Velocidad_Promedio"]:.1f} km/h<br>
-                Radio: {zona["Radio_Aprox_m"]:.0f} m
-                """
-            
-            folium.CircleMarker(
-                [zona["Latitud_Centro"], zona["Longitud_Centro"]],
-                radius=min(max(zona["Duracion_Minutos"] / 10, 5), 25),  # Radio proporcional a duración
-                popup=popup_text,
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.7 if es_agrupada else 0.6
-            ).add_to(mapa)
-    
-    return mapa
+        st.download_button("💾 Descargar reporte Excel",
+                           trabajo.leer,
+                           "reporte_operacional_filtrado.xlsx",
+                           MIME_XLSX,
+                           on_click="ignore")
+
+@st.fragment(run_every=0.5)
+def avance_reporte_excel():
+    """Avance del reporte; se refresca solo (sin re-ejecutar el dashboard) hasta que termina."""
+    trabajo = st.session_state.get("reporte_excel")
+    if trabajo is None or trabajo.listo:
+        st.rerun()
+    st.progress(trabajo.progreso,
+                text=f"Generando reporte Excel… {trabajo.filas_escritas:,} de {trabajo.filas_totales:,} filas")
+
+def panel_instrumentacion(instrumentacion: Instrumentacion):
+    """Tiempo, filas y memoria por etapa de la última ejecución, en la barra lateral."""
+    with st.sidebar:
+        st.markdown("**⏱️ Etapas de esta ejecución**")
+        tabla = instrumentacion.ultima_ejecucion()
+        if tabla.empty:
+            st.caption("Sin etapas medidas")
+            return
+        # Las etapas internas (p. ej. lectura dentro de "datos") van sangradas
+        tabla["etapa"] = pd.Series("· ", index=tabla.index).str.repeat(tabla["nivel"]) + tabla["etapa"]
+        st.dataframe(tabla[["etapa", "origen", "filas_entrada", "filas_salida", "segundos", "pico_mb"]],
+                     hide_index=True, use_container_width=True)
+        externas = tabla[tabla["nivel"] == 0]
+        st.caption(f"Total: {externas['segundos'].sum():.2f} s · "
+                   f"{(externas['origen'] == 'caché').sum()} de {len(externas)} etapas desde la caché")
+        exportacion = instrumentacion.ultima_medicion("exportacion")
+        if exportacion is not None:
+            st.caption(f"Último reporte Excel: {exportacion['segundos']:.1f} s · "
+                       f"{exportacion['filas_salida']:,} filas")
+        st.download_button("💾 Mediciones (JSON lines)", instrumentacion.a_jsonl(), "etapas_app6_mejorado.jsonl",
+                           "application/x-ndjson", on_click="ignore")
+
+@st.cache_resource
+def cache_compartido() -> CachePipeline:
+    """Caché de etapas compartida por todas las sesiones del servidor."""
+    return CachePipeline(PRESUPUESTO_CACHE_MB)
+
+def procesar_dataset(contenido: bytes, cache: CachePipeline | None = None, huella: str | None = None,
+                     instrumentacion: Instrumentacion | None = None, compacto: bool = False) -> dict:
+    """
+    Ejecuta el pipeline completo sobre el archivo cargado:
+    datos preparados, transiciones clasificadas, viajes y detenciones anómalas.
+    Cada etapa se memoiza en `cache` con la huella del archivo y los parámetros
+    de análisis, y se mide en `instrumentacion`. Los filtros de la interfaz se
+    aplican después sobre estas tablas con `filtrar_resultados`.
+
+    Con `compacto` (modo archivo grande) el CSV se lee por bloques y solo se
+    conservan los extremos de cada racha de geocerca: transiciones, viajes y
+    clasificación no cambian, pero las detenciones anómalas (que necesitan todos
+    los registros) no se calculan y quedan en None.
+    """
+    cache = cache if cache is not None else CachePipeline()
+    instrumentacion = instrumentacion if instrumentacion is not None else Instrumentacion(archivo="")
+    medir = instrumentacion.medir
+    # Con TMETAL_GEOCERCAS la geocerca sale de los polígonos y no de la columna exportada
+    registro = registro_configurado()
+    parametros = (UMBRAL_PERMANENCIA_REAL, SHIFT_DAY_START, SHIFT_NIGHT_START, registro and registro.huella, compacto)
+    huella = huella or huella_contenido(contenido)
+    etapa = instrumentacion.etapas(cache.etapas(huella, parametros))
+
+    if compacto:
+        # Lectura por bloques: la memoria crece con las rachas de geocerca, no con los registros
+        def leer():
+            return compactar_exportacion(contenido, transformar=lambda bloque: con_geocercas_resueltas(bloque, registro))
+    else:
+        # Lectura con esquema explícito; el Parquet en disco sobrevive a reinicios de la app
+        def leer():
+            return con_geocercas_resueltas(cargar_exportacion(contenido, huella), registro)
+
+    df = etapa("datos", lambda: medir("preparacion", preparar_datos, medir("lectura", leer)))
+    medir("dominios", poblar_dominios, df)
+
+    trans = etapa("transiciones", extraer_transiciones, df)
+    viajes = etapa("viajes", extraer_tiempos_viaje, df)
+    if not trans.empty:
+        trans = etapa("clasificacion", clasificar_proceso_con_secuencia, trans)
+
+    return {
+        "df": df,
+        "trans": trans,
+        "viajes": viajes,
+        "detenciones": None if compacto else etapa("detenciones", analizar_detenciones_anomalas, df, trans),
+    }
 
 # ─────────────────────────────────────────────────────────────
 # Interfaz Streamlit Reorganizada
@@ -998,21 +532,40 @@ def crear_mapa_calor(df: pd.DataFrame, zonas_candidatas: pd.DataFrame) -> folium
 st.header("📤 Carga de archivo CSV – Eventos GPS + Análisis de Tiempos de Viaje")
 archivo = st.file_uploader("Selecciona el CSV exportado desde GeoAustral", type=["csv"])
 
+# ─── Instrumentación de etapas (panel lateral opcional) ─────────────
+instrumentacion = st.session_state.setdefault("instrumentacion", Instrumentacion({"app": "app6_mejorado"}))
+with st.sidebar:
+    ver_instrumentacion = st.toggle("⏱️ Instrumentación de etapas",
+                                    help="Tiempo, filas y memoria de cada etapa del procesamiento")
+    medir_memoria = ver_instrumentacion and st.checkbox("Medir memoria (más lento)")
+    modo_compacto = st.toggle("🗜️ Modo archivo grande", value=MODO_ARCHIVO_GRANDE,
+                              help="Lee el CSV por bloques y conserva solo el inicio y el fin de cada estadía "
+                                   "en geocerca (memoria acotada). Transiciones, viajes y clasificación no "
+                                   "cambian; zonas no mapeadas, mapa de calor y detenciones anómalas se "
+                                   "desactivan porque necesitan todos los registros.")
+instrumentacion.memoria = medir_memoria or MEMORIA_INSTRUMENTACION
+
 if archivo:
-    raw = pd.read_csv(archivo)
-    df = preparar_datos(raw)
-    poblar_dominios(df)
+    # ─── Procesamiento inicial (caché compartida por huella del archivo) ─────────────
+    if st.session_state.get("archivo_procesado") != archivo.file_id:
+        st.session_state["huella_archivo"] = huella_contenido(archivo.getvalue())
+        st.session_state["archivo_procesado"] = archivo.file_id
+    instrumentacion.nueva_ejecucion(huella=st.session_state["huella_archivo"])
+    try:
+        resultados = procesar_dataset(archivo.getvalue(), cache_compartido(), st.session_state["huella_archivo"],
+                                      instrumentacion, modo_compacto)
+    except ValueError as e:
+        # Columnas obligatorias faltantes o, en modo archivo grande, registros desordenados entre bloques
+        st.error(f"❌ No se pudo procesar el archivo: {e}")
+        st.stop()
 
-    # ─── Procesamiento inicial ─────────────────────────────────
-    trans_inicial = extraer_transiciones(df)
-    viajes_inicial = extraer_tiempos_viaje(df)
+    df = resultados["df"]
+    trans_inicial = resultados["trans"]
+    viajes_inicial = resultados["viajes"]
     
     if trans_inicial.empty and viajes_inicial.empty:
         st.warning("No se encontraron transiciones válidas ni viajes detectados.")
         st.stop()
-
-    # Clasificar procesos
-    trans_inicial = clasificar_proceso_con_secuencia(trans_inicial)
     
     # ─── SECCIÓN 1: Geocercas Detectadas ────────────────────────
     st.subheader("🏭 Geocercas Detectadas Automáticamente")
@@ -1097,7 +650,7 @@ if archivo:
     
     with col1:
         # Filtro de fecha
-        dmin, dmax = df["Tiempo de evento"].dt.date.min(), df["Tiempo de evento"].dt.date.max()
+        dmin, dmax = df["Tiempo de evento"].min().date(), df["Tiempo de evento"].max().date()
         rango = st.date_input("Rango de fechas", [dmin, dmax])
         if isinstance(rango, tuple): rango = list(rango)
         if len(rango) == 1: rango = [rango[0], rango[0]]
@@ -1129,8 +682,7 @@ if archivo:
     
     with col1:
         # Crear DataFrame con fechas filtradas para obtener rango de horas
-        df_temp = df[(df["Tiempo de evento"].dt.date >= rango[0]) & 
-                     (df["Tiempo de evento"].dt.date <= rango[1])]
+        df_temp = df[solapa_rango_fechas(df["Tiempo de evento"], df["Tiempo de evento"], rango[0], rango[1])]
         
         if not df_temp.empty:
             hora_min = df_temp["Tiempo de evento"].dt.hour.min()
@@ -1157,9 +709,20 @@ if archivo:
     with col3:
         aplicar_filtro_horas = st.checkbox("Aplicar filtro de horas", value=False)
 
-    # Aplicar filtros a los datos
-    df_filtrado = df[(df["Tiempo de evento"].dt.date >= rango[0]) & 
-                     (df["Tiempo de evento"].dt.date <= rango[1])]
+    # Filtros aplicados a las tablas ya calculadas (solapamiento de intervalos)
+    filtros = dict(
+        rango_fechas=(rango[0], rango[1]),
+        rango_horas=tuple(rango_horas) if aplicar_filtro_horas else None,
+        vehiculo=None if veh_sel == "Todos" else veh_sel,
+        turno_tipo=None if turno_sel == "Todos" else ("dia" if turno_sel == "Día" else "noche"),
+        inicio_dia=SHIFT_DAY_START,
+        inicio_noche=SHIFT_NIGHT_START,
+    )
+    trans = filtrar_resultados(trans_inicial, "Tiempo_entrada", "Tiempo_salida", **filtros)
+    viajes = filtrar_resultados(viajes_inicial, "Inicio_viaje", "Fin_viaje", **filtros)
+
+    # Registros GPS filtrados (zonas no mapeadas y mapa de calor)
+    df_filtrado = df[solapa_rango_fechas(df["Tiempo de evento"], df["Tiempo de evento"], rango[0], rango[1])]
     
     # Aplicar filtro de horas si está activado
     if aplicar_filtro_horas:
@@ -1174,14 +737,9 @@ if archivo:
     
     if turno_sel != "Todos":
         turno_filter = "dia" if turno_sel == "Día" else "noche"
-        df_filtrado = df_filtrado[df_filtrado["Tiempo de evento"].apply(turno) == turno_filter]
-    
-    # Procesar datos filtrados
-    trans = extraer_transiciones(df_filtrado)
-    viajes = extraer_tiempos_viaje(df_filtrado)
-    
-    if not trans.empty:
-        trans = clasificar_proceso_con_secuencia(trans)
+        df_filtrado = df_filtrado[
+            turnos_vectorizado(df_filtrado["Tiempo de evento"], SHIFT_DAY_START, SHIFT_NIGHT_START) == turno_filter
+        ]
     
     # Filtrar transiciones por origen y destino
     trans_filtradas = trans.copy()
@@ -1191,401 +749,243 @@ if archivo:
         if destino_sel != "Todas":
             trans_filtradas = trans_filtradas[trans_filtradas["Destino"] == destino_sel]
 
+    # Cubo de conteos de producción: una sola pasada por combinación de archivo y filtros
+    clave_filtros = (st.session_state["huella_archivo"], repr(filtros), origen_sel, destino_sel)
+    if st.session_state.get("cubo_produccion", (None, None))[0] != clave_filtros:
+        st.session_state["cubo_produccion"] = (clave_filtros, construir_cubo_conteos(trans_filtradas))
+    cubo_produccion = st.session_state["cubo_produccion"][1]
+
     # ─── SECCIÓN 3: Matriz de Viajes de Carga/Descarga ────────────────────────
     st.subheader("📊 Matriz de Viajes de Producción (Carga/Descarga)")
     
-    if not trans_filtradas.empty:
-        viajes_produccion = trans_filtradas[trans_filtradas["Proceso"].isin(["carga", "descarga"])].copy()
+    if not cubo_produccion.empty:
+        etiquetas_proceso = {"carga": "Cargas", "descarga": "Descargas"}
+        turnos_str = {"dia": "Día", "noche": "Noche"}
+
+        def con_etiquetas(tabla: pd.DataFrame) -> pd.DataFrame:
+            """Fecha de turno como dd/mm/aaaa y turno como Día/Noche (tablas enrolladas del cubo)."""
+            if "Fecha_Turno" in tabla.columns:
+                tabla = tabla.assign(Fecha_Turno=tabla["Fecha_Turno"].dt.strftime("%d/%m/%Y"))
+            if "Turno" in tabla.columns:
+                tabla = tabla.assign(Turno=tabla["Turno"].map(turnos_str))
+            return tabla
+
+        totales_proceso = enrollar_cubo(cubo_produccion, ["Proceso"])
+
+        # Tabs expandidas para mostrar diferentes matrices
+        tab1, tab2, tab3, tab4, tab5 = st.tabs([
+            "📊 Matriz General", 
+            "📅 Matriz por Fecha", 
+            "🌅 Matriz por Turno",
+            "📅🌅 Matriz Fecha-Turno",
+            "🚛 Detalle por Vehículo"
+        ])
         
-        if not viajes_produccion.empty:
-            # Preparar columnas adicionales para análisis temporal
-            viajes_produccion["Fecha_str"] = viajes_produccion["Fecha_Turno"].dt.strftime("%d/%m/%Y")
-            viajes_produccion["Turno_str"] = viajes_produccion["Turno"].map({"dia": "Día", "noche": "Noche"})
+        with tab1:
+            st.markdown("**Matriz General de Viajes Origen → Destino**")
             
-            # Tabs expandidas para mostrar diferentes matrices
-            tab1, tab2, tab3, tab4, tab5 = st.tabs([
-                "📊 Matriz General", 
-                "📅 Matriz por Fecha", 
-                "🌅 Matriz por Turno",
-                "📅🌅 Matriz Fecha-Turno",
-                "🚛 Detalle por Vehículo"
-            ])
+            # Matriz origen-destino (roll-up del cubo)
+            matriz_pivot = enrollar_cubo(cubo_produccion, ["Origen"], ["Destino"])
+            st.dataframe(matriz_pivot, use_container_width=True)
             
-            with tab1:
-                st.markdown("**Matriz General de Viajes Origen → Destino**")
-                
-                # Crear matriz de origen-destino general
-                matriz_viajes = viajes_produccion.groupby(["Origen", "Destino", "Proceso"]).size().reset_index(name="Cantidad")
-                
-                # Pivot para mostrar como matriz
-                matriz_pivot = matriz_viajes.pivot_table(
-                    index="Origen", 
-                    columns="Destino", 
-                    values="Cantidad", 
-                    aggfunc="sum", 
-                    fill_value=0
+            # Estadísticas de la matriz general
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                total_carga = int(totales_proceso.get("carga", 0))
+                st.metric("Total Cargas", total_carga)
+            with col2:
+                total_descarga = int(totales_proceso.get("descarga", 0))
+                st.metric("Total Descargas", total_descarga)
+            with col3:
+                total_produccion = total_carga + total_descarga
+                st.metric("Total Producción", total_produccion)
+        
+        with tab2:
+            st.markdown("**📅 Matriz de Viajes por Fecha**")
+            
+            # Matriz por fecha de turno, en orden cronológico
+            matriz_fecha_pivot = con_etiquetas(
+                tabla_por_proceso(cubo_produccion, ["Fecha_Turno"], etiquetas_proceso)
+            ).rename(columns={"Fecha_Turno": "Fecha"})
+            st.dataframe(matriz_fecha_pivot, use_container_width=True)
+            
+            # Gráfico por fecha
+            matriz_por_fecha = con_etiquetas(
+                enrollar_cubo(cubo_produccion, ["Fecha_Turno", "Proceso"]).reset_index()
+            ).rename(columns={"Fecha_Turno": "Fecha_str"})
+            if not matriz_por_fecha.empty:
+                chart_fecha = (
+                    alt.Chart(matriz_por_fecha)
+                    .mark_bar()
+                    .encode(
+                        x=alt.X("Fecha_str:N", title="Fecha", sort=None),
+                        y=alt.Y("Cantidad:Q", title="Cantidad de Viajes"),
+                        color=alt.Color("Proceso:N", 
+                                       scale=alt.Scale(domain=["carga", "descarga"], 
+                                                     range=["#1f77b4", "#ff7f0e"])),
+                        tooltip=["Fecha_str:N", "Proceso:N", "Cantidad:Q"]
+                    )
+                    .properties(height=300, title="Viajes de Producción por Fecha")
                 )
-                
-                st.dataframe(matriz_pivot, use_container_width=True)
-                
-                # Estadísticas de la matriz general
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    total_carga = len(viajes_produccion[viajes_produccion["Proceso"] == "carga"])
-                    st.metric("Total Cargas", total_carga)
-                with col2:
-                    total_descarga = len(viajes_produccion[viajes_produccion["Proceso"] == "descarga"])
-                    st.metric("Total Descargas", total_descarga)
-                with col3:
-                    total_produccion = total_carga + total_descarga
-                    st.metric("Total Producción", total_produccion)
+                st.altair_chart(chart_fecha, use_container_width=True)
+        
+        with tab3:
+            st.markdown("**🌅 Matriz de Viajes por Turno**")
             
-            with tab2:
-                st.markdown("**📅 Matriz de Viajes por Fecha**")
-                
-                # Matriz agrupada por fecha
-                matriz_por_fecha = viajes_produccion.groupby(["Fecha_str", "Proceso"]).size().reset_index(name="Cantidad")
-                
-                # Pivot por fecha
-                matriz_fecha_pivot = matriz_por_fecha.pivot_table(
-                    index="Fecha_str",
-                    columns="Proceso",
-                    values="Cantidad",
-                    fill_value=0,
-                    aggfunc="sum"
-                ).reset_index()
-                
-                # Agregar columna de total
-                if "carga" in matriz_fecha_pivot.columns and "descarga" in matriz_fecha_pivot.columns:
-                    matriz_fecha_pivot["Total"] = matriz_fecha_pivot["carga"] + matriz_fecha_pivot["descarga"]
-                elif "carga" in matriz_fecha_pivot.columns:
-                    matriz_fecha_pivot["Total"] = matriz_fecha_pivot["carga"]
-                elif "descarga" in matriz_fecha_pivot.columns:
-                    matriz_fecha_pivot["Total"] = matriz_fecha_pivot["descarga"]
-                
-                # Renombrar columnas
-                matriz_fecha_pivot = matriz_fecha_pivot.rename(columns={
-                    "Fecha_str": "Fecha",
-                    "carga": "Cargas",
-                    "descarga": "Descargas"
-                })
-                
-                # Ordenar por fecha
-                if "Fecha" in matriz_fecha_pivot.columns:
-                    matriz_fecha_pivot["Fecha_sort"] = pd.to_datetime(matriz_fecha_pivot["Fecha"], format="%d/%m/%Y")
-                    matriz_fecha_pivot = matriz_fecha_pivot.sort_values("Fecha_sort").drop("Fecha_sort", axis=1)
-                
-                st.dataframe(matriz_fecha_pivot, use_container_width=True)
-                
-                # Gráfico por fecha
-                if not matriz_por_fecha.empty:
-                    chart_fecha = (
-                        alt.Chart(matriz_por_fecha)
-                        .mark_bar()
-                        .encode(
-                            x=alt.X("Fecha_str:N", title="Fecha", sort=None),
-                            y=alt.Y("Cantidad:Q", title="Cantidad de Viajes"),
-                            color=alt.Color("Proceso:N", 
-                                           scale=alt.Scale(domain=["carga", "descarga"], 
-                                                         range=["#1f77b4", "#ff7f0e"])),
-                            tooltip=["Fecha_str:N", "Proceso:N", "Cantidad:Q"]
-                        )
-                        .properties(height=300, title="Viajes de Producción por Fecha")
+            # Matriz por turno
+            matriz_turno_pivot = con_etiquetas(tabla_por_proceso(cubo_produccion, ["Turno"], etiquetas_proceso))
+            st.dataframe(matriz_turno_pivot, use_container_width=True)
+            
+            # Gráfico por turno
+            matriz_por_turno = con_etiquetas(
+                enrollar_cubo(cubo_produccion, ["Turno", "Proceso"]).reset_index()
+            ).rename(columns={"Turno": "Turno_str"})
+            if not matriz_por_turno.empty:
+                chart_turno = (
+                    alt.Chart(matriz_por_turno)
+                    .mark_bar()
+                    .encode(
+                        x=alt.X("Turno_str:N", title="Turno"),
+                        y=alt.Y("Cantidad:Q", title="Cantidad de Viajes"),
+                        color=alt.Color("Proceso:N",
+                                       scale=alt.Scale(domain=["carga", "descarga"], 
+                                                     range=["#1f77b4", "#ff7f0e"])),
+                        tooltip=["Turno_str:N", "Proceso:N", "Cantidad:Q"]
                     )
-                    st.altair_chart(chart_fecha, use_container_width=True)
+                    .properties(height=300, title="Viajes de Producción por Turno")
+                )
+                st.altair_chart(chart_turno, use_container_width=True)
             
-            with tab3:
-                st.markdown("**🌅 Matriz de Viajes por Turno**")
-                
-                # Matriz agrupada por turno
-                matriz_por_turno = viajes_produccion.groupby(["Turno_str", "Proceso"]).size().reset_index(name="Cantidad")
-                
-                # Pivot por turno
-                matriz_turno_pivot = matriz_por_turno.pivot_table(
-                    index="Turno_str",
-                    columns="Proceso", 
-                    values="Cantidad",
-                    fill_value=0,
-                    aggfunc="sum"
-                ).reset_index()
-                
-                # Agregar columna de total
-                if "carga" in matriz_turno_pivot.columns and "descarga" in matriz_turno_pivot.columns:
-                    matriz_turno_pivot["Total"] = matriz_turno_pivot["carga"] + matriz_turno_pivot["descarga"]
-                elif "carga" in matriz_turno_pivot.columns:
-                    matriz_turno_pivot["Total"] = matriz_turno_pivot["carga"]
-                elif "descarga" in matriz_turno_pivot.columns:
-                    matriz_turno_pivot["Total"] = matriz_turno_pivot["descarga"]
-                
-                # Renombrar columnas
-                matriz_turno_pivot = matriz_turno_pivot.rename(columns={
-                    "Turno_str": "Turno",
-                    "carga": "Cargas",
-                    "descarga": "Descargas"
-                })
-                
-                st.dataframe(matriz_turno_pivot, use_container_width=True)
-                
-                # Gráfico por turno
-                if not matriz_por_turno.empty:
-                    chart_turno = (
-                        alt.Chart(matriz_por_turno)
-                        .mark_bar()
-                        .encode(
-                            x=alt.X("Turno_str:N", title="Turno"),
-                            y=alt.Y("Cantidad:Q", title="Cantidad de Viajes"),
-                            color=alt.Color("Proceso:N",
-                                           scale=alt.Scale(domain=["carga", "descarga"], 
-                                                         range=["#1f77b4", "#ff7f0e"])),
-                            tooltip=["Turno_str:N", "Proceso:N", "Cantidad:Q"]
-                        )
-                        .properties(height=300, title="Viajes de Producción por Turno")
+            # Estadísticas adicionales por turno
+            st.markdown("**📊 Estadísticas Detalladas por Turno:**")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Promedio por turno
+                st.markdown("**Promedio de Viajes por Día de Turno:**")
+                dias_unicos = dias_activos(cubo_produccion)
+                if dias_unicos > 0:
+                    for turno in ["Día", "Noche"]:
+                        total_turno = matriz_turno_pivot[matriz_turno_pivot["Turno"] == turno]["Total"].sum() if not matriz_turno_pivot.empty else 0
+                        promedio = total_turno / dias_unicos
+                        st.metric(f"Promedio {turno}", f"{promedio:.1f} viajes/día")
+            
+            with col2:
+                # Distribución porcentual
+                st.markdown("**Distribución Porcentual:**")
+                if not matriz_turno_pivot.empty and "Total" in matriz_turno_pivot.columns:
+                    total_general = matriz_turno_pivot["Total"].sum()
+                    if total_general > 0:
+                        for turno, total_turno in zip(matriz_turno_pivot["Turno"], matriz_turno_pivot["Total"]):
+                            porcentaje = (total_turno / total_general) * 100
+                            st.metric(f"% {turno}", f"{porcentaje:.1f}%")
+        
+        with tab4:
+            st.markdown("**📅🌅 Matriz Combinada por Fecha y Turno**")
+            
+            # Matriz combinada fecha-turno, en orden cronológico
+            matriz_ft_pivot = con_etiquetas(
+                tabla_por_proceso(cubo_produccion, ["Fecha_Turno", "Turno"], etiquetas_proceso)
+            )
+            matriz_ft_pivot.insert(0, "Fecha - Turno", matriz_ft_pivot.pop("Fecha_Turno") + " - " + matriz_ft_pivot.pop("Turno"))
+            st.dataframe(matriz_ft_pivot, use_container_width=True)
+            
+            # Mostrar detalles con descripción completa de turnos
+            st.markdown("**🔍 Vista Detallada con Horarios:**")
+            detalle_pivot = tabla_por_proceso(
+                cubo_produccion, ["Descripcion_Turno"], etiquetas_proceso
+            ).rename(columns={"Descripcion_Turno": "Turno Detallado"})
+            st.dataframe(detalle_pivot, use_container_width=True)
+        
+        with tab5:
+            st.markdown("**🚛 Detalle de Viajes por Vehículo con Fecha y Turno**")
+            
+            # Selector de vehículo para el detalle
+            vehiculos_disponibles = sorted(cubo_produccion["Nombre del Vehículo"].unique())
+            veh_detalle = st.selectbox("Seleccionar vehículo para detalle:", vehiculos_disponibles, key="veh_detalle")
+            corte_veh = {"Nombre del Vehículo": veh_detalle}
+            
+            if veh_detalle is not None:
+                # Sub-tabs para diferentes vistas del vehículo
+                subtab1, subtab2, subtab3 = st.tabs(["📊 Matriz Origen-Destino", "📅 Por Fecha", "🌅 Por Turno"])
+                
+                with subtab1:
+                    # Matriz origen-destino del vehículo
+                    matriz_veh_pivot = enrollar_cubo(cubo_produccion, ["Origen"], ["Destino"], corte_veh)
+                    st.markdown(f"**Matriz de viajes para {veh_detalle}:**")
+                    st.dataframe(matriz_veh_pivot, use_container_width=True)
+                
+                with subtab2:
+                    # Análisis por fecha del vehículo
+                    st.markdown(f"**Viajes por Fecha - {veh_detalle}:**")
+                    pivot_veh_fecha = con_etiquetas(
+                        tabla_por_proceso(cubo_produccion, ["Fecha_Turno"], etiquetas_proceso, corte_veh)
+                    ).rename(columns={"Fecha_Turno": "Fecha"})
+                    st.dataframe(pivot_veh_fecha, use_container_width=True)
+                
+                with subtab3:
+                    # Análisis por turno del vehículo
+                    st.markdown(f"**Viajes por Turno - {veh_detalle}:**")
+                    pivot_veh_turno = con_etiquetas(
+                        tabla_por_proceso(cubo_produccion, ["Turno"], etiquetas_proceso, corte_veh)
                     )
-                    st.altair_chart(chart_turno, use_container_width=True)
-                
-                # Estadísticas adicionales por turno
-                st.markdown("**📊 Estadísticas Detalladas por Turno:**")
-                col1, col2 = st.columns(2)
+                    st.dataframe(pivot_veh_turno, use_container_width=True)
                 
+                # Estadísticas generales del vehículo
+                st.markdown(f"**📊 Estadísticas Generales - {veh_detalle}:**")
+                totales_veh = enrollar_cubo(cubo_produccion, ["Proceso"], cortes=corte_veh)
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    # Promedio por turno
-                    st.markdown("**Promedio de Viajes por Día de Turno:**")
-                    dias_unicos = viajes_produccion["Fecha_Turno"].nunique()
-                    if dias_unicos > 0:
-                        for turno in ["Día", "Noche"]:
-                            total_turno = matriz_turno_pivot[matriz_turno_pivot["Turno"] == turno]["Total"].sum() if not matriz_turno_pivot.empty else 0
-                            promedio = total_turno / dias_unicos
-                            st.metric(f"Promedio {turno}", f"{promedio:.1f} viajes/día")
-                
+                    carga_veh = int(totales_veh.get("carga", 0))
+                    st.metric("Cargas Total", carga_veh)
                 with col2:
-                    # Distribución porcentual
-                    st.markdown("**Distribución Porcentual:**")
-                    if not matriz_turno_pivot.empty and "Total" in matriz_turno_pivot.columns:
-                        total_general = matriz_turno_pivot["Total"].sum()
-                        if total_general > 0:
-                            for _, row in matriz_turno_pivot.iterrows():
-                                porcentaje = (row["Total"] / total_general) * 100
-                                st.metric(f"% {row['Turno']}", f"{porcentaje:.1f}%")
-            
-            with tab4:
-                st.markdown("**📅🌅 Matriz Combinada por Fecha y Turno**")
-                
-                # Crear descripción combinada de fecha-turno
-                viajes_produccion["Fecha_Turno_str"] = viajes_produccion["Fecha_str"] + " - " + viajes_produccion["Turno_str"]
-                
-                # Matriz combinada
-                matriz_fecha_turno = viajes_produccion.groupby(["Fecha_Turno_str", "Proceso"]).size().reset_index(name="Cantidad")
-                
-                # Pivot combinado
-                matriz_ft_pivot = matriz_fecha_turno.pivot_table(
-                    index="Fecha_Turno_str",
-                    columns="Proceso",
-                    values="Cantidad", 
-                    fill_value=0,
-                    aggfunc="sum"
-                ).reset_index()
-                
-                # Agregar columna de total
-                if "carga" in matriz_ft_pivot.columns and "descarga" in matriz_ft_pivot.columns:
-                    matriz_ft_pivot["Total"] = matriz_ft_pivot["carga"] + matriz_ft_pivot["descarga"]
-                elif "carga" in matriz_ft_pivot.columns:
-                    matriz_ft_pivot["Total"] = matriz_ft_pivot["carga"]
-                elif "descarga" in matriz_ft_pivot.columns:
-                    matriz_ft_pivot["Total"] = matriz_ft_pivot["descarga"]
-                
-                # Renombrar columnas
-                matriz_ft_pivot = matriz_ft_pivot.rename(columns={
-                    "Fecha_Turno_str": "Fecha - Turno",
-                    "carga": "Cargas",
-                    "descarga": "Descargas"
-                })
-                
-                st.dataframe(matriz_ft_pivot, use_container_width=True)
-                
-                # Mostrar detalles con descripción completa de turnos
-                st.markdown("**🔍 Vista Detallada con Horarios:**")
-                detalle_turnos = viajes_produccion.groupby(["Descripcion_Turno", "Proceso"]).size().reset_index(name="Cantidad")
-                detalle_pivot = detalle_turnos.pivot_table(
-                    index="Descripcion_Turno",
-                    columns="Proceso",
-                    values="Cantidad",
-                    fill_value=0,
-                    aggfunc="sum"
-                ).reset_index()
-                
-                # Agregar total
-                if "carga" in detalle_pivot.columns and "descarga" in detalle_pivot.columns:
-                    detalle_pivot["Total"] = detalle_pivot["carga"] + detalle_pivot["descarga"]
-                elif "carga" in detalle_pivot.columns:
-                    detalle_pivot["Total"] = detalle_pivot["carga"]
-                elif "descarga" in detalle_pivot.columns:
-                    detalle_pivot["Total"] = detalle_pivot["descarga"]
-                
-                # Renombrar
-                detalle_pivot = detalle_pivot.rename(columns={
-                    "Descripcion_Turno": "Turno Detallado",
-                    "carga": "Cargas",
-                    "descarga": "Descargas"
+                    descarga_veh = int(totales_veh.get("descarga", 0))
+                    st.metric("Descargas Total", descarga_veh)
+                with col3:
+                    dias_veh = dias_activos(cubo_produccion, cortes=corte_veh)
+                    st.metric("Días Activos", dias_veh)
+                with col4:
+                    total_veh = carga_veh + descarga_veh
+                    promedio_dia = total_veh / dias_veh if dias_veh > 0 else 0
+                    st.metric("Promedio/Día", f"{promedio_dia:.1f}")
+                
+                # Tabla detallada de viajes del vehículo (filas individuales, no agregadas)
+                st.markdown(f"**📋 Detalle Completo de Viajes - {veh_detalle}:**")
+                viajes_veh = trans_filtradas[
+                    (trans_filtradas["Nombre del Vehículo"] == veh_detalle)
+                    & trans_filtradas["Proceso"].isin(PROCESOS_PRODUCCION)
+                ]
+                viajes_detalle = viajes_veh[["Tiempo_entrada", "Origen", "Destino", "Proceso", "Descripcion_Turno"]].copy()
+                viajes_detalle["Tiempo_entrada"] = viajes_detalle["Tiempo_entrada"].dt.strftime("%d/%m/%Y %H:%M")
+                viajes_detalle = viajes_detalle.rename(columns={
+                    "Tiempo_entrada": "Fecha-Hora",
+                    "Descripcion_Turno": "Turno Detallado"
                 })
-                
-                st.dataframe(detalle_pivot, use_container_width=True)
+                st.dataframe(viajes_detalle, use_container_width=True)
             
-            with tab5:
-                st.markdown("**🚛 Detalle de Viajes por Vehículo con Fecha y Turno**")
-                
-                # Selector de vehículo para el detalle
-                vehiculos_disponibles = sorted(viajes_produccion["Nombre del Vehículo"].unique())
-                veh_detalle = st.selectbox("Seleccionar vehículo para detalle:", vehiculos_disponibles, key="veh_detalle")
-                
-                # Filtrar por vehículo seleccionado
-                viajes_veh = viajes_produccion[viajes_produccion["Nombre del Vehículo"] == veh_detalle]
-                
-                if not viajes_veh.empty:
-                    # Sub-tabs para diferentes vistas del vehículo
-                    subtab1, subtab2, subtab3 = st.tabs(["📊 Matriz Origen-Destino", "📅 Por Fecha", "🌅 Por Turno"])
-                    
-                    with subtab1:
-                        # Matriz tradicional para el vehículo específico
-                        matriz_veh = viajes_veh.groupby(["Origen", "Destino", "Proceso"]).size().reset_index(name="Cantidad")
-                        matriz_veh_pivot = matriz_veh.pivot_table(
-                            index="Origen", 
-                            columns="Destino", 
-                            values="Cantidad", 
-                            aggfunc="sum", 
-                            fill_value=0
-                        )
-                        
-                        st.markdown(f"**Matriz de viajes para {veh_detalle}:**")
-                        st.dataframe(matriz_veh_pivot, use_container_width=True)
-                    
-                    with subtab2:
-                        # Análisis por fecha del vehículo
-                        st.markdown(f"**Viajes por Fecha - {veh_detalle}:**")
-                        viajes_veh_fecha = viajes_veh.groupby(["Fecha_str", "Proceso"]).size().reset_index(name="Cantidad")
-                        
-                        if not viajes_veh_fecha.empty:
-                            pivot_veh_fecha = viajes_veh_fecha.pivot_table(
-                                index="Fecha_str",
-                                columns="Proceso",
-                                values="Cantidad",
-                                fill_value=0,
-                                aggfunc="sum"
-                            ).reset_index()
-                            
-                            # Agregar total
-                            if "carga" in pivot_veh_fecha.columns and "descarga" in pivot_veh_fecha.columns:
-                                pivot_veh_fecha["Total"] = pivot_veh_fecha["carga"] + pivot_veh_fecha["descarga"]
-                            elif "carga" in pivot_veh_fecha.columns:
-                                pivot_veh_fecha["Total"] = pivot_veh_fecha["carga"]
-                            elif "descarga" in pivot_veh_fecha.columns:
-                                pivot_veh_fecha["Total"] = pivot_veh_fecha["descarga"]
-                            
-                            pivot_veh_fecha = pivot_veh_fecha.rename(columns={
-                                "Fecha_str": "Fecha",
-                                "carga": "Cargas", 
-                                "descarga": "Descargas"
-                            })
-                            
-                            st.dataframe(pivot_veh_fecha, use_container_width=True)
-                    
-                    with subtab3:
-                        # Análisis por turno del vehículo
-                        st.markdown(f"**Viajes por Turno - {veh_detalle}:**")
-                        viajes_veh_turno = viajes_veh.groupby(["Turno_str", "Proceso"]).size().reset_index(name="Cantidad")
-                        
-                        if not viajes_veh_turno.empty:
-                            pivot_veh_turno = viajes_veh_turno.pivot_table(
-                                index="Turno_str",
-                                columns="Proceso",
-                                values="Cantidad",
-                                fill_value=0,
-                                aggfunc="sum"
-                            ).reset_index()
-                            
-                            # Agregar total
-                            if "carga" in pivot_veh_turno.columns and "descarga" in pivot_veh_turno.columns:
-                                pivot_veh_turno["Total"] = pivot_veh_turno["carga"] + pivot_veh_turno["descarga"]
-                            elif "carga" in pivot_veh_turno.columns:
-                                pivot_veh_turno["Total"] = pivot_veh_turno["carga"]
-                            elif "descarga" in pivot_veh_turno.columns:
-                                pivot_veh_turno["Total"] = pivot_veh_turno["descarga"]
-                            
-                            pivot_veh_turno = pivot_veh_turno.rename(columns={
-                                "Turno_str": "Turno",
-                                "carga": "Cargas",
-                                "descarga": "Descargas"
-                            })
-                            
-                            st.dataframe(pivot_veh_turno, use_container_width=True)
-                    
-                    # Estadísticas generales del vehículo
-                    st.markdown(f"**📊 Estadísticas Generales - {veh_detalle}:**")
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        carga_veh = len(viajes_veh[viajes_veh["Proceso"] == "carga"])
-                        st.metric("Cargas Total", carga_veh)
-                    with col2:
-                        descarga_veh = len(viajes_veh[viajes_veh["Proceso"] == "descarga"])
-                        st.metric("Descargas Total", descarga_veh)
-                    with col3:
-                        dias_activos = viajes_veh["Fecha_Turno"].nunique()
-                        st.metric("Días Activos", dias_activos)
-                    with col4:
-                        total_veh = carga_veh + descarga_veh
-                        promedio_dia = total_veh / dias_activos if dias_activos > 0 else 0
-                        st.metric("Promedio/Día", f"{promedio_dia:.1f}")
-                    
-                    # Tabla detallada de viajes del vehículo
-                    st.markdown(f"**📋 Detalle Completo de Viajes - {veh_detalle}:**")
-                    viajes_detalle = viajes_veh[["Tiempo_entrada", "Origen", "Destino", "Proceso", "Descripcion_Turno"]].copy()
-                    viajes_detalle["Tiempo_entrada"] = viajes_detalle["Tiempo_entrada"].dt.strftime("%d/%m/%Y %H:%M")
-                    viajes_detalle = viajes_detalle.rename(columns={
-                        "Tiempo_entrada": "Fecha-Hora",
-                        "Descripcion_Turno": "Turno Detallado"
-                    })
-                    st.dataframe(viajes_detalle, use_container_width=True)
-                
-                # Resumen por todos los vehículos con fecha y turno
-                st.markdown("**📋 Resumen General por Todos los Vehículos:**")
-                resumen_vehiculos = viajes_produccion.groupby(["Nombre del Vehículo", "Proceso"]).size().reset_index(name="Cantidad")
-                resumen_pivot = resumen_vehiculos.pivot_table(
-                    index="Nombre del Vehículo",
-                    columns="Proceso",
-                    values="Cantidad",
-                    aggfunc="sum",
-                    fill_value=0
-                )
-                
-                # Agregar estadísticas adicionales
-                resumen_pivot["Total"] = resumen_pivot.sum(axis=1)
-                
-                # Agregar días activos por vehículo
-                dias_por_vehiculo = viajes_produccion.groupby("Nombre del Vehículo")["Fecha_Turno"].nunique().reset_index()
-                dias_por_vehiculo.columns = ["Nombre del Vehículo", "Dias_Activos"]
-                
-                # Merge con resumen
-                resumen_pivot = resumen_pivot.reset_index()
-                resumen_final = pd.merge(resumen_pivot, dias_por_vehiculo, on="Nombre del Vehículo", how="left")
-                
-                # Calcular promedio por día
-                resumen_final["Promedio_Dia"] = (resumen_final["Total"] / resumen_final["Dias_Activos"]).round(1)
-                
-                # Ordenar por total descendente
-                resumen_final = resumen_final.sort_values("Total", ascending=False)
-                
-                # Renombrar columnas para presentación
-                resumen_final = resumen_final.rename(columns={
-                    "Nombre del Vehículo": "Vehículo",
-                    "carga": "Cargas",
-                    "descarga": "Descargas",
-                    "Dias_Activos": "Días Activos",
-                    "Promedio_Dia": "Prom/Día"
-                })
-                
-                st.dataframe(resumen_final, use_container_width=True)
-                
-        else:
-            st.info("No se encontraron viajes de producción con los filtros aplicados.")
+            # Resumen por todos los vehículos
+            st.markdown("**📋 Resumen General por Todos los Vehículos:**")
+            resumen_final = tabla_por_proceso(cubo_produccion, ["Nombre del Vehículo"], etiquetas_proceso)
+            resumen_final["Dias_Activos"] = resumen_final["Nombre del Vehículo"].map(
+                dias_activos(cubo_produccion, "Nombre del Vehículo")
+            )
+            
+            # Calcular promedio por día
+            resumen_final["Promedio_Dia"] = (resumen_final["Total"] / resumen_final["Dias_Activos"]).round(1)
+            
+            # Ordenar por total descendente
+            resumen_final = resumen_final.sort_values("Total", ascending=False)
+            
+            # Renombrar columnas para presentación
+            resumen_final = resumen_final.rename(columns={
+                "Nombre del Vehículo": "Vehículo",
+                "Dias_Activos": "Días Activos",
+                "Promedio_Dia": "Prom/Día"
+            })
+            
+            st.dataframe(resumen_final, use_container_width=True)
+    elif not trans_filtradas.empty:
+        st.info("No se encontraron viajes de producción con los filtros aplicados.")
     else:
         st.info("No hay transiciones para mostrar la matriz.")
 
@@ -1617,9 +1017,14 @@ if archivo:
         tiempos_vehiculo.columns = ["Tiempo_promedio_s", "Total_viajes"]
         tiempos_vehiculo = tiempos_vehiculo.reset_index()
         tiempos_vehiculo["Tiempo_promedio_min"] = tiempos_vehiculo["Tiempo_promedio_s"] / 60
-        
+        # Los vehículos con menos viajes se reúnen en "Otros" (promedio ponderado por viajes)
+        tiempos_grafico, detalle_grafico = limitar_categorias(
+            tiempos_vehiculo, "Nombre del Vehículo", "Total_viajes", sumas=["Total_viajes"],
+            promedios=["Tiempo_promedio_s", "Tiempo_promedio_min"], peso="Total_viajes"
+        )
+
         chart_vehiculos = (
-            alt.Chart(tiempos_vehiculo)
+            alt.Chart(tiempos_grafico)
             .mark_bar()
             .encode(
                 x=alt.X("Nombre del Vehículo:N", sort="-y", title="Vehículo"),
@@ -1628,7 +1033,7 @@ if archivo:
             )
             .properties(height=300, title="Tiempo promedio de viaje por vehículo")
         )
-        st.altair_chart(chart_vehiculos, use_container_width=True)
+        mostrar_grafico(chart_vehiculos, detalle_grafico)
         
         # Tabla de métricas por vehículo
         metricas_viaje = construir_metricas_viaje(viajes)
@@ -1686,135 +1091,144 @@ if archivo:
     # ─── SECCIÓN 5: Mapa de Calor - Zonas No Mapeadas ────────────────────────
     st.subheader("🗺️ Análisis de Zonas No Mapeadas")
     
-    st.info("""
-    **🎯 Funcionalidad de Detección de Zonas:**
-    - Identifica áreas donde los vehículos permanecen mucho tiempo fuera de geocercas conocidas
-    - Detecta patrones de baja velocidad que sugieren actividad operacional
-    - Ayuda a descubrir geocercas potenciales no mapeadas en el sistema
-    """)
-    
-    # Controles para el análisis
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        velocidad_max = st.slider("Velocidad máxima (km/h)", 0, 20, 5, help="Velocidad máxima para considerar como 'parado'")
-    with col2:
-        tiempo_min = st.slider("Tiempo mínimo (minutos)", 5, 60, 10, help="Tiempo mínimo de permanencia para considerar como zona candidata")
-    with col3:
-        radio_agrupacion = st.slider("Radio agrupación (metros)", 5, 50, 10, help="Radio para agrupar zonas cercanas")
-    with col4:
-        mostrar_mapa = st.checkbox("Mostrar mapa interactivo", value=True)
-    
-    # Analizar zonas candidatas
-    zonas_candidatas = analizar_zonas_no_mapeadas(df_filtrado, velocidad_max, tiempo_min, radio_agrupacion)
+    if modo_compacto:
+        st.info("🗜️ **Modo archivo grande:** el análisis de zonas no mapeadas y el mapa de calor necesitan "
+                "todos los registros GPS y están desactivados.")
+    else:
+        st.info("""
+        **🎯 Funcionalidad de Detección de Zonas:**
+        - Identifica áreas donde los vehículos permanecen mucho tiempo fuera de geocercas conocidas
+        - Detecta patrones de baja velocidad que sugieren actividad operacional
+        - Ayuda a descubrir geocercas potenciales no mapeadas en el sistema
+        """)
     
-    if not zonas_candidatas.empty:
-        # Estadísticas de zonas encontradas
+        # Controles para el análisis
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Zonas Detectadas", len(zonas_candidatas))
+            velocidad_max = st.slider("Velocidad máxima (km/h)", 0, 20, 5, help="Velocidad máxima para considerar como 'parado'")
         with col2:
-            duracion_total = zonas_candidatas["Duracion_Minutos"].sum()
-            st.metric("Tiempo Total", f"{duracion_total:.0f} min")
+            tiempo_min = st.slider("Tiempo mínimo (minutos)", 5, 60, 10, help="Tiempo mínimo de permanencia para considerar como zona candidata")
         with col3:
-            duracion_promedio = zonas_candidatas["Duracion_Minutos"].mean()
-            st.metric("Duración Promedio", f"{duracion_promedio:.1f} min")
+            radio_agrupacion = st.slider("Radio agrupación (metros)", 5, 50, 10, help="Radio para agrupar zonas cercanas")
         with col4:
-            vehiculos_afectados = zonas_candidatas["Nombre del Vehículo"].nunique()
-            st.metric("Vehículos Involucrados", vehiculos_afectados)
-        
-        # Tabla de zonas candidatas
-        st.markdown("**📋 Zonas Candidatas Detectadas (Agrupadas):**")
-        zonas_display = zonas_candidatas.copy()
-        zonas_display["Inicio"] = zonas_display["Inicio"].dt.strftime("%d/%m/%Y %H:%M")
-        zonas_display["Fin"] = zonas_display["Fin"].dt.strftime("%d/%m/%Y %H:%M")
-        zonas_display["Duracion_Minutos"] = zonas_display["Duracion_Minutos"].round(1)
-        zonas_display["Radio_Aprox_m"] = zonas_display["Radio_Aprox_m"].round(0)
-        zonas_display["Velocidad_Promedio"] = zonas_display["Velocidad_Promedio"].round(1)
+            mostrar_mapa = st.checkbox("Mostrar mapa interactivo", value=True)
+    
+        # Analizar zonas candidatas
+        zonas_candidatas = instrumentacion.medir("zonas", analizar_zonas_no_mapeadas, df_filtrado, velocidad_max,
+                                                 tiempo_min, radio_agrupacion)
+    
+        if not zonas_candidatas.empty:
+            # Estadísticas de zonas encontradas
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Zonas Detectadas", len(zonas_candidatas))
+            with col2:
+                duracion_total = zonas_candidatas["Duracion_Minutos"].sum()
+                st.metric("Tiempo Total", f"{duracion_total:.0f} min")
+            with col3:
+                duracion_promedio = zonas_candidatas["Duracion_Minutos"].mean()
+                st.metric("Duración Promedio", f"{duracion_promedio:.1f} min")
+            with col4:
+                vehiculos_afectados = zonas_candidatas["Nombre del Vehículo"].nunique()
+                st.metric("Vehículos Involucrados", vehiculos_afectados)
         
-        # Preparar información de agrupación
-        if "Zonas_Agrupadas" in zonas_display.columns:
-            zonas_display["Info_Agrupacion"] = zonas_display.apply(
-                lambda row: f"{row['Zonas_Agrupadas']} zonas" if row.get('Zonas_Agrupadas', 1) > 1 else "Individual", axis=1
-            )
-        else:
-            zonas_display["Info_Agrupacion"] = "Individual"
+            # Tabla de zonas candidatas
+            st.markdown("**📋 Zonas Candidatas Detectadas (Agrupadas):**")
+            zonas_display = zonas_candidatas.copy()
+            zonas_display["Inicio"] = zonas_display["Inicio"].dt.strftime("%d/%m/%Y %H:%M")
+            zonas_display["Fin"] = zonas_display["Fin"].dt.strftime("%d/%m/%Y %H:%M")
+            zonas_display["Duracion_Minutos"] = zonas_display["Duracion_Minutos"].round(1)
+            zonas_display["Radio_Aprox_m"] = zonas_display["Radio_Aprox_m"].round(0)
+            zonas_display["Velocidad_Promedio"] = zonas_display["Velocidad_Promedio"].round(1)
         
-        # Preparar lista de vehículos
-        if "Vehiculos_Involucrados" in zonas_display.columns:
-            zonas_display["Vehiculos_Lista"] = zonas_display["Vehiculos_Involucrados"].apply(
-                lambda x: ", ".join(x) if isinstance(x, list) else str(x)
-            )
-        else:
-            zonas_display["Vehiculos_Lista"] = zonas_display["Nombre del Vehículo"]
+            # Preparar información de agrupación
+            if "Zonas_Agrupadas" in zonas_display.columns:
+                zonas_display["Info_Agrupacion"] = zonas_display.apply(
+                    lambda row: f"{row['Zonas_Agrupadas']} zonas" if row.get('Zonas_Agrupadas', 1) > 1 else "Individual", axis=1
+                )
+            else:
+                zonas_display["Info_Agrupacion"] = "Individual"
         
-        # Renombrar columnas para mejor visualización
-        zonas_display = zonas_display.rename(columns={
-            "Nombre del Vehículo": "Tipo",
-            "Latitud_Centro": "Latitud",
-            "Longitud_Centro": "Longitud", 
-            "Duracion_Minutos": "Duración (min)",
-            "Radio_Aprox_m": "Radio (m)",
-            "Velocidad_Promedio": "Vel. Prom (km/h)",
-            "Info_Agrupacion": "Agrupación",
-            "Vehiculos_Lista": "Vehículos"
-        })
+            # Preparar lista de vehículos
+            if "Vehiculos_Involucrados" in zonas_display.columns:
+                zonas_display["Vehiculos_Lista"] = zonas_display["Vehiculos_Involucrados"].apply(
+                    lambda x: ", ".join(x) if isinstance(x, list) else str(x)
+                )
+            else:
+                zonas_display["Vehiculos_Lista"] = zonas_display["Nombre del Vehículo"]
         
-        # Mostrar tabla con información de agrupación
-        columnas_mostrar = ["Tipo", "Agrupación", "Vehículos", "Latitud", "Longitud", "Duración (min)", "Registros", "Radio (m)", "Vel. Prom (km/h)", "Inicio", "Fin"]
-        columnas_disponibles = [col for col in columnas_mostrar if col in zonas_display.columns]
-        st.dataframe(zonas_display[columnas_disponibles], use_container_width=True)
+            # Renombrar columnas para mejor visualización
+            zonas_display = zonas_display.rename(columns={
+                "Nombre del Vehículo": "Tipo",
+                "Latitud_Centro": "Latitud",
+                "Longitud_Centro": "Longitud", 
+                "Duracion_Minutos": "Duración (min)",
+                "Radio_Aprox_m": "Radio (m)",
+                "Velocidad_Promedio": "Vel. Prom (km/h)",
+                "Info_Agrupacion": "Agrupación",
+                "Vehiculos_Lista": "Vehículos"
+            })
         
-        # Mostrar información adicional sobre agrupación
-        zonas_agrupadas = zonas_candidatas[zonas_candidatas.get("Zonas_Agrupadas", 1) > 1] if "Zonas_Agrupadas" in zonas_candidatas.columns else pd.DataFrame()
-        if not zonas_agrupadas.empty:
-            st.info(f"""
-            **🔗 Agrupación Aplicada:**
-            - Radio de agrupación: {radio_agrupacion} metros
-            - {len(zonas_agrupadas)} zonas agrupadas de un total de {len(zonas_candidatas)}
-            - Zonas individuales: {len(zonas_candidatas) - len(zonas_agrupadas)}
-            """)
-        else:
-            st.info(f"**📍 Sin agrupación necesaria:** Todas las zonas están separadas por más de {radio_agrupacion} metros")
+            # Mostrar tabla con información de agrupación
+            columnas_mostrar = ["Tipo", "Agrupación", "Vehículos", "Latitud", "Longitud", "Duración (min)", "Registros", "Radio (m)", "Vel. Prom (km/h)", "Inicio", "Fin"]
+            columnas_disponibles = [col for col in columnas_mostrar if col in zonas_display.columns]
+            st.dataframe(zonas_display[columnas_disponibles], use_container_width=True)
         
-        # Mapa interactivo
-        if mostrar_mapa:
-            st.markdown("**🗺️ Mapa Interactivo:**")
-            try:
-                mapa = crear_mapa_calor(df_filtrado, zonas_candidatas)
-                st_folium(mapa, width=700, height=500)
-                
-                st.markdown("""
-                **Leyenda del Mapa:**
-                - 🟢 **Marcadores Verdes**: Geocercas conocidas y mapeadas
-                - 🔴 **Círculos Rojos**: Zonas individuales (un solo vehículo/permanencia)
-                - 🟠 **Círculos Naranjas**: Zonas agrupadas (múltiples vehículos/permanencias cercanas)
-                - **Tamaño del círculo**: Proporcional al tiempo total de permanencia
-                - **Click en círculo**: Ver detalles completos de la zona
+            # Mostrar información adicional sobre agrupación
+            zonas_agrupadas = zonas_candidatas[zonas_candidatas.get("Zonas_Agrupadas", 1) > 1] if "Zonas_Agrupadas" in zonas_candidatas.columns else pd.DataFrame()
+            if not zonas_agrupadas.empty:
+                st.info(f"""
+                **🔗 Agrupación Aplicada:**
+                - Radio de agrupación: {radio_agrupacion} metros
+                - {len(zonas_agrupadas)} zonas agrupadas de un total de {len(zonas_candidatas)}
+                - Zonas individuales: {len(zonas_candidatas) - len(zonas_agrupadas)}
                 """)
-            except Exception as e:
-                st.error(f"Error al generar el mapa: {str(e)}")
-                st.info("Para ver el mapa, instala las dependencias: `pip install folium streamlit-folium scikit-learn`")
+            else:
+                st.info(f"**📍 Sin agrupación necesaria:** Todas las zonas están separadas por más de {radio_agrupacion} metros")
+        
+            # Mapa interactivo
+            if mostrar_mapa:
+                st.markdown("**🗺️ Mapa Interactivo:**")
+                try:
+                    mapa = crear_mapa_calor(df_filtrado, zonas_candidatas)
+                    st_folium(mapa, width=700, height=500)
+                    if len(zonas_candidatas) > MAX_ELEMENTOS_MAPA:
+                        st.caption(f"Se muestran con detalle las {MAX_ELEMENTOS_MAPA} zonas de mayor duración; "
+                                   f"las {len(zonas_candidatas)} zonas están en la capa de calor.")
+                
+                    st.markdown("""
+                    **Leyenda del Mapa:**
+                    - 🟢 **Marcadores Verdes**: Geocercas conocidas y mapeadas
+                    - 🔴 **Círculos Rojos**: Zonas individuales (un solo vehículo/permanencia)
+                    - 🟠 **Círculos Naranjas**: Zonas agrupadas (múltiples vehículos/permanencias cercanas)
+                    - 🌡️ **Capa de calor**: Todas las zonas, ponderadas por tiempo de permanencia
+                    - **Tamaño del círculo**: Proporcional al tiempo total de permanencia
+                    - **Click en círculo**: Ver detalles completos de la zona
+                    """)
+                except Exception as e:
+                    st.error(f"Error al generar el mapa: {str(e)}")
+                    st.info("Para ver el mapa, instala las dependencias: `pip install folium streamlit-folium`")
         
-        # Recomendaciones
-        st.markdown("**💡 Recomendaciones:**")
-        zonas_importantes = zonas_candidatas[zonas_candidatas["Duracion_Minutos"] > 30]
-        if not zonas_importantes.empty:
-            st.warning(f"""
-            **🎯 {len(zonas_importantes)} zonas con permanencias largas (>30 min) detectadas:**
+            # Recomendaciones
+            st.markdown("**💡 Recomendaciones:**")
+            zonas_importantes = zonas_candidatas[zonas_candidatas["Duracion_Minutos"] > 30]
+            if not zonas_importantes.empty:
+                st.warning(f"""
+                **🎯 {len(zonas_importantes)} zonas con permanencias largas (>30 min) detectadas:**
             
-            Estas zonas podrían ser áreas operacionales importantes no mapeadas como geocercas.
-            Considera revisar si corresponden a:
-            - Nuevas áreas de trabajo
-            - Zonas de mantenimiento
-            - Áreas de espera o staging
-            - Instalaciones temporales
-            """)
-        else:
-            st.success("✅ No se detectaron zonas con permanencias prolongadas fuera de geocercas conocidas")
+                Estas zonas podrían ser áreas operacionales importantes no mapeadas como geocercas.
+                Considera revisar si corresponden a:
+                - Nuevas áreas de trabajo
+                - Zonas de mantenimiento
+                - Áreas de espera o staging
+                - Instalaciones temporales
+                """)
+            else:
+                st.success("✅ No se detectaron zonas con permanencias prolongadas fuera de geocercas conocidas")
             
-    else:
-        st.success("✅ No se encontraron zonas candidatas con los parámetros seleccionados")
-        st.info("Esto puede indicar que todas las áreas operacionales importantes ya están mapeadas como geocercas")
+        else:
+            st.success("✅ No se encontraron zonas candidatas con los parámetros seleccionados")
+            st.info("Esto puede indicar que todas las áreas operacionales importantes ya están mapeadas como geocercas")
 
     # ─── SECCIÓN 6: Análisis Detallado de Viajes por Hora ────────────────────────
     st.subheader("📊 Análisis Detallado de Viajes por Hora - Carga y Descarga")
@@ -1835,9 +1249,13 @@ if archivo:
             with tab1:
                 st.markdown("**Vista General: Todos los Vehículos por Hora**")
                 
-                # Gráfico de líneas para vista general
+                # Gráfico de líneas para vista general (con meses de datos, paso mayor a una hora)
+                general_grafico, detalle_general = agregar_por_tiempo(
+                    analisis_general.assign(Fecha_Hora=pd.to_datetime(analisis_general["Fecha_Hora"])),
+                    "Fecha_Hora", ["Cantidad_Viajes"], ["Proceso"], ["Hora_str", "Descripcion_Turno"]
+                )
                 chart_general = (
-                    alt.Chart(analisis_general)
+                    alt.Chart(general_grafico)
                     .mark_line(point=True, size=3)
                     .encode(
                         x=alt.X("Fecha_Hora:T", title="Fecha-Hora", axis=alt.Axis(labelAngle=-45)),
@@ -1850,7 +1268,7 @@ if archivo:
                     )
                     .properties(height=400, title="Producción Horaria - Todos los Vehículos")
                 )
-                st.altair_chart(chart_general, use_container_width=True)
+                mostrar_grafico(chart_general, detalle_general)
                 
                 # Estadísticas generales
                 col1, col2, col3, col4 = st.columns(4)
@@ -1879,8 +1297,12 @@ if archivo:
                 
                 if not datos_vehiculo.empty:
                     # Gráfico para el vehículo específico
+                    vehiculo_grafico, detalle_vehiculo = agregar_por_tiempo(
+                        datos_vehiculo.assign(Fecha_Hora=pd.to_datetime(datos_vehiculo["Fecha_Hora"])),
+                        "Fecha_Hora", ["Cantidad_Viajes"], ["Proceso"], ["Origen", "Destino", "Descripcion_Turno"]
+                    )
                     chart_vehiculo = (
-                        alt.Chart(datos_vehiculo)
+                        alt.Chart(vehiculo_grafico)
                         .mark_bar()
                         .encode(
                             x=alt.X("Fecha_Hora:T", title="Fecha-Hora", axis=alt.Axis(labelAngle=-45)),
@@ -1892,7 +1314,7 @@ if archivo:
                         )
                         .properties(height=400, title=f"Actividad Horaria - {veh_analisis}")
                     )
-                    st.altair_chart(chart_vehiculo, use_container_width=True)
+                    mostrar_grafico(chart_vehiculo, detalle_vehiculo)
                     
                     # Estadísticas del vehículo
                     col1, col2, col3, col4 = st.columns(4)
@@ -1998,14 +1420,10 @@ if archivo:
             # Asignar promedio fijo de 42 toneladas por viaje de producción
             viajes_produccion_tons["Toneladas"] = 42.0
 
-            # Agrupar por hora y tipo de proceso
-            tons_h = (
-                viajes_produccion_tons.groupby([
-                    viajes_produccion_tons["Tiempo_entrada"].dt.floor("h"),
-                    "Proceso"
-                ])["Toneladas"].sum().reset_index()
-                .rename(columns={"Tiempo_entrada": "Hora_cal", "Toneladas": "Toneladas_h"})
-            )
+            # Agrupar por hora (o el paso que quepa en el gráfico) y tipo de proceso
+            tons_h, detalle_tons = agregar_por_tiempo(viajes_produccion_tons, "Tiempo_entrada", ["Toneladas"], ["Proceso"])
+            tons_h = tons_h.rename(columns={"Tiempo_entrada": "Hora_cal", "Toneladas": "Toneladas_h"})
+            paso_tons = PASOS_TIEMPO[detalle_tons["paso"]]
 
             # Gráfico de toneladas
             bar_tons = (
@@ -2019,9 +1437,9 @@ if archivo:
                                                  range=["#1f77b4", "#ff7f0e"])),
                     tooltip=["Hora_cal:T", "Proceso:N", "Toneladas_h:Q"]
                 )
-                .properties(height=300, title="Toneladas por hora - Carga y Descarga")
+                .properties(height=300, title=f"Toneladas por {paso_tons} - Carga y Descarga")
             )
-            st.altair_chart(bar_tons, use_container_width=True)
+            mostrar_grafico(bar_tons, detalle_tons)
             
             # Estadísticas de toneladas
             col1, col2, col3 = st.columns(3)
@@ -2042,9 +1460,12 @@ if archivo:
     # ─── SECCIÓN 7: Análisis de Detenciones Anómalas ────────────────────────
     st.subheader("🚨 Análisis de Detenciones Anómalas")
     
-    if not trans_filtradas.empty and not df.empty:
-        # Ejecutar análisis de detenciones
-        detenciones = analizar_detenciones_anomalas(df, trans_filtradas)
+    if modo_compacto:
+        st.info("🗜️ **Modo archivo grande:** las detenciones anómalas necesitan todos los registros GPS "
+                "y están desactivadas.")
+    elif not trans_filtradas.empty and not df.empty:
+        # Detenciones calculadas sobre el archivo completo, filtradas por intervalo
+        detenciones = filtrar_resultados(resultados["detenciones"], "Tiempo_inicio", "Tiempo_fin", **filtros)
         
         if not detenciones.empty:
             # Aplicar filtros a las detenciones
@@ -2169,26 +1590,35 @@ if archivo:
                         st.altair_chart(chart_severidad, use_container_width=True)
                     
                     with col2:
-                        # Gráfico de duración vs exceso
-                        chart_duracion = alt.Chart(detenciones_filtradas).mark_circle(size=100).encode(
+                        # Gráfico de duración vs exceso (puntos agrupados por píxel si son muchos)
+                        duracion_grafico, detalle_duracion = agrupar_dispersion(
+                            detenciones_filtradas, "Duracion_total_min", "Exceso_min", ["Severidad"],
+                            ["Nombre del Vehículo", "Geocerca"]
+                        )
+                        chart_duracion = alt.Chart(duracion_grafico).mark_circle(size=100).encode(
                             x=alt.X("Duracion_total_min:Q", title="Duración Total (min)"),
                             y=alt.Y("Exceso_min:Q", title="Exceso sobre Normal (min)"),
                             color=alt.Color("Severidad:N", 
                                 scale=alt.Scale(range=["#ff5722", "#ff9800"])),
                             tooltip=["Nombre del Vehículo:N", "Geocerca:N", 
-                                   "Duracion_total_min:Q", "Exceso_min:Q", "Severidad:N"]
+                                   "Duracion_total_min:Q", "Exceso_min:Q", "Severidad:N", "Cantidad:Q"]
                         ).properties(
                             title="Duración vs Exceso",
                             width=300,
                             height=300
                         )
-                        st.altair_chart(chart_duracion, use_container_width=True)
+                        mostrar_grafico(chart_duracion, detalle_duracion)
                     
                     # Timeline de detenciones
                     if len(detenciones_filtradas) > 0:
                         st.markdown("**⏱️ Timeline de Detenciones:**")
                         
-                        chart_timeline = alt.Chart(detenciones_filtradas).mark_bar().encode(
+                        # Detenciones separadas por menos de un píxel se dibujan como una barra
+                        timeline_grafico, detalle_timeline = fusionar_intervalos(
+                            detenciones_filtradas, "Tiempo_inicio", "Tiempo_fin", ["Nombre del Vehículo", "Severidad"],
+                            ["Duracion_total_min"], ["Geocerca"]
+                        )
+                        chart_timeline = alt.Chart(timeline_grafico).mark_bar().encode(
                             x=alt.X("Tiempo_inicio:T", title="Tiempo"),
                             x2=alt.X2("Tiempo_fin:T"),
                             y=alt.Y("Nombre del Vehículo:N", title="Vehículo"),
@@ -2196,13 +1626,13 @@ if archivo:
                                 scale=alt.Scale(range=["#ff5722", "#ff9800"])),
                             tooltip=["Nombre del Vehículo:N", "Geocerca:N", 
                                    "Tiempo_inicio:T", "Tiempo_fin:T", 
-                                   "Duracion_total_min:Q", "Severidad:N"]
+                                   "Duracion_total_min:Q", "Severidad:N", "Cantidad:Q"]
                         ).properties(
                             title="Timeline de Detenciones por Vehículo",
                             width=700,
                             height=300
                         )
-                        st.altair_chart(chart_timeline, use_container_width=True)
+                        mostrar_grafico(chart_timeline, detalle_timeline)
             else:
                 st.success("✅ No se detectaron detenciones anómalas para los filtros seleccionados")
         else:
@@ -2338,19 +1768,12 @@ if archivo:
             fechas_turno["Tipo de Turno"] = fechas_turno["Tipo de Turno"].map({"dia": "Día", "noche": "Noche"})
             st.dataframe(fechas_turno, use_container_width=True)
 
-    # ─── Exportar a Excel ───────────────────────────────────
-    buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="xlsxwriter") as xls:
-        if not trans_filtradas.empty:
-            trans_filtradas.to_excel(excel_writer=xls, sheet_name="Transiciones", index=False)
-        if not viajes.empty:
-            viajes.to_excel(excel_writer=xls, sheet_name="TiemposViaje", index=False)
-        if not viajes.empty:
-            metricas_viaje = construir_metricas_viaje(viajes)
-            if not metricas_viaje.empty:
-                metricas_viaje.to_excel(excel_writer=xls, sheet_name="MetricasViaje", index=False)
-    
-    st.download_button("💾 Descargar reporte Excel",
-                       buf.getvalue(),
-                       "reporte_operacional_filtrado.xlsx",
-                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
\ No newline at end of file
+    # ─── Exportar a Excel (bajo demanda, en segundo plano) ───────────
+    panel_reporte_excel(clave_filtros, {
+        "Transiciones": trans_filtradas,
+        "TiemposViaje": viajes,
+        "MetricasViaje": lambda: construir_metricas_viaje(viajes),
+    }, instrumentacion)
+
+    if ver_instrumentacion:
+        panel_instrumentacion(instrumentacion)
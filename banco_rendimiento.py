@@ -0,0 +1,279 @@
+"""
+Banco de rendimiento por etapa - T-Metal
+Mide tiempo y memoria de cada etapa del pipeline de los dashboards
+(app5, app6, app6_mejorado, app7tport) sobre exportaciones sintéticas de
+`generador_flota` a varios tamaños, y guarda los resultados en JSON lines con
+el commit para compararlos entre versiones:
+
+    python banco_rendimiento.py --tamanos 10000 100000 1000000
+    python banco_rendimiento.py --comparar .rendimiento/base.jsonl .rendimiento/actual.jsonl
+
+Cada etapa se ejecuta `repeticiones` veces para el tiempo (se guarda el mejor)
+y una vez más bajo tracemalloc para el pico de memoria asignada; tracemalloc
+no ve la memoria de los workers de `ejecucion_paralela`. Una etapa que supera
+LIMITE_ETAPA_S se omite en los tamaños siguientes de esa app (los bucles por
+fila de las versiones antiguas no escalan a millones de registros).
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable
+
+import pandas as pd
+
+from generador_flota import a_csv, dias_para_filas, generar_exportacion
+from ingesta_columnar import leer_csv_geoaustral
+from instrumentacion import contar_filas
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+DIRECTORIO_RENDIMIENTO = os.getenv(
+    "TMETAL_DIRECTORIO_RENDIMIENTO", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rendimiento")
+)
+LIMITE_ETAPA_S = float(os.getenv("TMETAL_LIMITE_ETAPA_S", "120"))
+APPS_BANCO = ("app5", "app6", "app6_mejorado", "app7tport")
+TAMANOS_DEFECTO = (10_000, 100_000, 1_000_000)
+VEHICULOS_DEFECTO = 20
+INTERVALO_DEFECTO_S = 30.0
+
+# Disposición de geocercas y lector del CSV que usa cada dashboard
+DISPOSICION_APP = {"app7tport": "puerto"}
+LECTOR_APP = {
+    "app5": lambda contenido: pd.read_csv(io.BytesIO(contenido)),
+    "app6": lambda contenido: pd.read_csv(io.BytesIO(contenido)),
+    "app6_mejorado": leer_csv_geoaustral,
+    "app7tport": leer_csv_geoaustral,
+}
+
+# Cadena de etapas: (función del dashboard, entradas, salida). Las que una app no
+# define se omiten; las entradas/salidas son claves del contexto compartido.
+CADENA_ETAPAS = [
+    ("preparar_datos", ("crudo",), "df"),
+    ("poblar_dominios", ("df",), None),
+    ("extraer_transiciones", ("df",), "trans"),
+    ("extraer_tiempos_viaje", ("df",), "viajes"),
+    ("clasificar_proceso_con_secuencia", ("trans",), "trans"),
+    ("consolidar_estadias_internas", ("trans",), "trans"),
+    ("detectar_ciclos", ("trans",), "ciclos"),
+    ("construir_metricas", ("trans",), "metricas"),
+    ("analizar_detenciones_anomalas", ("df", "trans"), "detenciones"),
+    ("analizar_zonas_no_mapeadas", ("df",), "zonas"),
+]
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Medición de una etapa
+# ─────────────────────────────────────────────────────────────
+def medir(funcion: Callable, *args, repeticiones: int = 1, memoria: bool = True) -> tuple[Any, float, int | None]:
+    """
+    Ejecuta `funcion(*args)`: (resultado de la primera ejecución, mejor tiempo en
+    segundos, pico de memoria asignada en bytes o None). Los `print` de
+    diagnóstico de las etapas se descartan.
+    """
+    resultado, mejor = None, float("inf")
+    for i in range(max(repeticiones, 1)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = perf_counter()
+            salida = funcion(*args)
+            mejor = min(mejor, perf_counter() - inicio)
+        if i == 0:
+            resultado = salida
+        del salida
+
+    pico = None
+    if memoria:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                funcion(*args)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return resultado, mejor, pico
+
+
+def importar_app(nombre: str):
+    """Importa un dashboard como módulo (Streamlit corre sin sesión y no dibuja nada)."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return importlib.import_module(nombre)
+
+
+def version_codigo() -> str:
+    """Commit actual (con "+cambios" si hay modificaciones sin commit) o "sin-git"."""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directorio, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        cambios = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directorio,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "sin-git"
+    return f"{commit}+cambios" if cambios else commit
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Banco: apps × tamaños × etapas
+# ─────────────────────────────────────────────────────────────
+def ejecutar_app(nombre: str, contenido: bytes, repeticiones: int = 1, memoria: bool = True,
+                 omitir: set[str] = frozenset()) -> list[dict]:
+    """Mide la lectura y cada etapa de `CADENA_ETAPAS` que define el dashboard `nombre`."""
+    app = importar_app(nombre)
+    mediciones = []
+
+    def registrar(etapa, funcion, args, filas_entrada):
+        if etapa in omitir:
+            mediciones.append({"etapa": etapa, "estado": "omitida", "filas_entrada": filas_entrada})
+            return None
+        try:
+            resultado, segundos, pico = medir(funcion, *args, repeticiones=repeticiones, memoria=memoria)
+        except Exception as e:
+            mediciones.append({"etapa": etapa, "estado": f"error: {type(e).__name__}: {e}",
+                               "filas_entrada": filas_entrada})
+            return None
+        mediciones.append({"etapa": etapa, "estado": "ok", "filas_entrada": filas_entrada,
+                           "filas_salida": contar_filas(resultado), "segundos": round(segundos, 4),
+                           "pico_mb": None if pico is None else round(pico / 1e6, 2)})
+        return resultado
+
+    contexto = {"crudo": registrar("lectura", LECTOR_APP[nombre], (contenido,), 0)}
+    for etapa, entradas, salida in CADENA_ETAPAS:
+        funcion = getattr(app, etapa, None)
+        if funcion is None:
+            continue
+        args = [contexto.get(e) for e in entradas]
+        if any(a is None for a in args):
+            mediciones.append({"etapa": etapa, "estado": "sin entrada", "filas_entrada": 0})
+            continue
+        resultado = registrar(etapa, funcion, args, sum(contar_filas(a) for a in args))
+        if salida is not None:
+            # Una etapa omitida o con error deja sin entrada a las que dependen de ella
+            contexto[salida] = resultado
+    return mediciones
+
+
+def ejecutar_banco(apps: list[str] = APPS_BANCO, tamanos: list[int] = TAMANOS_DEFECTO,
+                   vehiculos: int = VEHICULOS_DEFECTO, intervalo_s: float = INTERVALO_DEFECTO_S,
+                   repeticiones: int = 1, memoria: bool = True, semilla: int = 0,
+                   limite_s: float = LIMITE_ETAPA_S, al_medir: Callable[[dict], None] | None = None) -> pd.DataFrame:
+    """
+    Mide todas las etapas de `apps` con exportaciones de ~`tamanos` registros.
+    Devuelve una fila por (app, tamaño, etapa); `al_medir` recibe cada fila al
+    terminarla (para informar el avance).
+    """
+    version, fecha = version_codigo(), datetime.now().isoformat(timespec="seconds")
+    lentas = {app: set() for app in apps}
+    filas = []
+    for tamano in sorted(tamanos):
+        exportaciones = {}
+        for app in apps:
+            disposicion = DISPOSICION_APP.get(app, "mina")
+            if disposicion not in exportaciones:
+                df = generar_exportacion(vehiculos, dias_para_filas(tamano, vehiculos, intervalo_s), intervalo_s,
+                                         disposicion, semilla=semilla)
+                exportaciones[disposicion] = (len(df), a_csv(df))
+            registros, contenido = exportaciones[disposicion]
+
+            for medicion in ejecutar_app(app, contenido, repeticiones, memoria, lentas[app]):
+                fila = {"commit": version, "fecha": fecha, "app": app, "tamano": tamano, "registros": registros,
+                        "vehiculos": vehiculos, "python": platform.python_version(), "pandas": pd.__version__,
+                        **medicion}
+                if medicion.get("segundos", 0) > limite_s:
+                    lentas[app].add(medicion["etapa"])
+                filas.append(fila)
+                if al_medir:
+                    al_medir(fila)
+    return pd.DataFrame(filas)
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Resultados en disco y comparación entre commits
+# ─────────────────────────────────────────────────────────────
+def guardar_resultados(resultados: pd.DataFrame, directorio: str = DIRECTORIO_RENDIMIENTO) -> str:
+    """Escribe los resultados en `<directorio>/<fecha>-<commit>.jsonl` y devuelve la ruta."""
+    os.makedirs(directorio, exist_ok=True)
+    marca = datetime.now().strftime("%Y%m%d-%H%M%S")
+    version = resultados["commit"].iloc[0] if not resultados.empty else "vacio"
+    ruta = os.path.join(directorio, f"{marca}-{version}.jsonl")
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        for fila in resultados.to_dict("records"):
+            fila = {k: v for k, v in fila.items() if not (isinstance(v, float) and pd.isna(v))}
+            archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+    return ruta
+
+
+def cargar_resultados(ruta: str) -> pd.DataFrame:
+    return pd.read_json(ruta, lines=True)
+
+
+def comparar_resultados(base: pd.DataFrame, actual: pd.DataFrame) -> pd.DataFrame:
+    """
+    Une dos corridas por (app, tamaño, etapa) con la razón actual/base de
+    tiempo y memoria (< 1 = mejora). Solo etapas medidas ("ok") en ambas.
+    """
+    claves = ["app", "tamano", "etapa"]
+    columnas = claves + ["segundos", "pico_mb", "filas_salida"]
+
+    def medidas(df):
+        df = df[df["estado"] == "ok"]
+        return df.reindex(columns=columnas)
+
+    unidas = medidas(base).merge(medidas(actual), on=claves, suffixes=("_base", "_actual"))
+    unidas["razon_tiempo"] = (unidas["segundos_actual"] / unidas["segundos_base"]).round(3)
+    unidas["razon_memoria"] = (unidas["pico_mb_actual"] / unidas["pico_mb_base"]).round(3)
+    orden = {etapa: i for i, etapa in enumerate(["lectura", *(e for e, _, _ in CADENA_ETAPAS)])}
+    return unidas.sort_values(claves, key=lambda c: c.map(orden) if c.name == "etapa" else c,
+                              kind="stable").reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# 4 | Línea de comandos
+# ─────────────────────────────────────────────────────────────
+def imprimir_medicion(fila: dict):
+    if fila["estado"] == "ok":
+        memoria = "" if fila.get("pico_mb") is None else f"  {fila['pico_mb']:>9,.1f} MB"
+        print(f"{fila['app']:<14} {fila['tamano']:>10,} {fila['etapa']:<34} {fila['segundos']:>9.3f} s{memoria}"
+              f"  {fila['filas_entrada']:>10,} → {fila['filas_salida']:,}")
+    else:
+        print(f"{fila['app']:<14} {fila['tamano']:>10,} {fila['etapa']:<34} {fila['estado']}")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Banco de rendimiento por etapa de los dashboards T-Metal")
+    parser.add_argument("--apps", nargs="+", default=list(APPS_BANCO), choices=APPS_BANCO)
+    parser.add_argument("--tamanos", nargs="+", type=int, default=list(TAMANOS_DEFECTO),
+                        help="Registros aproximados de cada exportación sintética")
+    parser.add_argument("--vehiculos", type=int, default=VEHICULOS_DEFECTO)
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_DEFECTO_S, help="Segundos entre registros")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir el pico de memoria (más rápido)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--directorio", default=DIRECTORIO_RENDIMIENTO)
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "ACTUAL"),
+                        help="Compara dos archivos de resultados en lugar de medir")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        comparacion = comparar_resultados(*(cargar_resultados(r) for r in args.comparar))
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(comparacion.to_string(index=False))
+        return
+
+    print(f"🚀 Banco de rendimiento ({version_codigo()}): {', '.join(args.apps)}")
+    resultados = ejecutar_banco(args.apps, args.tamanos, args.vehiculos, args.intervalo, args.repeticiones,
+                                not args.sin_memoria, args.semilla, al_medir=imprimir_medicion)
+    print(f"💾 Resultados en {guardar_resultados(resultados, args.directorio)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
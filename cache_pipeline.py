@@ -0,0 +1,132 @@
+"""
+Caché de etapas del pipeline GPS - T-Metal
+Memoiza la salida de cada etapa (lectura, preparación, transiciones, viajes, ...)
+con una clave formada por la huella del archivo cargado, el nombre de la etapa
+y los parámetros de análisis. Los resultados se guardan en memoria con un
+presupuesto configurable y se expulsan por LRU (el menos usado recientemente).
+
+La instancia se comparte entre sesiones del navegador (ver `st.cache_resource`
+en los dashboards): dos usuarios que suben la misma exportación reutilizan los
+mismos resultados. Los objetos guardados son compartidos y deben tratarse como
+de solo lectura.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+PRESUPUESTO_CACHE_MB = float(os.getenv("TMETAL_CACHE_MB", "512"))
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Claves y tamaño de los resultados
+# ─────────────────────────────────────────────────────────────
+def huella_contenido(contenido: bytes) -> str:
+    """Huella (BLAKE2b, 128 bits) de los bytes del archivo cargado."""
+    return hashlib.blake2b(contenido, digest_size=16).hexdigest()
+
+
+def estimar_bytes(objeto: Any) -> int:
+    """Estimación del tamaño en memoria de un resultado de etapa."""
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        uso = objeto.memory_usage(deep=True)
+        return int(uso.sum() if isinstance(uso, pd.Series) else uso)
+    if isinstance(objeto, np.ndarray):
+        return int(objeto.nbytes)
+    if isinstance(objeto, dict):
+        return sys.getsizeof(objeto) + sum(estimar_bytes(v) for v in objeto.values())
+    if isinstance(objeto, (list, tuple, set, frozenset)):
+        return sys.getsizeof(objeto) + sum(estimar_bytes(v) for v in objeto)
+    return sys.getsizeof(objeto)
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Caché LRU con presupuesto de memoria
+# ─────────────────────────────────────────────────────────────
+class CachePipeline:
+    """Caché LRU de resultados de etapas, segura entre hilos (una sesión Streamlit = un hilo)."""
+
+    def __init__(self, presupuesto_mb: float = PRESUPUESTO_CACHE_MB):
+        self.presupuesto_bytes = int(presupuesto_mb * 1024 * 1024)
+        self._entradas: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave: Hashable, defecto: Any = None) -> Any:
+        with self._lock:
+            if clave not in self._entradas:
+                return defecto
+            self._entradas.move_to_end(clave)
+            return self._entradas[clave][0]
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        """Guarda un resultado; si por sí solo excede el presupuesto no se guarda."""
+        tamano = estimar_bytes(valor)
+        with self._lock:
+            if clave in self._entradas:
+                self._bytes -= self._entradas.pop(clave)[1]
+            if tamano > self.presupuesto_bytes:
+                return
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+            while self._bytes > self.presupuesto_bytes:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self._bytes -= liberado
+                self.expulsiones += 1
+
+    def obtener_o_calcular(self, clave: Hashable, funcion: Callable, *args, **kwargs) -> Any:
+        """Devuelve el resultado memoizado de `clave` o lo calcula con `funcion(*args, **kwargs)`."""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave][0]
+            self.fallos += 1
+
+        # El cálculo se hace fuera del lock: otras sesiones no quedan bloqueadas
+        valor = funcion(*args, **kwargs)
+        self.guardar(clave, valor)
+        return valor
+
+    def etapas(self, huella: str, parametros: tuple = ()) -> Callable:
+        """
+        Atajo para memoizar las etapas de un archivo:
+        `etapa = cache.etapas(huella, parametros); df = etapa("datos", preparar_datos, raw)`.
+        """
+        def etapa(nombre: Hashable, funcion: Callable, *args, **kwargs) -> Any:
+            return self.obtener_o_calcular((huella, nombre, parametros), funcion, *args, **kwargs)
+        return etapa
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "uso_mb": round(self._bytes / 1024 / 1024, 1),
+                "presupuesto_mb": round(self.presupuesto_bytes / 1024 / 1024, 1),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def __contains__(self, clave: Hashable) -> bool:
+        return clave in self._entradas
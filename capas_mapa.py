@@ -0,0 +1,296 @@
+"""
+Capas livianas para mapas folium - T-Metal
+Prepara en el servidor lo que se envía al navegador, para que el HTML del mapa
+no crezca con el tamaño del dataset:
+
+- Centroides de geocercas en un solo groupby
+- Grilla de densidad: millones de puntos se resumen en a lo más
+  CELDAS_CALOR_MAX celdas ponderadas para una capa HeatMap
+- Tope de marcadores individuales (MAX_ELEMENTOS_MAPA); lo que queda fuera
+  sigue visible en la capa de calor
+- Recorridos GPS simplificados (Douglas–Peucker) con una tolerancia en metros
+  que depende del zoom elegido, conservando entradas/salidas de geocerca y detenciones
+"""
+
+import os
+
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import HeatMap, MarkerCluster
+
+from motor_vectorizado import RADIO_TIERRA_M, VELOCIDAD_DETENIDO_KMH, distancia_haversine
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+MAX_ELEMENTOS_MAPA = int(os.getenv("TMETAL_MAX_ELEMENTOS_MAPA", "300"))  # Marcadores con popup
+CELDAS_CALOR_MAX = int(os.getenv("TMETAL_CELDAS_CALOR", "2000"))         # Celdas de la capa de calor
+CENTRO_DEFECTO = (-22.59, -69.86)
+METROS_POR_PIXEL_ZOOM_0 = 156543.03392  # Teselas OSM/Leaflet de 256 px en el ecuador
+ZOOM_DETALLE_DEFECTO = 15
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Resúmenes de puntos en el servidor
+# ─────────────────────────────────────────────────────────────
+def centroides_geocercas(df: pd.DataFrame, columna_geocerca: str = "Geocercas") -> pd.DataFrame:
+    """Centro (promedio de coordenadas) y registros de cada geocerca, en orden de primera aparición."""
+    conocidas = df[(df[columna_geocerca] != "").to_numpy(dtype=bool)
+                   & df["Latitud"].notna().to_numpy() & df["Longitud"].notna().to_numpy()]
+    if conocidas.empty:
+        return pd.DataFrame(columns=["Geocerca", "Latitud", "Longitud", "Registros"])
+    centros = conocidas.groupby(columna_geocerca, sort=False, observed=True).agg(
+        Latitud=("Latitud", "mean"), Longitud=("Longitud", "mean"), Registros=("Latitud", "size")
+    )
+    return centros.rename_axis("Geocerca").reset_index()
+
+
+def grilla_densidad(lat, lon, pesos=None, max_celdas: int = CELDAS_CALOR_MAX) -> pd.DataFrame:
+    """
+    Agrupa los puntos en una grilla regular y devuelve una fila por celda no vacía:
+    centro ponderado de sus puntos y peso total (ordenadas de mayor a menor peso).
+    La celda parte en extensión / √max_celdas y crece un 10% por vuelta hasta
+    quedar bajo `max_celdas`; el peso total se conserva.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    pesos = np.ones(len(lat)) if pesos is None else np.asarray(pesos, dtype=float)
+    validos = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(pesos)
+    lat, lon, pesos = lat[validos], lon[validos], pesos[validos]
+    if len(lat) == 0:
+        return pd.DataFrame(columns=["Latitud", "Longitud", "Peso"])
+
+    extension = max(lat.max() - lat.min(), lon.max() - lon.min(), 1e-9)
+    lado = extension / np.sqrt(max(max_celdas, 1))
+    while True:
+        fila = np.floor((lat - lat.min()) / lado).astype(np.int64)
+        columna = np.floor((lon - lon.min()) / lado).astype(np.int64)
+        celdas, celda = np.unique(fila * (columna.max() + 1) + columna, return_inverse=True)
+        if len(celdas) <= max_celdas:
+            break
+        lado *= 1.1
+
+    peso = np.bincount(celda, pesos)
+    # Celdas con peso total cero: centro simple de sus puntos
+    divisor = np.where(peso > 0, peso, 1)
+    conteo = np.bincount(celda)
+    centro_lat = np.where(peso > 0, np.bincount(celda, pesos * lat) / divisor, np.bincount(celda, lat) / conteo)
+    centro_lon = np.where(peso > 0, np.bincount(celda, pesos * lon) / divisor, np.bincount(celda, lon) / conteo)
+
+    resultado = pd.DataFrame({"Latitud": centro_lat, "Longitud": centro_lon, "Peso": peso})
+    return resultado.sort_values("Peso", ascending=False, kind="stable").reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Mapa de zonas no mapeadas
+# ─────────────────────────────────────────────────────────────
+def _popup_zona(zona: dict) -> str:
+    if zona.get("Zonas_Agrupadas", 1) > 1:
+        vehiculos_info = ", ".join(zona.get("Vehiculos_Involucrados", [zona["Nombre del Vehículo"]]))
+        return f"""
+                <b>Zona Agrupada</b><br>
+                Zonas combinadas: {zona.get("Zonas_Agrupadas", 1)}<br>
+                Vehículos: {vehiculos_info}<br>
+                Duración Total: {zona["Duracion_Minutos"]:.1f} min<br>
+                Registros: {zona["Registros"]}<br>
+                Velocidad Prom: {zona["Velocidad_Promedio"]:.1f} km/h<br>
+                Radio: {zona["Radio_Aprox_m"]:.0f} m
+                """
+    return f"""
+                <b>Zona Individual</b><br>
+                Vehículo: {zona["Nombre del Vehículo"]}<br>
+                Duración: {zona["Duracion_Minutos"]:.1f} min<br>
+                Registros: {zona["Registros"]}<br>
+                Velocidad Prom: {zona["Velocidad_Promedio"]:.1f} km/h<br>
+                Radio: {zona["Radio_Aprox_m"]:.0f} m
+                """
+
+
+def crear_mapa_calor(df: pd.DataFrame, zonas_candidatas: pd.DataFrame,
+                     max_elementos: int = MAX_ELEMENTOS_MAPA, max_celdas: int = CELDAS_CALOR_MAX) -> folium.Map:
+    """
+    Crea un mapa de calor con las zonas candidatas y geocercas existentes:
+    - Capa de calor con todas las zonas, ponderadas por duración y resumidas en la grilla
+    - Marcadores con detalle solo para las `max_elementos` zonas más largas
+    - Un marcador por geocerca conocida en su centroide (las `max_elementos` más visitadas)
+    """
+    # Calcular centro del mapa
+    centro_lat, centro_lon = CENTRO_DEFECTO
+    con_coordenadas = not df.empty and "Latitud" in df.columns and "Longitud" in df.columns
+    if con_coordenadas:
+        validas = (df["Latitud"].notna() & df["Longitud"].notna()).to_numpy()
+        if validas.any():
+            centro_lat = df["Latitud"].to_numpy()[validas].mean()
+            centro_lon = df["Longitud"].to_numpy()[validas].mean()
+
+    mapa = folium.Map(location=[centro_lat, centro_lon], zoom_start=13, tiles='OpenStreetMap')
+
+    # Añadir geocercas conocidas
+    if con_coordenadas:
+        centros = centroides_geocercas(df)
+        if len(centros) > max_elementos:
+            centros = centros.nlargest(max_elementos, "Registros", keep="first")
+        for geocerca, lat_media, lon_media in zip(centros["Geocerca"], centros["Latitud"], centros["Longitud"]):
+            folium.Marker(
+                [lat_media, lon_media],
+                popup=f"Geocerca: {geocerca}",
+                icon=folium.Icon(color='green', icon='info-sign')
+            ).add_to(mapa)
+
+    if zonas_candidatas.empty:
+        return mapa
+
+    # Capa de calor: todas las zonas, resumidas en la grilla del servidor
+    celdas = grilla_densidad(zonas_candidatas["Latitud_Centro"], zonas_candidatas["Longitud_Centro"],
+                             zonas_candidatas["Duracion_Minutos"], max_celdas)
+    if not celdas.empty and celdas["Peso"].max() > 0:
+        intensidad = celdas["Peso"] / celdas["Peso"].max()
+        HeatMap(np.column_stack([celdas["Latitud"], celdas["Longitud"], intensidad]).tolist(),
+                name="Densidad de zonas", radius=20, blur=15, min_opacity=0.3).add_to(mapa)
+
+    # Marcadores de detalle: las zonas de mayor duración
+    detalle = zonas_candidatas.nlargest(min(max_elementos, len(zonas_candidatas)), "Duracion_Minutos", keep="first")
+    for zona in detalle.to_dict("records"):
+        es_agrupada = zona.get("Zonas_Agrupadas", 1) > 1
+        color = 'orange' if es_agrupada else 'red'
+        folium.CircleMarker(
+            [zona["Latitud_Centro"], zona["Longitud_Centro"]],
+            radius=min(max(zona["Duracion_Minutos"] / 10, 5), 25),  # Radio proporcional a duración
+            popup=_popup_zona(zona),
+            color=color,
+            fill=True,
+            fillColor=color,
+            fillOpacity=0.7 if es_agrupada else 0.6
+        ).add_to(mapa)
+
+    return mapa
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Recorridos simplificados (nivel de detalle por zoom)
+# ─────────────────────────────────────────────────────────────
+def tolerancia_por_zoom(zoom: float, latitud: float, pixeles: float = 1.0) -> float:
+    """Metros que cubren `pixeles` píxeles de pantalla en ese zoom de Leaflet a esa latitud."""
+    return pixeles * METROS_POR_PIXEL_ZOOM_0 * np.cos(np.radians(latitud)) / 2 ** zoom
+
+
+def puntos_clave(df: pd.DataFrame, columna_geocerca: str = "Geocercas") -> np.ndarray:
+    """
+    Registros (ordenados por tiempo, de un vehículo) que la simplificación no puede
+    descartar: primero y último, los dos lados de cada entrada/salida de geocerca y
+    de cada inicio/fin de detención (velocidad < VELOCIDAD_DETENIDO_KMH). Sin columna
+    de velocidad se usa la velocidad desde el registro anterior.
+    """
+    n = len(df)
+    clave = np.zeros(n, dtype=bool)
+    if n == 0:
+        return clave
+    clave[[0, -1]] = True
+
+    geocerca = df[columna_geocerca].fillna("").astype(str).to_numpy()
+    if "Velocidad [km/h]" in df.columns:
+        velocidad = pd.to_numeric(df["Velocidad [km/h]"], errors="coerce").to_numpy(dtype=float)
+    else:
+        lat, lon = df["Latitud"].to_numpy(dtype=float), df["Longitud"].to_numpy(dtype=float)
+        horas = np.diff(df["Tiempo de evento"].to_numpy()) / np.timedelta64(1, "h")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocidad = np.insert(distancia_haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]) / 1000 / horas, 0, np.inf)
+    detenido = velocidad < VELOCIDAD_DETENIDO_KMH
+
+    cambio = (geocerca[1:] != geocerca[:-1]) | (detenido[1:] != detenido[:-1])
+    clave[1:] |= cambio
+    clave[:-1] |= cambio
+    return clave
+
+
+def simplificar_trayectoria(lat, lon, tolerancia_m: float, conservar=None) -> np.ndarray:
+    """
+    Douglas–Peucker vectorizado: máscara de los vértices que se mantienen. Todo punto
+    descartado queda a menos de `tolerancia_m` metros del tramo entre los vértices
+    conservados que lo rodean. Los puntos marcados en `conservar` (y los extremos) se
+    mantienen siempre y dividen el recorrido en tramos independientes.
+
+    Cada vuelta evalúa a la vez todos los tramos pendientes (un recorrido completo de
+    los puntos), en proyección equirectangular local en metros.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    n = len(lat)
+    mantener = np.zeros(n, dtype=bool) if conservar is None else np.array(conservar, dtype=bool)
+    if n <= 2:
+        return np.ones(n, dtype=bool)
+    mantener[[0, -1]] = True
+
+    metros_por_grado = np.radians(1) * RADIO_TIERRA_M
+    y = lat * metros_por_grado
+    x = lon * metros_por_grado * np.cos(np.radians(np.mean(lat)))
+    tolerancia2 = tolerancia_m ** 2
+
+    anclas = np.flatnonzero(mantener)
+    inicio, fin = anclas[:-1], anclas[1:]
+    while True:
+        pendientes = fin - inicio > 1
+        inicio, fin = inicio[pendientes], fin[pendientes]
+        if not len(inicio):
+            return mantener
+
+        # Puntos interiores de todos los tramos, concatenados tramo a tramo
+        largo = fin - inicio - 1
+        desde = np.cumsum(largo) - largo
+        tramo = np.repeat(np.arange(len(inicio)), largo)
+        punto = inicio[tramo] + 1 + np.arange(len(tramo)) - desde[tramo]
+
+        # Distancia al segmento (no a la recta) entre los extremos del tramo
+        ax, ay = x[inicio][tramo], y[inicio][tramo]
+        dx, dy = x[fin][tramo] - ax, y[fin][tramo] - ay
+        largo2 = dx * dx + dy * dy
+        t = np.clip(((x[punto] - ax) * dx + (y[punto] - ay) * dy) / np.where(largo2 > 0, largo2, 1), 0, 1)
+        distancia2 = (x[punto] - ax - t * dx) ** 2 + (y[punto] - ay - t * dy) ** 2
+
+        maximo = np.maximum.reduceat(distancia2, desde)
+        dividir = maximo > tolerancia2
+        # Primer punto más lejano de cada tramo que se divide
+        en_maximo = np.flatnonzero(dividir[tramo] & (distancia2 == maximo[tramo]))
+        _, primero = np.unique(tramo[en_maximo], return_index=True)
+        corte = punto[en_maximo[primero]]
+        mantener[corte] = True
+
+        inicio, fin = np.concatenate([inicio[dividir], corte]), np.concatenate([corte, fin[dividir]])
+
+
+def mapa_recorrido(df_v: pd.DataFrame, zoom_detalle: float = ZOOM_DETALLE_DEFECTO,
+                   columna_geocerca: str = "Geocercas",
+                   max_elementos: int = MAX_ELEMENTOS_MAPA) -> tuple[folium.Map, dict]:
+    """
+    Mapa del recorrido de un vehículo: línea simplificada con la tolerancia de un
+    píxel en `zoom_detalle` y marcadores (con hora) en los puntos clave, a lo más
+    `max_elementos` repartidos a lo largo del recorrido.
+    Devuelve (mapa, resumen) con registros, vértices, marcadores y tolerancia usada.
+    """
+    puntos = df_v.dropna(subset=["Latitud", "Longitud"]).sort_values("Tiempo de evento", kind="stable")
+    lat = puntos["Latitud"].to_numpy(dtype=float)
+    lon = puntos["Longitud"].to_numpy(dtype=float)
+
+    tolerancia_m = tolerancia_por_zoom(zoom_detalle, lat.mean())
+    clave = puntos_clave(puntos, columna_geocerca)
+    mantener = simplificar_trayectoria(lat, lon, tolerancia_m, clave)
+
+    mapa = folium.Map(location=[lat.mean(), lon.mean()], zoom_start=12)
+    folium.PolyLine(np.column_stack([lat[mantener], lon[mantener]]).tolist(),
+                    color="blue", weight=3, opacity=0.8).add_to(mapa)
+
+    marcadores = np.flatnonzero(clave)
+    if len(marcadores) > max_elementos:
+        marcadores = marcadores[np.linspace(0, len(marcadores) - 1, max_elementos).round().astype(int)]
+    horas = puntos["Tiempo de evento"].dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+    cluster = MarkerCluster().add_to(mapa)
+    for i in marcadores:
+        folium.Marker(location=[lat[i], lon[i]], popup=horas[i]).add_to(cluster)
+
+    return mapa, {
+        "registros": len(puntos),
+        "vertices": int(mantener.sum()),
+        "marcadores": len(marcadores),
+        "tolerancia_m": tolerancia_m,
+    }
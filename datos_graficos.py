@@ -0,0 +1,234 @@
+"""
+Datos para gráficos Altair - T-Metal
+Altair embebe el DataFrame completo en la especificación Vega-Lite que viaja al
+navegador. Estas funciones agregan en el servidor a la resolución que el
+gráfico puede mostrar, con un tope de filas por gráfico (FILAS_MAX_GRAFICO):
+
+- Series temporales: el paso (1 h, 2 h, ..., 4 semanas) se elige para que
+  intervalos × series no supere el tope
+- Categorías: las de mayor peso se muestran y el resto se suma en "Otros (n)"
+- Intervalos (timeline): se fusionan los que quedan a menos de un píxel
+- Dispersión: los puntos se agrupan en una grilla de píxeles
+
+Bajo el tope los datos se devuelven sin cambios. Cada función devuelve también
+un detalle de la reducción; `describir_grafico` lo resume junto al tamaño de la
+especificación para mostrarlo bajo el gráfico.
+"""
+
+import os
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+FILAS_MAX_GRAFICO = int(os.getenv("TMETAL_FILAS_GRAFICO", "1500"))             # Filas embebidas por gráfico
+CATEGORIAS_MAX_GRAFICO = int(os.getenv("TMETAL_CATEGORIAS_GRAFICO", "40"))    # Barras por gráfico de categorías
+ANCHO_GRAFICO_PX = 700    # Ancho visible de un gráfico a todo el ancho
+ANCHO_DISPERSION_PX = 300  # Ancho visible de un gráfico de dispersión en columna
+ETIQUETA_OTROS = "Otros"
+ETIQUETA_VARIOS = "Varios"
+
+# Pasos temporales candidatos (alias de pandas → descripción para títulos)
+PASOS_TIEMPO = {
+    "1h": "hora",
+    "2h": "2 horas",
+    "3h": "3 horas",
+    "6h": "6 horas",
+    "12h": "12 horas",
+    "1D": "día",
+    "7D": "semana",
+    "28D": "4 semanas",
+}
+
+
+def _colapsar_etiquetas(agrupado, columnas: list[str]) -> pd.DataFrame:
+    """Por grupo: el valor de cada columna si es único, si no ETIQUETA_VARIOS."""
+    primeros = agrupado[columnas].first().astype(object)
+    distintos = agrupado[columnas].nunique()
+    return primeros.where(distintos <= 1, ETIQUETA_VARIOS)
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Series temporales al paso visible
+# ─────────────────────────────────────────────────────────────
+def elegir_paso(inicio: pd.Timestamp, fin: pd.Timestamp, series: int = 1,
+                max_filas: int = FILAS_MAX_GRAFICO, paso_minimo: str = "1h") -> str:
+    """Paso más fino (desde `paso_minimo`) con el que intervalos × series cabe en `max_filas`."""
+    pasos = list(PASOS_TIEMPO)
+    for paso in pasos[pasos.index(paso_minimo):]:
+        intervalos = (fin.floor(paso) - inicio.floor(paso)) // pd.Timedelta(paso) + 1
+        if intervalos * max(series, 1) <= max_filas:
+            return paso
+    return paso
+
+
+def agregar_por_tiempo(df: pd.DataFrame, columna_tiempo: str, sumas: list[str], grupos: list[str] = (),
+                       etiquetas: list[str] = (), max_filas: int = FILAS_MAX_GRAFICO,
+                       paso_minimo: str = "1h") -> tuple[pd.DataFrame, dict]:
+    """
+    Suma `sumas` por intervalo de tiempo (y por `grupos`, una serie cada uno).
+    Las columnas de `etiquetas` conservan su valor si es único en el intervalo.
+    Devuelve (datos, {"filas_origen", "filas", "paso"}).
+    """
+    grupos, sumas, etiquetas = list(grupos), list(sumas), list(etiquetas)
+    if df.empty:
+        vacio = pd.DataFrame(columns=[columna_tiempo, *grupos, *sumas, *etiquetas])
+        return vacio, {"filas_origen": 0, "filas": 0, "paso": paso_minimo}
+
+    tiempos = pd.to_datetime(df[columna_tiempo])
+    series = df.groupby(grupos, observed=True, dropna=False).ngroups if grupos else 1
+    paso = elegir_paso(tiempos.min(), tiempos.max(), series, max_filas, paso_minimo)
+
+    claves = [tiempos.dt.floor(paso).rename(columna_tiempo), *(df[g] for g in grupos)]
+    agrupado = df.groupby(claves, sort=True, observed=True, dropna=False)
+    resultado = agrupado[sumas].sum()
+    if etiquetas:
+        resultado = resultado.join(_colapsar_etiquetas(agrupado, etiquetas))
+    resultado = resultado.reset_index()
+    return resultado, {"filas_origen": len(df), "filas": len(resultado), "paso": paso}
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Categorías con tope ("Otros")
+# ─────────────────────────────────────────────────────────────
+def limitar_categorias(df: pd.DataFrame, categoria: str, orden: str,
+                       max_categorias: int = CATEGORIAS_MAX_GRAFICO, sumas: list[str] = (),
+                       promedios: list[str] = (), peso: str | None = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Conserva las `max_categorias - 1` filas de mayor `orden` y reúne el resto en
+    una fila "Otros (n)": suma `sumas` y promedia `promedios` (ponderados por
+    `peso` si se indica). Devuelve (datos, {"filas_origen", "filas", "agrupadas"}).
+    """
+    if len(df) <= max_categorias:
+        return df, {"filas_origen": len(df), "filas": len(df), "agrupadas": 0}
+
+    ordenado = df.sort_values(orden, ascending=False, kind="stable")
+    visibles, resto = ordenado.iloc[:max_categorias - 1], ordenado.iloc[max_categorias - 1:]
+    otros = {categoria: f"{ETIQUETA_OTROS} ({len(resto)})"}
+    for columna in sumas:
+        otros[columna] = resto[columna].sum()
+    for columna in promedios:
+        pesos = resto[peso] if peso else None
+        ponderable = pesos is not None and pesos.sum() > 0
+        otros[columna] = np.average(resto[columna], weights=pesos) if ponderable else resto[columna].mean()
+
+    resultado = pd.concat([visibles, pd.DataFrame([otros])], ignore_index=True)
+    return resultado, {"filas_origen": len(df), "filas": len(resultado), "agrupadas": len(resto)}
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Intervalos (timeline) a resolución de píxel
+# ─────────────────────────────────────────────────────────────
+def fusionar_intervalos(df: pd.DataFrame, inicio: str, fin: str, grupos: list[str], sumas: list[str] = (),
+                        etiquetas: list[str] = (), max_filas: int = FILAS_MAX_GRAFICO,
+                        ancho_px: int = ANCHO_GRAFICO_PX,
+                        columna_cantidad: str = "Cantidad") -> tuple[pd.DataFrame, dict]:
+    """
+    Fusiona, dentro de cada grupo, los intervalos separados por menos de la
+    resolución (duración visible / `ancho_px`, duplicada hasta caber en
+    `max_filas`). `columna_cantidad` cuenta los intervalos de cada barra.
+    Devuelve (datos, {"filas_origen", "filas", "resolucion"}).
+    """
+    grupos, sumas, etiquetas = list(grupos), list(sumas), list(etiquetas)
+    if len(df) <= max_filas:
+        detalle = {"filas_origen": len(df), "filas": len(df), "resolucion": None}
+        return df.assign(**{columna_cantidad: 1}), detalle
+
+    ordenado = df.sort_values([*grupos, inicio], kind="stable")
+    inicios = ordenado[inicio].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    fines = ordenado[fin].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    id_grupo = ordenado.groupby(grupos, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    nuevo_grupo = np.r_[True, id_grupo[1:] != id_grupo[:-1]]
+
+    # Hueco contra el fin más tardío de los intervalos anteriores del grupo (cubre solapes)
+    fin_acumulado = pd.Series(fines).groupby(id_grupo).cummax().to_numpy()
+    hueco = np.r_[0, inicios[1:] - fin_acumulado[:-1]]
+    extension = max(int(fines.max() - inicios.min()), 1)
+    resolucion = max(extension // ancho_px, 1)
+    while True:
+        bloques = np.cumsum(nuevo_grupo | (hueco > resolucion))
+        if bloques[-1] <= max_filas or resolucion >= extension:
+            break
+        resolucion *= 2
+
+    agrupado = ordenado.groupby(bloques, sort=True)
+    resultado = agrupado[grupos].first()
+    resultado[inicio] = agrupado[inicio].min()
+    resultado[fin] = agrupado[fin].max()
+    resultado[columna_cantidad] = agrupado.size()
+    for columna in sumas:
+        resultado[columna] = agrupado[columna].sum()
+    if etiquetas:
+        resultado = resultado.join(_colapsar_etiquetas(agrupado, etiquetas))
+    resultado = resultado.reset_index(drop=True)
+    detalle = {"filas_origen": len(df), "filas": len(resultado), "resolucion": pd.Timedelta(resolucion)}
+    return resultado, detalle
+
+
+# ─────────────────────────────────────────────────────────────
+# 4 | Dispersión en grilla de píxeles
+# ─────────────────────────────────────────────────────────────
+def agrupar_dispersion(df: pd.DataFrame, x: str, y: str, grupos: list[str] = (), etiquetas: list[str] = (),
+                       max_filas: int = FILAS_MAX_GRAFICO, celdas_por_eje: int = ANCHO_DISPERSION_PX,
+                       columna_cantidad: str = "Cantidad") -> tuple[pd.DataFrame, dict]:
+    """
+    Agrupa los puntos en una grilla de `celdas_por_eje` × `celdas_por_eje`
+    (reducida a la mitad hasta caber en `max_filas`); cada celda se dibuja en el
+    promedio de sus puntos. Devuelve (datos, {"filas_origen", "filas", "celdas"}).
+    """
+    grupos, etiquetas = list(grupos), list(etiquetas)
+    if len(df) <= max_filas:
+        detalle = {"filas_origen": len(df), "filas": len(df), "celdas": None}
+        return df.assign(**{columna_cantidad: 1}), detalle
+
+    validos = df[np.isfinite(df[x].to_numpy(dtype=float)) & np.isfinite(df[y].to_numpy(dtype=float))]
+    vx, vy = validos[x].to_numpy(dtype=float), validos[y].to_numpy(dtype=float)
+
+    def celda(valores: np.ndarray, celdas: int) -> np.ndarray:
+        rango = valores.max() - valores.min() if len(valores) else 0
+        if rango == 0:
+            return np.zeros(len(valores), dtype=np.int64)
+        return np.minimum(((valores - valores.min()) / rango * celdas).astype(np.int64), celdas - 1)
+
+    celdas = celdas_por_eje
+    while True:
+        claves = [*(validos[g] for g in grupos), pd.Series(celda(vx, celdas), index=validos.index, name="_cx"),
+                  pd.Series(celda(vy, celdas), index=validos.index, name="_cy")]
+        agrupado = validos.groupby(claves, sort=True, observed=True, dropna=False)
+        if agrupado.ngroups <= max_filas or celdas == 1:
+            break
+        celdas //= 2
+
+    resultado = agrupado[[x, y]].mean()
+    resultado[columna_cantidad] = agrupado.size()
+    if etiquetas:
+        resultado = resultado.join(_colapsar_etiquetas(agrupado, etiquetas))
+    resultado = resultado.reset_index().drop(columns=["_cx", "_cy"])
+    return resultado, {"filas_origen": len(df), "filas": len(resultado), "celdas": celdas}
+
+
+# ─────────────────────────────────────────────────────────────
+# 5 | Tamaño de la especificación enviada al navegador
+# ─────────────────────────────────────────────────────────────
+def tamano_especificacion(grafico: alt.TopLevelMixin) -> int:
+    """Bytes de la especificación Vega-Lite con los datos embebidos."""
+    with alt.data_transformers.disable_max_rows():
+        return len(grafico.to_json(indent=None).encode())
+
+
+def describir_grafico(grafico: alt.TopLevelMixin, detalle: dict) -> str:
+    """Resumen de la reducción y del tamaño del gráfico para mostrar bajo él."""
+    partes = [f"{detalle['filas']:,} de {detalle['filas_origen']:,} filas"]
+    if detalle.get("paso"):
+        partes.append(f"por {PASOS_TIEMPO[detalle['paso']]}")
+    if detalle.get("agrupadas"):
+        partes.append(f"{detalle['agrupadas']:,} en «{ETIQUETA_OTROS}»")
+    if detalle.get("resolucion") is not None:
+        partes.append(f"intervalos fusionados a {detalle['resolucion'].round('s')}")
+    if detalle.get("celdas"):
+        partes.append(f"grilla de {detalle['celdas']}×{detalle['celdas']}")
+    partes.append(f"{tamano_especificacion(grafico) / 1024:,.1f} KB")
+    return "📦 " + " · ".join(partes)
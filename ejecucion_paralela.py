@@ -0,0 +1,163 @@
+"""
+Ejecución multinúcleo por vehículo - T-Metal
+Divide el DataFrame preparado en particiones por "Nombre del Vehículo" y ejecuta
+una etapa del motor en un pool de procesos. Cada vehículo queda completo en una
+sola partición, por lo que las etapas por vehículo producen el mismo resultado
+que en serie; la combinación es determinista (orden por vehículo).
+
+Las funciones enviadas al pool deben estar definidas a nivel de módulo en un
+módulo importable (p. ej. `motor_vectorizado`), no en el script de Streamlit.
+
+El pool usa el contexto "spawn", que re-importa el `__main__` del proceso padre
+en cada worker. Bajo `streamlit run` ese módulo es el script del dashboard, así
+que el pool solo se crea desde el hilo principal (un script normal, las pruebas
+o `iniciar_dashboard.py`, que lo arranca antes de entregar el control a
+Streamlit) y todos sus workers se lanzan de una vez. Los hilos de Streamlit
+usan ese pool si existe y, si no, ejecutan la etapa en serie.
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+WORKERS_PIPELINE = int(os.getenv("TMETAL_WORKERS", "1"))                # 1 = ejecución en serie
+MIN_FILAS_PARALELO = int(os.getenv("TMETAL_MIN_FILAS_PARALELO", "200000"))  # Bajo esto no compensa el pool
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_aviso_sin_pool = False
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Particiones por vehículo y combinación de resultados
+# ─────────────────────────────────────────────────────────────
+def particionar_por_vehiculo(df: pd.DataFrame, n_particiones: int) -> list[pd.DataFrame]:
+    """
+    Reparte los vehículos en `n_particiones` con carga similar de filas
+    (el vehículo con más registros va a la partición menos cargada).
+    El reparto depende solo de los datos, no del orden de llegada de las filas.
+    """
+    codigos, vehiculos = pd.factorize(df["Nombre del Vehículo"], sort=True)
+    conteos = np.bincount(codigos, minlength=len(vehiculos))
+
+    asignacion = np.empty(len(vehiculos), dtype=np.int64)
+    cargas = np.zeros(n_particiones, dtype=np.int64)
+    for vehiculo in np.argsort(-conteos, kind="stable"):
+        destino = int(np.argmin(cargas))
+        asignacion[vehiculo] = destino
+        cargas[destino] += conteos[vehiculo]
+
+    particion_fila = asignacion[codigos]
+    return [df[particion_fila == i] for i in range(n_particiones) if cargas[i] > 0]
+
+
+def combinar_resultados(resultados: list) -> Any:
+    """
+    Combina los resultados de cada partición:
+    - DataFrame: concatenación ordenada (estable) por vehículo
+    - dict de contadores: suma por clave
+    - tuple: combinación elemento a elemento
+    """
+    primero = resultados[0]
+    if isinstance(primero, pd.DataFrame):
+        no_vacios = [r for r in resultados if not r.empty]
+        if not no_vacios:
+            return primero
+        combinado = pd.concat(no_vacios, ignore_index=True)
+        if "Nombre del Vehículo" in combinado.columns:
+            combinado = combinado.sort_values("Nombre del Vehículo", kind="stable").reset_index(drop=True)
+        return combinado
+    if isinstance(primero, dict):
+        return {clave: sum(r[clave] for r in resultados) for clave in primero}
+    if isinstance(primero, tuple):
+        return tuple(combinar_resultados(list(partes)) for partes in zip(*resultados))
+    raise TypeError(f"No se sabe combinar resultados de tipo {type(primero).__name__}")
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Pool de procesos
+# ─────────────────────────────────────────────────────────────
+def iniciar_pool(workers: int = WORKERS_PIPELINE) -> ProcessPoolExecutor:
+    """
+    Crea el pool persistente (se reutiliza entre reruns de Streamlit) y lanza todos
+    sus workers de inmediato; se recrea si cambia `workers`. Debe llamarse desde el
+    hilo principal, donde `__main__` es el programa que se está ejecutando.
+    """
+    global _pool, _pool_workers
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError("El pool de procesos solo se inicia desde el hilo principal")
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+            _pool_workers = workers
+            # Con "spawn" cada envío sin worker libre lanza uno nuevo: se ocupan todos ahora,
+            # para que los envíos posteriores (desde cualquier hilo) no lancen procesos
+            for futuro in [_pool.submit(os.getpid) for _ in range(workers)]:
+                futuro.result()
+        return _pool
+
+
+def _obtener_pool(workers: int) -> tuple[ProcessPoolExecutor | None, int]:
+    """
+    Pool para ejecutar una etapa y su número de workers: se crea en el hilo principal;
+    los demás hilos (los del script de Streamlit) solo usan el existente.
+    """
+    global _aviso_sin_pool
+    if threading.current_thread() is threading.main_thread():
+        return iniciar_pool(workers), workers
+    with _pool_lock:
+        if _pool is None and not _aviso_sin_pool:
+            _aviso_sin_pool = True
+            print("ℹ️ Pool de procesos no iniciado: las etapas se ejecutan en serie "
+                  "(inicie el dashboard con iniciar_dashboard.py)")
+        return _pool, _pool_workers
+
+
+def cerrar_pool() -> None:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+atexit.register(cerrar_pool)
+
+
+def ejecutar_por_vehiculo(funcion: Callable, df: pd.DataFrame, *args,
+                          workers: int | None = None, min_filas: int = MIN_FILAS_PARALELO, **kwargs) -> Any:
+    """
+    Ejecuta `funcion(df, *args, **kwargs)` repartiendo `df` por vehículo en un pool de procesos.
+    Con un worker, pocos registros o un solo vehículo se ejecuta en serie en el proceso actual,
+    igual que en un hilo que no es el principal si el pool no se inició antes.
+    """
+    workers = WORKERS_PIPELINE if workers is None else workers
+    if workers <= 1 or len(df) < min_filas or df["Nombre del Vehículo"].nunique() < 2:
+        return funcion(df, *args, **kwargs)
+
+    pool, workers = _obtener_pool(workers)
+    if pool is None:
+        return funcion(df, *args, **kwargs)
+
+    particiones = particionar_por_vehiculo(df, workers)
+    try:
+        futuros = [pool.submit(funcion, particion, *args, **kwargs) for particion in particiones]
+        return combinar_resultados([futuro.result() for futuro in futuros])
+    except BrokenProcessPool:
+        # Un worker murió (p. ej. sin memoria): se descarta el pool y se calcula en serie
+        cerrar_pool()
+        print("⚠️ Pool de procesos interrumpido: se ejecuta la etapa en serie")
+        return funcion(df, *args, **kwargs)
@@ -0,0 +1,241 @@
+"""
+Generador de exportaciones GeoAustral sintéticas - T-Metal
+Produce registros GPS realistas para medir cómo escala el pipeline sin depender
+de exportaciones reales. Cada vehículo recorre el circuito de una disposición
+de geocercas (mina o puerto):
+
+- Estadías en geocercas (carga/descarga) con algunas detenciones anómalas largas
+- Viajes entre geocercas a velocidad de ruta, a veces por una geocerca de ruta
+- Paradas fuera de geocercas (zonas no mapeadas)
+- Celdas con varias geocercas separadas por ';' (p. ej. "Ruta 5; Módulo 2")
+- Ruido GPS en metros, registros perdidos y geocercas que "parpadean" a vacío
+
+El circuito se arma con un bucle corto por vehículo (decenas de segmentos por
+día); los registros se muestrean de forma vectorizada sobre esos segmentos.
+"""
+
+import numpy as np
+import pandas as pd
+
+from motor_vectorizado import distancia_haversine
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+METROS_POR_GRADO = 111_320
+INICIO_DEFECTO = "2025-07-31 06:00:00"
+FORMATO_TIEMPO_CSV = "%Y-%m-%d %H:%M:%S"
+
+ESTADIA_MIN = (6, 20)              # Minutos de una estadía normal en geocerca
+DETENCION_ANOMALA_MIN = (60, 180)  # Minutos de una detención anómala
+PARADA_NO_MAPEADA_MIN = (15, 60)   # Minutos de una parada fuera de geocercas
+VELOCIDAD_RUTA_KMH = (25, 45)
+PROB_DETENCION_ANOMALA = 0.03
+PROB_PARADA_NO_MAPEADA = 0.05
+PROB_SERVICIO = 0.05               # Pasada por casino/taller entre dos etapas del circuito
+PROB_VIAJE_POR_RUTA = 0.5          # Viajes cuyo tramo central queda en la geocerca de ruta
+
+# Disposiciones: geocerca → (metros al este, metros al norte, radio en metros) respecto del centro.
+# El circuito alterna grupos de geocercas; cada etapa elige una geocerca del grupo.
+DISPOSICIONES = {
+    "mina": {
+        "centro": (-22.59, -69.86),
+        "geocercas": {
+            "Stock Central - 30 km hr": (0, 0, 150),
+            "Stock Norte": (600, 2500, 120),
+            "Módulo 1": (2500, 800, 100),
+            "Módulo 2": (3000, -400, 100),
+            "Módulo 3": (2200, -1500, 100),
+            "Pila Rom 1": (-1800, 1200, 120),
+            "Pila Rom 2": (-2200, -900, 120),
+            "Botadero Norte": (4500, 3500, 200),
+            "Botadero Sur": (5000, -3000, 200),
+            "Casino": (-500, -300, 60),
+            "Instalación de Faena": (-900, 300, 80),
+        },
+        "circuito": [
+            ["Stock Central - 30 km hr", "Stock Norte"],
+            ["Módulo 1", "Módulo 2", "Módulo 3", "Pila Rom 1", "Pila Rom 2"],
+            ["Botadero Norte", "Botadero Sur"],
+            ["Módulo 1", "Módulo 2", "Módulo 3", "Pila Rom 1", "Pila Rom 2"],
+        ],
+        "servicio": ["Casino", "Instalación de Faena"],
+        "ruta": "Ruta 5",
+    },
+    "puerto": {
+        "centro": (-23.10, -70.44),
+        "geocercas": {
+            "Ciudad Mejillones": (0, 0, 400),
+            "TGN": (-2500, 3000, 250),
+            "Oxiquim": (-1500, 4200, 200),
+            "Terquim": (-3500, 1500, 200),
+            "Interacid": (-4200, 800, 200),
+            "Puerto Angamos": (-3000, -1200, 300),
+            "Puerto Mejillones": (-1200, -600, 250),
+            "GNLM": (-5200, 2600, 250),
+            "Muelle Centinela": (-6000, -2500, 200),
+            "Casino": (800, 500, 60),
+        },
+        "circuito": [
+            ["Ciudad Mejillones"],
+            ["TGN", "Oxiquim", "Terquim", "Interacid", "Puerto Angamos", "Puerto Mejillones"],
+            ["GNLM", "Muelle Centinela", "Puerto Angamos"],
+        ],
+        "servicio": ["Casino"],
+        "ruta": "Ruta - Afta Mejillones",
+    },
+}
+
+# Tipos de segmento
+ESTADIA, VIAJE, PARADA = 0, 1, 2
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Circuito de cada vehículo (segmentos)
+# ─────────────────────────────────────────────────────────────
+def coordenadas_geocercas(disposicion: dict) -> dict[str, tuple[float, float, float]]:
+    """Geocerca → (latitud, longitud, radio en metros) de una disposición."""
+    lat0, lon0 = disposicion["centro"]
+    escala_lon = METROS_POR_GRADO * np.cos(np.radians(lat0))
+    return {
+        nombre: (lat0 + norte / METROS_POR_GRADO, lon0 + este / escala_lon, radio)
+        for nombre, (este, norte, radio) in disposicion["geocercas"].items()
+    }
+
+
+def segmentos_vehiculo(rng: np.random.Generator, disposicion: dict, duracion_s: float) -> pd.DataFrame:
+    """
+    Recorre el circuito desde una etapa al azar hasta cubrir `duracion_s`.
+    Cada segmento: inicio/fin en segundos, tipo, geocerca, punto inicial/final,
+    radio de dispersión y velocidad nominal.
+    """
+    sitios = coordenadas_geocercas(disposicion)
+    circuito = disposicion["circuito"]
+    etapa = int(rng.integers(len(circuito)))
+    actual = circuito[etapa][rng.integers(len(circuito[etapa]))]
+    t = float(rng.uniform(0, 600))
+    segmentos = []
+
+    def agregar(tipo, duracion, geocerca, desde, hasta, radio, velocidad, por_ruta=False):
+        nonlocal t
+        segmentos.append((t, t + duracion, tipo, geocerca, *desde, *hasta, radio, velocidad, por_ruta))
+        t += duracion
+
+    while t < duracion_s:
+        lat, lon, radio = sitios[actual]
+        minutos = rng.uniform(*(DETENCION_ANOMALA_MIN if rng.random() < PROB_DETENCION_ANOMALA else ESTADIA_MIN))
+        agregar(ESTADIA, minutos * 60, actual, (lat, lon), (lat, lon), radio, 0.0)
+
+        if rng.random() < PROB_SERVICIO:
+            siguiente = disposicion["servicio"][rng.integers(len(disposicion["servicio"]))]
+        else:
+            etapa = (etapa + 1) % len(circuito)
+            siguiente = circuito[etapa][rng.integers(len(circuito[etapa]))]
+        lat2, lon2, _ = sitios[siguiente]
+        velocidad = rng.uniform(*VELOCIDAD_RUTA_KMH)
+        viaje_s = max(float(distancia_haversine(lat, lon, lat2, lon2)), 200.0) / (velocidad / 3.6)
+        por_ruta = bool(disposicion.get("ruta")) and rng.random() < PROB_VIAJE_POR_RUTA
+
+        if rng.random() < PROB_PARADA_NO_MAPEADA:
+            # Parada a mitad de camino, fuera de toda geocerca
+            f = rng.uniform(0.3, 0.7)
+            medio = (lat + f * (lat2 - lat), lon + f * (lon2 - lon))
+            agregar(VIAJE, f * viaje_s, "", (lat, lon), medio, 0.0, velocidad, por_ruta)
+            agregar(PARADA, rng.uniform(*PARADA_NO_MAPEADA_MIN) * 60, "", medio, medio, 15.0, 0.0)
+            agregar(VIAJE, (1 - f) * viaje_s, "", medio, (lat2, lon2), 0.0, velocidad, por_ruta)
+        else:
+            agregar(VIAJE, viaje_s, "", (lat, lon), (lat2, lon2), 0.0, velocidad, por_ruta)
+        actual = siguiente
+
+    return pd.DataFrame(segmentos, columns=[
+        "inicio", "fin", "tipo", "geocerca", "lat0", "lon0", "lat1", "lon1", "radio", "velocidad", "por_ruta"
+    ])
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Registros GPS muestreados sobre los segmentos
+# ─────────────────────────────────────────────────────────────
+def registros_vehiculo(rng: np.random.Generator, segmentos: pd.DataFrame, duracion_s: float,
+                       intervalo_s: float, ruta: str, fraccion_multigeocerca: float, ruido_gps_m: float,
+                       ruido_geocerca: float, fraccion_perdida: float) -> pd.DataFrame:
+    """Registros cada ~`intervalo_s` (±50%) con posición, velocidad y geocerca según el segmento."""
+    n = int(duracion_s / intervalo_s * 1.05) + 2
+    tiempos = np.cumsum(rng.uniform(0.5, 1.5, n) * intervalo_s)
+    tiempos = tiempos[(tiempos < duracion_s) & (rng.random(n) >= fraccion_perdida)]
+    n = len(tiempos)
+
+    inicio = segmentos["inicio"].to_numpy()
+    i = np.clip(np.searchsorted(inicio, tiempos, side="right") - 1, 0, len(segmentos) - 1)
+    s = {columna: segmentos[columna].to_numpy()[i] for columna in segmentos.columns}
+    avance = np.clip((tiempos - s["inicio"]) / np.maximum(s["fin"] - s["inicio"], 1e-9), 0, 1)
+
+    # Posición: interpolada en viajes, dispersa dentro del radio en estadías y paradas, más ruido GPS
+    lat = s["lat0"] + avance * (s["lat1"] - s["lat0"])
+    lon = s["lon0"] + avance * (s["lon1"] - s["lon0"])
+    distancia = s["radio"] * 0.4 * np.sqrt(rng.random(n)) + np.abs(rng.normal(0, ruido_gps_m, n))
+    angulo = rng.uniform(0, 2 * np.pi, n)
+    lat = lat + distancia * np.sin(angulo) / METROS_POR_GRADO
+    lon = lon + distancia * np.cos(angulo) / (METROS_POR_GRADO * np.cos(np.radians(lat)))
+
+    tipo = s["tipo"]
+    velocidad = np.select(
+        [tipo == ESTADIA, tipo == PARADA],
+        [np.minimum(rng.exponential(1.0, n), 8.0), rng.uniform(0, 1.5, n)],
+        np.maximum(s["velocidad"] + rng.normal(0, 3, n), 0),
+    )
+
+    geocerca = s["geocerca"].astype(object)
+    en_estadia = tipo == ESTADIA
+    if ruta:
+        multiple = en_estadia & (rng.random(n) < fraccion_multigeocerca)
+        geocerca[multiple] = ruta + "; " + geocerca[multiple]
+        geocerca[(tipo == VIAJE) & s["por_ruta"].astype(bool) & (avance > 0.2) & (avance < 0.8)] = ruta
+    geocerca[en_estadia & (rng.random(n) < ruido_geocerca)] = ""
+
+    return pd.DataFrame({
+        "Segundos": tiempos,
+        "Geocercas": geocerca,
+        "Velocidad [km/h]": np.round(velocidad, 1),
+        "Latitud": np.round(lat, 6),
+        "Longitud": np.round(lon, 6),
+    })
+
+
+def generar_exportacion(vehiculos: int = 10, dias: float = 1.0, intervalo_s: float = 30.0,
+                        disposicion: str | dict = "mina", fraccion_multigeocerca: float = 0.15,
+                        ruido_gps_m: float = 5.0, ruido_geocerca: float = 0.01, fraccion_perdida: float = 0.01,
+                        inicio: str = INICIO_DEFECTO, semilla: int = 0) -> pd.DataFrame:
+    """
+    Exportación GeoAustral sintética: "Nombre del Vehículo", "Tiempo de evento",
+    "Geocercas", "Velocidad [km/h]", "Latitud", "Longitud", ordenada por tiempo
+    como la exportación real. `disposicion` es "mina", "puerto" o un dict con la
+    misma forma que DISPOSICIONES.
+    """
+    disposicion = DISPOSICIONES[disposicion] if isinstance(disposicion, str) else disposicion
+    rng = np.random.default_rng(semilla)
+    duracion_s = dias * 86400
+    partes = []
+    for v in range(vehiculos):
+        segmentos = segmentos_vehiculo(rng, disposicion, duracion_s)
+        registros = registros_vehiculo(rng, segmentos, duracion_s, intervalo_s, disposicion.get("ruta", ""),
+                                       fraccion_multigeocerca, ruido_gps_m, ruido_geocerca, fraccion_perdida)
+        registros.insert(0, "Nombre del Vehículo", f"Camión_{v:03d}")
+        partes.append(registros)
+
+    df = pd.concat(partes, ignore_index=True)
+    tiempo = pd.Timestamp(inicio) + pd.to_timedelta(df.pop("Segundos").round(), unit="s")
+    df.insert(1, "Tiempo de evento", tiempo)
+    return df.sort_values("Tiempo de evento", kind="stable").reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Tamaños y CSV
+# ─────────────────────────────────────────────────────────────
+def dias_para_filas(filas: int, vehiculos: int = 10, intervalo_s: float = 30.0) -> float:
+    """Días de registros necesarios para obtener ~`filas` registros con `vehiculos`."""
+    return filas * intervalo_s / (vehiculos * 86400)
+
+
+def a_csv(df: pd.DataFrame) -> bytes:
+    """CSV con el formato de la exportación GeoAustral (ESPECIFICACION_INPUT.md)."""
+    return df.to_csv(index=False, date_format=FORMATO_TIEMPO_CSV).encode("utf-8")
@@ -0,0 +1,302 @@
+"""
+Registro de geocercas por polígono - T-Metal
+Asigna la geocerca a cada punto GPS a partir de su latitud/longitud, sin
+depender de la columna 'Geocercas' de GeoAustral. Los polígonos se cargan desde
+GeoJSON o KML y se indexan en una grilla uniforme: cada punto solo se prueba
+contra los polígonos cuya caja toca su celda.
+
+- `asignar`: lotes de millones de puntos con NumPy (ray casting vectorizado)
+- `ubicar`: un punto en microsegundos, para el webhook
+
+Si un punto cae en varias geocercas superpuestas se asigna la de menor área (la
+más específica), en lugar de adivinar entre nombres unidos por ';'.
+"""
+
+import functools
+import hashlib
+import json
+import math
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+RUTA_GEOCERCAS = os.getenv("TMETAL_GEOCERCAS", "")  # GeoJSON o KML; vacío = usar la columna de GeoAustral
+CELDAS_MAX = 1_000_000                              # Tope de celdas de la grilla
+ELEMENTOS_POR_BLOQUE = 2_000_000                    # Puntos × aristas evaluados a la vez
+ARISTAS_BUCLE_PUNTO = 16                            # Sobre esto `ubicar` usa NumPy en lugar de un bucle
+CLAVES_NOMBRE = ["name", "nombre", "Nombre", "NOMBRE", "Geocerca", "geocerca"]
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Lectura de polígonos (GeoJSON / KML)
+# ─────────────────────────────────────────────────────────────
+def _anillo(coordenadas) -> np.ndarray:
+    """Anillo [(lon, lat), ...] como arreglo (n, 2); se ignora la altitud."""
+    return np.asarray([(float(c[0]), float(c[1])) for c in coordenadas], dtype=np.float64)
+
+
+def leer_geojson(fuente: str | dict) -> list[tuple[str, list[np.ndarray], list[np.ndarray]]]:
+    """
+    Lee un FeatureCollection (ruta o dict) con Polygon/MultiPolygon.
+    Devuelve [(nombre, anillos_exteriores, huecos)] por polígono.
+    """
+    if isinstance(fuente, str):
+        with open(fuente, encoding="utf-8") as f:
+            fuente = json.load(f)
+    features = fuente["features"] if fuente.get("type") == "FeatureCollection" else [fuente]
+
+    poligonos = []
+    for feature in features:
+        propiedades = feature.get("properties") or {}
+        nombre = next((str(propiedades[c]) for c in CLAVES_NOMBRE if propiedades.get(c)), "")
+        geometria = feature.get("geometry") or {}
+        if geometria.get("type") == "Polygon":
+            partes = [geometria["coordinates"]]
+        elif geometria.get("type") == "MultiPolygon":
+            partes = geometria["coordinates"]
+        else:
+            continue
+        for anillos in partes:
+            poligonos.append((nombre, [_anillo(anillos[0])], [_anillo(a) for a in anillos[1:]]))
+    return poligonos
+
+
+def leer_kml(fuente: str) -> list[tuple[str, list[np.ndarray], list[np.ndarray]]]:
+    """Lee los Placemark con Polygon de un KML (ruta o texto XML), sin depender del namespace."""
+    raiz = ET.fromstring(fuente) if fuente.lstrip().startswith("<") else ET.parse(fuente).getroot()
+    etiqueta = lambda e: e.tag.rsplit("}", 1)[-1]
+
+    def anillos(poligono: ET.Element, borde: str) -> list[np.ndarray]:
+        return [
+            _anillo(par.split(",") for par in coord.text.split())
+            for b in poligono.iter() if etiqueta(b) == borde
+            for coord in b.iter() if etiqueta(coord) == "coordinates" and coord.text
+        ]
+
+    poligonos = []
+    for placemark in (e for e in raiz.iter() if etiqueta(e) == "Placemark"):
+        nombre = next((e.text.strip() for e in placemark if etiqueta(e) == "name" and e.text), "")
+        for poligono in (e for e in placemark.iter() if etiqueta(e) == "Polygon"):
+            poligonos.append((nombre, anillos(poligono, "outerBoundaryIs"), anillos(poligono, "innerBoundaryIs")))
+    return poligonos
+
+
+def _area(anillo: np.ndarray) -> float:
+    x, y = anillo[:, 0], anillo[:, 1]
+    return abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))) / 2
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Registro con índice de grilla uniforme
+# ─────────────────────────────────────────────────────────────
+class RegistroGeocercas:
+    """
+    Polígonos ordenados por área (de menor a mayor) con su lista de aristas,
+    su caja envolvente y una grilla uniforme celda → polígonos candidatos.
+    Las coordenadas se tratan en el plano (lon, lat): suficiente a escala de faena.
+    """
+
+    def __init__(self, poligonos: list[tuple[str, list[np.ndarray], list[np.ndarray]]],
+                 tamano_celda: float | None = None):
+        poligonos = [p for p in poligonos if p[1]]
+        areas = [sum(_area(a) for a in exteriores) - sum(_area(a) for a in huecos)
+                 for _, exteriores, huecos in poligonos]
+        orden = np.argsort(areas, kind="stable")
+
+        self.nombres = np.array([poligonos[i][0] for i in orden] + [""], dtype=object)  # -1 ⇒ ""
+        self.aristas: list[np.ndarray] = []   # (m, 4): x1, y1, x2, y2 (regla par-impar con huecos)
+        self._aristas_py: list[list[tuple] | None] = []   # Bucle Python para polígonos pequeños
+        self._aristas_t: list[np.ndarray] = []
+        cajas = []
+        for i in orden:
+            _, exteriores, huecos = poligonos[i]
+            anillos = exteriores + huecos
+            aristas = np.vstack([np.hstack([a, np.roll(a, -1, axis=0)]) for a in anillos])
+            self.aristas.append(aristas)
+            self._aristas_py.append([tuple(fila) for fila in aristas.tolist()]
+                                    if len(aristas) <= ARISTAS_BUCLE_PUNTO else None)
+            self._aristas_t.append(np.ascontiguousarray(aristas.T))
+            vertices = np.vstack(exteriores)
+            cajas.append((*vertices.min(axis=0), *vertices.max(axis=0)))
+        self.cajas = np.asarray(cajas, dtype=np.float64).reshape(-1, 4)  # lon_min, lat_min, lon_max, lat_max
+
+        self.huella = hashlib.blake2b(
+            json.dumps(self.nombres.tolist()).encode() + b"".join(a.tobytes() for a in self.aristas),
+            digest_size=16,
+        ).hexdigest()
+        self._construir_grilla(tamano_celda)
+
+    def _construir_grilla(self, tamano_celda: float | None) -> None:
+        if len(self.cajas) == 0:
+            self.origen, self.celda, self.nx, self.ny = (0.0, 0.0), 1.0, 1, 1
+            self.inicios, self.ids = np.zeros(2, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            return
+
+        x0, y0 = self.cajas[:, 0].min(), self.cajas[:, 1].min()
+        ancho = max(self.cajas[:, 2].max() - x0, 1e-9)
+        alto = max(self.cajas[:, 3].max() - y0, 1e-9)
+        if tamano_celda is None:
+            # Celdas del tamaño típico de una geocerca
+            tamano_celda = float(np.median(np.maximum(self.cajas[:, 2] - self.cajas[:, 0],
+                                                      self.cajas[:, 3] - self.cajas[:, 1])))
+        tamano_celda = max(tamano_celda, np.sqrt(ancho * alto / CELDAS_MAX), 1e-9)
+
+        self.origen, self.celda = (x0, y0), tamano_celda
+        self.nx = int(ancho // tamano_celda) + 1
+        self.ny = int(alto // tamano_celda) + 1
+
+        celdas, ids = [], []
+        for pid, (xmin, ymin, xmax, ymax) in enumerate(self.cajas):
+            cx = np.arange(int((xmin - x0) // tamano_celda), int((xmax - x0) // tamano_celda) + 1)
+            cy = np.arange(int((ymin - y0) // tamano_celda), int((ymax - y0) // tamano_celda) + 1)
+            tocadas = (cy[:, None] * self.nx + cx[None, :]).ravel()
+            celdas.append(tocadas)
+            ids.append(np.full(len(tocadas), pid))
+        celdas, ids = np.concatenate(celdas), np.concatenate(ids)
+
+        # CSR: polígonos de la celda c en ids[inicios[c]:inicios[c + 1]], en orden de área
+        orden = np.lexsort((ids, celdas))
+        self.ids = ids[orden]
+        self.inicios = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(celdas, minlength=self.nx * self.ny), out=self.inicios[1:])
+
+    def __len__(self) -> int:
+        return len(self.aristas)
+
+    def _celdas(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Celda de cada punto (-1 fuera de la grilla)."""
+        cx = np.floor((lon - self.origen[0]) / self.celda)
+        cy = np.floor((lat - self.origen[1]) / self.celda)
+        dentro = (cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny)
+        return np.where(dentro, cy * self.nx + cx, -1).astype(np.int64)
+
+    # ─── Lotes ────────────────────────────────────────────────
+    def asignar(self, lat, lon) -> np.ndarray:
+        """Nombre de la geocerca de cada punto ("" fuera de todas o sin coordenadas)."""
+        return self.nombres[self.asignar_indices(lat, lon)]
+
+    def asignar_indices(self, lat, lon) -> np.ndarray:
+        """Índice del polígono de cada punto (-1 fuera de todos)."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        resultado = np.full(len(lat), -1, dtype=np.int64)
+        if len(self) == 0 or len(lat) == 0:
+            return resultado
+
+        with np.errstate(invalid="ignore"):
+            celdas = self._celdas(lon, lat)
+        puntos = np.flatnonzero(celdas >= 0)
+        celdas = celdas[puntos]
+
+        # Pares (punto, polígono candidato) expandiendo los rangos CSR de cada celda
+        cantidades = self.inicios[celdas + 1] - self.inicios[celdas]
+        pares_punto = np.repeat(puntos, cantidades)
+        desplazamiento = np.arange(len(pares_punto)) - np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+        pares_poligono = self.ids[np.repeat(self.inicios[celdas], cantidades) + desplazamiento]
+
+        caja = self.cajas[pares_poligono]
+        x, y = lon[pares_punto], lat[pares_punto]
+        en_caja = (x >= caja[:, 0]) & (x <= caja[:, 2]) & (y >= caja[:, 1]) & (y <= caja[:, 3])
+        pares_punto, pares_poligono = pares_punto[en_caja], pares_poligono[en_caja]
+
+        # De mayor a menor área: la geocerca más pequeña que contiene al punto queda al final
+        orden = np.argsort(-pares_poligono, kind="stable")
+        pares_punto, pares_poligono = pares_punto[orden], pares_poligono[orden]
+        cortes = np.flatnonzero(np.diff(pares_poligono)) + 1
+        for grupo in np.split(np.arange(len(pares_poligono)), cortes):
+            if len(grupo) == 0:
+                continue
+            pid = pares_poligono[grupo[0]]
+            pts = pares_punto[grupo]
+            resultado[pts[self._contiene(pid, lon[pts], lat[pts])]] = pid
+        return resultado
+
+    def _contiene(self, pid: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Ray casting par-impar de los puntos contra todas las aristas del polígono."""
+        x1, y1, x2, y2 = self.aristas[pid].T
+        dentro = np.empty(len(x), dtype=bool)
+        bloque = max(1, ELEMENTOS_POR_BLOQUE // len(x1))
+        for i in range(0, len(x), bloque):
+            px, py = x[i:i + bloque, None], y[i:i + bloque, None]
+            cruza = (y1 > py) != (y2 > py)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_corte = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            dentro[i:i + bloque] = (np.count_nonzero(cruza & (px < x_corte), axis=1) % 2) == 1
+        return dentro
+
+    # ─── Punto a punto ────────────────────────────────────────
+    def ubicar(self, lat: float, lon: float) -> str:
+        """Geocerca de un punto ("" si no está en ninguna)."""
+        if len(self) == 0 or lat is None or lon is None or not (math.isfinite(lat) and math.isfinite(lon)):
+            return ""
+        cx = int((lon - self.origen[0]) // self.celda)
+        cy = int((lat - self.origen[1]) // self.celda)
+        if not (0 <= cx < self.nx and 0 <= cy < self.ny):
+            return ""
+        c = cy * self.nx + cx
+        for pid in self.ids[self.inicios[c]:self.inicios[c + 1]].tolist():
+            xmin, ymin, xmax, ymax = self.cajas[pid]
+            if not (xmin <= lon <= xmax and ymin <= lat <= ymax):
+                continue
+            if self._contiene_punto(pid, lon, lat):
+                return self.nombres[pid]
+        return ""
+
+    def _contiene_punto(self, pid: int, x: float, y: float) -> bool:
+        aristas = self._aristas_py[pid]
+        if aristas is None:
+            # Polígonos con muchas aristas: una pasada NumPy cuesta menos que el bucle
+            x1, y1, x2, y2 = self._aristas_t[pid]
+            cruza = np.flatnonzero((y1 > y) != (y2 > y))
+            x_corte = x1[cruza] + (y - y1[cruza]) * (x2[cruza] - x1[cruza]) / (y2[cruza] - y1[cruza])
+            return bool(np.count_nonzero(x < x_corte) % 2)
+        dentro = False
+        for x1, y1, x2, y2 in aristas:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                dentro = not dentro
+        return dentro
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Carga desde archivo y uso sobre DataFrames
+# ─────────────────────────────────────────────────────────────
+def cargar_registro(ruta: str, tamano_celda: float | None = None) -> RegistroGeocercas:
+    """Carga un registro desde un archivo .geojson/.json o .kml."""
+    if ruta.lower().endswith(".kml"):
+        return RegistroGeocercas(leer_kml(ruta), tamano_celda)
+    return RegistroGeocercas(leer_geojson(ruta), tamano_celda)
+
+
+@functools.lru_cache(maxsize=1)
+def registro_configurado() -> RegistroGeocercas | None:
+    """Registro de TMETAL_GEOCERCAS (cargado una vez por proceso) o None si no está configurado."""
+    if not RUTA_GEOCERCAS:
+        return None
+    registro = cargar_registro(RUTA_GEOCERCAS)
+    print(f"📍 {len(registro)} polígonos de geocercas cargados desde {RUTA_GEOCERCAS}")
+    return registro
+
+
+def resolver_geocercas(df: pd.DataFrame, registro: RegistroGeocercas) -> pd.Series:
+    """
+    Columna 'Geocercas' calculada desde 'Latitud'/'Longitud' con el registro.
+    Los registros sin coordenadas conservan el valor exportado por GeoAustral.
+    """
+    lat = pd.to_numeric(df["Latitud"], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df["Longitud"], errors="coerce").to_numpy(dtype=np.float64)
+    con_coordenadas = np.isfinite(lat) & np.isfinite(lon)
+    resuelto = registro.asignar(lat, lon)
+    return pd.Series(np.where(con_coordenadas, resuelto, df["Geocercas"].fillna("").astype(str).to_numpy()),
+                     index=df.index, name="Geocercas")
+
+
+def con_geocercas_resueltas(df: pd.DataFrame, registro: RegistroGeocercas | None) -> pd.DataFrame:
+    """Reemplaza 'Geocercas' por la geocerca de cada coordenada si hay registro y columnas de posición."""
+    if registro is None or not {"Latitud", "Longitud"} <= set(df.columns):
+        return df
+    return df.assign(Geocercas=resolver_geocercas(df, registro))
@@ -0,0 +1,211 @@
+"""
+Ingesta columnar de exportaciones GeoAustral - T-Metal
+Lee el CSV una sola vez con el esquema explícito de ESPECIFICACION_INPUT.md y
+guarda el resultado en Parquet en un directorio local, con la huella del
+contenido como nombre. Volver a abrir la misma exportación (en otra sesión o
+tras reiniciar la app) lee el Parquet en lugar de re-interpretar el CSV.
+
+Para exportaciones que no caben en memoria, `compactar_exportacion` lee el CSV
+por bloques (solo las columnas necesarias, tipos compactos) y los acumula por
+vehículo reducidos a los extremos de cada racha de geocerca. Es la lectura del
+"modo archivo grande" de los dashboards (toggle lateral o TMETAL_ARCHIVO_GRANDE=1).
+
+pyarrow es opcional: si no está instalado se aplica el mismo esquema pero no
+se persiste nada en disco.
+"""
+
+import os
+import uuid
+from io import BytesIO
+from typing import IO, Callable, Iterator
+
+import pandas as pd
+
+from cache_pipeline import huella_contenido
+from motor_vectorizado import compactar_rachas
+
+try:
+    import pyarrow  # noqa: F401  (motor de Parquet para pandas)
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+DIRECTORIO_CACHE_INGESTA = os.getenv(
+    "TMETAL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_ingesta")
+)
+VERSION_ESQUEMA = 1  # Cambiarla invalida los Parquet guardados
+
+# Esquema de ESPECIFICACION_INPUT.md
+COLUMNAS_OBLIGATORIAS = ["Nombre del Vehículo", "Tiempo de evento", "Geocercas"]
+FORMATO_TIEMPO = "ISO8601"  # YYYY-MM-DD HH:MM[:SS]
+TIPOS_TEXTO = {"Nombre del Vehículo": str, "Geocercas": str}
+TIPOS_NUMERICOS = {"Velocidad [km/h]": "float32", "Latitud": "float64", "Longitud": "float64"}
+
+# Lectura por bloques: únicas columnas que usa el pipeline
+COLUMNAS_BLOQUES = COLUMNAS_OBLIGATORIAS + list(TIPOS_NUMERICOS)
+FILAS_POR_BLOQUE = int(os.getenv("TMETAL_FILAS_BLOQUE", "250000"))
+MODO_ARCHIVO_GRANDE = os.getenv("TMETAL_ARCHIVO_GRANDE", "0") == "1"  # Valor inicial del toggle
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Lectura con esquema explícito
+# ─────────────────────────────────────────────────────────────
+def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica el esquema GeoAustral a un DataFrame leído del CSV:
+    - Verifica las columnas obligatorias
+    - 'Tiempo de evento' a datetime (formato ISO); registros sin tiempo válido se eliminan
+    - 'Geocercas' vacía como "" (viaje), nombres de vehículo como texto
+    - Columnas numéricas conocidas (velocidad, coordenadas) a float
+    """
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"El archivo no tiene las columnas obligatorias: {', '.join(faltantes)}")
+
+    df["Tiempo de evento"] = pd.to_datetime(df["Tiempo de evento"], format=FORMATO_TIEMPO, errors="coerce")
+    df = df.dropna(subset=["Tiempo de evento"])
+    df["Nombre del Vehículo"] = df["Nombre del Vehículo"].astype(str)
+    df["Geocercas"] = df["Geocercas"].fillna("").astype(str)
+
+    for columna, tipo in TIPOS_NUMERICOS.items():
+        if columna in df.columns:
+            df[columna] = pd.to_numeric(df[columna], errors="coerce").astype(tipo)
+    return df.reset_index(drop=True)
+
+
+def leer_csv_geoaustral(contenido: bytes) -> pd.DataFrame:
+    """Interpreta los bytes del CSV exportado con tipos explícitos (sin inferencia por columna)."""
+    encabezado = pd.read_csv(BytesIO(contenido), nrows=0).columns
+    tipos = {c: t for c, t in {**TIPOS_TEXTO, **TIPOS_NUMERICOS}.items() if c in encabezado}
+    # El tiempo se lee como texto y se convierte con formato fijo en aplicar_esquema
+    tipos["Tiempo de evento"] = str
+
+    lector = {"engine": "pyarrow"} if PARQUET_DISPONIBLE else {}
+    return aplicar_esquema(pd.read_csv(BytesIO(contenido), dtype=tipos, **lector))
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Caché Parquet por huella de contenido
+# ─────────────────────────────────────────────────────────────
+def ruta_parquet(huella: str, directorio: str = DIRECTORIO_CACHE_INGESTA) -> str:
+    return os.path.join(directorio, f"{huella}-v{VERSION_ESQUEMA}.parquet")
+
+
+def cargar_exportacion(contenido: bytes, huella: str | None = None,
+                       directorio: str = DIRECTORIO_CACHE_INGESTA) -> pd.DataFrame:
+    """
+    Devuelve la exportación como DataFrame tipado. La primera vez interpreta el
+    CSV y guarda un Parquet; las siguientes (misma huella) leen el Parquet.
+    """
+    if not PARQUET_DISPONIBLE:
+        return leer_csv_geoaustral(contenido)
+
+    ruta = ruta_parquet(huella or huella_contenido(contenido), directorio)
+    if os.path.exists(ruta):
+        try:
+            return pd.read_parquet(ruta)
+        except Exception as e:
+            print(f"⚠️ Parquet en caché ilegible ({e}); se vuelve a leer el CSV")
+
+    df = leer_csv_geoaustral(contenido)
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        # Escritura atómica: otra sesión nunca ve un Parquet a medio escribir
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        df.to_parquet(temporal, index=False)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar la caché de ingesta en {directorio}: {e}")
+    return df
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Lectura por bloques y compactación incremental por vehículo
+# ─────────────────────────────────────────────────────────────
+def leer_bloques(fuente: str | bytes | IO, filas_por_bloque: int = FILAS_POR_BLOQUE) -> Iterator[pd.DataFrame]:
+    """
+    Lee la exportación por bloques de `filas_por_bloque` registros, solo con las
+    columnas de COLUMNAS_BLOQUES. Vehículo y geocerca se leen como categorías;
+    los registros sin tiempo válido se descartan como indica ESPECIFICACION_INPUT.md.
+    """
+    if isinstance(fuente, bytes):
+        fuente = BytesIO(fuente)
+    tipos = {"Nombre del Vehículo": "category", "Geocercas": "category",
+             "Tiempo de evento": str, **TIPOS_NUMERICOS}
+
+    lector = pd.read_csv(fuente, usecols=lambda c: c in COLUMNAS_BLOQUES, dtype=tipos,
+                         chunksize=filas_por_bloque)
+    for bloque in lector:
+        faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in bloque.columns]
+        if faltantes:
+            raise ValueError(f"El archivo no tiene las columnas obligatorias: {', '.join(faltantes)}")
+
+        bloque["Tiempo de evento"] = pd.to_datetime(bloque["Tiempo de evento"], format=FORMATO_TIEMPO,
+                                                    errors="coerce")
+        bloque = bloque.dropna(subset=["Tiempo de evento"])
+        geocercas = bloque["Geocercas"]
+        if "" not in geocercas.cat.categories:
+            geocercas = geocercas.cat.add_categories("")
+        bloque["Geocercas"] = geocercas.fillna("")
+        yield bloque
+
+
+class CompactadorIncremental:
+    """
+    Acumula bloques de registros GPS compactados por racha (ver `compactar_rachas`).
+    La memoria ocupada crece con el número de rachas, no con el de registros.
+
+    Requiere que los registros de cada vehículo lleguen en orden cronológico entre
+    bloques (dentro de un bloque pueden venir desordenados).
+    """
+
+    def __init__(self, columna_geocerca: str = "Geocercas"):
+        self.columna_geocerca = columna_geocerca
+        self.registros = 0
+        self._partes: list[pd.DataFrame] = []
+        self._ultimo_tiempo = pd.Series(dtype="datetime64[ns]")  # por vehículo
+
+    def agregar(self, bloque: pd.DataFrame) -> None:
+        if bloque.empty:
+            return
+        rango = bloque.groupby(bloque["Nombre del Vehículo"].astype(str))["Tiempo de evento"].agg(["min", "max"])
+
+        anterior = self._ultimo_tiempo.reindex(rango.index)
+        desordenados = rango.index[(rango["min"] < anterior).to_numpy()]
+        if len(desordenados):
+            raise ValueError(
+                "Los registros no están en orden cronológico por vehículo entre bloques "
+                f"({', '.join(desordenados[:3])}); use la lectura completa (cargar_exportacion)"
+            )
+        self._ultimo_tiempo = rango["max"].combine_first(self._ultimo_tiempo)
+
+        self.registros += len(bloque)
+        self._partes.append(compactar_rachas(bloque, self.columna_geocerca))
+
+    def resultado(self) -> pd.DataFrame:
+        """Registros compactados de todos los bloques, ordenados por vehículo y tiempo."""
+        if not self._partes:
+            return pd.DataFrame(columns=COLUMNAS_BLOQUES)
+        # Las categorías difieren entre bloques: se unen como texto
+        df = pd.concat(self._partes, ignore_index=True)
+        df["Nombre del Vehículo"] = df["Nombre del Vehículo"].astype(str)
+        df["Geocercas"] = df["Geocercas"].astype(str)
+        return compactar_rachas(df, self.columna_geocerca)
+
+
+def compactar_exportacion(fuente: str | bytes | IO, filas_por_bloque: int = FILAS_POR_BLOQUE,
+                          transformar: Callable[[pd.DataFrame], pd.DataFrame] | None = None) -> pd.DataFrame:
+    """
+    Lee una exportación de cualquier tamaño por bloques y devuelve solo los extremos de
+    cada racha de geocerca por vehículo: entrada válida para `preparar_datos` y las
+    etapas de transiciones y viajes, con memoria acotada por el número de rachas.
+    `transformar` se aplica a cada bloque antes de compactarlo (p. ej. resolver la
+    geocerca desde los polígonos con `con_geocercas_resueltas`).
+    """
+    compactador = CompactadorIncremental()
+    for bloque in leer_bloques(fuente, filas_por_bloque):
+        compactador.agregar(transformar(bloque) if transformar is not None else bloque)
+    return compactador.resultado()
@@ -0,0 +1,33 @@
+"""
+Lanzador de los dashboards con pool de procesos - T-Metal
+Inicia el pool de `ejecucion_paralela` desde el hilo principal, antes de que
+Streamlit instale el script del dashboard como `__main__`, y luego ejecuta
+`streamlit run` en el mismo proceso. Los workers ("spawn") re-importan este
+módulo, que no hace nada fuera de `main()`.
+
+Uso:
+    TMETAL_WORKERS=4 python iniciar_dashboard.py app6_mejorado.py [opciones de streamlit]
+"""
+
+import sys
+
+from ejecucion_paralela import WORKERS_PIPELINE, iniciar_pool
+
+
+def main() -> int:
+    from streamlit.web import cli
+
+    if len(sys.argv) < 2:
+        print("Uso: python iniciar_dashboard.py <dashboard.py> [opciones de streamlit]")
+        return 2
+
+    if WORKERS_PIPELINE > 1:
+        iniciar_pool(WORKERS_PIPELINE)
+        print(f"⚙️ Pool de procesos iniciado con {WORKERS_PIPELINE} workers")
+
+    sys.argv = ["streamlit", "run", *sys.argv[1:]]
+    return cli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Instrumentación de etapas del pipeline GPS - T-Metal
+Registra, para cada etapa de una ejecución del dashboard (lectura, preparación,
+dominios, transiciones, viajes, clasificación, detenciones, zonas,
+exportación), el tiempo de reloj, las filas de entrada y salida y el pico de
+memoria asignada. Las mediciones se muestran en el panel lateral opcional de
+los dashboards y, si TMETAL_INSTRUMENTACION indica un archivo, se agregan ahí
+como JSON lines para analizarlas fuera de línea (mismas columnas de etapa que
+`banco_rendimiento`).
+
+Las etapas pueden anidarse (p. ej. lectura y preparación dentro de la etapa
+memoizada "datos"): cada medición guarda su `nivel` y el tiempo de la etapa
+externa incluye el de las internas.
+
+El pico de memoria sale de tracemalloc, que ralentiza las etapas: solo se mide
+si se pide (toggle del panel o TMETAL_INSTRUMENTACION_MEMORIA=1). tracemalloc
+es global al proceso, así que las etapas medidas con memoria se serializan
+entre sesiones y no ven la memoria de los workers de `ejecucion_paralela`.
+"""
+
+import json
+import os
+import threading
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable, Hashable
+
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+ARCHIVO_INSTRUMENTACION = os.getenv("TMETAL_INSTRUMENTACION", "")  # Vacío: no se escribe a disco
+MEMORIA_INSTRUMENTACION = os.getenv("TMETAL_INSTRUMENTACION_MEMORIA", "0") == "1"
+HISTORIAL_MAX = 500  # Mediciones que se conservan por sesión
+
+COLUMNAS_MEDICION = ["ejecucion", "fecha", "etapa", "nivel", "origen", "filas_entrada", "filas_salida",
+                     "segundos", "pico_mb"]
+
+_CANDADO_MEMORIA = threading.Lock()  # tracemalloc es uno solo por proceso
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Filas de entrada y salida
+# ─────────────────────────────────────────────────────────────
+def contar_filas(objeto: Any) -> int:
+    """Filas de un resultado: DataFrame, tupla/lista/dict de DataFrames o nada."""
+    if isinstance(objeto, pd.DataFrame):
+        return len(objeto)
+    if isinstance(objeto, dict):
+        objeto = list(objeto.values())
+    if isinstance(objeto, (tuple, list)):
+        return sum(len(o) for o in objeto if isinstance(o, pd.DataFrame))
+    return 0
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Registro de mediciones
+# ─────────────────────────────────────────────────────────────
+class Instrumentacion:
+    """
+    Mediciones por etapa de una sesión del dashboard. `nueva_ejecucion()` marca
+    cada re-ejecución del script; `contexto` (app, huella del archivo, ...) se
+    agrega a cada medición.
+    """
+
+    def __init__(self, contexto: dict | None = None, memoria: bool = MEMORIA_INSTRUMENTACION,
+                 archivo: str = ARCHIVO_INSTRUMENTACION, historial_max: int = HISTORIAL_MAX):
+        self.contexto = dict(contexto or {})
+        self.memoria = memoria
+        self.archivo = archivo
+        self.ejecucion = 0
+        self.mediciones: deque[dict] = deque(maxlen=historial_max)
+        self._candado = threading.Lock()
+        self._local = threading.local()  # Pila de etapas abiertas en cada hilo
+
+    def nueva_ejecucion(self, **contexto) -> None:
+        """Empieza una ejecución (un rerun de Streamlit) y actualiza el contexto."""
+        with self._candado:
+            self.ejecucion += 1
+            self.contexto.update(contexto)
+
+    def _pila(self) -> list[dict]:
+        if not hasattr(self._local, "pila"):
+            self._local.pila = []
+        return self._local.pila
+
+    def registrar(self, etapa: str, segundos: float, filas_entrada: int = 0, filas_salida: int = 0,
+                  pico_bytes: int | None = None, origen: str = "calculada", nivel: int | None = None) -> dict:
+        """Agrega una medición (también las tomadas fuera de `medir`, p. ej. en un hilo de fondo)."""
+        medicion = {
+            **self.contexto,
+            "ejecucion": self.ejecucion,
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "etapa": etapa,
+            "nivel": len(self._pila()) if nivel is None else nivel,
+            "origen": origen,
+            "filas_entrada": int(filas_entrada),
+            "filas_salida": int(filas_salida),
+            "segundos": round(segundos, 6),
+            "pico_mb": None if pico_bytes is None else round(pico_bytes / 1024 / 1024, 3),
+        }
+        with self._candado:
+            self.mediciones.append(medicion)
+            if self.archivo:
+                os.makedirs(os.path.dirname(os.path.abspath(self.archivo)), exist_ok=True)
+                with open(self.archivo, "a", encoding="utf-8") as salida:
+                    salida.write(json.dumps(medicion, ensure_ascii=False, default=str) + "\n")
+        return medicion
+
+    def medir(self, etapa: str, funcion: Callable, *args, memoria: bool | None = None, **kwargs) -> Any:
+        """
+        Ejecuta `funcion(*args, **kwargs)` midiendo tiempo, filas y (si se pide)
+        el pico de memoria; devuelve su resultado. Una etapa que falla queda
+        registrada con origen "error" y la excepción se propaga.
+        """
+        pila = self._pila()
+        externa = pila[-1] if pila else None
+        # Las etapas internas miden memoria solo si la externa la está midiendo
+        trazar = externa["base"] is not None if externa else (self.memoria if memoria is None else memoria)
+        abierta = {"base": None, "pico": 0}
+
+        iniciada = False
+        if trazar:
+            if externa is None:
+                _CANDADO_MEMORIA.acquire()
+                iniciada = not tracemalloc.is_tracing()
+                if iniciada:
+                    tracemalloc.start()
+            else:
+                externa["pico"] = max(externa["pico"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            abierta["base"] = tracemalloc.get_traced_memory()[0]
+
+        pila.append(abierta)
+        origen, resultado = "error", None
+        inicio = perf_counter()
+        try:
+            resultado = funcion(*args, **kwargs)
+            origen = "calculada"
+            return resultado
+        finally:
+            segundos = perf_counter() - inicio
+            pila.pop()
+            pico = None
+            if trazar:
+                maximo = max(abierta["pico"], tracemalloc.get_traced_memory()[1])
+                pico = maximo - abierta["base"]
+                if externa is not None:
+                    externa["pico"] = max(externa["pico"], maximo)
+                else:
+                    if iniciada:
+                        tracemalloc.stop()
+                    _CANDADO_MEMORIA.release()
+            self.registrar(etapa, segundos, contar_filas(args), contar_filas(resultado), pico, origen)
+
+    def etapas(self, etapa_cache: Callable) -> Callable:
+        """
+        Envuelve el atajo de `CachePipeline.etapas`: las etapas que se calculan se
+        miden con `medir` y las servidas desde la caché se registran con origen "caché".
+        Las claves compuestas (`("filtrado", filtros)`) se registran por su primer elemento.
+        """
+        def etapa(nombre: Hashable, funcion: Callable, *args, **kwargs) -> Any:
+            calculada = False
+            registro = str(nombre[0] if isinstance(nombre, tuple) else nombre)
+
+            def calcular(*a, **k):
+                nonlocal calculada
+                calculada = True
+                return self.medir(registro, funcion, *a, **k)
+
+            inicio = perf_counter()
+            resultado = etapa_cache(nombre, calcular, *args, **kwargs)
+            if not calculada:
+                self.registrar(registro, perf_counter() - inicio, contar_filas(args), contar_filas(resultado),
+                               origen="caché")
+            return resultado
+        return etapa
+
+    # ─── Consultas ────────────────────────────────────────────
+    def tabla(self, ejecucion: int | None = None) -> pd.DataFrame:
+        """Mediciones guardadas (todas o las de una ejecución) como DataFrame."""
+        with self._candado:
+            filas = [m for m in self.mediciones if ejecucion is None or m["ejecucion"] == ejecucion]
+        tabla = pd.DataFrame(filas)
+        return tabla if not tabla.empty else pd.DataFrame(columns=COLUMNAS_MEDICION)
+
+    def ultima_ejecucion(self) -> pd.DataFrame:
+        return self.tabla(self.ejecucion)
+
+    def ultima_medicion(self, etapa: str) -> dict | None:
+        """Medición más reciente de `etapa` en cualquier ejecución."""
+        with self._candado:
+            return next((m for m in reversed(self.mediciones) if m["etapa"] == etapa), None)
+
+    def a_jsonl(self) -> bytes:
+        """Mediciones guardadas en JSON lines (una por línea)."""
+        with self._candado:
+            lineas = [json.dumps(m, ensure_ascii=False, default=str) for m in self.mediciones]
+        return ("\n".join(lineas) + "\n" if lineas else "").encode("utf-8")
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+import asyncio
 import os
+import random
+import sqlite3
 import httpx
 
-load_dotenv()
+from spool_eventos import RUTA_SPOOL, SPOOL_MAX_EVENTOS, SpoolEventos, SpoolLleno
+from transiciones_streaming import RUTA_ESTADO, AlmacenTransiciones, MaquinaTransiciones
+from geocercas_poligonos import RegistroGeocercas, registro_configurado
 
+load_dotenv()
 
-app = FastAPI()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_API_KEY = os.getenv("SUPABASE_API_KEY")
@@ -14,34 +22,235 @@ print("SUPABASE_URL ->", SUPABASE_URL)
 print("API_KEY ->", SUPABASE_API_KEY)
 
 SUPABASE_TABLE = "eventos_gps"
+CAMPOS_EVENTO = ["event_time", "system_time", "imei", "vid", "lat", "lon", "velocidad"]
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros del envío por lotes
+# ─────────────────────────────────────────────────────────────
+LOTE_MAX_EVENTOS  = int(os.getenv("WEBHOOK_LOTE_MAX", "500"))        # Envío al juntar este número de eventos
+INTERVALO_FLUSH_S = float(os.getenv("WEBHOOK_FLUSH_S", "1.0"))       # ... o al pasar este tiempo
+CONEXIONES_MAX    = int(os.getenv("WEBHOOK_CONEXIONES_MAX", "10"))
+BACKOFF_BASE_S    = float(os.getenv("WEBHOOK_BACKOFF_BASE_S", "0.5"))  # Primer reintento tras un fallo
+BACKOFF_MAX_S     = float(os.getenv("WEBHOOK_BACKOFF_MAX_S", "60"))    # Tope de la espera exponencial
+REINTENTO_CLIENTE_S = 5  # Retry-After sugerido al emisor cuando el spool está lleno
+
+
+def crear_cliente() -> httpx.AsyncClient:
+    """Cliente HTTP de larga vida: reutiliza conexiones (y el handshake TLS) entre lotes."""
+    return httpx.AsyncClient(
+        base_url=SUPABASE_URL or "",
+        headers={
+            "apikey": SUPABASE_API_KEY or "",
+            "Authorization": f"Bearer {SUPABASE_API_KEY}",
+            "Content-Type": "application/json",
+            "prefer": "return=minimal",
+        },
+        timeout=10,
+        limits=httpx.Limits(max_connections=CONEXIONES_MAX, max_keepalive_connections=CONEXIONES_MAX),
+    )
+
+
+async def insertar_lote(cliente: httpx.AsyncClient, eventos: list[dict]) -> None:
+    """Inserción masiva: un solo POST con el arreglo de eventos."""
+    response = await cliente.post(f"/rest/v1/{SUPABASE_TABLE}", json=eventos)
+    response.raise_for_status()
+
+
+def es_reintentable(error: httpx.HTTPError) -> bool:
+    """Errores de red, 408, 429 y 5xx se reintentan; el resto de 4xx rechaza el lote."""
+    if isinstance(error, httpx.HTTPStatusError):
+        codigo = error.response.status_code
+        return codigo in (408, 429) or codigo >= 500
+    return True
+
+
+class DrenadorEventos:
+    """
+    Reenvía los eventos del spool a Supabase en lotes desde una tarea de fondo.
+    El envío se dispara al juntar `lote_max` eventos o cada `intervalo_s` segundos;
+    tras un fallo reintenta con espera exponencial (con jitter) hasta `backoff_max_s`.
+    Un lote se quita del spool solo cuando Supabase lo confirma.
+    """
+
+    def __init__(self, spool: SpoolEventos, enviar: Callable[[list[dict]], Awaitable[None]],
+                 lote_max: int = LOTE_MAX_EVENTOS, intervalo_s: float = INTERVALO_FLUSH_S,
+                 backoff_base_s: float = BACKOFF_BASE_S, backoff_max_s: float = BACKOFF_MAX_S):
+        self.spool = spool
+        self.enviar = enviar
+        self.lote_max = lote_max
+        self.intervalo_s = intervalo_s
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.enviados = 0
+        self.rechazados = 0
+        self.fallos_consecutivos = 0
+        self._lleno = asyncio.Event()
+        self._parar = asyncio.Event()
+        self._tarea: asyncio.Task | None = None
+
+    async def agregar(self, eventos: list[dict]) -> None:
+        """
+        Escribe los eventos en el spool (puede lanzar SpoolLleno). El commit a disco
+        corre en un hilo para no bloquear el event loop (drenador y otras peticiones).
+        """
+        await asyncio.to_thread(self.spool.agregar, eventos)
+        if self.spool.pendientes() >= self.lote_max:
+            self._lleno.set()
+
+    async def drenar(self) -> bool:
+        """
+        Envía lotes hasta vaciar el spool. Devuelve False si un envío falló y hay que reintentar.
+        Las lecturas y confirmaciones del spool corren en un hilo: comparten el lock de
+        `agregar` y no deben detener el event loop mientras otra petición escribe a disco.
+        """
+        while True:
+            ultimo_id, lote = await asyncio.to_thread(self.spool.leer_lote, self.lote_max)
+            if not lote:
+                return True
+            try:
+                await self.enviar(lote)
+            except httpx.HTTPError as e:
+                if es_reintentable(e):
+                    self.fallos_consecutivos += 1
+                    print(f"⚠️ Falló el envío de {len(lote)} eventos (intento {self.fallos_consecutivos}): {e}")
+                    return False
+                print(f"❌ Supabase rechazó {len(lote)} eventos: {e}")
+                await asyncio.to_thread(self.spool.confirmar, ultimo_id, motivo_rechazo=str(e))
+                self.rechazados += len(lote)
+                continue
+            await asyncio.to_thread(self.spool.confirmar, ultimo_id)
+            self.enviados += len(lote)
+            self.fallos_consecutivos = 0
+
+    def espera_reintento(self) -> float:
+        espera = min(self.backoff_base_s * 2 ** (self.fallos_consecutivos - 1), self.backoff_max_s)
+        return espera * random.uniform(0.5, 1.0)
+
+    async def _esperar(self, evento: asyncio.Event, segundos: float) -> None:
+        try:
+            await asyncio.wait_for(evento.wait(), timeout=segundos)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _drenar_seguro(self) -> bool:
+        """`drenar` sin cortar la tarea de fondo: un error inesperado (SQLite, un bug) cuenta como fallo."""
+        try:
+            return await self.drenar()
+        except Exception as e:
+            self.fallos_consecutivos += 1
+            print(f"⚠️ Error inesperado al drenar el spool (intento {self.fallos_consecutivos}): {e!r}")
+            return False
+
+    async def _ciclo(self) -> None:
+        while not self._parar.is_set():
+            await self._esperar(self._lleno, self.intervalo_s)
+            self._lleno.clear()
+            # Durante el backoff solo se despierta para detenerse, no por eventos nuevos
+            while not await self._drenar_seguro() and not self._parar.is_set():
+                await self._esperar(self._parar, self.espera_reintento())
+
+    def iniciar(self) -> None:
+        self._tarea = asyncio.create_task(self._ciclo())
+
+    async def detener(self) -> None:
+        """Detiene la tarea de fondo (sin cortar un envío en curso) e intenta enviar lo pendiente."""
+        self._parar.set()
+        self._lleno.set()
+        if self._tarea is not None:
+            await self._tarea
+            self._tarea = None
+        # Si falla, los eventos quedan en el spool para el próximo arranque
+        await self._drenar_seguro()
+
+
+@asynccontextmanager
+async def ciclo_vida(app: FastAPI):
+    cliente = crear_cliente()
+    spool = SpoolEventos(RUTA_SPOOL, SPOOL_MAX_EVENTOS)
+    drenador = DrenadorEventos(spool, lambda lote: insertar_lote(cliente, lote))
+    drenador.iniciar()
+    app.state.drenador = drenador
+    # Transiciones en línea: se retoma el estado guardado de cada vehículo
+    almacen = AlmacenTransiciones(RUTA_ESTADO)
+    app.state.almacen = almacen
+    app.state.maquina = almacen.cargar(MaquinaTransiciones())
+    app.state.registro = registro_configurado()
+    app.state.candado_maquina = asyncio.Lock()  # Los lotes avanzan la máquina de a uno y en orden
+    try:
+        yield
+    finally:
+        await drenador.detener()
+        await cliente.aclose()
+        spool.cerrar()
+        almacen.cerrar()
+
+
+app = FastAPI(lifespan=ciclo_vida)
+
+
+def armar_payload(data: dict) -> dict:
+    return {campo: data.get(campo) for campo in CAMPOS_EVENTO}
+
+
+def completar_geocercas(eventos: list[dict], registro: RegistroGeocercas | None) -> None:
+    """Ubica en los polígonos los eventos que no traen `geocerca` (solo lat/lon)."""
+    if registro is None:
+        return
+    for evento in eventos:
+        if "geocerca" not in evento:
+            try:
+                evento["geocerca"] = registro.ubicar(float(evento["lat"]), float(evento["lon"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+
+def avanzar_transiciones(maquina: MaquinaTransiciones, almacen: AlmacenTransiciones,
+                         registro: RegistroGeocercas | None, eventos: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Ubica, procesa y guarda un lote de eventos (trabajo síncrono con SQLite: se ejecuta en un hilo)."""
+    completar_geocercas(eventos, registro)
+    transiciones, viajes = maquina.procesar_eventos(eventos)
+    almacen.guardar(maquina, transiciones, viajes)
+    return transiciones, viajes
+
+
 @app.post("/webhook")
 async def recibir_datos(request: Request):
     data = await request.json()
+    recibidos = data if isinstance(data, list) else [data]
+    eventos = [armar_payload(d) for d in recibidos]
 
-    payload = {
-        "event_time": data.get("event_time"),
-        "system_time": data.get("system_time"),
-        "imei": data.get("imei"),
-        "vid": data.get("vid"),
-        "lat": data.get("lat"),
-        "lon": data.get("lon"),
-        "velocidad": data.get("velocidad")
-    }
+    drenador: DrenadorEventos = request.app.state.drenador
+    try:
+        await drenador.agregar(eventos)
+    except SpoolLleno as e:
+        # Contrapresión: el emisor debe reintentar más tarde
+        return JSONResponse({"status": "spool_lleno", "detail": str(e)}, status_code=429,
+                            headers={"Retry-After": str(REINTENTO_CLIENTE_S)})
+    except sqlite3.Error as e:
+        return JSONResponse({"status": "spool_no_disponible", "detail": str(e)}, status_code=503,
+                            headers={"Retry-After": str(REINTENTO_CLIENTE_S)})
 
-    headers = {
-        "apikey": SUPABASE_API_KEY,
-        "Authorization": f"Bearer {SUPABASE_API_KEY}",
-        "Content-Type": "application/json",
-        "prefer": "return=minimal"
-    }
+    # Solo los eventos aceptados por el spool avanzan la máquina de estados. Como ya están
+    # en el spool, un error aquí no debe devolver 500: el emisor los reenviaría duplicados
+    estado = request.app.state
+    try:
+        async with estado.candado_maquina:
+            transiciones, viajes = await asyncio.to_thread(
+                avanzar_transiciones, estado.maquina, estado.almacen, estado.registro, recibidos)
+    except Exception as e:
+        print(f"⚠️ No se pudieron procesar las transiciones de {len(recibidos)} eventos: {e!r}")
+        transiciones, viajes = [], []
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/rest/v1/eventos_gps",
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
+    return {"status": "ok", "encolados": len(eventos), "pendientes": drenador.spool.pendientes(),
+            "transiciones": len(transiciones), "viajes": len(viajes)}
 
-    return {"status": "ok", "supabase_status": response.status_code, "text": response.text}
 
+@app.get("/transiciones")
+def ultimas_transiciones(request: Request, vehiculo: str | None = None, limite: int = 100):
+    # Handler síncrono: FastAPI lo ejecuta en su threadpool, así la lectura de SQLite
+    # (que espera el lock de `guardar`) no detiene el event loop
+    almacen: AlmacenTransiciones = request.app.state.almacen
+    return {
+        "transiciones": almacen.recientes("transiciones", limite, vehiculo),
+        "viajes": almacen.recientes("viajes", limite, vehiculo),
+    }
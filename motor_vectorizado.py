@@ -0,0 +1,950 @@
+"""
+Motor vectorizado de procesamiento GPS - T-Metal
+Funciones compartidas por los dashboards (app6, app6_mejorado, app7tport) que
+reemplazan los recorridos fila a fila (`iterrows`) por operaciones sobre arreglos
+NumPy para todos los vehículos a la vez.
+
+Este módulo no importa Streamlit: puede usarse desde scripts, pruebas y
+procesos de trabajo sin ejecutar la interfaz.
+"""
+
+from datetime import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+UMBRAL_PERMANENCIA_REAL = 60  # Umbral para permanencias reales (no ruido GPS), en segundos
+SHIFT_DAY_START         = time(8, 0)   # 08:00 ⇒ turno día
+SHIFT_NIGHT_START       = time(20, 0)  # 20:00 ⇒ turno noche
+
+COLUMNAS_PERMANENCIAS = [
+    "Nombre del Vehículo", "Geocerca", "Tiempo_entrada", "Tiempo_salida", "Duracion_s"
+]
+COLUMNAS_TRANSICIONES = [
+    "Nombre del Vehículo", "Origen", "Destino", "Tiempo_entrada", "Tiempo_salida", "Duracion_s"
+]
+COLUMNAS_TURNO = ["Turno", "Fecha_Turno", "Descripcion_Turno"]
+# Categorías de dominio (bits) para clasificar procesos
+CATEGORIA_STOCK            = 1
+CATEGORIA_MODULO_PILA      = 2  # Módulos y Pilas ROM
+CATEGORIA_BOTADERO         = 4
+CATEGORIA_NO_OPERACIONAL   = 8  # Instalaciones de faena, casino
+PROCESOS = np.array(["otro", "carga", "descarga", "retorno"], dtype=object)
+# Secuencias entre geocercas específicas (puerto): coincidencia por subcadena
+PROCESOS_SECUENCIA = np.array(["otro", "viaje_parcial", "viaje_especifico", "estadia_interna"], dtype=object)
+
+COLUMNAS_VIAJES = [
+    "Nombre del Vehículo", "Origen", "Destino", "Inicio_viaje", "Fin_viaje", "Duracion_viaje_s"
+]
+
+RADIO_TIERRA_M  = 6371000
+PARES_POR_LOTE  = 1_000_000  # Pares de puntos evaluados por lote en la agrupación por radio
+
+SEPARACION_DETENCION_S  = 300  # Un hueco mayor entre registros lentos inicia otra detención
+REGISTROS_MIN_DETENCION = 3
+COLUMNAS_ZONAS = [
+    "Nombre del Vehículo", "Latitud_Centro", "Longitud_Centro", "Duracion_Minutos", "Registros",
+    "Radio_Aprox_m", "Inicio", "Fin", "Velocidad_Promedio"
+]
+
+DURACION_MIN_ESTADIA_MIN   = 10  # Estadías más cortas no se evalúan como detención anómala
+VELOCIDAD_DETENIDO_KMH     = 2
+UMBRAL_NORMAL_DEFECTO_MIN  = 30  # Geocercas sin transiciones de referencia
+UMBRAL_ANOMALO_DEFECTO_MIN = 60
+COLUMNAS_DETENCIONES = [
+    "Nombre del Vehículo", "Geocerca", "Tiempo_inicio", "Tiempo_fin",
+    "Duracion_total_min", "Duracion_detenido_min", "Velocidad_promedio",
+    "Tipo_anomalia", "Severidad", "Umbral_normal_min", "Exceso_min"
+]
+
+DIMENSIONES_CUBO = ["Nombre del Vehículo", "Origen", "Destino", "Proceso", "Fecha_Turno", "Turno", "Hora"]
+PROCESOS_PRODUCCION = ("carga", "descarga")
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Normalización de geocercas por valor único
+# ─────────────────────────────────────────────────────────────
+def codificar_geocercas(geocercas: pd.Series, normalizador: Callable[[str], str]) -> pd.Series:
+    """
+    Normaliza cada valor distinto de `geocercas` una sola vez (incluidas las celdas con
+    varias geocercas separadas por ';') y devuelve el resultado como columna categórica
+    alineada con la entrada. Un registro en viaje queda con la categoría "".
+    """
+    codigos, originales = pd.factorize(geocercas.fillna("").astype(str))
+    normalizadas = np.array([normalizador(geo) for geo in originales], dtype=object)
+    codigos_norm, categorias = pd.factorize(normalizadas)
+    categorias = pd.Index(categorias, dtype=object)
+    if "" not in categorias:
+        categorias = categorias.append(pd.Index([""], dtype=object))
+    return pd.Series(
+        pd.Categorical.from_codes(codigos_norm[codigos], categories=categorias),
+        index=geocercas.index, name=geocercas.name
+    )
+
+
+def _codigos_geocerca(geo: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Códigos enteros por geocerca (-1 para registros en viaje) y sus etiquetas."""
+    if isinstance(geo.dtype, pd.CategoricalDtype):
+        categorias = geo.cat.categories
+        codigos = geo.cat.codes.to_numpy().astype(np.int64)
+        codigos[np.isin(codigos, np.flatnonzero(categorias == ""))] = -1
+        return codigos, categorias
+    geo = geo.fillna("").astype(str).str.strip()
+    return pd.factorize(geo.where(geo != ""))
+
+
+def _ordenar_registros(df: pd.DataFrame, columna_geocerca: str) -> tuple:
+    """
+    Codifica vehículo y geocerca y ordena (de forma estable) por vehículo y tiempo.
+    Devuelve (veh_codigos, vehiculos, tiempos, geo_codigos, geocercas).
+    """
+    veh_codigos, vehiculos = pd.factorize(df["Nombre del Vehículo"], sort=True)
+    tiempos = df["Tiempo de evento"].to_numpy()
+    geo_codigos, geocercas = _codigos_geocerca(df[columna_geocerca])
+
+    orden = np.lexsort((tiempos, veh_codigos))
+    return veh_codigos[orden], vehiculos, tiempos[orden], geo_codigos[orden], geocercas
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Permanencias (run-length encoding por vehículo y geocerca)
+# ─────────────────────────────────────────────────────────────
+def detectar_permanencias(df: pd.DataFrame, columna_geocerca: str = "Geocercas",
+                          umbral_s: float = UMBRAL_PERMANENCIA_REAL) -> pd.DataFrame:
+    """
+    Detecta permanencias reales en geocercas para todos los vehículos a la vez.
+
+    Una permanencia es una racha de registros consecutivos del mismo vehículo con la
+    misma geocerca no vacía. Comienza en el primer registro de la racha y termina en el
+    registro siguiente (salida hacia otra geocerca o hacia viaje) o, si la racha cierra
+    los datos del vehículo, en su último registro. Solo se conservan las permanencias
+    con duración >= `umbral_s`.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_PERMANENCIAS)
+
+    veh_codigos, vehiculos, tiempos, geo_codigos, geocercas = _ordenar_registros(df, columna_geocerca)
+
+    n = len(tiempos)
+    inicio_racha = np.ones(n, dtype=bool)
+    inicio_racha[1:] = (veh_codigos[1:] != veh_codigos[:-1]) | (geo_codigos[1:] != geo_codigos[:-1])
+    inicios = np.flatnonzero(inicio_racha)
+    fines = np.append(inicios[1:], n) - 1
+
+    # Salida: registro siguiente a la racha si pertenece al mismo vehículo
+    siguiente = np.minimum(fines + 1, n - 1)
+    hay_siguiente = (fines + 1 < n) & (veh_codigos[siguiente] == veh_codigos[inicios])
+    entrada = tiempos[inicios]
+    salida = np.where(hay_siguiente, tiempos[siguiente], tiempos[fines])
+    duracion_s = (salida - entrada) / np.timedelta64(1, "s")
+
+    validas = (geo_codigos[inicios] != -1) & (duracion_s >= umbral_s)
+    inicios = inicios[validas]
+
+    return pd.DataFrame({
+        "Nombre del Vehículo": vehiculos[veh_codigos[inicios]],
+        "Geocerca": geocercas[geo_codigos[inicios]],
+        "Tiempo_entrada": entrada[validas],
+        "Tiempo_salida": salida[validas],
+        "Duracion_s": duracion_s[validas],
+    })
+
+
+def construir_transiciones(permanencias: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construye pares Origen → Destino entre permanencias consecutivas del mismo vehículo.
+    El tiempo y la duración de cada transición corresponden a la permanencia en el origen.
+    """
+    if len(permanencias) < 2:
+        return pd.DataFrame(columns=COLUMNAS_TRANSICIONES)
+
+    veh = permanencias["Nombre del Vehículo"].to_numpy()
+    geo = permanencias["Geocerca"].to_numpy()
+    mismo_vehiculo = veh[:-1] == veh[1:]
+
+    return pd.DataFrame({
+        "Nombre del Vehículo": veh[:-1][mismo_vehiculo],
+        "Origen": geo[:-1][mismo_vehiculo],
+        "Destino": geo[1:][mismo_vehiculo],
+        "Tiempo_entrada": permanencias["Tiempo_entrada"].to_numpy()[:-1][mismo_vehiculo],
+        "Tiempo_salida": permanencias["Tiempo_salida"].to_numpy()[:-1][mismo_vehiculo],
+        "Duracion_s": permanencias["Duracion_s"].to_numpy()[:-1][mismo_vehiculo],
+    })
+
+
+def extraer_transiciones_vectorizado(df: pd.DataFrame, columna_geocerca: str = "Geocercas",
+                                     umbral_s: float = UMBRAL_PERMANENCIA_REAL) -> pd.DataFrame:
+    """
+    Detecta transiciones completas Geocerca1 → [VIAJE] → Geocerca2 sin recorrer filas.
+    Equivale al bucle `iterrows` de `extraer_transiciones` (mismas columnas y orden).
+    """
+    return construir_transiciones(detectar_permanencias(df, columna_geocerca, umbral_s))
+
+
+# ─────────────────────────────────────────────────────────────
+# 3 | Tiempos de viaje (registros fuera de geocerca)
+# ─────────────────────────────────────────────────────────────
+def extraer_viajes_vectorizado(df: pd.DataFrame, columna_geocerca: str = "Geocercas",
+                               duracion_min_s: float = 30, registros_min: int = 2) -> tuple[pd.DataFrame, dict]:
+    """
+    Extrae viajes (rachas de registros sin geocerca) en tiempo lineal.
+
+    El origen de cada viaje es la última geocerca no vacía anterior del mismo vehículo
+    (forward-fill) y el destino la primera posterior (back-fill); si no existe se usa
+    "DESCONOCIDO". Las rachas se resumen con un único groupby.
+
+    Returns:
+        tuple: (viajes, casos_desconocidos) donde casos_desconocidos cuenta los viajes
+        con solo origen, solo destino o ambos desconocidos.
+    """
+    casos_desconocidos = {"origen": 0, "destino": 0, "ambos": 0}
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_VIAJES), casos_desconocidos
+
+    veh_codigos, vehiculos, tiempos, geo_codigos, geocercas = _ordenar_registros(df, columna_geocerca)
+
+    en_viaje = geo_codigos == -1
+    inicio_racha = np.ones(len(tiempos), dtype=bool)
+    inicio_racha[1:] = (veh_codigos[1:] != veh_codigos[:-1]) | (en_viaje[1:] != en_viaje[:-1])
+
+    # Última geocerca anterior / primera posterior dentro del mismo vehículo
+    geo_conocida = pd.Series(np.where(en_viaje, np.nan, geo_codigos))
+    por_vehiculo = geo_conocida.groupby(veh_codigos)
+
+    registros = pd.DataFrame({
+        "racha": np.cumsum(inicio_racha),
+        "veh": veh_codigos,
+        "tiempo": tiempos,
+        "origen": por_vehiculo.ffill().to_numpy(),
+        "destino": por_vehiculo.bfill().to_numpy(),
+    })[en_viaje]
+
+    rachas = registros.groupby("racha", sort=True).agg(
+        veh=("veh", "first"),
+        inicio=("tiempo", "first"),
+        fin=("tiempo", "last"),
+        puntos=("tiempo", "size"),
+        origen=("origen", "first"),
+        destino=("destino", "first"),
+    )
+    rachas["duracion_s"] = (rachas["fin"] - rachas["inicio"]).dt.total_seconds()
+    rachas = rachas[(rachas["puntos"] >= registros_min) & (rachas["duracion_s"] >= duracion_min_s)]
+
+    if rachas.empty:
+        return pd.DataFrame(columns=COLUMNAS_VIAJES), casos_desconocidos
+
+    origen_desconocido = rachas["origen"].isna().to_numpy()
+    destino_desconocido = rachas["destino"].isna().to_numpy()
+    casos_desconocidos["ambos"] = int((origen_desconocido & destino_desconocido).sum())
+    casos_desconocidos["origen"] = int((origen_desconocido & ~destino_desconocido).sum())
+    casos_desconocidos["destino"] = int((~origen_desconocido & destino_desconocido).sum())
+
+    # El código -1 indexa la última etiqueta: "DESCONOCIDO"
+    etiquetas = np.append(np.asarray(geocercas, dtype=object), "DESCONOCIDO")
+    origen = np.where(origen_desconocido, -1, rachas["origen"].fillna(-1)).astype(np.int64)
+    destino = np.where(destino_desconocido, -1, rachas["destino"].fillna(-1)).astype(np.int64)
+
+    viajes = pd.DataFrame({
+        "Nombre del Vehículo": vehiculos[rachas["veh"].to_numpy()],
+        "Origen": etiquetas[origen],
+        "Destino": etiquetas[destino],
+        "Inicio_viaje": rachas["inicio"].to_numpy(),
+        "Fin_viaje": rachas["fin"].to_numpy(),
+        "Duracion_viaje_s": rachas["duracion_s"].to_numpy(),
+    })
+    return viajes, casos_desconocidos
+
+
+# ─────────────────────────────────────────────────────────────
+# 4 | Clasificación de procesos con tabla de dominios
+# ─────────────────────────────────────────────────────────────
+def _categorias_dominio(geocercas: pd.Series, stocks: set, modulos_pilas: set,
+                        botaderos: set, no_operacionales: set) -> np.ndarray:
+    """Bits de categoría por fila, evaluando la pertenencia a cada dominio una vez por etiqueta única."""
+    codigos, etiquetas = pd.factorize(geocercas)
+    categorias = [
+        (CATEGORIA_STOCK if geo in stocks else 0)
+        | (CATEGORIA_MODULO_PILA if geo in modulos_pilas else 0)
+        | (CATEGORIA_BOTADERO if geo in botaderos else 0)
+        | (CATEGORIA_NO_OPERACIONAL if geo in no_operacionales else 0)
+        for geo in etiquetas
+    ]
+    # El código -1 (valor nulo) apunta a la última posición, sin categoría
+    return np.array(categorias + [0], dtype=np.int8)[codigos]
+
+
+def clasificar_procesos_vectorizado(trans: pd.DataFrame, stocks: set, modulos_pilas: set,
+                                    botaderos: set, no_operacionales: set = frozenset()) -> pd.DataFrame:
+    """
+    Clasifica cada transición en carga / descarga / retorno / otro con máscaras vectorizadas:
+    - No operacional (origen o destino): otro
+    - Carga: Stock → Módulo/Pila ROM
+    - Descarga: Módulo/Pila ROM → Botadero
+    - Retorno: Botadero → Módulo/Pila ROM si la transición anterior del vehículo fue descarga
+    - Retorno: Módulo/Pila ROM → Stock si la transición anterior del vehículo fue carga
+
+    Las etiquetas Origen/Destino se traducen a categorías una sola vez por valor único.
+    Devuelve las transiciones ordenadas por vehículo y Tiempo_entrada con la columna 'Proceso'.
+    """
+    if trans.empty:
+        return trans
+
+    veh_codigos, _ = pd.factorize(trans["Nombre del Vehículo"], sort=True)
+    tiempos = trans["Tiempo_entrada"].to_numpy()
+    dominios = (stocks, modulos_pilas, botaderos, no_operacionales)
+    origen = _categorias_dominio(trans["Origen"], *dominios)
+    destino = _categorias_dominio(trans["Destino"], *dominios)
+
+    # Las transiciones del motor ya vienen ordenadas por vehículo y tiempo: solo se reordena si hace falta
+    mismo_vehiculo = veh_codigos[1:] == veh_codigos[:-1]
+    ordenado = (np.all(veh_codigos[1:] >= veh_codigos[:-1])
+                and np.all(~mismo_vehiculo | (tiempos[1:] >= tiempos[:-1])))
+    if not ordenado:
+        orden = np.lexsort((tiempos, veh_codigos))
+        trans = trans.take(orden)
+        veh_codigos, origen, destino = veh_codigos[orden], origen[orden], destino[orden]
+        mismo_vehiculo = veh_codigos[1:] == veh_codigos[:-1]
+    trans = trans.reset_index(drop=True)
+
+    operacional = ((origen | destino) & CATEGORIA_NO_OPERACIONAL) == 0
+    o_stock = (origen & CATEGORIA_STOCK) != 0
+    o_modulo = (origen & CATEGORIA_MODULO_PILA) != 0
+    o_botadero = (origen & CATEGORIA_BOTADERO) != 0
+    d_stock = (destino & CATEGORIA_STOCK) != 0
+    d_modulo = (destino & CATEGORIA_MODULO_PILA) != 0
+    d_botadero = (destino & CATEGORIA_BOTADERO) != 0
+
+    carga = operacional & o_stock & d_modulo
+    descarga = operacional & ~carga & o_modulo & d_botadero
+    candidato_retorno_descarga = operacional & ~carga & ~descarga & o_botadero & d_modulo
+    candidato_retorno_carga = (operacional & ~carga & ~descarga & ~candidato_retorno_descarga
+                               & o_modulo & d_stock)
+
+    # Proceso anterior del mismo vehículo (solo carga/descarga habilitan un retorno)
+    base = np.where(carga, 1, np.where(descarga, 2, 0)).astype(np.int8)
+    anterior = np.zeros(len(trans), dtype=np.int8)
+    anterior[1:] = np.where(mismo_vehiculo, base[:-1], 0)
+
+    retorno = ((candidato_retorno_descarga & (anterior == 2))
+               | (candidato_retorno_carga & (anterior == 1)))
+    trans["Proceso"] = PROCESOS[np.where(retorno, 3, base)]
+    return trans
+
+
+def _contiene_alguna(geocercas: pd.Series, fragmentos: set) -> np.ndarray:
+    """Por fila, si la geocerca contiene alguno de los fragmentos; se evalúa una vez por etiqueta única."""
+    codigos, etiquetas = pd.factorize(geocercas)
+    coincide = [any(fragmento in geo for fragmento in fragmentos) for geo in etiquetas]
+    # El código -1 (valor nulo) apunta a la última posición, sin coincidencia
+    return np.array(coincide + [False], dtype=bool)[codigos]
+
+
+def clasificar_secuencias_vectorizado(trans: pd.DataFrame, especificas: set,
+                                      excluidas: set = frozenset()) -> pd.DataFrame:
+    """
+    Clasifica cada transición según las geocercas específicas y excluidas que contienen
+    su Origen y Destino (por subcadena), con máscaras vectorizadas:
+    - estadia_interna: Origen y Destino son la misma geocerca
+    - otro: Origen o Destino contiene una geocerca excluida
+    - viaje_especifico: Origen y Destino contienen geocercas específicas
+    - viaje_parcial: solo uno de los dos contiene una geocerca específica
+
+    Devuelve las transiciones ordenadas por vehículo y Tiempo_entrada con la columna 'Proceso'.
+    """
+    if trans.empty:
+        return trans
+
+    veh_codigos, _ = pd.factorize(trans["Nombre del Vehículo"], sort=True)
+    orden = np.lexsort((trans["Tiempo_entrada"].to_numpy(), veh_codigos))
+    trans = trans.take(orden).reset_index(drop=True)
+
+    origen, destino = trans["Origen"], trans["Destino"]
+    misma = (origen == destino).to_numpy(dtype=bool)
+    excluida = _contiene_alguna(origen, excluidas) | _contiene_alguna(destino, excluidas)
+    especificas_en_tramo = (_contiene_alguna(origen, especificas).astype(np.int8)
+                            + _contiene_alguna(destino, especificas).astype(np.int8))
+
+    trans["Proceso"] = PROCESOS_SECUENCIA[np.where(misma, 3, np.where(excluida, 0, especificas_en_tramo))]
+    return trans
+
+
+# ─────────────────────────────────────────────────────────────
+# 5 | Calendario de turnos por columnas
+# ─────────────────────────────────────────────────────────────
+def _desde_medianoche(hora: time) -> pd.Timedelta:
+    return pd.Timedelta(hours=hora.hour, minutes=hora.minute, seconds=hora.second)
+
+
+def _minuto_anterior(hora: time) -> str:
+    """Rótulo HH:MM del último minuto del turno que termina en `hora`."""
+    minutos = (hora.hour * 60 + hora.minute - 1) % (24 * 60)
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def es_turno_dia(tiempos: pd.Series, inicio_dia: time = SHIFT_DAY_START,
+                 inicio_noche: time = SHIFT_NIGHT_START) -> np.ndarray:
+    """Máscara booleana del turno día (inicio_dia ≤ hora < inicio_noche) para una columna de fechas."""
+    tiempos = pd.to_datetime(tiempos)
+    hora = tiempos - tiempos.dt.normalize()
+    return ((hora >= _desde_medianoche(inicio_dia)) & (hora < _desde_medianoche(inicio_noche))).to_numpy()
+
+
+def turnos_vectorizado(tiempos: pd.Series, inicio_dia: time = SHIFT_DAY_START,
+                       inicio_noche: time = SHIFT_NIGHT_START) -> np.ndarray:
+    """Equivalente por columnas de `turno`: arreglo de "dia" / "noche"."""
+    return np.where(es_turno_dia(tiempos, inicio_dia, inicio_noche), "dia", "noche").astype(object)
+
+
+def calendario_turnos(tiempos: pd.Series, inicio_dia: time = SHIFT_DAY_START,
+                      inicio_noche: time = SHIFT_NIGHT_START) -> pd.DataFrame:
+    """
+    Calcula Turno, Fecha_Turno y Descripcion_Turno para una columna completa de fechas.
+
+    La fecha de turno es la fecha de `tiempo - inicio_dia`: la madrugada (antes de
+    inicio_dia) pertenece al turno noche del día anterior. Las descripciones se
+    construyen una sola vez por fecha de turno distinta y se asignan por código.
+    """
+    tiempos = pd.to_datetime(pd.Series(tiempos))
+    dia = es_turno_dia(tiempos, inicio_dia, inicio_noche)
+    fecha_turno = (tiempos - _desde_medianoche(inicio_dia)).dt.normalize()
+
+    hora_dia, hora_noche = inicio_dia.strftime("%H:%M"), inicio_noche.strftime("%H:%M")
+    fin_dia, fin_noche = _minuto_anterior(inicio_noche), _minuto_anterior(inicio_dia)
+
+    codigos, fechas = pd.factorize(fecha_turno)
+    fecha_str = fechas.strftime("%d-%m-%Y")
+    siguiente_str = (fechas + pd.Timedelta(days=1)).strftime("%d-%m-%Y")
+    descripcion_dia = np.array(
+        [f"Turno Día {f} ({hora_dia}-{fin_dia})" for f in fecha_str] + [None], dtype=object
+    )
+    descripcion_noche = np.array(
+        [f"Turno Noche {f} ({hora_noche} del {f} - {fin_noche} del {s})" for f, s in zip(fecha_str, siguiente_str)]
+        + [None], dtype=object
+    )
+
+    return pd.DataFrame({
+        "Turno": np.where(dia, "dia", "noche").astype(object),
+        "Fecha_Turno": fecha_turno,
+        "Descripcion_Turno": np.where(dia, descripcion_dia[codigos], descripcion_noche[codigos]),
+    }, index=tiempos.index)
+
+
+# ─────────────────────────────────────────────────────────────
+# 6 | Filtros sobre tablas de resultados (solapamiento de intervalos)
+# ─────────────────────────────────────────────────────────────
+def solapa_rango_fechas(inicio: pd.Series, fin: pd.Series, desde, hasta) -> np.ndarray:
+    """Filas cuyo intervalo [inicio, fin] toca los días de `desde` a `hasta` (ambos inclusive)."""
+    desde = pd.Timestamp(desde).normalize()
+    hasta = pd.Timestamp(hasta).normalize() + pd.Timedelta(days=1)
+    return ((inicio < hasta) & (fin >= desde)).to_numpy()
+
+
+def solapa_franja_horaria(inicio: pd.Series, fin: pd.Series, hora_inicio: int, hora_fin: int) -> np.ndarray:
+    """
+    Filas cuyo intervalo [inicio, fin] toca, algún día, la franja diaria
+    hora_inicio:00 – hora_fin:59. Un intervalo que empieza fuera de la franja
+    la toca si la siguiente apertura de la franja ocurre antes de su fin.
+    """
+    apertura = pd.Timedelta(hours=hora_inicio)
+    cierre = pd.Timedelta(hours=hora_fin + 1)
+    medianoche = inicio.dt.normalize()
+    hora = inicio - medianoche
+
+    dentro = (hora >= apertura) & (hora < cierre)
+    siguiente_apertura = medianoche + apertura + pd.to_timedelta(np.where(hora >= apertura, 1, 0), unit="D")
+    return (dentro | (siguiente_apertura <= fin)).to_numpy()
+
+
+def filtrar_resultados(tabla: pd.DataFrame, columna_inicio: str, columna_fin: str,
+                       rango_fechas: tuple | None = None, rango_horas: tuple[int, int] | None = None,
+                       vehiculo: str | None = None, turno_tipo: str | None = None,
+                       inicio_dia: time = SHIFT_DAY_START, inicio_noche: time = SHIFT_NIGHT_START) -> pd.DataFrame:
+    """
+    Aplica los filtros de la interfaz a una tabla de resultados ya calculada
+    (transiciones, viajes, detenciones) en lugar de recalcularla sobre los
+    registros GPS filtrados:
+    - rango_fechas / rango_horas: solapamiento del intervalo [columna_inicio, columna_fin]
+    - vehiculo: igualdad exacta
+    - turno_tipo ("dia" / "noche"): turno de columna_inicio (columna 'Turno' si existe)
+    """
+    if tabla.empty:
+        return tabla
+
+    mascara = np.ones(len(tabla), dtype=bool)
+    inicio, fin = tabla[columna_inicio], tabla[columna_fin]
+
+    if rango_fechas is not None:
+        mascara &= solapa_rango_fechas(inicio, fin, *rango_fechas)
+    if rango_horas is not None:
+        mascara &= solapa_franja_horaria(inicio, fin, *rango_horas)
+    if vehiculo is not None:
+        mascara &= (tabla["Nombre del Vehículo"] == vehiculo).to_numpy()
+    if turno_tipo is not None:
+        turnos = (tabla["Turno"].to_numpy() if "Turno" in tabla.columns
+                  else turnos_vectorizado(inicio, inicio_dia, inicio_noche))
+        mascara &= turnos == turno_tipo
+
+    return tabla[mascara]
+
+
+# ─────────────────────────────────────────────────────────────
+# 7 | Compactación de rachas (procesamiento por bloques)
+# ─────────────────────────────────────────────────────────────
+def compactar_rachas(df: pd.DataFrame, columna_geocerca: str = "Geocercas") -> pd.DataFrame:
+    """
+    Reduce cada racha (registros consecutivos del mismo vehículo con la misma geocerca,
+    o sin geocerca) a su primer y último registro, ordenados por vehículo y tiempo.
+
+    Las permanencias, transiciones y viajes solo dependen de los extremos de cada racha,
+    por lo que dan el mismo resultado sobre la tabla compactada (los viajes, mientras
+    `registros_min <= 2`). Compactar de nuevo la concatenación de bloques compactados
+    une las rachas que cruzan el límite entre bloques.
+    """
+    if df.empty:
+        return df.reset_index(drop=True)
+
+    veh_codigos, _ = pd.factorize(df["Nombre del Vehículo"], sort=True)
+    geo_codigos, _ = _codigos_geocerca(df[columna_geocerca])
+    orden = np.lexsort((df["Tiempo de evento"].to_numpy(), veh_codigos))
+    veh_codigos, geo_codigos = veh_codigos[orden], geo_codigos[orden]
+
+    n = len(orden)
+    inicio_racha = np.ones(n, dtype=bool)
+    inicio_racha[1:] = (veh_codigos[1:] != veh_codigos[:-1]) | (geo_codigos[1:] != geo_codigos[:-1])
+    fin_racha = np.append(inicio_racha[1:], True)
+
+    return df.iloc[orden[inicio_racha | fin_racha]].reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# 8 | Agrupación espacial por radio (grilla + unión-búsqueda)
+# ─────────────────────────────────────────────────────────────
+def distancia_haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distancia en metros entre puntos GPS en grados (escalares o arreglos, con broadcasting)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _raices(padre: np.ndarray) -> np.ndarray:
+    """Compresión completa de caminos: cada nodo apunta directo a su raíz."""
+    while True:
+        abuelo = padre[padre]
+        if np.array_equal(abuelo, padre):
+            return padre
+        padre = abuelo
+
+
+def _unir(padre: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Une los conjuntos de cada par (u, v); la raíz de cada conjunto es su índice menor."""
+    padre = _raices(padre)
+    while len(u):
+        ru, rv = padre[u], padre[v]
+        distintos = ru != rv
+        u, v, ru, rv = u[distintos], v[distintos], ru[distintos], rv[distintos]
+        np.minimum.at(padre, np.maximum(ru, rv), np.minimum(ru, rv))
+        padre = _raices(padre)
+    return padre
+
+
+def agrupar_por_radio(lat, lon, radio_m: float, pares_por_lote: int = PARES_POR_LOTE) -> np.ndarray:
+    """
+    Etiqueta cada punto con su grupo: dos puntos quedan juntos si existe una cadena de
+    puntos entre ellos separados a lo más `radio_m` metros (haversine). Es el resultado
+    de DBSCAN con `min_samples=1`. Etiquetas 0..k-1 en orden de primera aparición.
+
+    Los puntos se indexan en una grilla de celdas de diagonal menor que el radio, de modo
+    que cada celda ya es un grupo; solo se miden distancias entre celdas vecinas que
+    todavía pertenecen a grupos distintos, por lotes de `pares_por_lote` pares y de las
+    celdas con menos puntos a las más pobladas.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if radio_m <= 0:
+        raise ValueError(f"El radio debe ser positivo: {radio_m}")
+    if not (np.isfinite(lat).all() and np.isfinite(lon).all()):
+        raise ValueError("Coordenadas no válidas (NaN o infinitas)")
+    if len(lat) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Celdas: alto y ancho reales <= lado en toda la banda de latitudes de los datos
+    lado = radio_m / np.sqrt(2) * 0.999
+    cos_min = max(np.cos(np.radians(np.abs(lat).max())), 1e-3)
+    cos_max = np.cos(np.radians(np.abs(lat).min()))
+    alto_grados = np.degrees(lado / RADIO_TIERRA_M)
+    ancho_grados = np.degrees(lado / (RADIO_TIERRA_M * cos_max))
+    # Alcance en celdas de un vecino a distancia <= radio (el ancho real mínimo es lado·cos_min/cos_max)
+    alcance_y = int(np.ceil(radio_m * 1.001 / lado))
+    alcance_x = int(np.ceil(radio_m * 1.001 * cos_max / (lado * cos_min)))
+
+    fila = np.floor(lat / alto_grados).astype(np.int64)
+    columna = np.floor(lon / ancho_grados).astype(np.int64)
+    fila -= fila.min()
+    columna -= columna.min() - alcance_x
+    ancho_clave = int(columna.max()) + alcance_x + 1
+    claves, celda = np.unique(fila * ancho_clave + columna, return_inverse=True)
+
+    # Puntos ordenados por celda (CSR) y caja de cada celda
+    orden = np.argsort(celda, kind="stable")
+    conteo = np.bincount(celda)
+    inicio = np.concatenate(([0], np.cumsum(conteo)[:-1]))
+    lat_o, lon_o = lat[orden], lon[orden]
+    caja = [f.reduceat(v, inicio) for v in (lat_o, lon_o) for f in (np.minimum, np.maximum)]
+
+    # Pares de celdas vecinas (media vecindad) cuyas cajas pueden estar a menos del radio
+    grado_m = np.radians(1) * RADIO_TIERRA_M
+    celdas_a, celdas_b = [], []
+    for dy in range(0, alcance_y + 1):
+        for dx in range(-alcance_x, alcance_x + 1):
+            if dy == 0 and dx <= 0:
+                continue
+            vecina = np.searchsorted(claves, claves + dy * ancho_clave + dx)
+            vecina = np.minimum(vecina, len(claves) - 1)
+            a = np.flatnonzero(claves[vecina] == claves + dy * ancho_clave + dx)
+            b = vecina[a]
+            separacion_y = np.maximum(np.maximum(caja[0][a], caja[0][b]) - np.minimum(caja[1][a], caja[1][b]), 0)
+            separacion_x = np.maximum(np.maximum(caja[2][a], caja[2][b]) - np.minimum(caja[3][a], caja[3][b]), 0)
+            cerca = np.hypot(separacion_y, separacion_x * cos_min) * grado_m <= radio_m * 1.001
+            celdas_a.append(a[cerca])
+            celdas_b.append(b[cerca])
+    celdas_a = np.concatenate(celdas_a)
+    celdas_b = np.concatenate(celdas_b)
+    costo_total = conteo[celdas_a] * conteo[celdas_b]
+    por_costo = np.argsort(costo_total, kind="stable")
+    celdas_a, celdas_b, costo_total = celdas_a[por_costo], celdas_b[por_costo], costo_total[por_costo]
+    revisados = np.zeros(len(celdas_a), dtype=np.int64)
+
+    # Haversine sin arcoseno: d <= radio  ⇔  a <= sin²(radio / 2R)
+    lat_r, lon_r = np.radians(lat_o), np.radians(lon_o)
+    cos_lat = np.cos(lat_r)
+    umbral_a = np.sin(radio_m / (2 * RADIO_TIERRA_M)) ** 2
+
+    padre = np.arange(len(claves))
+    while len(celdas_a):
+        pendientes = padre[celdas_a] != padre[celdas_b]
+        celdas_a, celdas_b = celdas_a[pendientes], celdas_b[pendientes]
+        costo_total, revisados = costo_total[pendientes], revisados[pendientes]
+        if not len(celdas_a):
+            break
+
+        # Siguiente lote: cada par de celdas aporta a lo más `cuota` pares de puntos, así
+        # las celdas densas se unen con el primer par cercano sin medirlas completas
+        cuota = max(pares_por_lote // len(celdas_a), 64)
+        largo = np.minimum(costo_total - revisados, cuota)
+        n_celdas = max(int(np.searchsorted(np.cumsum(largo), pares_por_lote, side="right")), 1)
+        largo = largo[:n_celdas]
+        par = np.repeat(np.arange(n_celdas), largo)
+        k = revisados[par] + np.arange(len(par)) - np.repeat(np.cumsum(largo) - largo, largo)
+        conteo_b = conteo[celdas_b[par]]
+        i = inicio[celdas_a[par]] + k // conteo_b
+        j = inicio[celdas_b[par]] + k % conteo_b
+
+        a = (np.sin((lat_r[j] - lat_r[i]) / 2) ** 2
+             + cos_lat[i] * cos_lat[j] * np.sin((lon_r[j] - lon_r[i]) / 2) ** 2)
+        unidos = np.unique(par[a <= umbral_a])
+        padre = _unir(padre, celdas_a[unidos], celdas_b[unidos])
+
+        revisados[:n_celdas] += largo
+        quedan = revisados < costo_total
+        celdas_a, celdas_b = celdas_a[quedan], celdas_b[quedan]
+        costo_total, revisados = costo_total[quedan], revisados[quedan]
+
+    return pd.factorize(padre[celda])[0]
+
+
+def agrupar_zonas_cercanas(zonas_df: pd.DataFrame, radio_metros: float = 10.0) -> pd.DataFrame:
+    """
+    Agrupa zonas candidatas (`Latitud_Centro`, `Longitud_Centro`) encadenadas a menos de
+    `radio_metros`. Las zonas solas se mantienen; las agrupadas toman el centro ponderado
+    por duración y el radio máximo entre ese centro y sus zonas. Orden: duración descendente.
+    """
+    if zonas_df.empty:
+        return zonas_df
+
+    lat = zonas_df["Latitud_Centro"].to_numpy(dtype=float)
+    lon = zonas_df["Longitud_Centro"].to_numpy(dtype=float)
+    grupos = agrupar_por_radio(lat, lon, radio_metros)
+    n_grupos = int(grupos.max()) + 1
+    cantidad = np.bincount(grupos, minlength=n_grupos)
+
+    # Centro ponderado por duración (promedio simple si las duraciones suman cero)
+    pesos = zonas_df["Duracion_Minutos"].to_numpy(dtype=float)
+    suma_pesos = np.bincount(grupos, pesos, n_grupos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lat_centro = np.where(suma_pesos > 0, np.bincount(grupos, pesos * lat, n_grupos) / suma_pesos,
+                              np.bincount(grupos, lat, n_grupos) / cantidad)
+        lon_centro = np.where(suma_pesos > 0, np.bincount(grupos, pesos * lon, n_grupos) / suma_pesos,
+                              np.bincount(grupos, lon, n_grupos) / cantidad)
+    sola = cantidad == 1
+    lat_centro[sola] = (np.bincount(grupos, lat, n_grupos) / cantidad)[sola]
+    lon_centro[sola] = (np.bincount(grupos, lon, n_grupos) / cantidad)[sola]
+
+    radio_grupo = np.zeros(n_grupos)
+    np.maximum.at(radio_grupo, grupos, distancia_haversine(lat_centro[grupos], lon_centro[grupos], lat, lon))
+
+    g = zonas_df.groupby(grupos, sort=True)
+    nombres = g["Nombre del Vehículo"].first().to_numpy(dtype=object)
+    resultado = pd.DataFrame({
+        "Nombre del Vehículo": np.where(sola, nombres, [f"AGRUPADA ({n} zonas)" for n in cantidad]),
+        "Latitud_Centro": lat_centro,
+        "Longitud_Centro": lon_centro,
+        "Duracion_Minutos": g["Duracion_Minutos"].sum().to_numpy(),
+        "Registros": g["Registros"].sum().to_numpy(),
+        "Radio_Aprox_m": np.where(sola, g["Radio_Aprox_m"].first().to_numpy(dtype=float),
+                                  np.fmax(radio_grupo, g["Radio_Aprox_m"].max().to_numpy(dtype=float))),
+        "Inicio": g["Inicio"].min().to_numpy(),
+        "Fin": g["Fin"].max().to_numpy(),
+        "Velocidad_Promedio": g["Velocidad_Promedio"].mean().to_numpy(),
+        "Zonas_Agrupadas": cantidad,
+        "Vehiculos_Involucrados": g["Nombre del Vehículo"].agg(list).to_numpy(),
+    })
+    return resultado.sort_values("Duracion_Minutos", ascending=False, kind="stable").reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# 9 | Detenciones fuera de geocercas (zonas no mapeadas)
+# ─────────────────────────────────────────────────────────────
+def detectar_detenciones(df: pd.DataFrame, velocidad_max: float = 5.0, tiempo_min_minutos: float = 10,
+                         separacion_s: float = SEPARACION_DETENCION_S,
+                         registros_min: int = REGISTROS_MIN_DETENCION) -> pd.DataFrame:
+    """
+    Detenciones candidatas a zona no mapeada: registros sin geocerca, con velocidad
+    <= `velocidad_max` (o sin velocidad) y coordenadas válidas, cortados por vehículo
+    cuando pasan más de `separacion_s` segundos entre registros. Se conservan los tramos
+    con al menos `registros_min` registros y `tiempo_min_minutos` de duración.
+
+    Todos los tramos se resumen en una sola agregación sobre el identificador de tramo
+    (vehículo + corte temporal). El radio aproximado es la dispersión de las coordenadas
+    (desviación estándar en grados × 111 km).
+    """
+    vacio = pd.DataFrame(columns=COLUMNAS_ZONAS)
+    if df.empty:
+        return vacio
+
+    velocidad = pd.to_numeric(df["Velocidad [km/h]"], errors="coerce").to_numpy(dtype=float)
+    lat = pd.to_numeric(df["Latitud"], errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(df["Longitud"], errors="coerce").to_numpy(dtype=float)
+    lentos = ((df["Geocercas"] == "").to_numpy(dtype=bool)
+              & ~(velocidad > velocidad_max) & ~np.isnan(lat) & ~np.isnan(lon))
+    if lentos.sum() < 10:  # Se necesitan suficientes puntos
+        return vacio
+
+    veh_codigos, vehiculos = pd.factorize(df["Nombre del Vehículo"].to_numpy()[lentos], sort=True)
+    tiempos = df["Tiempo de evento"].to_numpy()[lentos]
+    orden = np.lexsort((tiempos, veh_codigos))
+    veh_codigos, tiempos = veh_codigos[orden], tiempos[orden]
+
+    # Identificador de tramo: cambia con el vehículo o tras un hueco mayor a `separacion_s`
+    nuevo_tramo = np.ones(len(orden), dtype=bool)
+    hueco_s = (tiempos[1:] - tiempos[:-1]) / np.timedelta64(1, "s")
+    nuevo_tramo[1:] = (veh_codigos[1:] != veh_codigos[:-1]) | (hueco_s > separacion_s)
+    tramo = np.cumsum(nuevo_tramo) - 1
+
+    tramos = pd.DataFrame({
+        "tramo": tramo,
+        "vehiculo": veh_codigos,
+        "tiempo": tiempos,
+        "lat": lat[lentos][orden],
+        "lon": lon[lentos][orden],
+        "velocidad": velocidad[lentos][orden],
+    }).groupby("tramo", sort=True).agg(
+        vehiculo=("vehiculo", "first"),
+        Inicio=("tiempo", "min"),
+        Fin=("tiempo", "max"),
+        Registros=("tiempo", "size"),
+        Latitud_Centro=("lat", "mean"),
+        Longitud_Centro=("lon", "mean"),
+        lat_std=("lat", "std"),
+        lon_std=("lon", "std"),
+        Velocidad_Promedio=("velocidad", "mean"),
+    )
+
+    tramos["Duracion_Minutos"] = (tramos["Fin"] - tramos["Inicio"]).dt.total_seconds() / 60
+    tramos = tramos[(tramos["Registros"] >= registros_min) & (tramos["Duracion_Minutos"] >= tiempo_min_minutos)]
+    if tramos.empty:
+        return vacio
+
+    tramos["Nombre del Vehículo"] = vehiculos[tramos["vehiculo"].to_numpy()]
+    tramos["Radio_Aprox_m"] = np.hypot(tramos["lat_std"], tramos["lon_std"]) * 111000
+    return tramos[COLUMNAS_ZONAS].reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# 10 | Detenciones anómalas dentro de geocercas operacionales
+# ─────────────────────────────────────────────────────────────
+def lineas_base_permanencia(trans: pd.DataFrame, geocercas_operacionales: set) -> pd.DataFrame:
+    """Línea base por geocerca de origen (índice): duración media y umbral anómalo (media + 2σ), en segundos."""
+    operacionales = trans[trans["Origen"].isin(geocercas_operacionales)]
+    lineas_base = operacionales.groupby("Origen")["Duracion_s"].agg(["mean", "std"])
+    lineas_base["umbral_anomalo"] = lineas_base["mean"] + 2 * lineas_base["std"]
+    return lineas_base
+
+
+def _redondear(valores: np.ndarray, decimales: int) -> list[float]:
+    """`round` de Python (redondeo decimal exacto) sobre las pocas filas de salida."""
+    return [round(float(v), decimales) for v in valores]
+
+
+def detectar_detenciones_anomalas(df: pd.DataFrame, lineas_base: pd.DataFrame, geocercas_operacionales: set,
+                                  columna_geocerca: str = "Geocercas") -> pd.DataFrame:
+    """
+    Evalúa cada estadía (racha de registros del mismo vehículo en la misma geocerca
+    operacional, desde su primer hasta su último registro) de al menos 2 registros y
+    DURACION_MIN_ESTADIA_MIN minutos contra la línea base de su geocerca:
+
+    - Detención Prolongada: supera media + 2σ y el tiempo detenido (tramos entre
+      registros que parten con velocidad < VELOCIDAD_DETENIDO_KMH) supera 1,5 × media.
+      Severidad Alta si además supera 1,5 × (media + 2σ).
+    - Velocidad Anómala: supera media + 2σ, velocidad promedio < 1 km/h y duración
+      mayor a 1,2 × media.
+
+    Sin columna de velocidad, toda la estadía cuenta como tiempo detenido.
+    La línea base se cruza por código de geocerca y el tiempo detenido se suma por
+    racha sobre las diferencias de tiempo enmascaradas, sin recorrer filas.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_DETENCIONES)
+
+    veh_codigos, vehiculos = pd.factorize(df["Nombre del Vehículo"], sort=True)
+    geo_codigos, geocercas = _codigos_geocerca(df[columna_geocerca])
+    etiquetas = np.asarray(geocercas, dtype=object)
+    # Las geocercas no operacionales cortan la estadía igual que un registro en viaje
+    operacional = np.append(np.isin(etiquetas, list(geocercas_operacionales)), False)
+    geo_codigos = np.where(operacional[geo_codigos], geo_codigos, -1)
+
+    tiempos = df["Tiempo de evento"].to_numpy()
+    orden = np.lexsort((tiempos, veh_codigos))
+    veh_codigos, geo_codigos, tiempos = veh_codigos[orden], geo_codigos[orden], tiempos[orden]
+    velocidad_disponible = "Velocidad [km/h]" in df.columns
+    # Celdas de velocidad no numéricas quedan como NaN (igual que en `detectar_detenciones`)
+    velocidad = (pd.to_numeric(df["Velocidad [km/h]"], errors="coerce").to_numpy(dtype=float)[orden]
+                 if velocidad_disponible else np.zeros(len(orden)))
+
+    n = len(orden)
+    inicio_racha = np.ones(n, dtype=bool)
+    inicio_racha[1:] = (veh_codigos[1:] != veh_codigos[:-1]) | (geo_codigos[1:] != geo_codigos[:-1])
+    rachas = np.flatnonzero(inicio_racha)
+
+    # Segundos detenido por registro: hasta el registro siguiente de la misma racha
+    tramo_s = np.zeros(n)
+    tramo_s[:-1] = (tiempos[1:] - tiempos[:-1]) / np.timedelta64(1, "s")
+    detenido_s = np.where((velocidad < VELOCIDAD_DETENIDO_KMH) & np.append(~inicio_racha[1:], False), tramo_s, 0.0)
+    suma_detenido = np.add.reduceat(detenido_s, rachas) / 60
+    suma_velocidad = np.add.reduceat(velocidad, rachas)
+
+    fines = np.append(rachas[1:], n) - 1
+    registros = fines - rachas + 1
+    duracion_total_min = (tiempos[fines] - tiempos[rachas]) / np.timedelta64(1, "s") / 60
+    geo_racha = geo_codigos[rachas]
+    evaluar = (geo_racha != -1) & (registros >= 2) & (duracion_total_min >= DURACION_MIN_ESTADIA_MIN)
+    rachas, fines, geo_racha = rachas[evaluar], fines[evaluar], geo_racha[evaluar]
+    duracion_total_min = duracion_total_min[evaluar]
+    if velocidad_disponible:
+        velocidad_promedio = suma_velocidad[evaluar] / registros[evaluar]
+        duracion_detenido_min = suma_detenido[evaluar]
+    else:
+        velocidad_promedio = np.zeros(len(rachas))
+        duracion_detenido_min = duracion_total_min
+
+    # Línea base por código de geocerca (valores por defecto si la geocerca no tiene transiciones)
+    en_base = np.asarray(pd.Index(etiquetas).isin(lineas_base.index))
+    normal_min = np.where(en_base, lineas_base["mean"].reindex(etiquetas).to_numpy() / 60,
+                          UMBRAL_NORMAL_DEFECTO_MIN)[geo_racha]
+    anomalo_min = np.where(en_base, lineas_base["umbral_anomalo"].reindex(etiquetas).to_numpy() / 60,
+                           UMBRAL_ANOMALO_DEFECTO_MIN)[geo_racha]
+
+    supera = duracion_total_min > anomalo_min
+    prolongada = supera & (duracion_detenido_min > normal_min * 1.5)
+    lenta = supera & ~prolongada & (velocidad_promedio < 1) & (duracion_total_min > normal_min * 1.2)
+    anomalas = prolongada | lenta
+    if not anomalas.any():
+        return pd.DataFrame(columns=COLUMNAS_DETENCIONES)
+
+    alta = prolongada & (duracion_total_min > anomalo_min * 1.5)
+    return pd.DataFrame({
+        "Nombre del Vehículo": vehiculos[veh_codigos[rachas[anomalas]]],
+        "Geocerca": etiquetas[geo_racha[anomalas]],
+        "Tiempo_inicio": tiempos[rachas[anomalas]],
+        "Tiempo_fin": tiempos[fines[anomalas]],
+        "Duracion_total_min": _redondear(duracion_total_min[anomalas], 1),
+        "Duracion_detenido_min": _redondear(duracion_detenido_min[anomalas], 1),
+        "Velocidad_promedio": _redondear(velocidad_promedio[anomalas], 2),
+        "Tipo_anomalia": np.where(prolongada, "Detención Prolongada", "Velocidad Anómala")[anomalas],
+        "Severidad": np.where(alta, "Alta", "Media")[anomalas],
+        "Umbral_normal_min": _redondear(normal_min[anomalas], 1),
+        "Exceso_min": _redondear((duracion_total_min - normal_min)[anomalas], 1),
+    })
+
+
+# ─────────────────────────────────────────────────────────────
+# 11 | Cubo de conteos de transiciones (roll-ups sin volver a las filas)
+# ─────────────────────────────────────────────────────────────
+def construir_cubo_conteos(trans: pd.DataFrame, procesos: tuple | None = PROCESOS_PRODUCCION) -> pd.DataFrame:
+    """
+    Cubo de conteos de transiciones: una fila por combinación presente de
+    DIMENSIONES_CUBO (vehículo, origen, destino, proceso, fecha de turno, turno y
+    hora de entrada) con su Cantidad. Descripcion_Turno acompaña cada celda
+    (depende solo de la fecha de turno y el turno).
+
+    Es la única pasada sobre las transiciones; matrices, gráficos y resúmenes se
+    obtienen con `enrollar_cubo` y `dias_activos` sobre unas pocas filas.
+    """
+    if procesos is not None and not trans.empty:
+        trans = trans[trans["Proceso"].isin(procesos)]
+    if trans.empty:
+        return pd.DataFrame(columns=DIMENSIONES_CUBO + ["Descripcion_Turno", "Cantidad"])
+
+    claves = trans[DIMENSIONES_CUBO[:-1] + ["Descripcion_Turno"]].assign(Hora=trans["Tiempo_entrada"].dt.hour)
+    cubo = claves.groupby(DIMENSIONES_CUBO + ["Descripcion_Turno"], sort=True, observed=True, dropna=False).size()
+    return cubo.rename("Cantidad").reset_index()
+
+
+def _cortar(cubo: pd.DataFrame, cortes: dict | None) -> pd.DataFrame:
+    """Celdas del cubo con los valores indicados en `cortes` (dimensión → valor)."""
+    if not cortes or cubo.empty:
+        return cubo
+    mascara = np.ones(len(cubo), dtype=bool)
+    for dimension, valor in cortes.items():
+        mascara &= (cubo[dimension] == valor).to_numpy()
+    return cubo[mascara]
+
+
+def enrollar_cubo(cubo: pd.DataFrame, filas: list[str], columnas: list[str] | None = None,
+                  cortes: dict | None = None) -> pd.DataFrame | pd.Series:
+    """
+    Roll-up del cubo: suma de Cantidad por `filas` (ordenadas). Con `columnas`
+    devuelve la tabla cruzada (0 en las combinaciones ausentes); sin ellas, una
+    Serie. `cortes` restringe antes a un valor por dimensión, p. ej. un vehículo.
+    """
+    celdas = _cortar(cubo, cortes)
+    totales = celdas.groupby(filas + (columnas or []), sort=True, observed=True)["Cantidad"].sum()
+    if columnas:
+        return totales.unstack(columnas, fill_value=0)
+    return totales
+
+
+def dias_activos(cubo: pd.DataFrame, por: str | None = None, cortes: dict | None = None) -> int | pd.Series:
+    """Fechas de turno distintas con conteos (en total o por la dimensión `por`)."""
+    celdas = _cortar(cubo, cortes)
+    if por is None:
+        return int(celdas["Fecha_Turno"].nunique())
+    return celdas.groupby(por, sort=True, observed=True)["Fecha_Turno"].nunique()
+
+
+def tabla_por_proceso(cubo: pd.DataFrame, filas: list[str], etiquetas: dict[str, str],
+                      cortes: dict | None = None) -> pd.DataFrame:
+    """
+    Conteos por `filas` con una columna por proceso (renombrada según `etiquetas`,
+    en ese orden, solo los presentes) y la columna Total.
+    """
+    tabla = enrollar_cubo(cubo, filas, ["Proceso"], cortes)
+    presentes = [proceso for proceso in etiquetas if proceso in tabla.columns]
+    tabla = tabla[presentes]
+    if presentes:
+        tabla = tabla.assign(Total=tabla.sum(axis=1))
+    tabla.columns.name = None
+    return tabla.reset_index().rename(columns=etiquetas)
@@ -0,0 +1,210 @@
+"""
+Reporte Excel bajo demanda - T-Metal
+Genera el reporte de los dashboards solo cuando se pide, en un hilo de fondo y
+con xlsxwriter en modo `constant_memory`: cada fila se escribe al archivo
+temporal apenas se completa, por lo que la memoria no crece con el tamaño del
+reporte. La UI consulta el avance (`TrabajoReporte.progreso`) sin bloquearse.
+
+Se usa un hilo (no un proceso) para no copiar las tablas ya calculadas; el
+trabajo conserva referencias de solo lectura a ellas mientras escribe.
+"""
+
+import os
+import tempfile
+import threading
+import weakref
+from time import perf_counter
+from typing import Callable, Hashable
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from instrumentacion import Instrumentacion
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+FILAS_POR_BLOQUE = int(os.getenv("TMETAL_EXCEL_FILAS_BLOQUE", "5000"))  # Filas convertidas por paso
+MAX_FILAS_HOJA = 1_048_575  # Límite de Excel sin contar el encabezado
+FORMATO_FECHA_HORA = "yyyy-mm-dd hh:mm:ss"
+FORMATO_FECHA = "yyyy-mm-dd"
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+_EPOCA_EXCEL = np.datetime64("1899-12-30")
+
+
+class ReporteCancelado(Exception):
+    """El trabajo se descartó antes de terminar."""
+
+
+Hojas = dict[str, "pd.DataFrame | Callable[[], pd.DataFrame]"]
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Escritura por filas (constant_memory)
+# ─────────────────────────────────────────────────────────────
+def _columna_para_excel(serie: pd.Series) -> tuple[np.ndarray, str, bool]:
+    """
+    Convierte una columna a valores listos para xlsxwriter, vectorizado:
+    (valores con None en los faltantes, tipo de escritura, usa formato de fecha).
+    Fechas → número de serie de Excel; numéricas → float; texto → `write_string`;
+    el resto → `write` genérico.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        fechas = serie.dt.tz_localize(None) if serie.dt.tz is not None else serie
+        dias = (fechas.to_numpy(dtype="datetime64[ns]") - _EPOCA_EXCEL) / np.timedelta64(1, "D")
+        return np.where(np.isnan(dias), None, dias), "numero", True
+    if pd.api.types.is_bool_dtype(serie):
+        valores = serie.to_numpy(dtype=object)
+        return np.where(serie.isna().to_numpy(), None, valores), "booleano", False
+    if pd.api.types.is_numeric_dtype(serie):
+        numeros = serie.to_numpy(dtype=float, na_value=np.nan)
+        return np.where(np.isfinite(numeros), numeros, None).astype(object), "numero", False
+    valores = np.where(serie.isna().to_numpy(), None, serie.to_numpy(dtype=object))
+    if pd.api.types.infer_dtype(serie, skipna=True) == "string":
+        return valores, "texto", False
+    return valores, "generico", False
+
+
+def escribir_hojas(ruta: str, hojas: Hojas, al_avanzar: Callable[[int, int], None] | None = None,
+                   filas_por_bloque: int = FILAS_POR_BLOQUE) -> dict[str, int]:
+    """
+    Escribe `hojas` (nombre → DataFrame, o función que lo construye) en `ruta`.
+    Las hojas vacías se omiten; las que superan el límite de Excel continúan en
+    "Nombre (2)", "Nombre (3)", ... `al_avanzar(filas_escritas, filas_totales)` se
+    llama después de cada bloque. Devuelve las filas escritas por hoja.
+    """
+    tablas = {nombre: (tabla() if callable(tabla) else tabla) for nombre, tabla in hojas.items()}
+    tablas = {nombre: tabla for nombre, tabla in tablas.items() if tabla is not None and not tabla.empty}
+    totales = sum(len(tabla) for tabla in tablas.values())
+    escritas = 0
+    if al_avanzar:
+        al_avanzar(0, totales)
+
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True, "default_date_format": FORMATO_FECHA,
+                                       "strings_to_formulas": False, "strings_to_urls": False})
+    encabezado = libro.add_format({"bold": True, "border": 1})
+    fecha_hora = libro.add_format({"num_format": FORMATO_FECHA_HORA})
+    resumen = {}
+    try:
+        for nombre, tabla in tablas.items():
+            for parte, desde in enumerate(range(0, len(tabla), MAX_FILAS_HOJA), start=1):
+                titulo = nombre if parte == 1 else f"{nombre[:26]} ({parte})"
+                hoja = libro.add_worksheet(titulo)
+
+                def escribir_generico(fila, columna, valor, formato, hoja=hoja):
+                    try:
+                        hoja.write(fila, columna, valor, formato)
+                    except TypeError:  # Listas, tuplas y otros objetos: como texto
+                        hoja.write_string(fila, columna, str(valor), formato)
+
+                hoja.write_row(0, 0, [str(c) for c in tabla.columns], encabezado)
+                hasta = min(desde + MAX_FILAS_HOJA, len(tabla))
+
+                for inicio in range(desde, hasta, filas_por_bloque):
+                    bloque = tabla.iloc[inicio:min(inicio + filas_por_bloque, hasta)]
+                    escritores = []
+                    for j in range(bloque.shape[1]):
+                        valores, tipo, es_fecha = _columna_para_excel(bloque.iloc[:, j])
+                        escribir = {"numero": hoja.write_number, "booleano": hoja.write_boolean,
+                                    "texto": hoja.write_string, "generico": escribir_generico}[tipo]
+                        escritores.append((j, valores.tolist(), escribir, fecha_hora if es_fecha else None))
+
+                    fila_excel = inicio - desde + 1
+                    for i in range(len(bloque)):
+                        for j, valores, escribir, formato in escritores:
+                            valor = valores[i]
+                            if valor is not None:
+                                escribir(fila_excel + i, j, valor, formato)
+
+                    escritas += len(bloque)
+                    if al_avanzar:
+                        al_avanzar(escritas, totales)
+                resumen[titulo] = hasta - desde
+    finally:
+        libro.close()
+    return resumen
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Trabajo en segundo plano
+# ─────────────────────────────────────────────────────────────
+class TrabajoReporte:
+    """
+    Genera un reporte en un hilo de fondo sobre un archivo temporal.
+    `clave` identifica los datos/filtros con que se pidió (la UI descarta el
+    trabajo si cambian). El archivo se elimina con `descartar()` o cuando el
+    objeto deja de usarse. Con `instrumentacion`, el reporte terminado queda
+    registrado como etapa "exportacion" (tiempo y filas, sin memoria).
+    """
+
+    def __init__(self, hojas: Hojas, clave: Hashable = None, filas_por_bloque: int = FILAS_POR_BLOQUE,
+                 instrumentacion: Instrumentacion | None = None):
+        self.clave = clave
+        self.filas_escritas = 0
+        self.filas_totales = 0
+        self.hojas_escritas: dict[str, int] = {}
+        self.error: BaseException | None = None
+        self.segundos: float | None = None
+        self._instrumentacion = instrumentacion
+        self._cancelado = threading.Event()
+        descriptor, self.ruta = tempfile.mkstemp(prefix="tmetal_reporte_", suffix=".xlsx")
+        os.close(descriptor)
+        self._limpieza = weakref.finalize(self, _eliminar, self.ruta)
+        self._hilo = threading.Thread(target=self._ejecutar, args=(hojas, filas_por_bloque),
+                                      name="reporte-excel", daemon=True)
+        self._hilo.start()
+
+    def _ejecutar(self, hojas: Hojas, filas_por_bloque: int):
+        inicio = perf_counter()
+        try:
+            self.hojas_escritas = escribir_hojas(self.ruta, hojas, self._al_avanzar, filas_por_bloque)
+        except BaseException as error:  # Se informa en la UI
+            self.error = error
+        self.segundos = perf_counter() - inicio
+        if self._cancelado.is_set():
+            _eliminar(self.ruta)
+        elif self._instrumentacion is not None:
+            self._instrumentacion.registrar("exportacion", self.segundos, self.filas_totales,
+                                            sum(self.hojas_escritas.values()), nivel=0,
+                                            origen="error" if self.error is not None else "calculada")
+
+    def _al_avanzar(self, escritas: int, totales: int):
+        if self._cancelado.is_set():
+            raise ReporteCancelado()
+        self.filas_escritas, self.filas_totales = escritas, totales
+
+    @property
+    def listo(self) -> bool:
+        return not self._hilo.is_alive()
+
+    @property
+    def progreso(self) -> float:
+        """Fracción de filas escritas (0 a 1)."""
+        if self.listo and self.error is None:
+            return 1.0
+        return self.filas_escritas / self.filas_totales if self.filas_totales else 0.0
+
+    def esperar(self, timeout: float | None = None) -> bool:
+        """Espera hasta `timeout` segundos; devuelve si el trabajo terminó."""
+        self._hilo.join(timeout)
+        return self.listo
+
+    def leer(self) -> bytes:
+        """Contenido del reporte terminado."""
+        if not self.listo or self.error is not None:
+            raise RuntimeError("El reporte no está disponible")
+        with open(self.ruta, "rb") as archivo:
+            return archivo.read()
+
+    def descartar(self):
+        """Detiene la escritura en el próximo bloque y elimina el archivo temporal."""
+        self._cancelado.set()
+        self._limpieza()
+
+
+def _eliminar(ruta: str):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
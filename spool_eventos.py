@@ -0,0 +1,91 @@
+"""
+Spool durable de eventos GPS - T-Metal
+Cola en disco (SQLite en modo WAL) entre el webhook y Supabase: el webhook
+escribe cada evento a velocidad de disco local y un drenador en segundo plano
+los reenvía en lotes. Si Supabase está lento o caído los eventos esperan en el
+archivo y sobreviven a un reinicio del servicio.
+
+Los lotes que Supabase rechaza de forma definitiva (errores 4xx distintos de
+408/429) pasan a la tabla `rechazados` para revisión en lugar de reintentarse.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+RUTA_SPOOL = os.getenv("WEBHOOK_SPOOL_PATH", "spool_eventos.db")
+SPOOL_MAX_EVENTOS = int(os.getenv("WEBHOOK_SPOOL_MAX", "1000000"))  # Sobre esto el webhook responde 429
+
+
+class SpoolLleno(Exception):
+    """El spool alcanzó SPOOL_MAX_EVENTOS: el emisor debe reintentar más tarde."""
+
+
+class SpoolEventos:
+    """Cola FIFO persistente de eventos (un evento JSON por fila)."""
+
+    def __init__(self, ruta: str = RUTA_SPOOL, max_eventos: int = SPOOL_MAX_EVENTOS):
+        self.ruta = ruta
+        self.max_eventos = max_eventos
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        # WAL + synchronous=NORMAL: escrituras sin fsync por transacción, el archivo sigue consistente
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS eventos (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)"
+        )
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS rechazados ("
+            "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, motivo TEXT, "
+            "fecha TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._pendientes = self._conexion.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+
+    def agregar(self, eventos: list[dict]) -> None:
+        """Agrega eventos al final de la cola; lanza SpoolLleno si se supera el máximo."""
+        with self._lock:
+            if self._pendientes + len(eventos) > self.max_eventos:
+                raise SpoolLleno(f"Spool lleno ({self._pendientes} eventos pendientes)")
+            with self._conexion:
+                self._conexion.execute("BEGIN")
+                self._conexion.executemany(
+                    "INSERT INTO eventos (payload) VALUES (?)", [(json.dumps(e),) for e in eventos]
+                )
+            self._pendientes += len(eventos)
+
+    def leer_lote(self, n: int) -> tuple[int, list[dict]]:
+        """Devuelve (último id, eventos) con los `n` eventos más antiguos, sin quitarlos de la cola."""
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT id, payload FROM eventos ORDER BY id LIMIT ?", (n,)
+            ).fetchall()
+        if not filas:
+            return 0, []
+        return filas[-1][0], [json.loads(payload) for _, payload in filas]
+
+    def confirmar(self, ultimo_id: int, motivo_rechazo: str | None = None) -> None:
+        """
+        Quita de la cola los eventos hasta `ultimo_id` (ya enviados). Con `motivo_rechazo`
+        se guardan antes en la tabla `rechazados`.
+        """
+        with self._lock, self._conexion:
+            self._conexion.execute("BEGIN")
+            if motivo_rechazo is not None:
+                self._conexion.execute(
+                    "INSERT INTO rechazados (id, payload, motivo) SELECT id, payload, ? FROM eventos WHERE id <= ?",
+                    (motivo_rechazo, ultimo_id),
+                )
+            borrados = self._conexion.execute("DELETE FROM eventos WHERE id <= ?", (ultimo_id,)).rowcount
+            self._pendientes -= borrados
+
+    def pendientes(self) -> int:
+        return self._pendientes
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conexion.close()
@@ -0,0 +1,115 @@
+"""
+Script de pruebas automatizadas para app7tport.py
+Ejecuta pruebas unitarias de las funciones propias del dashboard portuario
+"""
+
+import pandas as pd
+import sys
+import os
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Importar funciones de app7tport.py
+from app7tport import consolidar_estadias_internas, poblar_dominios, preparar_datos, procesar_transiciones
+from ingesta_columnar import compactar_exportacion, leer_csv_geoaustral
+from test_motor_vectorizado import generar_flota
+
+# Geocercas de la flota sintética renombradas a geocercas del puerto (específicas, otras y excluidas)
+GEOCERCAS_PUERTO = {
+    "Stock Central - 30 km hr": "Puerto Angamos", "Módulo 1": "TGN", "Módulo 2": "Oxiquim",
+    "Pila Rom 1": "Zona Norte", "Botadero Norte": "Ciudad Mejillones", "Casino": "Ruta - Afta Mejillones",
+}
+
+
+def crear_transiciones(procesos: list[str], vehiculo: str = "Camión_001") -> pd.DataFrame:
+    """Transiciones de 5 minutos separadas por 10 minutos con los procesos indicados."""
+    t0 = pd.Timestamp("2025-01-15 08:00:00")
+    entradas = [t0 + pd.Timedelta(minutes=10 * i) for i in range(len(procesos))]
+    return pd.DataFrame({
+        "Nombre del Vehículo": vehiculo,
+        "Origen": "Ciudad Mejillones",
+        "Destino": "TGN",
+        "Tiempo_entrada": entradas,
+        "Tiempo_salida": [t + pd.Timedelta(minutes=5) for t in entradas],
+        "Duracion_s": 300.0,
+        "Proceso": procesos,
+    })
+
+
+def test_consolidar_estadias_internas():
+    """Prueba la consolidación de estadías internas con el viaje válido anterior"""
+    print("🧪 Probando función consolidar_estadias_internas()...")
+
+    procesos = ["estadia_interna", "viaje_especifico", "estadia_interna", "estadia_interna",
+                "otro", "estadia_interna", "viaje_parcial", "estadia_interna"]
+    df = pd.concat([
+        crear_transiciones(procesos),
+        crear_transiciones(["viaje_parcial", "otro"], vehiculo="Camión_002"),
+    ], ignore_index=True)
+
+    resultado = consolidar_estadias_internas(df.sample(frac=1, random_state=0))
+
+    camion_1 = resultado[resultado["Nombre del Vehículo"] == "Camión_001"]
+    # La estadía inicial no tiene viaje anterior y se mantiene
+    assert camion_1["Proceso"].tolist() == ["estadia_interna", "viaje_especifico", "otro", "viaje_parcial"]
+
+    # viaje_especifico (08:10) absorbe las estadías de 08:20, 08:30 y 08:50 (salta "otro")
+    viaje = camion_1.iloc[1]
+    assert viaje["Tiempo_salida"] == pd.Timestamp("2025-01-15 08:55:00"), viaje
+    assert viaje["Duracion_s"] == 45 * 60, viaje
+    assert viaje["Estadias_Consolidadas"] == 3, viaje
+
+    # viaje_parcial (09:00) absorbe la última estadía
+    assert camion_1.iloc[3]["Estadias_Consolidadas"] == 1
+    assert camion_1.iloc[3]["Duracion_s"] == 15 * 60
+
+    # Las estadías no cruzan de vehículo y los demás registros no cambian
+    camion_2 = resultado[resultado["Nombre del Vehículo"] == "Camión_002"]
+    assert camion_2["Duracion_s"].tolist() == [300.0, 300.0]
+    assert camion_2["Estadias_Consolidadas"].isna().all()
+
+    # Sin estadías consolidables no se agrega la columna
+    sin_cambios = consolidar_estadias_internas(crear_transiciones(["viaje_parcial", "otro"]))
+    assert "Estadias_Consolidadas" not in sin_cambios.columns
+    assert len(sin_cambios) == 2
+
+    print("✅ Función consolidar_estadias_internas() - OK")
+
+
+def test_modo_archivo_grande():
+    """Prueba que transiciones, viajes y clasificación no cambian al leer la exportación compactada"""
+    print("🧪 Probando modo archivo grande (lectura compactada)...")
+
+    flota = generar_flota(n_vehiculos=4, n_registros=400, semilla=3)
+    flota["Geocercas"] = flota["Geocercas"].replace(GEOCERCAS_PUERTO)
+    # La exportación viene ordenada por tiempo, con los vehículos intercalados
+    contenido = flota.sort_values("Tiempo de evento", kind="stable").to_csv(index=False).encode("utf-8")
+
+    completo = preparar_datos(leer_csv_geoaustral(contenido))
+    compacto = preparar_datos(compactar_exportacion(contenido, filas_por_bloque=97))
+    assert len(compacto) < len(completo), "La compactación no redujo los registros"
+
+    poblar_dominios(completo)
+    trans, viajes = procesar_transiciones(completo)
+    trans_compacto, viajes_compacto = procesar_transiciones(compacto)
+
+    assert {"viaje_especifico", "viaje_parcial", "otro"} <= set(trans["Proceso"]), set(trans["Proceso"])
+    pd.testing.assert_frame_equal(trans_compacto, trans)
+    pd.testing.assert_frame_equal(viajes_compacto, viajes)
+
+    print("✅ Modo archivo grande - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de app7tport.py")
+    print("=" * 50)
+    test_consolidar_estadias_internas()
+    test_modo_archivo_grande()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Script de pruebas automatizadas para banco_rendimiento.py
+Verifica la medición de una etapa, la cadena de etapas por dashboard, la
+omisión de etapas lentas y el guardado/comparación de resultados
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from banco_rendimiento import (
+    cargar_resultados,
+    comparar_resultados,
+    contar_filas,
+    ejecutar_banco,
+    guardar_resultados,
+    medir,
+)
+
+
+def test_medir():
+    """Prueba el resultado, el tiempo y el pico de memoria de una etapa"""
+    print("🧪 Probando función medir()...")
+
+    llamadas = []
+
+    def etapa(n):
+        llamadas.append(n)
+        print("diagnóstico que no debe aparecer")
+        return pd.DataFrame({"x": np.zeros(n)})
+
+    resultado, segundos, pico = medir(etapa, 100_000, repeticiones=2)
+    assert len(resultado) == 100_000 and segundos > 0 and len(llamadas) == 3
+    assert pico >= 100_000 * 8, pico
+    _, _, sin_memoria = medir(etapa, 10, memoria=False)
+    assert sin_memoria is None
+
+    assert contar_filas(resultado) == 100_000 and contar_filas((resultado, resultado.head(5))) == 100_005
+    assert contar_filas(None) == 0
+
+    print("✅ Función medir() - OK")
+
+
+def test_ejecutar_banco():
+    """Prueba la cadena de etapas de cada dashboard y la omisión de etapas lentas"""
+    print("🧪 Probando función ejecutar_banco()...")
+
+    resultados = ejecutar_banco(["app6_mejorado", "app7tport"], [3000, 6000], vehiculos=4)
+    pequeno = resultados[resultados["tamano"] == 3000]
+    assert (pequeno["estado"] == "ok").all(), pequeno[pequeno["estado"] != "ok"]
+
+    etapas = pequeno.groupby("app")["etapa"].apply(list)
+    assert etapas["app6_mejorado"] == [
+        "lectura", "preparar_datos", "poblar_dominios", "extraer_transiciones", "extraer_tiempos_viaje",
+        "clasificar_proceso_con_secuencia", "analizar_detenciones_anomalas", "analizar_zonas_no_mapeadas",
+    ]
+    assert "consolidar_estadias_internas" in etapas["app7tport"]
+    assert "analizar_detenciones_anomalas" not in etapas["app7tport"]
+
+    # La exportación sintética ejercita todas las etapas
+    salidas = pequeno.set_index(["app", "etapa"])["filas_salida"]
+    for app in ("app6_mejorado", "app7tport"):
+        for etapa in ("lectura", "extraer_transiciones", "extraer_tiempos_viaje", "analizar_zonas_no_mapeadas"):
+            assert salidas[(app, etapa)] > 0, (app, etapa)
+    assert abs(pequeno["registros"].iloc[0] - 3000) < 300
+    assert pequeno["pico_mb"].notna().all() and pequeno["commit"].iloc[0]
+
+    # Con un límite de 0 s todo se omite en el tamaño siguiente
+    omitidas = ejecutar_banco(["app6_mejorado"], [2000, 3000], vehiculos=4, memoria=False, limite_s=0)
+    segundo = omitidas[omitidas["tamano"] == 3000]
+    assert set(segundo["estado"]) <= {"omitida", "sin entrada"} and (segundo["estado"] == "omitida").any()
+    assert omitidas.loc[omitidas["tamano"] == 2000, "pico_mb"].isna().all()
+
+    print("✅ Función ejecutar_banco() - OK")
+
+
+def test_guardar_y_comparar():
+    """Prueba el guardado en JSON lines y la comparación entre dos corridas"""
+    print("🧪 Probando guardado y comparación de resultados...")
+
+    resultados = ejecutar_banco(["app5", "app6_mejorado"], [2000, 3000], vehiculos=4, memoria=False)
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = guardar_resultados(resultados, directorio)
+        assert ruta.endswith(".jsonl") and os.path.dirname(ruta) == directorio
+        leidos = cargar_resultados(ruta)
+    assert len(leidos) == len(resultados)
+    assert np.allclose(leidos["segundos"], resultados["segundos"], equal_nan=True)
+
+    actual = leidos.copy()
+    lenta = (actual["etapa"] == "extraer_transiciones") & (actual["app"] == "app6_mejorado")
+    actual.loc[lenta, "segundos"] *= 2
+    comparacion = comparar_resultados(leidos, actual)
+    assert len(comparacion) == (leidos["estado"] == "ok").sum()
+    assert (comparacion.loc[comparacion["etapa"] == "extraer_transiciones", "razon_tiempo"]
+            .tolist() == [1.0, 1.0, 2.0, 2.0])
+    # Orden del pipeline dentro de cada app y tamaño
+    primeras = comparacion.groupby(["app", "tamano"])["etapa"].first()
+    assert (primeras == "lectura").all()
+
+    print("✅ Guardado y comparación - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de banco_rendimiento.py")
+    print("=" * 50)
+    test_medir()
+    test_ejecutar_banco()
+    test_guardar_y_comparar()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Script de pruebas automatizadas para cache_pipeline.py
+Ejecuta pruebas de la caché LRU de etapas con presupuesto de memoria
+"""
+
+import pandas as pd
+import numpy as np
+import sys
+import os
+import threading
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_pipeline import CachePipeline, estimar_bytes, huella_contenido
+
+
+def crear_tabla(filas: int) -> pd.DataFrame:
+    return pd.DataFrame({"valor": np.arange(filas, dtype=np.int64)})
+
+
+def test_huella_contenido():
+    """La huella depende solo de los bytes del archivo"""
+    print("🧪 Probando función huella_contenido()...")
+
+    assert huella_contenido(b"a;b\n1;2\n") == huella_contenido(b"a;b\n1;2\n")
+    assert huella_contenido(b"a;b\n1;2\n") != huella_contenido(b"a;b\n1;3\n")
+    assert len(huella_contenido(b"")) == 32
+
+    print("✅ Función huella_contenido() - OK")
+
+
+def test_memoizacion_por_etapa():
+    """Cada etapa se calcula una vez por huella y parámetros"""
+    print("🧪 Probando memoización de etapas...")
+
+    cache = CachePipeline(presupuesto_mb=10)
+    llamadas = []
+
+    def preparar(n: int) -> pd.DataFrame:
+        llamadas.append(n)
+        return crear_tabla(n)
+
+    etapa = cache.etapas("huella-1", parametros=(60,))
+    primero = etapa("datos", preparar, 100)
+    segundo = etapa("datos", preparar, 100)
+    assert primero is segundo, "Error: la segunda llamada debe reutilizar el resultado"
+    assert llamadas == [100]
+
+    # Otro archivo u otros parámetros son otra entrada
+    cache.etapas("huella-2", parametros=(60,))("datos", preparar, 100)
+    cache.etapas("huella-1", parametros=(30,))("datos", preparar, 100)
+    assert llamadas == [100, 100, 100]
+    assert cache.estadisticas()["aciertos"] == 1
+    assert cache.estadisticas()["fallos"] == 3
+
+    print("✅ Memoización de etapas - OK")
+
+
+def test_presupuesto_y_lru():
+    """Las entradas menos usadas se expulsan al superar el presupuesto"""
+    print("🧪 Probando expulsión LRU...")
+
+    tamano = estimar_bytes(crear_tabla(10_000))
+    cache = CachePipeline(presupuesto_mb=2.5 * tamano / 1024 / 1024)  # caben 2 tablas
+
+    cache.guardar("a", crear_tabla(10_000))
+    cache.guardar("b", crear_tabla(10_000))
+    cache.obtener("a")  # "a" pasa a ser la más reciente
+    cache.guardar("c", crear_tabla(10_000))
+
+    assert "a" in cache and "c" in cache, "Error: se expulsó una entrada reciente"
+    assert "b" not in cache, "Error: no se expulsó la entrada menos usada"
+    assert cache.estadisticas()["expulsiones"] == 1
+
+    # Un resultado mayor que el presupuesto no se guarda ni vacía la caché
+    cache.guardar("enorme", crear_tabla(100_000))
+    assert "enorme" not in cache and len(cache) == 2
+
+    print("✅ Expulsión LRU - OK")
+
+
+def test_sesiones_concurrentes():
+    """Varias sesiones (hilos) comparten la misma instancia sin corromperla"""
+    print("🧪 Probando acceso concurrente...")
+
+    cache = CachePipeline(presupuesto_mb=1)
+    errores = []
+
+    def sesion(semilla: int):
+        try:
+            for i in range(200):
+                clave = f"huella-{(semilla + i) % 20}"
+                tabla = cache.obtener_o_calcular(clave, crear_tabla, 1_000)
+                assert len(tabla) == 1_000
+        except Exception as e:  # pragma: no cover - se informa abajo
+            errores.append(e)
+
+    hilos = [threading.Thread(target=sesion, args=(s,)) for s in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert not errores, errores
+    estadisticas = cache.estadisticas()
+    assert estadisticas["uso_mb"] <= estadisticas["presupuesto_mb"]
+
+    print("✅ Acceso concurrente - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de cache_pipeline.py")
+    print("=" * 50)
+    test_huella_contenido()
+    test_memoizacion_por_etapa()
+    test_presupuesto_y_lru()
+    test_sesiones_concurrentes()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
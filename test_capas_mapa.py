@@ -0,0 +1,216 @@
+"""
+Script de pruebas automatizadas para capas_mapa.py
+Verifica los centroides de geocercas, la grilla de densidad, el tope de elementos del mapa
+y la simplificación de recorridos GPS
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+import os
+import time
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from capas_mapa import (
+    centroides_geocercas,
+    crear_mapa_calor,
+    grilla_densidad,
+    mapa_recorrido,
+    puntos_clave,
+    simplificar_trayectoria,
+    tolerancia_por_zoom,
+)
+
+
+def zonas_aleatorias(n: int, semilla: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    agrupadas = rng.integers(1, 4, n)
+    return pd.DataFrame({
+        "Nombre del Vehículo": [f"Camión_{i % 7:03d}" for i in range(n)],
+        "Latitud_Centro": rng.uniform(-23.3, -22.9, n),
+        "Longitud_Centro": rng.uniform(-70.6, -70.2, n),
+        "Duracion_Minutos": rng.uniform(10, 300, n),
+        "Registros": rng.integers(3, 500, n),
+        "Radio_Aprox_m": rng.uniform(1, 40, n),
+        "Velocidad_Promedio": rng.uniform(0, 5, n),
+        "Zonas_Agrupadas": agrupadas,
+        "Vehiculos_Involucrados": [["Camión_001"] * k for k in agrupadas],
+    })
+
+
+def recorrido_sintetico(n: int, semilla: int = 0) -> pd.DataFrame:
+    """Recorrido de un camión cada 10 s: tramos rectos con ruido de ~1 m, detenciones y geocercas"""
+    rng = np.random.default_rng(semilla)
+    tramo = np.arange(n) // 400
+    rumbo = rng.uniform(0, 2 * np.pi, tramo.max() + 1)[tramo]
+    detenido = (tramo % 5 == 4) & (np.arange(n) % 400 < 120)
+    velocidad = np.where(detenido, 0.0, rng.uniform(25, 40, n))
+    paso = velocidad / 3.6 * 10 / 111_320
+    lat = -23.1 + np.cumsum(paso * np.sin(rumbo)) + rng.normal(0, 1e-5, n)
+    lon = -70.4 + np.cumsum(paso * np.cos(rumbo)) + rng.normal(0, 1e-5, n)
+    geocerca = np.where(tramo % 5 == 4, np.array(["Stock Central", "Módulo 1"])[tramo % 2], "")
+    return pd.DataFrame({
+        "Tiempo de evento": pd.Timestamp("2025-01-15") + pd.to_timedelta(np.arange(n) * 10, unit="s"),
+        "Latitud": lat,
+        "Longitud": lon,
+        "Velocidad [km/h]": velocidad,
+        "Geocercas": np.where(geocerca == "", None, geocerca),
+    })
+
+
+def douglas_peucker_recursivo(x, y, i, j, tolerancia, mantener):
+    """Versión recursiva de referencia (distancia al segmento)"""
+    if j - i < 2:
+        return
+    dx, dy = x[j] - x[i], y[j] - y[i]
+    largo2 = dx * dx + dy * dy or 1.0
+    t = np.clip(((x[i + 1:j] - x[i]) * dx + (y[i + 1:j] - y[i]) * dy) / largo2, 0, 1)
+    distancia = np.hypot(x[i + 1:j] - x[i] - t * dx, y[i + 1:j] - y[i] - t * dy)
+    k = int(np.argmax(distancia))
+    if distancia[k] > tolerancia:
+        mantener[i + 1 + k] = True
+        douglas_peucker_recursivo(x, y, i, i + 1 + k, tolerancia, mantener)
+        douglas_peucker_recursivo(x, y, i + 1 + k, j, tolerancia, mantener)
+
+
+def test_simplificar_trayectoria():
+    """Prueba la paridad con Douglas–Peucker recursivo, la reducción de puntos y los puntos clave"""
+    print("🧪 Probando función simplificar_trayectoria()...")
+
+    # Paridad con la versión recursiva en metros planos
+    rng = np.random.default_rng(3)
+    lat = -23.1 + np.cumsum(rng.normal(0, 2e-4, 3000))
+    lon = -70.4 + np.cumsum(rng.normal(0, 2e-4, 3000))
+    metros = np.radians(1) * 6371000
+    x, y = lon * metros * np.cos(np.radians(lat.mean())), lat * metros
+    for tolerancia in (1.0, 15.0, 200.0):
+        referencia = np.zeros(3000, dtype=bool)
+        referencia[[0, -1]] = True
+        douglas_peucker_recursivo(x, y, 0, 2999, tolerancia, referencia)
+        assert np.array_equal(simplificar_trayectoria(lat, lon, tolerancia), referencia), tolerancia
+
+    # Una semana de un camión: más de 90% menos puntos en el zoom por defecto
+    df = recorrido_sintetico(60_000)
+    clave = puntos_clave(df)
+    tolerancia = tolerancia_por_zoom(15, df["Latitud"].mean())
+    inicio = time.perf_counter()
+    mantener = simplificar_trayectoria(df["Latitud"], df["Longitud"], tolerancia, clave)
+    reduccion = 1 - mantener.sum() / len(df)
+    print(f"   60.000 puntos → {mantener.sum()} vértices ({reduccion:.1%} menos, "
+          f"tolerancia {tolerancia:.1f} m) en {time.perf_counter() - inicio:.2f} s")
+    assert reduccion > 0.9, f"Reducción insuficiente: {reduccion:.1%}"
+    assert mantener[clave].all() and mantener[[0, -1]].all()
+
+    # Entradas/salidas de geocerca y bordes de detención están entre los puntos clave
+    geocerca = df["Geocercas"].fillna("")
+    entradas = np.flatnonzero((geocerca != geocerca.shift()).to_numpy()[1:]) + 1
+    detenido = (df["Velocidad [km/h]"] < 2).astype(int)
+    bordes = np.flatnonzero(detenido.diff().fillna(0).to_numpy() != 0)
+    assert clave[entradas].all() and clave[entradas - 1].all() and clave[bordes].all()
+
+    # Sin columna de velocidad se usa la velocidad entre registros
+    assert puntos_clave(df.drop(columns="Velocidad [km/h]"))[bordes].all()
+
+    # Más zoom, más detalle; casos borde
+    assert tolerancia_por_zoom(18, -23.1) < tolerancia < tolerancia_por_zoom(10, -23.1)
+    assert simplificar_trayectoria([-23.1, -23.2], [-70.4, -70.5], 5).all()
+    assert len(simplificar_trayectoria([], [], 5)) == 0
+
+    mapa, detalle = mapa_recorrido(df, 15, max_elementos=50)
+    assert detalle["registros"] == 60_000 and detalle["vertices"] == mantener.sum()
+    assert mapa.get_root().render().count("L.marker(") == detalle["marcadores"] == 50
+
+    print("✅ Función simplificar_trayectoria() - OK")
+
+
+def test_centroides_geocercas():
+    """Prueba que los centroides coinciden con el filtrado por geocerca original"""
+    print("🧪 Probando función centroides_geocercas()...")
+
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "Geocercas": rng.choice(["Stock Central", "Módulo 1", "", "Botadero Norte"], 5000),
+        "Latitud": rng.uniform(-23.2, -23.0, 5000),
+        "Longitud": rng.uniform(-70.5, -70.3, 5000),
+    })
+    df.loc[rng.random(5000) < 0.1, "Latitud"] = np.nan
+
+    centros = centroides_geocercas(df)
+    conocidas = df[df["Geocercas"] != ""].dropna(subset=["Latitud", "Longitud"])
+    assert centros["Geocerca"].tolist() == list(conocidas["Geocercas"].unique())
+    for geocerca, lat, lon in zip(centros["Geocerca"], centros["Latitud"], centros["Longitud"]):
+        puntos = conocidas[conocidas["Geocercas"] == geocerca]
+        assert np.isclose(lat, puntos["Latitud"].mean()) and np.isclose(lon, puntos["Longitud"].mean())
+    assert centroides_geocercas(df[df["Geocercas"] == ""]).empty
+
+    print("✅ Función centroides_geocercas() - OK")
+
+
+def test_grilla_densidad():
+    """Prueba el tope de celdas, la conservación del peso y los centros dentro de la extensión"""
+    print("🧪 Probando función grilla_densidad()...")
+
+    rng = np.random.default_rng(2)
+    lat = np.concatenate([rng.normal(-23.1, 0.01, 500_000), rng.uniform(-23.5, -22.5, 500_000)])
+    lon = np.concatenate([rng.normal(-70.4, 0.01, 500_000), rng.uniform(-70.9, -69.9, 500_000)])
+    pesos = rng.uniform(0, 10, len(lat))
+
+    inicio = time.perf_counter()
+    celdas = grilla_densidad(lat, lon, pesos, max_celdas=1500)
+    print(f"   10⁶ puntos → {len(celdas)} celdas en {time.perf_counter() - inicio:.2f} s")
+    assert 100 < len(celdas) <= 1500
+    assert np.isclose(celdas["Peso"].sum(), pesos.sum())
+    assert celdas["Peso"].is_monotonic_decreasing
+    assert celdas["Latitud"].between(lat.min(), lat.max()).all()
+    # La celda más pesada está en el núcleo denso
+    assert abs(celdas["Latitud"].iloc[0] + 23.1) < 0.05 and abs(celdas["Longitud"].iloc[0] + 70.4) < 0.05
+
+    # Un solo punto, pesos en cero y coordenadas faltantes
+    assert len(grilla_densidad([-23.1], [-70.4])) == 1
+    sin_peso = grilla_densidad([-23.1, -23.1], [-70.4, -70.4], [0, 0])
+    assert sin_peso["Peso"].tolist() == [0] and np.isclose(sin_peso["Latitud"].iloc[0], -23.1)
+    assert grilla_densidad([np.nan], [np.nan]).empty
+
+    print("✅ Función grilla_densidad() - OK")
+
+
+def test_mapa_con_tope():
+    """Prueba que el HTML del mapa no crece con la cantidad de zonas"""
+    print("🧪 Probando función crear_mapa_calor()...")
+
+    df = pd.DataFrame({"Geocercas": ["Stock Central", ""], "Latitud": [-23.1, -23.2], "Longitud": [-70.4, -70.5]})
+    tamanos = {}
+    for n in (100, 50_000):
+        zonas = zonas_aleatorias(n)
+        mapa = crear_mapa_calor(df, zonas, max_elementos=100, max_celdas=1000)
+        html = mapa.get_root().render()
+        tamanos[n] = len(html)
+        assert html.count("L.circleMarker(") == 100 and html.count("L.marker(") == 1
+        assert "HeatLayer" in html or "heatLayer" in html
+
+    print(f"   HTML: {tamanos[100] // 1024} KB con 100 zonas, {tamanos[50_000] // 1024} KB con 50.000 zonas")
+    assert tamanos[50_000] < tamanos[100] * 2, f"El mapa crece con las zonas: {tamanos}"
+
+    # Sin zonas ni coordenadas: mapa base centrado en el valor por defecto
+    vacio = crear_mapa_calor(pd.DataFrame(), pd.DataFrame())
+    assert vacio.location == [-22.59, -69.86]
+
+    print("✅ Función crear_mapa_calor() - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de capas_mapa.py")
+    print("=" * 50)
+    test_centroides_geocercas()
+    test_grilla_densidad()
+    test_mapa_con_tope()
+    test_simplificar_trayectoria()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Script de pruebas automatizadas para datos_graficos.py
+Verifica que cada reducción respeta el tope de filas, conserva los totales,
+no cambia los datos bajo el tope y achica la especificación Vega-Lite
+"""
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import sys
+import os
+import time
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datos_graficos import (
+    agregar_por_tiempo,
+    agrupar_dispersion,
+    describir_grafico,
+    elegir_paso,
+    fusionar_intervalos,
+    limitar_categorias,
+    tamano_especificacion,
+)
+
+
+def viajes_aleatorios(n: int, dias: int = 90, semilla: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    entrada = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, dias * 86400, n), unit="s")
+    return pd.DataFrame({
+        "Nombre del Vehículo": rng.choice([f"Camión_{i:03d}" for i in range(60)], n),
+        "Tiempo_entrada": entrada,
+        "Proceso": rng.choice(["carga", "descarga"], n),
+        "Toneladas": 42.0,
+        "Descripcion_Turno": np.where(entrada.hour.to_numpy() < 20, "Día", "Noche"),
+    })
+
+
+def detenciones_aleatorias(n: int, semilla: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    inicio = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 90 * 86400, n), unit="s")
+    duracion = rng.uniform(10, 300, n)
+    return pd.DataFrame({
+        "Nombre del Vehículo": rng.choice([f"Camión_{i:03d}" for i in range(30)], n),
+        "Geocerca": rng.choice(["Stock Central", "Módulo 1", "Botadero Norte"], n),
+        "Tiempo_inicio": inicio,
+        "Tiempo_fin": inicio + pd.to_timedelta(duracion, unit="min"),
+        "Duracion_total_min": duracion,
+        "Exceso_min": duracion * rng.uniform(0.1, 0.9, n),
+        "Severidad": rng.choice(["Alta", "Media"], n),
+    })
+
+
+def test_agregar_por_tiempo():
+    """Prueba el paso elegido, el tope de filas, los totales y la paridad por hora bajo el tope"""
+    print("🧪 Probando función agregar_por_tiempo()...")
+
+    # Tres meses de viajes: el paso crece hasta caber en el tope y la suma se conserva
+    viajes = viajes_aleatorios(300_000)
+    inicio = time.perf_counter()
+    datos, detalle = agregar_por_tiempo(viajes, "Tiempo_entrada", ["Toneladas"], ["Proceso"],
+                                        ["Descripcion_Turno"], max_filas=1500)
+    print(f"   300.000 viajes → {detalle['filas']} filas (paso {detalle['paso']}) "
+          f"en {time.perf_counter() - inicio:.2f} s")
+    assert detalle["paso"] == "3h" and detalle["filas"] <= 1500
+    assert np.isclose(datos["Toneladas"].sum(), viajes["Toneladas"].sum())
+    assert set(datos["Descripcion_Turno"]) == {"Día", "Noche", "Varios"}
+
+    # Un día de viajes: por hora, igual al groupby original
+    dia = viajes_aleatorios(2000, dias=1)
+    datos, detalle = agregar_por_tiempo(dia, "Tiempo_entrada", ["Toneladas"], ["Proceso"])
+    esperado = (dia.groupby([dia["Tiempo_entrada"].dt.floor("h"), "Proceso"])["Toneladas"]
+                .sum().reset_index())
+    assert detalle["paso"] == "1h"
+    pd.testing.assert_frame_equal(datos, esperado)
+
+    # Sin datos y elección directa del paso
+    vacio, detalle = agregar_por_tiempo(dia.iloc[0:0], "Tiempo_entrada", ["Toneladas"], ["Proceso"])
+    assert vacio.empty and detalle["filas"] == 0
+    desde = pd.Timestamp("2025-01-01")
+    assert elegir_paso(desde, desde + pd.Timedelta(days=3 * 365), 2, 1500) == "7D"
+    assert elegir_paso(desde, desde + pd.Timedelta(hours=5), 2, 1500, paso_minimo="1D") == "1D"
+
+    print("✅ Función agregar_por_tiempo() - OK")
+
+
+def test_limitar_categorias():
+    """Prueba la fila "Otros" con sumas y promedios ponderados"""
+    print("🧪 Probando función limitar_categorias()...")
+
+    rng = np.random.default_rng(1)
+    tiempos = pd.DataFrame({
+        "Nombre del Vehículo": [f"Camión_{i:03d}" for i in range(100)],
+        "Total_viajes": rng.integers(1, 50, 100),
+        "Tiempo_promedio_min": rng.uniform(5, 60, 100),
+    })
+    datos, detalle = limitar_categorias(tiempos, "Nombre del Vehículo", "Total_viajes", 20,
+                                        sumas=["Total_viajes"], promedios=["Tiempo_promedio_min"],
+                                        peso="Total_viajes")
+    assert len(datos) == 20 and detalle == {"filas_origen": 100, "filas": 20, "agrupadas": 81}
+    otros = datos.iloc[-1]
+    assert otros["Nombre del Vehículo"] == "Otros (81)"
+    assert datos["Total_viajes"].sum() == tiempos["Total_viajes"].sum()
+    # El promedio general ponderado se conserva
+    total = (datos["Tiempo_promedio_min"] * datos["Total_viajes"]).sum()
+    assert np.isclose(total, (tiempos["Tiempo_promedio_min"] * tiempos["Total_viajes"]).sum())
+    assert datos.iloc[:-1]["Total_viajes"].min() >= tiempos["Total_viajes"].nlargest(19).min()
+
+    # Bajo el tope no se toca
+    pocos, detalle = limitar_categorias(tiempos.head(5), "Nombre del Vehículo", "Total_viajes", 20)
+    assert pocos.equals(tiempos.head(5)) and detalle["agrupadas"] == 0
+
+    print("✅ Función limitar_categorias() - OK")
+
+
+def test_fusionar_intervalos():
+    """Prueba el tope de barras del timeline, los conteos y la cobertura de los intervalos"""
+    print("🧪 Probando función fusionar_intervalos()...")
+
+    detenciones = detenciones_aleatorias(100_000)
+    inicio = time.perf_counter()
+    datos, detalle = fusionar_intervalos(detenciones, "Tiempo_inicio", "Tiempo_fin",
+                                         ["Nombre del Vehículo", "Severidad"], ["Duracion_total_min"],
+                                         ["Geocerca"], max_filas=1500)
+    print(f"   100.000 detenciones → {detalle['filas']} barras (resolución {detalle['resolucion']}) "
+          f"en {time.perf_counter() - inicio:.2f} s")
+    assert detalle["filas"] <= 1500
+    assert datos["Cantidad"].sum() == len(detenciones)
+    assert np.isclose(datos["Duracion_total_min"].sum(), detenciones["Duracion_total_min"].sum())
+
+    # Cada detención queda dentro de una barra de su vehículo y severidad
+    unidas = detenciones.merge(datos, on=["Nombre del Vehículo", "Severidad"], suffixes=("", "_barra"))
+    dentro = ((unidas["Tiempo_inicio"] >= unidas["Tiempo_inicio_barra"])
+              & (unidas["Tiempo_fin"] <= unidas["Tiempo_fin_barra"]))
+    assert dentro.groupby([unidas["Tiempo_inicio"], unidas["Nombre del Vehículo"]]).any().all()
+
+    # Intervalos solapados o separados por menos de la resolución se unen; bajo el tope, sin cambios
+    base = pd.Timestamp("2025-01-01")
+    pocos = pd.DataFrame({
+        "Nombre del Vehículo": ["A"] * 4,
+        "Tiempo_inicio": base + pd.to_timedelta([0, 10, 20, 600], unit="min"),
+        "Tiempo_fin": base + pd.to_timedelta([30, 15, 25, 610], unit="min"),
+    })
+    unido, _ = fusionar_intervalos(pocos, "Tiempo_inicio", "Tiempo_fin", ["Nombre del Vehículo"], max_filas=2)
+    assert unido["Cantidad"].tolist() == [3, 1]
+    assert unido["Tiempo_fin"].iloc[0] == base + pd.Timedelta(minutes=30)
+    igual, detalle = fusionar_intervalos(pocos, "Tiempo_inicio", "Tiempo_fin", ["Nombre del Vehículo"])
+    assert igual.drop(columns="Cantidad").equals(pocos) and detalle["resolucion"] is None
+
+    print("✅ Función fusionar_intervalos() - OK")
+
+
+def test_agrupar_dispersion():
+    """Prueba el tope de puntos, los conteos y las etiquetas de la dispersión"""
+    print("🧪 Probando función agrupar_dispersion()...")
+
+    detenciones = detenciones_aleatorias(100_000)
+    detenciones.loc[:9, "Exceso_min"] = np.nan
+    datos, detalle = agrupar_dispersion(detenciones, "Duracion_total_min", "Exceso_min", ["Severidad"],
+                                        ["Nombre del Vehículo", "Geocerca"], max_filas=1500)
+    assert detalle["filas"] <= 1500 and datos["Cantidad"].sum() == len(detenciones) - 10
+    assert datos["Duracion_total_min"].between(10, 300).all()
+    assert "Varios" in set(datos["Nombre del Vehículo"])
+
+    pocos, detalle = agrupar_dispersion(detenciones.head(50), "Duracion_total_min", "Exceso_min")
+    assert len(pocos) == 50 and detalle["celdas"] is None
+
+    print("✅ Función agrupar_dispersion() - OK")
+
+
+def test_tamano_especificacion():
+    """Prueba que la especificación del gráfico queda acotada con meses de datos"""
+    print("🧪 Probando tamaño de la especificación Vega-Lite...")
+
+    detenciones = detenciones_aleatorias(20_000)
+
+    def timeline(datos):
+        return alt.Chart(datos).mark_bar().encode(
+            x="Tiempo_inicio:T", x2="Tiempo_fin:T", y="Nombre del Vehículo:N", color="Severidad:N"
+        )
+
+    completo = tamano_especificacion(timeline(detenciones))
+    datos, detalle = fusionar_intervalos(detenciones, "Tiempo_inicio", "Tiempo_fin",
+                                         ["Nombre del Vehículo", "Severidad"], max_filas=1000)
+    reducido = tamano_especificacion(timeline(datos))
+    print(f"   Timeline: {completo / 1024:,.0f} KB → {reducido / 1024:,.0f} KB")
+    assert reducido < completo / 10
+
+    resumen = describir_grafico(timeline(datos), detalle)
+    assert resumen.startswith("📦") and f"{detalle['filas']:,} de 20,000 filas" in resumen and "KB" in resumen
+
+    print("✅ Tamaño de la especificación - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de datos_graficos.py")
+    print("=" * 50)
+    test_agregar_por_tiempo()
+    test_limitar_categorias()
+    test_fusionar_intervalos()
+    test_agrupar_dispersion()
+    test_tamano_especificacion()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Script de pruebas automatizadas para ejecucion_paralela.py
+Verifica que la ejecución por particiones de vehículos en un pool de procesos
+produce exactamente el mismo resultado que la ejecución en serie.
+"""
+
+import pandas as pd
+import sys
+import os
+import tempfile
+import threading
+import types
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ejecucion_paralela import (
+    cerrar_pool, combinar_resultados, ejecutar_por_vehiculo, iniciar_pool, particionar_por_vehiculo
+)
+from motor_vectorizado import detectar_permanencias, extraer_transiciones_vectorizado, extraer_viajes_vectorizado
+from test_motor_vectorizado import generar_flota
+
+
+def test_particionar_por_vehiculo():
+    """Cada vehículo queda completo en una sola partición y la carga se reparte"""
+    print("🧪 Probando función particionar_por_vehiculo()...")
+
+    df = generar_flota(n_vehiculos=7, n_registros=100, semilla=1)
+    particiones = particionar_por_vehiculo(df, 3)
+
+    assert len(particiones) == 3
+    assert sum(len(p) for p in particiones) == len(df), "Error: se perdieron filas"
+    vehiculos = [set(p["Nombre del Vehículo"]) for p in particiones]
+    for i in range(len(vehiculos)):
+        for j in range(i + 1, len(vehiculos)):
+            assert not vehiculos[i] & vehiculos[j], "Error: un vehículo quedó en dos particiones"
+
+    # Reparto determinista: no depende del orden de las filas
+    mezclado = particionar_por_vehiculo(df.sample(frac=1, random_state=3), 3)
+    assert [set(p["Nombre del Vehículo"]) for p in mezclado] == vehiculos
+
+    # Más particiones que vehículos: no se generan particiones vacías
+    assert len(particionar_por_vehiculo(df, 20)) == 7
+
+    print("✅ Función particionar_por_vehiculo() - OK")
+
+
+def test_combinar_resultados():
+    """Contadores se suman y tablas se ordenan por vehículo"""
+    print("🧪 Probando función combinar_resultados()...")
+
+    a = pd.DataFrame({"Nombre del Vehículo": ["B", "B"], "Orden": [1, 2]})
+    b = pd.DataFrame({"Nombre del Vehículo": ["A", "C"], "Orden": [1, 1]})
+    tabla, contadores = combinar_resultados([(a, {"origen": 1}), (b, {"origen": 2})])
+
+    assert tabla["Nombre del Vehículo"].tolist() == ["A", "B", "B", "C"]
+    assert tabla["Orden"].tolist() == [1, 1, 2, 1], "Error: se alteró el orden dentro de un vehículo"
+    assert contadores == {"origen": 3}
+
+    print("✅ Función combinar_resultados() - OK")
+
+
+def test_paridad_pool_vs_serie():
+    """Las etapas del motor dan el mismo resultado en el pool que en serie"""
+    print("🧪 Probando paridad pool de procesos vs. serie...")
+
+    df = generar_flota(n_vehiculos=9, n_registros=300, semilla=5)
+    try:
+        for funcion in [detectar_permanencias, extraer_transiciones_vectorizado]:
+            esperado = funcion(df)
+            resultado = ejecutar_por_vehiculo(funcion, df, workers=2, min_filas=0)
+            pd.testing.assert_frame_equal(resultado, esperado)
+
+        viajes_esperados, casos_esperados = extraer_viajes_vectorizado(df)
+        viajes, casos = ejecutar_por_vehiculo(extraer_viajes_vectorizado, df, workers=3, min_filas=0)
+        pd.testing.assert_frame_equal(viajes, viajes_esperados)
+        assert casos == casos_esperados, f"Error: {casos} != {casos_esperados}"
+    finally:
+        cerrar_pool()
+
+    print("✅ Paridad pool de procesos vs. serie - OK")
+
+
+def proceso_por_vehiculo(df: pd.DataFrame) -> pd.DataFrame:
+    """Etapa de prueba: el proceso que atendió cada vehículo."""
+    return pd.DataFrame({"Nombre del Vehículo": sorted(df["Nombre del Vehículo"].unique()), "pid": os.getpid()})
+
+
+def en_hilo(funcion, *args) -> dict:
+    """Ejecuta `funcion` en otro hilo (como el ScriptRunner de Streamlit) y devuelve su resultado o error."""
+    salida = {}
+
+    def ejecutar():
+        try:
+            salida["resultado"] = funcion(*args)
+        except Exception as e:
+            salida["error"] = e
+
+    hilo = threading.Thread(target=ejecutar)
+    hilo.start()
+    hilo.join(120)
+    return salida
+
+
+def test_pool_desde_hilo_de_script():
+    """Los hilos de script no crean el pool ni re-importan su `__main__` en los workers"""
+    print("🧪 Probando pool desde un hilo de script...")
+
+    # Por su módulo y no por `__main__`, que aquí se reemplaza por el script simulado
+    from test_ejecucion_paralela import proceso_por_vehiculo as etapa
+
+    df = generar_flota(n_vehiculos=6, n_registros=50, semilla=2)
+    with tempfile.TemporaryDirectory() as directorio:
+        # Script que, si un worker lo re-importa como `__mp_main__`, deja una marca
+        marca = os.path.join(directorio, "importado.txt")
+        script = os.path.join(directorio, "dashboard.py")
+        with open(script, "w", encoding="utf-8") as archivo:
+            archivo.write(f"open({marca!r}, 'w').close()\n")
+
+        principal = sys.modules["__main__"]
+        dashboard = types.ModuleType("__main__")
+        dashboard.__file__ = script
+        try:
+            cerrar_pool()
+            sys.modules["__main__"] = dashboard  # Como lo instala el ScriptRunner de Streamlit
+
+            # Sin pool iniciado: la etapa se ejecuta en serie en el proceso actual
+            salida = en_hilo(lambda: ejecutar_por_vehiculo(etapa, df, workers=2, min_filas=0))
+            assert "error" not in salida, salida
+            assert set(salida["resultado"]["pid"]) == {os.getpid()}, "Error: un hilo de script creó el pool"
+            assert isinstance(en_hilo(iniciar_pool, 2).get("error"), RuntimeError)
+
+            # Pool iniciado desde el hilo principal: los hilos de script lo usan
+            sys.modules["__main__"] = principal
+            iniciar_pool(2)
+            sys.modules["__main__"] = dashboard
+            salida = en_hilo(lambda: ejecutar_por_vehiculo(etapa, df, workers=2, min_filas=0))
+            assert "error" not in salida, salida
+            resultado = salida["resultado"]
+            assert resultado["Nombre del Vehículo"].tolist() == sorted(df["Nombre del Vehículo"].unique())
+            assert os.getpid() not in set(resultado["pid"]), "Error: la etapa no se ejecutó en el pool"
+            assert sys.modules["__main__"] is dashboard
+            assert not os.path.exists(marca), "Error: un worker re-importó el script del dashboard"
+        finally:
+            sys.modules["__main__"] = principal
+            cerrar_pool()
+
+    print("✅ Pool desde un hilo de script - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de ejecucion_paralela.py")
+    print("=" * 50)
+    test_particionar_por_vehiculo()
+    test_combinar_resultados()
+    test_paridad_pool_vs_serie()
+    test_pool_desde_hilo_de_script()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
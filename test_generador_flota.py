@@ -0,0 +1,134 @@
+"""
+Script de pruebas automatizadas para generador_flota.py
+Verifica el tamaño, el formato GeoAustral, las celdas con varias geocercas,
+el ruido GPS y que las paradas simuladas se detectan como zonas no mapeadas
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import generador_flota
+from generador_flota import (
+    DISPOSICIONES,
+    PARADA,
+    a_csv,
+    coordenadas_geocercas,
+    dias_para_filas,
+    generar_exportacion,
+    registros_vehiculo,
+    segmentos_vehiculo,
+)
+from ingesta_columnar import leer_csv_geoaustral
+from motor_vectorizado import detectar_detenciones, distancia_haversine
+
+
+def test_generar_exportacion():
+    """Prueba el tamaño, las columnas, el orden, la reproducibilidad y el CSV"""
+    print("🧪 Probando función generar_exportacion()...")
+
+    df = generar_exportacion(vehiculos=8, dias=dias_para_filas(20_000, 8), semilla=1)
+    print(f"   {len(df):,} registros de {df['Nombre del Vehículo'].nunique()} vehículos")
+    assert abs(len(df) - 20_000) < 20_000 * 0.05, len(df)
+    assert list(df.columns) == ["Nombre del Vehículo", "Tiempo de evento", "Geocercas",
+                                "Velocidad [km/h]", "Latitud", "Longitud"]
+    assert df["Tiempo de evento"].is_monotonic_increasing
+    assert df["Nombre del Vehículo"].nunique() == 8 and (df["Velocidad [km/h]"] >= 0).all()
+    intervalo = df.groupby("Nombre del Vehículo")["Tiempo de evento"].diff().dt.total_seconds().median()
+    assert 25 <= intervalo <= 35, intervalo
+
+    # Misma semilla, mismos datos; otra semilla, otros datos
+    pd.testing.assert_frame_equal(df, generar_exportacion(vehiculos=8, dias=dias_para_filas(20_000, 8), semilla=1))
+    assert not df.equals(generar_exportacion(vehiculos=8, dias=dias_para_filas(20_000, 8), semilla=2))
+
+    # El CSV se lee con el esquema de la exportación real
+    leido = leer_csv_geoaustral(a_csv(df))
+    assert len(leido) == len(df) and (leido["Geocercas"] == df["Geocercas"]).all()
+    assert (leido["Tiempo de evento"] == df["Tiempo de evento"]).all()
+
+    # Disposición de puerto: geocercas del dashboard portuario y su ruta
+    puerto = generar_exportacion(vehiculos=3, dias=1, disposicion="puerto", semilla=0)
+    geocercas = set(puerto["Geocercas"])
+    assert {"Ciudad Mejillones", "Ruta - Afta Mejillones"} <= geocercas
+    assert geocercas - {""} <= set(DISPOSICIONES["puerto"]["geocercas"]) | {
+        g for g in geocercas if g.startswith("Ruta - Afta Mejillones")}
+
+    print("✅ Función generar_exportacion() - OK")
+
+
+def test_celdas_y_ruido():
+    """Prueba la fracción de celdas con ';', el parpadeo de geocerca y el ruido GPS"""
+    print("🧪 Probando celdas múltiples y ruido GPS...")
+
+    df = generar_exportacion(vehiculos=5, dias=2, fraccion_multigeocerca=0.3, ruido_geocerca=0.0,
+                             ruido_gps_m=0.0, semilla=4)
+    sitios = coordenadas_geocercas(DISPOSICIONES["mina"])
+    en_sitio = df["Geocercas"].str.replace("Ruta 5; ", "", regex=False).isin(sitios)
+    multiples = df["Geocercas"].str.startswith("Ruta 5; ")
+    assert abs(multiples[en_sitio].mean() - 0.3) < 0.03, multiples[en_sitio].mean()
+
+    # Sin ruido, cada registro en geocerca cae dentro de su radio
+    nombres = df.loc[en_sitio, "Geocercas"].str.replace("Ruta 5; ", "", regex=False)
+    centro = np.array([sitios[n] for n in nombres])
+    distancia = distancia_haversine(df.loc[en_sitio, "Latitud"], df.loc[en_sitio, "Longitud"],
+                                    centro[:, 0], centro[:, 1])
+    assert (distancia <= centro[:, 2] * 0.4 + 1).all()
+
+    # Con ruido, la dispersión crece; con parpadeo, hay estadías con registros vacíos
+    ruidoso = generar_exportacion(vehiculos=5, dias=2, ruido_gps_m=50.0, ruido_geocerca=0.2, semilla=4)
+    en_modulo = ruidoso["Geocercas"] == "Módulo 1"
+    lejos = distancia_haversine(ruidoso.loc[en_modulo, "Latitud"], ruidoso.loc[en_modulo, "Longitud"],
+                                sitios["Módulo 1"][0], sitios["Módulo 1"][1])
+    assert lejos.max() > sitios["Módulo 1"][2] * 0.4 + 50
+    lentos_vacios = ((ruidoso["Geocercas"] == "") & (ruidoso["Velocidad [km/h]"] < 2)).mean()
+    assert lentos_vacios > ((df["Geocercas"] == "") & (df["Velocidad [km/h]"] < 2)).mean()
+
+    print("✅ Celdas múltiples y ruido GPS - OK")
+
+
+def test_paradas_no_mapeadas():
+    """Prueba que cada parada simulada fuera de geocercas se detecta como zona candidata"""
+    print("🧪 Probando paradas fuera de geocercas...")
+
+    original = generador_flota.PROB_PARADA_NO_MAPEADA
+    generador_flota.PROB_PARADA_NO_MAPEADA = 0.3
+    try:
+        rng = np.random.default_rng(5)
+        segmentos = segmentos_vehiculo(rng, DISPOSICIONES["mina"], 3 * 86400)
+        registros = registros_vehiculo(rng, segmentos, 3 * 86400, 30.0, "Ruta 5", 0.15, 5.0, 0.0, 0.0)
+    finally:
+        generador_flota.PROB_PARADA_NO_MAPEADA = original
+
+    registros.insert(0, "Nombre del Vehículo", "Camión_000")
+    registros["Tiempo de evento"] = pd.Timestamp("2025-07-31") + pd.to_timedelta(registros["Segundos"], unit="s")
+    paradas = segmentos[segmentos["tipo"] == PARADA]
+    zonas = detectar_detenciones(registros)
+    print(f"   {len(paradas)} paradas simuladas → {len(zonas)} zonas detectadas")
+    # Cada parada completa (la última puede quedar cortada por el fin del período) es una zona
+    completas = paradas["inicio"] < 3 * 86400 - 15 * 60
+    assert completas.sum() > 10 and completas.sum() <= len(zonas) <= len(paradas)
+    distancia = distancia_haversine(zonas["Latitud_Centro"].to_numpy()[:, None],
+                                    zonas["Longitud_Centro"].to_numpy()[:, None],
+                                    paradas["lat0"].to_numpy(), paradas["lon0"].to_numpy())
+    assert (distancia.min(axis=1) < 30).all()
+
+    print("✅ Paradas fuera de geocercas - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de generador_flota.py")
+    print("=" * 50)
+    test_generar_exportacion()
+    test_celdas_y_ruido()
+    test_paradas_no_mapeadas()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Script de pruebas automatizadas para geocercas_poligonos.py
+Verifica la lectura GeoJSON/KML y la asignación de geocercas por lote y por punto
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+import os
+import time
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from geocercas_poligonos import RegistroGeocercas, leer_geojson, leer_kml, resolver_geocercas
+
+
+def cuadrado(lon: float, lat: float, lado: float) -> list[list[float]]:
+    return [[lon, lat], [lon + lado, lat], [lon + lado, lat + lado], [lon, lat + lado], [lon, lat]]
+
+
+GEOJSON = {
+    "type": "FeatureCollection",
+    "features": [
+        # Stock con un hueco (zona excluida) en el centro
+        {"type": "Feature", "properties": {"name": "Stock Central"},
+         "geometry": {"type": "Polygon", "coordinates": [cuadrado(-70.40, -23.10, 0.02),
+                                                         cuadrado(-70.395, -23.095, 0.01)]}},
+        # Módulo superpuesto con el stock: gana por ser más pequeño
+        {"type": "Feature", "properties": {"nombre": "Módulo 1"},
+         "geometry": {"type": "Polygon", "coordinates": [cuadrado(-70.385, -23.085, 0.004)]}},
+        {"type": "Feature", "properties": {"Geocerca": "Botadero Norte"},
+         "geometry": {"type": "MultiPolygon", "coordinates": [[cuadrado(-70.30, -23.00, 0.01)],
+                                                              [cuadrado(-70.25, -23.00, 0.01)]]}},
+        # Triángulo (bordes no alineados a la grilla)
+        {"type": "Feature", "properties": {"name": "Pila Rom 1"},
+         "geometry": {"type": "Polygon", "coordinates": [[[-70.35, -23.05], [-70.33, -23.05],
+                                                          [-70.34, -23.03], [-70.35, -23.05]]]}},
+    ],
+}
+
+KML = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2"><Document>
+  <Placemark><name>Casino</name><Polygon>
+    <outerBoundaryIs><LinearRing><coordinates>
+      -70.20,-23.20,0 -70.19,-23.20,0 -70.19,-23.19,0 -70.20,-23.19,0 -70.20,-23.20,0
+    </coordinates></LinearRing></outerBoundaryIs>
+    <innerBoundaryIs><LinearRing><coordinates>
+      -70.196,-23.196 -70.194,-23.196 -70.194,-23.194 -70.196,-23.194 -70.196,-23.196
+    </coordinates></LinearRing></innerBoundaryIs>
+  </Polygon></Placemark>
+</Document></kml>"""
+
+
+def contiene_fuerza_bruta(aristas: np.ndarray, lon: float, lat: float) -> bool:
+    dentro = False
+    for x1, y1, x2, y2 in aristas:
+        if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            dentro = not dentro
+    return dentro
+
+
+def test_lectura_y_casos_conocidos():
+    """Prueba la lectura de GeoJSON/KML, los huecos, las superposiciones y los multipolígonos"""
+    print("🧪 Probando RegistroGeocercas con casos conocidos...")
+
+    registro = RegistroGeocercas(leer_geojson(GEOJSON) + leer_kml(KML))
+    assert len(registro) == 6
+
+    casos = [
+        ((-23.099, -70.399), "Stock Central"),
+        ((-23.090, -70.390), ""),                 # Hueco del stock
+        ((-23.083, -70.383), "Módulo 1"),          # Superpuesto con el stock
+        ((-22.995, -70.295), "Botadero Norte"),
+        ((-22.995, -70.245), "Botadero Norte"),    # Segunda parte del multipolígono
+        ((-22.995, -70.270), ""),                 # Entre las dos partes
+        ((-23.045, -70.340), "Pila Rom 1"),
+        ((-23.035, -70.349), ""),                 # Dentro de la caja pero fuera del triángulo
+        ((-23.199, -70.199), "Casino"),
+        ((-23.195, -70.195), ""),                 # Hueco del KML
+        ((-10.0, -50.0), ""),                     # Fuera de la grilla
+        ((np.nan, -70.399), ""),
+    ]
+    lat = [c[0][0] for c in casos]
+    lon = [c[0][1] for c in casos]
+    esperados = [c[1] for c in casos]
+    assert registro.asignar(lat, lon).tolist() == esperados, registro.asignar(lat, lon)
+    assert [registro.ubicar(la, lo) for la, lo in zip(lat, lon)] == esperados
+
+    print("✅ RegistroGeocercas con casos conocidos - OK")
+
+
+def test_paridad_lote_punto_y_fuerza_bruta():
+    """Prueba que el lote, el punto a punto y la fuerza bruta coinciden en puntos aleatorios"""
+    print("🧪 Probando asignación aleatoria contra fuerza bruta...")
+
+    rng = np.random.default_rng(0)
+    registro = RegistroGeocercas(leer_geojson(GEOJSON) + leer_kml(KML), tamano_celda=0.003)
+    # Puntos alrededor de cada polígono (caja ampliada un 20%)
+    caja = registro.cajas[rng.integers(len(registro), size=5000)]
+    margen = (caja[:, 2:] - caja[:, :2]) * 0.2
+    lon = rng.uniform(caja[:, 0] - margen[:, 0], caja[:, 2] + margen[:, 0])
+    lat = rng.uniform(caja[:, 1] - margen[:, 1], caja[:, 3] + margen[:, 1])
+
+    lote = registro.asignar_indices(lat, lon)
+    for i in range(len(lat)):
+        contenedores = [pid for pid in range(len(registro))
+                        if contiene_fuerza_bruta(registro.aristas[pid], lon[i], lat[i])]
+        esperado = contenedores[0] if contenedores else -1   # Polígonos ordenados por área
+        assert lote[i] == esperado, (i, lote[i], esperado)
+        assert registro.ubicar(lat[i], lon[i]) == registro.nombres[esperado]
+    assert (lote >= 0).sum() > 2000, "Pocos puntos dentro de geocercas"
+
+    # Rendimiento: un millón de puntos por lote
+    lat_m = rng.uniform(-23.21, -22.98, 1_000_000)
+    lon_m = rng.uniform(-70.41, -70.18, 1_000_000)
+    inicio = time.perf_counter()
+    registro.asignar(lat_m, lon_m)
+    print(f"   1M puntos en {time.perf_counter() - inicio:.2f} s")
+
+    print("✅ Asignación aleatoria contra fuerza bruta - OK")
+
+
+def test_resolver_geocercas():
+    """Prueba que el DataFrame conserva la geocerca exportada cuando no hay coordenadas"""
+    print("🧪 Probando función resolver_geocercas()...")
+
+    registro = RegistroGeocercas(leer_geojson(GEOJSON))
+    df = pd.DataFrame({
+        "Geocercas": ["Stock Central; Módulo 1", "Botadero Norte", None],
+        "Latitud": [-23.083, None, -23.5],
+        "Longitud": [-70.383, None, -70.5],
+    })
+    assert resolver_geocercas(df, registro).tolist() == ["Módulo 1", "Botadero Norte", ""]
+
+    print("✅ Función resolver_geocercas() - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de geocercas_poligonos.py")
+    print("=" * 50)
+    test_lectura_y_casos_conocidos()
+    test_paridad_lote_punto_y_fuerza_bruta()
+    test_resolver_geocercas()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Script de pruebas automatizadas para ingesta_columnar.py
+Verifica el esquema de lectura y la caché Parquet por huella de contenido
+"""
+
+import pandas as pd
+import sys
+import os
+import tempfile
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ingesta_columnar
+from ingesta_columnar import cargar_exportacion, compactar_exportacion, leer_bloques, leer_csv_geoaustral, ruta_parquet
+from cache_pipeline import huella_contenido
+from motor_vectorizado import extraer_transiciones_vectorizado, extraer_viajes_vectorizado
+from test_motor_vectorizado import generar_flota
+
+CSV_PRUEBA = (
+    "Nombre del Vehículo,Tiempo de evento,Geocercas,Velocidad [km/h],Latitud,Longitud\n"
+    "Camión_001,2025-01-15 08:00:00,Stock Central,0,-23.1,-70.4\n"
+    "Camión_001,2025-01-15 08:05,,35.5,-23.2,-70.5\n"
+    "Camión_002,fecha inválida,Botadero Norte,12,-23.3,-70.6\n"
+    "007,2025-01-15 09:00:00,Módulo 1,,-23.4,-70.7\n"
+).encode("utf-8")
+
+
+def test_leer_csv_geoaustral():
+    """Prueba la lectura con esquema explícito"""
+    print("🧪 Probando función leer_csv_geoaustral()...")
+
+    df = leer_csv_geoaustral(CSV_PRUEBA)
+
+    # El registro con tiempo inválido se descarta; el tiempo sin segundos se acepta
+    assert len(df) == 3, f"Se esperaban 3 registros, hay {len(df)}"
+    assert pd.api.types.is_datetime64_any_dtype(df["Tiempo de evento"])
+    assert df["Tiempo de evento"].iloc[1] == pd.Timestamp("2025-01-15 08:05:00")
+
+    # Geocerca vacía = viaje (""), nombres numéricos se mantienen como texto
+    assert df["Geocercas"].tolist() == ["Stock Central", "", "Módulo 1"]
+    assert df["Nombre del Vehículo"].iloc[2] == "007"
+
+    assert df["Velocidad [km/h]"].dtype == "float32"
+    assert pd.isna(df["Velocidad [km/h]"].iloc[2])
+
+    # Faltan columnas obligatorias
+    try:
+        leer_csv_geoaustral(b"Nombre del Vehiculo,Tiempo de evento\nA,2025-01-15 08:00:00\n")
+        raise AssertionError("Debió fallar por columnas obligatorias faltantes")
+    except ValueError as e:
+        assert "Geocercas" in str(e)
+
+    print("✅ Función leer_csv_geoaustral() - OK")
+
+
+def test_cargar_exportacion_cache():
+    """Prueba que la segunda carga de la misma exportación lee el Parquet guardado"""
+    print("🧪 Probando función cargar_exportacion()...")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        primera = cargar_exportacion(CSV_PRUEBA, directorio=directorio)
+        if not ingesta_columnar.PARQUET_DISPONIBLE:
+            print("⚠️ pyarrow no instalado: se omite la verificación de la caché en disco")
+            return
+
+        ruta = ruta_parquet(huella_contenido(CSV_PRUEBA), directorio)
+        assert os.path.exists(ruta), "No se guardó el Parquet"
+        assert not [f for f in os.listdir(directorio) if f.endswith(".tmp")], "Quedó un temporal"
+
+        # La segunda carga no vuelve a interpretar el CSV
+        leer_original = ingesta_columnar.leer_csv_geoaustral
+        ingesta_columnar.leer_csv_geoaustral = lambda _: (_ for _ in ()).throw(AssertionError("Se releyó el CSV"))
+        try:
+            segunda = cargar_exportacion(CSV_PRUEBA, directorio=directorio)
+        finally:
+            ingesta_columnar.leer_csv_geoaustral = leer_original
+        pd.testing.assert_frame_equal(primera, segunda)
+
+        # Un Parquet corrupto se reemplaza leyendo de nuevo el CSV
+        with open(ruta, "wb") as f:
+            f.write(b"no es parquet")
+        tercera = cargar_exportacion(CSV_PRUEBA, directorio=directorio)
+        pd.testing.assert_frame_equal(primera, tercera)
+        pd.testing.assert_frame_equal(primera, pd.read_parquet(ruta))
+
+    print("✅ Función cargar_exportacion() - OK")
+
+
+def test_compactar_exportacion():
+    """Prueba la lectura por bloques contra la lectura completa"""
+    print("🧪 Probando función compactar_exportacion()...")
+
+    # Tipos compactos y solo las columnas del pipeline
+    bloques = list(leer_bloques(CSV_PRUEBA.replace(b"Longitud\n", b"Longitud,Extra\n"), filas_por_bloque=2))
+    assert len(bloques) == 2 and sum(len(b) for b in bloques) == 3
+    assert "Extra" not in bloques[0].columns
+    assert isinstance(bloques[0]["Geocercas"].dtype, pd.CategoricalDtype)
+
+    # Exportación ordenada por tiempo (vehículos intercalados), en bloques pequeños
+    flota = generar_flota(n_vehiculos=4, n_registros=400, semilla=3).sort_values("Tiempo de evento", kind="stable")
+    contenido = flota.to_csv(index=False).encode("utf-8")
+    completo = leer_csv_geoaustral(contenido)
+    compacto = compactar_exportacion(contenido, filas_por_bloque=97)
+    assert len(compacto) < len(completo), "La compactación no redujo los registros"
+
+    pd.testing.assert_frame_equal(extraer_transiciones_vectorizado(completo),
+                                  extraer_transiciones_vectorizado(compacto))
+    pd.testing.assert_frame_equal(extraer_viajes_vectorizado(completo)[0], extraer_viajes_vectorizado(compacto)[0])
+
+    # La transformación por bloque (p. ej. geocercas desde polígonos) se aplica antes de compactar
+    bloques_transformados = []
+
+    def a_mayusculas(bloque):
+        bloques_transformados.append(len(bloque))
+        return bloque.assign(Geocercas=bloque["Geocercas"].astype(str).str.upper())
+
+    transformado = compactar_exportacion(contenido, filas_por_bloque=97, transformar=a_mayusculas)
+    assert sum(bloques_transformados) == len(completo) and len(bloques_transformados) > 1
+    pd.testing.assert_frame_equal(
+        extraer_transiciones_vectorizado(transformado),
+        extraer_transiciones_vectorizado(completo.assign(Geocercas=completo["Geocercas"].str.upper()))
+    )
+
+    # Registros de un vehículo que retroceden en el tiempo entre bloques
+    desordenado = flota.sample(frac=1, random_state=0).to_csv(index=False).encode("utf-8")
+    try:
+        compactar_exportacion(desordenado, filas_por_bloque=97)
+        raise AssertionError("Debió fallar por registros fuera de orden")
+    except ValueError as e:
+        assert "orden cronológico" in str(e)
+
+    print("✅ Función compactar_exportacion() - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de ingesta_columnar.py")
+    print("=" * 50)
+    test_leer_csv_geoaustral()
+    test_cargar_exportacion_cache()
+    test_compactar_exportacion()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Script de pruebas automatizadas para instrumentacion.py
+Verifica el tiempo, las filas y el pico de memoria por etapa, las etapas
+anidadas, el registro de aciertos de caché, los errores y el JSON lines
+"""
+
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_pipeline import CachePipeline
+from instrumentacion import Instrumentacion, contar_filas
+from reporte_excel import TrabajoReporte
+
+
+def test_medir():
+    """Prueba filas, tiempo y memoria de una etapa y de sus etapas internas"""
+    print("🧪 Probando función medir()...")
+
+    instrumentacion = Instrumentacion({"app": "prueba"}, memoria=True, archivo="")
+    instrumentacion.nueva_ejecucion(huella="abc")
+
+    def leer():
+        return pd.DataFrame({"x": np.zeros(200_000)})
+
+    def preparar(df):
+        return df[df["x"] == 0].head(1000)
+
+    df = instrumentacion.medir("datos", lambda: instrumentacion.medir(
+        "preparacion", preparar, instrumentacion.medir("lectura", leer)))
+    assert len(df) == 1000 and not tracemalloc.is_tracing()
+
+    tabla = instrumentacion.ultima_ejecucion().set_index("etapa")
+    assert list(tabla.index) == ["lectura", "preparacion", "datos"]
+    assert tabla["nivel"].tolist() == [1, 1, 0]
+    assert tabla.loc["preparacion", "filas_entrada"] == 200_000
+    assert tabla.loc["preparacion", "filas_salida"] == 1000 and tabla.loc["lectura", "filas_salida"] == 200_000
+    # 200.000 float64 = 1,5 MB: lo ven la lectura y la etapa externa
+    assert tabla.loc["lectura", "pico_mb"] >= 1.5 and tabla.loc["datos", "pico_mb"] >= tabla.loc["lectura", "pico_mb"]
+    assert tabla.loc["datos", "segundos"] >= tabla.loc["lectura", "segundos"] + tabla.loc["preparacion", "segundos"]
+    assert (tabla["app"] == "prueba").all() and (tabla["huella"] == "abc").all()
+
+    # Sin memoria no se activa tracemalloc
+    instrumentacion.memoria = False
+    instrumentacion.nueva_ejecucion()
+    instrumentacion.medir("lectura", leer)
+    assert instrumentacion.ultima_ejecucion()["pico_mb"].isna().all()
+    assert instrumentacion.ejecucion == 2 and len(instrumentacion.tabla()) == 4
+
+    # Una etapa que falla se registra y el error se propaga
+    try:
+        instrumentacion.medir("zonas", lambda: 1 / 0)
+        assert False, "Debió propagarse el error"
+    except ZeroDivisionError:
+        pass
+    assert instrumentacion.ultima_medicion("zonas")["origen"] == "error"
+
+    assert contar_filas({"a": df, "b": "texto"}) == 1000 and contar_filas(None) == 0
+
+    print("✅ Función medir() - OK")
+
+
+def test_etapas_con_cache():
+    """Prueba que las etapas calculadas se miden y las memoizadas se registran como caché"""
+    print("🧪 Probando etapas memoizadas...")
+
+    cache = CachePipeline(64)
+    instrumentacion = Instrumentacion(archivo="")
+    df = pd.DataFrame({"x": range(500)})
+    llamadas = []
+
+    def transiciones(datos):
+        llamadas.append(len(datos))
+        return datos.head(10)
+
+    for _ in range(2):
+        instrumentacion.nueva_ejecucion()
+        etapa = instrumentacion.etapas(cache.etapas("huella", ()))
+        resultado = etapa("transiciones", transiciones, df)
+        assert len(resultado) == 10
+        etapa(("filtrado", ("Noche",)), transiciones, df.head(100))
+
+    assert llamadas == [500, 100]
+    tabla = instrumentacion.tabla()
+    assert tabla["etapa"].tolist() == ["transiciones", "filtrado"] * 2
+    assert tabla["origen"].tolist() == ["calculada", "calculada", "caché", "caché"]
+    assert tabla["filas_entrada"].tolist() == [500, 100] * 2 and tabla["filas_salida"].tolist() == [10] * 4
+
+    print("✅ Etapas memoizadas - OK")
+
+
+def test_json_lines():
+    """Prueba el archivo JSON lines, la descarga y el registro de la exportación"""
+    print("🧪 Probando JSON lines y exportación...")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "sub", "etapas.jsonl")
+        instrumentacion = Instrumentacion({"app": "prueba"}, archivo=ruta)
+        instrumentacion.nueva_ejecucion()
+        instrumentacion.medir("viajes", lambda df: df, pd.DataFrame({"x": [1, 2, 3]}))
+
+        trabajo = TrabajoReporte({"Viajes": pd.DataFrame({"x": range(250)})}, instrumentacion=instrumentacion)
+        assert trabajo.esperar(30) and trabajo.error is None
+        trabajo.descartar()
+
+        with open(ruta, encoding="utf-8") as archivo:
+            lineas = [json.loads(linea) for linea in archivo]
+
+    assert [m["etapa"] for m in lineas] == ["viajes", "exportacion"]
+    assert lineas[0]["filas_salida"] == 3 and lineas[0]["app"] == "prueba"
+    assert lineas[1]["filas_entrada"] == lineas[1]["filas_salida"] == 250 and lineas[1]["nivel"] == 0
+    assert lineas[1]["segundos"] == round(trabajo.segundos, 6)
+
+    descarga = [json.loads(linea) for linea in instrumentacion.a_jsonl().decode("utf-8").splitlines()]
+    assert descarga == lineas
+    assert Instrumentacion(archivo="").a_jsonl() == b""
+
+    print("✅ JSON lines y exportación - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de instrumentacion.py")
+    print("=" * 50)
+    test_medir()
+    test_etapas_con_cache()
+    test_json_lines()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
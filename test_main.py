@@ -0,0 +1,388 @@
+"""
+Script de pruebas automatizadas para main.py (webhook de eventos GPS)
+Usa un servidor HTTP local que imita el endpoint REST de Supabase
+"""
+
+import asyncio
+import json
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from fastapi.testclient import TestClient
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from main import DrenadorEventos, insertar_lote
+from spool_eventos import SpoolEventos, SpoolLleno
+
+
+class SupabaseLocal:
+    """Servidor HTTP en un hilo: guarda los lotes recibidos y responde los códigos de `fallos` primero."""
+
+    def __init__(self, fallos: list[int] | None = None):
+        self.lotes: list[list[dict]] = []
+        self.intentos: list[float] = []
+        self.fallos = list(fallos or [])
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers["Content-Length"]))
+                servidor.intentos.append(time.monotonic())
+                codigo = servidor.fallos.pop(0) if servidor.fallos else 201
+                if codigo == 201:
+                    assert self.path == "/rest/v1/eventos_gps", self.path
+                    servidor.lotes.append(json.loads(cuerpo))
+                self.send_response(codigo)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def cliente(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url=self.url, timeout=5)
+
+    def eventos(self) -> list[dict]:
+        return [e for lote in self.lotes for e in lote]
+
+    def cerrar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def evento(i: int) -> dict:
+    return {"imei": "358000000000001", "event_time": f"2025-01-15 08:{i // 60 % 60:02d}:{i % 60:02d}",
+            "lat": -23.1, "lon": -70.4, "velocidad": float(i)}
+
+
+async def esperar(condicion, limite_s: float = 5.0):
+    inicio = time.monotonic()
+    while not condicion():
+        assert time.monotonic() - inicio < limite_s, "Tiempo de espera agotado"
+        await asyncio.sleep(0.01)
+
+
+def test_spool_persistente():
+    """Prueba que el spool conserva el orden y los eventos entre reaperturas"""
+    print("🧪 Probando SpoolEventos...")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "spool.db")
+        spool = SpoolEventos(ruta, max_eventos=10)
+        spool.agregar([evento(i) for i in range(8)])
+        try:
+            spool.agregar([evento(8), evento(9), evento(10)])
+            raise AssertionError("Debió rechazar por spool lleno")
+        except SpoolLleno:
+            pass
+        spool.cerrar()
+
+        # Tras reabrir siguen los 8 eventos, en orden
+        spool = SpoolEventos(ruta, max_eventos=10)
+        assert spool.pendientes() == 8
+        ultimo_id, lote = spool.leer_lote(5)
+        assert [e["velocidad"] for e in lote] == [0, 1, 2, 3, 4]
+
+        spool.confirmar(ultimo_id)
+        ultimo_id, lote = spool.leer_lote(5)
+        assert [e["velocidad"] for e in lote] == [5, 6, 7] and spool.pendientes() == 3
+
+        spool.confirmar(ultimo_id, motivo_rechazo="400 Bad Request")
+        assert spool.pendientes() == 0 and spool.leer_lote(5) == (0, [])
+        rechazados = spool._conexion.execute("SELECT COUNT(*), MIN(motivo) FROM rechazados").fetchone()
+        assert rechazados == (3, "400 Bad Request")
+        spool.cerrar()
+
+    print("✅ SpoolEventos - OK")
+
+
+def test_drenador_con_reintentos():
+    """Prueba el envío por lotes con backoff exponencial ante 503 y el rechazo definitivo de un 400"""
+    print("🧪 Probando DrenadorEventos...")
+
+    async def escenario(directorio):
+        supabase = SupabaseLocal(fallos=[503, 503, 429])
+        cliente = supabase.cliente()
+        spool = SpoolEventos(os.path.join(directorio, "spool.db"))
+        drenador = DrenadorEventos(spool, lambda lote: insertar_lote(cliente, lote),
+                                   lote_max=100, intervalo_s=0.05, backoff_base_s=0.1)
+        drenador.iniciar()
+
+        await drenador.agregar([evento(i) for i in range(250)])
+        await esperar(lambda: len(supabase.eventos()) == 250)
+        # Tres fallos seguidos y luego los lotes completos, en orden
+        assert [e["velocidad"] for e in supabase.eventos()] == list(range(250))
+        assert [len(l) for l in supabase.lotes] == [100, 100, 50]
+        esperas = [b - a for a, b in zip(supabase.intentos[:3], supabase.intentos[1:4])]
+        assert esperas[0] >= 0.05 and esperas[2] >= 0.2, f"Sin backoff exponencial: {esperas}"
+
+        # Un 400 no se reintenta: el lote pasa a rechazados y el drenado continúa
+        supabase.fallos = [400]
+        await drenador.agregar([evento(i) for i in range(300, 303)])
+        await esperar(lambda: drenador.rechazados == 3)
+        await drenador.agregar([evento(400)])
+        await esperar(lambda: len(supabase.eventos()) == 251)
+
+        await drenador.detener()
+        assert spool.pendientes() == 0 and drenador.enviados == 251
+        await cliente.aclose()
+        spool.cerrar()
+        supabase.cerrar()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        asyncio.run(escenario(directorio))
+    print("✅ DrenadorEventos - OK")
+
+
+def test_drenador_error_inesperado():
+    """Prueba que un error que no es HTTP no detiene el drenador y los eventos se envían después"""
+    print("🧪 Probando DrenadorEventos ante errores inesperados...")
+
+    async def escenario(directorio):
+        recibidos, fallas = [], [ValueError("payload inválido")]
+
+        async def enviar(lote):
+            if fallas:
+                raise fallas.pop(0)
+            recibidos.extend(lote)
+
+        spool = SpoolEventos(os.path.join(directorio, "spool.db"))
+        drenador = DrenadorEventos(spool, enviar, lote_max=10, intervalo_s=0.05, backoff_base_s=0.05)
+        drenador.iniciar()
+
+        await drenador.agregar([evento(i) for i in range(5)])
+        await esperar(lambda: len(recibidos) == 5)
+        assert [e["velocidad"] for e in recibidos] == list(range(5)) and not drenador._tarea.done()
+
+        # La tarea sigue viva para los eventos siguientes y se detiene sin relanzar el error
+        await drenador.agregar([evento(5)])
+        await esperar(lambda: len(recibidos) == 6)
+        await drenador.detener()
+        assert spool.pendientes() == 0 and drenador.enviados == 6 and drenador.fallos_consecutivos == 0
+        spool.cerrar()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        asyncio.run(escenario(directorio))
+    print("✅ DrenadorEventos ante errores inesperados - OK")
+
+
+def test_drenador_no_bloquea_event_loop():
+    """Prueba que el drenador no detiene el event loop mientras otro hilo tiene tomado el spool"""
+    print("🧪 Probando que el drenador no bloquea el event loop...")
+
+    async def escenario(directorio):
+        recibidos = []
+
+        async def enviar(lote):
+            recibidos.extend(lote)
+
+        spool = SpoolEventos(os.path.join(directorio, "spool.db"))
+        spool.agregar([evento(i) for i in range(3)])
+        drenador = DrenadorEventos(spool, enviar, lote_max=10, intervalo_s=0.01)
+
+        # Otro hilo retiene el lock del spool 0,5 s (como un commit lento de `agregar`)
+        tomado = threading.Event()
+
+        def retener():
+            with spool._lock:
+                tomado.set()
+                time.sleep(0.5)
+
+        hilo = threading.Thread(target=retener)
+        hilo.start()
+        tomado.wait()
+        drenado = asyncio.create_task(drenador.drenar())
+        latidos = 0
+        inicio = time.monotonic()
+        while time.monotonic() - inicio < 0.3:
+            await asyncio.sleep(0.01)
+            latidos += 1
+        assert latidos >= 10 and not drenado.done(), f"Event loop detenido ({latidos} latidos)"
+
+        assert await drenado and len(recibidos) == 3 and spool.pendientes() == 0
+        hilo.join()
+        spool.cerrar()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        asyncio.run(escenario(directorio))
+    print("✅ Drenador sin bloquear el event loop - OK")
+
+
+def test_webhook():
+    """Prueba que el webhook responde sin esperar a Supabase, conserva eventos si cae y aplica contrapresión"""
+    print("🧪 Probando endpoint /webhook...")
+
+    supabase = SupabaseLocal(fallos=[503] * 1000)
+    originales = (main.crear_cliente, main.RUTA_SPOOL, main.SPOOL_MAX_EVENTOS, main.RUTA_ESTADO)
+    with tempfile.TemporaryDirectory() as directorio:
+        main.crear_cliente = supabase.cliente
+        main.RUTA_SPOOL = os.path.join(directorio, "spool.db")
+        main.RUTA_ESTADO = os.path.join(directorio, "estado.db")
+        main.SPOOL_MAX_EVENTOS = 6
+        try:
+            # Supabase caído: el webhook acepta hasta llenar el spool y luego responde 429
+            with TestClient(main.app) as cliente:
+                for i in range(5):
+                    respuesta = cliente.post("/webhook", json={**evento(i), "extra": "ignorado"})
+                    assert respuesta.status_code == 200 and respuesta.json()["status"] == "ok"
+                respuesta = cliente.post("/webhook", json=[evento(10), evento(11)])
+                assert respuesta.status_code == 429 and "Retry-After" in respuesta.headers
+            assert supabase.lotes == []
+
+            # Al volver Supabase, un reinicio del servicio envía lo que quedó en el spool
+            supabase.fallos = []
+            with TestClient(main.app) as cliente:
+                assert cliente.post("/webhook", json=evento(5)).json()["pendientes"] == 6
+        finally:
+            main.crear_cliente, main.RUTA_SPOOL, main.SPOOL_MAX_EVENTOS, main.RUTA_ESTADO = originales
+            supabase.cerrar()
+
+    eventos = supabase.eventos()
+    assert [e["velocidad"] for e in eventos] == [0, 1, 2, 3, 4, 5]
+    assert set(eventos[0]) == set(main.CAMPOS_EVENTO)
+
+    print("✅ Endpoint /webhook - OK")
+
+
+def test_webhook_transiciones():
+    """Prueba que el webhook alimenta la máquina de transiciones y la retoma tras un reinicio"""
+    print("🧪 Probando transiciones en línea del webhook...")
+
+    supabase = SupabaseLocal()
+    originales = (main.crear_cliente, main.RUTA_SPOOL, main.RUTA_ESTADO)
+
+    def estadia(geocerca: str, minuto: int) -> dict:
+        return {"imei": "358000000000001", "event_time": f"2025-01-15 08:{minuto:02d}:00", "geocerca": geocerca}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        main.crear_cliente = supabase.cliente
+        main.RUTA_SPOOL = os.path.join(directorio, "spool.db")
+        main.RUTA_ESTADO = os.path.join(directorio, "estado.db")
+        try:
+            with TestClient(main.app) as cliente:
+                cliente.post("/webhook", json=[estadia("Stock Central", 0), estadia("Stock Central", 5),
+                                               estadia("", 6), estadia("", 8)])
+            # Tras el reinicio, la llegada a Módulo 1 cierra el viaje y confirma la transición
+            with TestClient(main.app) as cliente:
+                respuesta = cliente.post("/webhook", json=[estadia("Módulo 1", 9), estadia("Módulo 1", 11)])
+                assert respuesta.json()["viajes"] == 1 and respuesta.json()["transiciones"] == 1
+                resultado = cliente.get("/transiciones", params={"vehiculo": "358000000000001"}).json()
+        finally:
+            main.crear_cliente, main.RUTA_SPOOL, main.RUTA_ESTADO = originales
+            supabase.cerrar()
+
+    transicion = resultado["transiciones"][0]
+    assert (transicion["origen"], transicion["destino"], transicion["duracion_s"]) == ("Stock Central", "Módulo 1", 360)
+    assert resultado["viajes"][0]["origen"] == "Stock Central" and resultado["viajes"][0]["duracion_viaje_s"] == 120
+    # La geocerca no forma parte de la fila insertada en Supabase
+    assert set(supabase.eventos()[0]) == set(main.CAMPOS_EVENTO)
+
+    print("✅ Transiciones en línea del webhook - OK")
+
+
+def test_webhook_error_en_transiciones():
+    """Prueba que un error de la máquina de transiciones no rechaza eventos ya guardados en el spool"""
+    print("🧪 Probando errores de transiciones en el webhook...")
+
+    supabase = SupabaseLocal(fallos=[503] * 1000)
+    originales = (main.crear_cliente, main.RUTA_SPOOL, main.RUTA_ESTADO)
+
+    def estadia(geocerca, minuto: int) -> dict:
+        return {"imei": "358000000000003", "event_time": f"2025-01-15 10:{minuto:02d}:00", "geocerca": geocerca}
+
+    def guardar_fallido(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        main.crear_cliente = supabase.cliente
+        main.RUTA_SPOOL = os.path.join(directorio, "spool.db")
+        main.RUTA_ESTADO = os.path.join(directorio, "estado.db")
+        try:
+            with TestClient(main.app) as cliente:
+                # Geocerca que no es texto: el evento se encola y la máquina lo descarta
+                respuesta = cliente.post("/webhook", json=[estadia(42, 0), estadia("Stock Central", 1)])
+                assert respuesta.status_code == 200 and respuesta.json()["encolados"] == 2
+                assert cliente.app.state.maquina.descartados == 1
+
+                # Falla al guardar el estado: 200 igual, los eventos quedan una sola vez en el spool
+                almacen = cliente.app.state.almacen
+                guardar = almacen.guardar
+                almacen.guardar = guardar_fallido
+                respuesta = cliente.post("/webhook", json=estadia("Stock Central", 5))
+                assert respuesta.status_code == 200 and respuesta.json()["pendientes"] == 3
+                almacen.guardar = guardar
+                respuesta = cliente.post("/webhook", json=estadia("Módulo 1", 9))
+                assert respuesta.status_code == 200 and respuesta.json()["pendientes"] == 4
+        finally:
+            main.crear_cliente, main.RUTA_SPOOL, main.RUTA_ESTADO = originales
+            supabase.cerrar()
+
+    print("✅ Errores de transiciones en el webhook - OK")
+
+
+def test_webhook_geocercas_por_poligono():
+    """Prueba que los eventos con solo lat/lon se ubican en el registro de polígonos"""
+    print("🧪 Probando ubicación por polígono en el webhook...")
+
+    from geocercas_poligonos import RegistroGeocercas, leer_geojson
+    from test_geocercas_poligonos import GEOJSON
+
+    supabase = SupabaseLocal()
+    originales = (main.crear_cliente, main.RUTA_SPOOL, main.RUTA_ESTADO, main.registro_configurado)
+
+    def punto(lat: float, lon: float, minuto: int) -> dict:
+        return {"imei": "358000000000002", "event_time": f"2025-01-15 09:{minuto:02d}:00", "lat": lat, "lon": lon}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        main.crear_cliente = supabase.cliente
+        main.RUTA_SPOOL = os.path.join(directorio, "spool.db")
+        main.RUTA_ESTADO = os.path.join(directorio, "estado.db")
+        main.registro_configurado = lambda: RegistroGeocercas(leer_geojson(GEOJSON))
+        try:
+            with TestClient(main.app) as cliente:
+                cliente.post("/webhook", json=[punto(-23.099, -70.399, 0), punto(-23.098, -70.398, 3),
+                                               punto(-23.30, -70.60, 4), punto(-23.31, -70.61, 6)])
+                respuesta = cliente.post("/webhook", json=[punto(-22.995, -70.295, 8), punto(-22.995, -70.296, 10)])
+                assert respuesta.json()["viajes"] == 1 and respuesta.json()["transiciones"] == 1
+                resultado = cliente.get("/transiciones").json()
+        finally:
+            main.crear_cliente, main.RUTA_SPOOL, main.RUTA_ESTADO, main.registro_configurado = originales
+            supabase.cerrar()
+
+    assert (resultado["transiciones"][0]["origen"], resultado["transiciones"][0]["destino"]) == \
+        ("Stock Central", "Botadero Norte")
+
+    print("✅ Ubicación por polígono en el webhook - OK")
+
+
+def main_pruebas():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de main.py")
+    print("=" * 50)
+    test_spool_persistente()
+    test_drenador_con_reintentos()
+    test_drenador_error_inesperado()
+    test_drenador_no_bloquea_event_loop()
+    test_webhook()
+    test_webhook_transiciones()
+    test_webhook_error_en_transiciones()
+    test_webhook_geocercas_por_poligono()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main_pruebas()
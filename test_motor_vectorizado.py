@@ -0,0 +1,835 @@
+"""
+Pruebas de paridad para motor_vectorizado.py
+Comparan el motor vectorizado con las implementaciones originales fila a fila
+(copiadas aquí como referencia) sobre datos sintéticos.
+"""
+
+import pandas as pd
+import numpy as np
+import sys
+import os
+from time import perf_counter
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from motor_vectorizado import (
+    UMBRAL_PERMANENCIA_REAL, agrupar_por_radio, agrupar_zonas_cercanas, calendario_turnos,
+    clasificar_procesos_vectorizado, clasificar_secuencias_vectorizado, codificar_geocercas, compactar_rachas, construir_cubo_conteos,
+    detectar_detenciones, detectar_detenciones_anomalas, detectar_permanencias, dias_activos, distancia_haversine,
+    enrollar_cubo, extraer_transiciones_vectorizado, extraer_viajes_vectorizado, filtrar_resultados,
+    lineas_base_permanencia, tabla_por_proceso
+)
+from datetime import time
+
+
+# ─────────────────────────────────────────────────────────────
+# Implementaciones de referencia (bucles originales)
+# ─────────────────────────────────────────────────────────────
+def extraer_transiciones_referencia(df: pd.DataFrame, columna_geocerca: str = "Geocercas") -> pd.DataFrame:
+    """Bucle `iterrows` original de extraer_transiciones (sin columnas de turno)."""
+    transiciones_completas = []
+
+    for veh, g in df.groupby("Nombre del Vehículo"):
+        g = g.copy().sort_values("Tiempo de evento", kind="stable")
+
+        geocercas_validas = []
+        tiempos_entrada = []
+        tiempos_salida = []
+
+        geocerca_actual = None
+        tiempo_entrada_actual = None
+
+        for i, row in g.iterrows():
+            geo = str(row[columna_geocerca]).strip()
+            tiempo = row["Tiempo de evento"]
+
+            if geo != "":
+                if geocerca_actual != geo:
+                    if geocerca_actual is not None:
+                        duracion = (tiempo - tiempo_entrada_actual).total_seconds()
+                        if duracion >= UMBRAL_PERMANENCIA_REAL:
+                            geocercas_validas.append(geocerca_actual)
+                            tiempos_entrada.append(tiempo_entrada_actual)
+                            tiempos_salida.append(tiempo)
+                    geocerca_actual = geo
+                    tiempo_entrada_actual = tiempo
+            else:
+                if geocerca_actual is not None:
+                    duracion = (tiempo - tiempo_entrada_actual).total_seconds()
+                    if duracion >= UMBRAL_PERMANENCIA_REAL:
+                        geocercas_validas.append(geocerca_actual)
+                        tiempos_entrada.append(tiempo_entrada_actual)
+                        tiempos_salida.append(tiempo)
+                    geocerca_actual = None
+                    tiempo_entrada_actual = None
+
+        if geocerca_actual is not None:
+            ultimo_tiempo = g["Tiempo de evento"].iloc[-1]
+            duracion = (ultimo_tiempo - tiempo_entrada_actual).total_seconds()
+            if duracion >= UMBRAL_PERMANENCIA_REAL:
+                geocercas_validas.append(geocerca_actual)
+                tiempos_entrada.append(tiempo_entrada_actual)
+                tiempos_salida.append(ultimo_tiempo)
+
+        for i in range(len(geocercas_validas) - 1):
+            transiciones_completas.append({
+                "Nombre del Vehículo": veh,
+                "Origen": geocercas_validas[i],
+                "Destino": geocercas_validas[i + 1],
+                "Tiempo_entrada": tiempos_entrada[i],
+                "Tiempo_salida": tiempos_salida[i],
+                "Duracion_s": (tiempos_salida[i] - tiempos_entrada[i]).total_seconds(),
+            })
+
+    return pd.DataFrame(transiciones_completas, columns=[
+        "Nombre del Vehículo", "Origen", "Destino", "Tiempo_entrada", "Tiempo_salida", "Duracion_s"
+    ])
+
+
+def extraer_tiempos_viaje_referencia(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Búsqueda cuadrática original de origen/destino de extraer_tiempos_viaje (sin turnos)."""
+    viajes = []
+    casos_desconocidos = {"origen": 0, "destino": 0, "ambos": 0}
+
+    for veh, g in df.groupby("Nombre del Vehículo"):
+        g = g.copy().sort_values("Tiempo de evento", kind="stable").reset_index(drop=True)
+        g["es_viaje"] = g["Geocercas"] == ""
+        g["grupo_viaje"] = (g["es_viaje"] != g["es_viaje"].shift()).cumsum()
+
+        for grupo_id, grupo in g[g["es_viaje"]].groupby("grupo_viaje"):
+            if len(grupo) < 2:
+                continue
+            inicio = grupo["Tiempo de evento"].iloc[0]
+            fin = grupo["Tiempo de evento"].iloc[-1]
+            duracion_s = (fin - inicio).total_seconds()
+            if duracion_s < 30:
+                continue
+
+            origen = "DESCONOCIDO"
+            anteriores = g[g.index < grupo.index[0]]
+            anteriores = anteriores[anteriores["Geocercas"] != ""]
+            if not anteriores.empty:
+                origen = anteriores["Geocercas"].iloc[-1]
+
+            destino = "DESCONOCIDO"
+            posteriores = g[g.index > grupo.index[-1]]
+            posteriores = posteriores[posteriores["Geocercas"] != ""]
+            if not posteriores.empty:
+                destino = posteriores["Geocercas"].iloc[0]
+
+            if origen == "DESCONOCIDO" and destino == "DESCONOCIDO":
+                casos_desconocidos["ambos"] += 1
+            elif origen == "DESCONOCIDO":
+                casos_desconocidos["origen"] += 1
+            elif destino == "DESCONOCIDO":
+                casos_desconocidos["destino"] += 1
+
+            viajes.append({
+                "Nombre del Vehículo": veh,
+                "Origen": origen,
+                "Destino": destino,
+                "Inicio_viaje": inicio,
+                "Fin_viaje": fin,
+                "Duracion_viaje_s": duracion_s,
+            })
+
+    return pd.DataFrame(viajes, columns=[
+        "Nombre del Vehículo", "Origen", "Destino", "Inicio_viaje", "Fin_viaje", "Duracion_viaje_s"
+    ]), casos_desconocidos
+
+
+def clasificar_proceso_referencia(df: pd.DataFrame, stocks: set, modulos_pilas: set,
+                                  botaderos: set, no_operacionales: set) -> pd.DataFrame:
+    """Bucle original de clasificar_proceso_con_secuencia con los dominios como parámetros."""
+    df = df.sort_values(["Nombre del Vehículo", "Tiempo_entrada"]).copy()
+    df["Proceso"] = "otro"
+    grupos_procesados = []
+
+    for veh, grupo in df.groupby("Nombre del Vehículo"):
+        grupo = grupo.copy().sort_values("Tiempo_entrada").reset_index(drop=True)
+
+        for i in range(len(grupo)):
+            origen = grupo.loc[i, "Origen"]
+            destino = grupo.loc[i, "Destino"]
+
+            if origen in no_operacionales or destino in no_operacionales:
+                continue
+            if origen in stocks and destino in modulos_pilas:
+                grupo.loc[i, "Proceso"] = "carga"
+            elif origen in modulos_pilas and destino in botaderos:
+                grupo.loc[i, "Proceso"] = "descarga"
+            elif origen in botaderos and destino in modulos_pilas:
+                if i > 0 and grupo.loc[i - 1, "Proceso"] == "descarga":
+                    grupo.loc[i, "Proceso"] = "retorno"
+            elif origen in modulos_pilas and destino in stocks:
+                if i > 0 and grupo.loc[i - 1, "Proceso"] == "carga":
+                    grupo.loc[i, "Proceso"] = "retorno"
+
+        grupos_procesados.append(grupo)
+
+    return pd.concat(grupos_procesados, ignore_index=True)
+
+
+def clasificar_secuencia_referencia(df: pd.DataFrame, especificas: set, excluidas: set) -> pd.DataFrame:
+    """Bucle original de clasificar_proceso_con_secuencia (app7tport) con las geocercas como parámetros."""
+    df = df.sort_values(["Nombre del Vehículo", "Tiempo_entrada"]).copy()
+    df["Proceso"] = "otro"
+    grupos_procesados = []
+
+    for veh, grupo in df.groupby("Nombre del Vehículo"):
+        grupo = grupo.copy().sort_values("Tiempo_entrada").reset_index(drop=True)
+
+        for i in range(len(grupo)):
+            origen = grupo.loc[i, "Origen"]
+            destino = grupo.loc[i, "Destino"]
+
+            if origen == destino:
+                grupo.loc[i, "Proceso"] = "estadia_interna"
+                continue
+            if any(e in origen for e in excluidas) or any(e in destino for e in excluidas):
+                continue
+            origen_especifico = any(g in origen for g in especificas)
+            destino_especifico = any(g in destino for g in especificas)
+            if origen_especifico and destino_especifico:
+                grupo.loc[i, "Proceso"] = "viaje_especifico"
+            elif origen_especifico or destino_especifico:
+                grupo.loc[i, "Proceso"] = "viaje_parcial"
+
+        grupos_procesados.append(grupo)
+
+    return pd.concat(grupos_procesados, ignore_index=True)
+
+
+def detectar_detenciones_referencia(df: pd.DataFrame, velocidad_max: float = 5.0,
+                                    tiempo_min_minutos: int = 10) -> pd.DataFrame:
+    """Bucle por vehículo y sub-grupo original de analizar_zonas_no_mapeadas (sin agrupación)."""
+    fuera_geocercas = df[df["Geocercas"] == ""].copy()
+    fuera_geocercas["Velocidad [km/h]"] = pd.to_numeric(fuera_geocercas["Velocidad [km/h]"], errors='coerce')
+    baja_velocidad = fuera_geocercas[
+        (fuera_geocercas["Velocidad [km/h]"].isna()) |
+        (fuera_geocercas["Velocidad [km/h]"] <= velocidad_max)
+    ].copy()
+    baja_velocidad = baja_velocidad.dropna(subset=["Latitud", "Longitud"])
+    if len(baja_velocidad) < 10:
+        return pd.DataFrame()
+
+    zonas_candidatas = []
+    for veh, grupo in baja_velocidad.groupby("Nombre del Vehículo"):
+        grupo = grupo.sort_values("Tiempo de evento").reset_index(drop=True)
+        grupo["tiempo_diff"] = grupo["Tiempo de evento"].diff().dt.total_seconds().fillna(0)
+        grupo["nuevo_grupo"] = (grupo["tiempo_diff"] > 300).cumsum()
+
+        for grupo_id, subgrupo in grupo.groupby("nuevo_grupo"):
+            if len(subgrupo) < 3:
+                continue
+            duracion_minutos = (subgrupo["Tiempo de evento"].max() - subgrupo["Tiempo de evento"].min()).total_seconds() / 60
+            if duracion_minutos >= tiempo_min_minutos:
+                lat_std = subgrupo["Latitud"].std()
+                lon_std = subgrupo["Longitud"].std()
+                zonas_candidatas.append({
+                    "Nombre del Vehículo": veh,
+                    "Latitud_Centro": subgrupo["Latitud"].mean(),
+                    "Longitud_Centro": subgrupo["Longitud"].mean(),
+                    "Duracion_Minutos": duracion_minutos,
+                    "Registros": len(subgrupo),
+                    "Radio_Aprox_m": np.sqrt(lat_std**2 + lon_std**2) * 111000,
+                    "Inicio": subgrupo["Tiempo de evento"].min(),
+                    "Fin": subgrupo["Tiempo de evento"].max(),
+                    "Velocidad_Promedio": subgrupo["Velocidad [km/h]"].mean()
+                })
+    return pd.DataFrame(zonas_candidatas)
+
+
+def analizar_detenciones_anomalas_referencia(df: pd.DataFrame, trans: pd.DataFrame,
+                                             geocercas_operacionales: set) -> pd.DataFrame:
+    """Bucle `iterrows` original de analizar_detenciones_anomalas (dominios como parámetro)."""
+    detenciones_anomalas = []
+    trans_operacionales = trans[trans["Origen"].isin(geocercas_operacionales)].copy()
+    estadisticas_geocercas = trans_operacionales.groupby("Origen")["Duracion_s"].agg([
+        "mean", "std", "count", "median"
+    ]).reset_index()
+    estadisticas_geocercas["umbral_anomalo"] = (
+        estadisticas_geocercas["mean"] + 2 * estadisticas_geocercas["std"]
+    )
+
+    def analizar_en_geocerca(vehiculo, geocerca, tiempo_inicio, registros, estadisticas, velocidad_disponible):
+        if len(registros) < 2:
+            return []
+        tiempo_fin = registros[-1][0]
+        duracion_total_min = (tiempo_fin - tiempo_inicio).total_seconds() / 60
+        if duracion_total_min < 10:
+            return []
+        umbral_info = estadisticas[estadisticas["Origen"] == geocerca]
+        if umbral_info.empty:
+            umbral_normal_min = 30
+            umbral_anomalo_min = 60
+        else:
+            umbral_normal_min = umbral_info["mean"].iloc[0] / 60
+            umbral_anomalo_min = umbral_info["umbral_anomalo"].iloc[0] / 60
+        if velocidad_disponible:
+            velocidades = [v for _, v in registros]
+            velocidad_promedio = sum(velocidades) / len(velocidades) if velocidades else 0
+            tiempos_detenido = []
+            for i in range(len(registros) - 1):
+                if registros[i][1] < 2:
+                    tiempos_detenido.append((registros[i+1][0] - registros[i][0]).total_seconds() / 60)
+            duracion_detenido_min = sum(tiempos_detenido)
+        else:
+            velocidad_promedio = 0
+            duracion_detenido_min = duracion_total_min
+        tipo_anomalia = None
+        severidad = "Normal"
+        if duracion_total_min > umbral_anomalo_min:
+            if duracion_detenido_min > umbral_normal_min * 1.5:
+                tipo_anomalia = "Detención Prolongada"
+                severidad = "Alta" if duracion_total_min > umbral_anomalo_min * 1.5 else "Media"
+            elif velocidad_promedio < 1 and duracion_total_min > umbral_normal_min * 1.2:
+                tipo_anomalia = "Velocidad Anómala"
+                severidad = "Media"
+        if not tipo_anomalia:
+            return []
+        return [{
+            "Nombre del Vehículo": vehiculo, "Geocerca": geocerca,
+            "Tiempo_inicio": tiempo_inicio, "Tiempo_fin": tiempo_fin,
+            "Duracion_total_min": round(duracion_total_min, 1),
+            "Duracion_detenido_min": round(duracion_detenido_min, 1),
+            "Velocidad_promedio": round(velocidad_promedio, 2),
+            "Tipo_anomalia": tipo_anomalia, "Severidad": severidad,
+            "Umbral_normal_min": round(umbral_normal_min, 1),
+            "Exceso_min": round(duracion_total_min - umbral_normal_min, 1)
+        }]
+
+    for veh, g in df.groupby("Nombre del Vehículo"):
+        g = g.copy().sort_values("Tiempo de evento", kind="stable")
+        velocidad_disponible = "Velocidad [km/h]" in g.columns
+        geocerca_actual = None
+        tiempo_entrada_actual = None
+        registros_geocerca = []
+        for i, row in g.iterrows():
+            geo = row["Geocercas"]
+            tiempo = row["Tiempo de evento"]
+            velocidad = row.get("Velocidad [km/h]", 0) if velocidad_disponible else 0
+            if geo != "" and geo in geocercas_operacionales:
+                if geocerca_actual != geo:
+                    if geocerca_actual is not None and registros_geocerca:
+                        detenciones_anomalas.extend(analizar_en_geocerca(
+                            veh, geocerca_actual, tiempo_entrada_actual,
+                            registros_geocerca, estadisticas_geocercas, velocidad_disponible))
+                    geocerca_actual = geo
+                    tiempo_entrada_actual = tiempo
+                    registros_geocerca = [(tiempo, velocidad)]
+                else:
+                    registros_geocerca.append((tiempo, velocidad))
+            else:
+                if geocerca_actual is not None and registros_geocerca:
+                    detenciones_anomalas.extend(analizar_en_geocerca(
+                        veh, geocerca_actual, tiempo_entrada_actual,
+                        registros_geocerca, estadisticas_geocercas, velocidad_disponible))
+                    geocerca_actual = None
+                    registros_geocerca = []
+        if geocerca_actual is not None and registros_geocerca:
+            detenciones_anomalas.extend(analizar_en_geocerca(
+                veh, geocerca_actual, tiempo_entrada_actual,
+                registros_geocerca, estadisticas_geocercas, velocidad_disponible))
+
+    return pd.DataFrame(detenciones_anomalas)
+
+
+# ─────────────────────────────────────────────────────────────
+# Datos sintéticos
+# ─────────────────────────────────────────────────────────────
+def generar_flota(n_vehiculos: int = 5, n_registros: int = 400, semilla: int = 7) -> pd.DataFrame:
+    """Genera registros GPS aleatorios con rachas en geocercas, viajes y ruido corto."""
+    rng = np.random.default_rng(semilla)
+    geocercas = ["Stock Central - 30 km hr", "Módulo 1", "Módulo 2", "Pila Rom 1",
+                 "Botadero Norte", "Casino", ""]
+    filas = []
+    for v in range(n_vehiculos):
+        t = pd.Timestamp("2025-07-31 06:00:00")
+        geo = ""
+        for _ in range(n_registros):
+            if rng.random() < 0.3:
+                geo = geocercas[rng.integers(len(geocercas))]
+            t = t + pd.Timedelta(seconds=int(rng.integers(5, 90)))
+            filas.append({"Nombre del Vehículo": f"Camión_{v:03d}", "Tiempo de evento": t, "Geocercas": geo})
+    df = pd.DataFrame(filas)
+    # Mezclar filas: el motor debe ordenar por vehículo y tiempo por sí mismo
+    return df.sample(frac=1, random_state=semilla).reset_index(drop=True)
+
+
+def generar_estadias(n_vehiculos: int = 4, n_estadias: int = 150, semilla: int = 0) -> pd.DataFrame:
+    """Genera estadías largas (hasta 120 registros cada 20-70 s) con velocidades bajas, altas y faltantes."""
+    rng = np.random.default_rng(semilla)
+    geocercas = ["Stock Central", "Módulo 1", "Pila Rom 1", "Botadero Norte", "Casino", ""]
+    filas = []
+    for v in range(n_vehiculos):
+        t = pd.Timestamp("2025-07-31 06:00:00")
+        for _ in range(n_estadias):
+            geo = geocercas[rng.integers(len(geocercas))]
+            velocidades = [[0.0, 0.4, 1.5], [0.0, 0.0, 2.0], [0.5, 3.0, 25.0]][rng.integers(3)]
+            for _ in range(int(rng.integers(1, 120))):
+                t = t + pd.Timedelta(seconds=int(rng.integers(20, 70)))
+                velocidad = rng.choice(velocidades)
+                filas.append({"Nombre del Vehículo": f"Camión_{v:03d}", "Tiempo de evento": t, "Geocercas": geo,
+                              "Velocidad [km/h]": np.nan if rng.random() < 0.002 else velocidad})
+    df = pd.DataFrame(filas)
+    return df.sample(frac=1, random_state=semilla).reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# Pruebas
+# ─────────────────────────────────────────────────────────────
+def test_paridad_extraer_transiciones():
+    """El motor vectorizado produce las mismas transiciones que el bucle original."""
+    print("🧪 Probando paridad de extraer_transiciones_vectorizado()...")
+
+    for semilla in range(5):
+        df = generar_flota(semilla=semilla)
+        esperado = extraer_transiciones_referencia(df)
+        resultado = extraer_transiciones_vectorizado(df)
+
+        assert len(esperado) > 0, "Error: los datos sintéticos no generaron transiciones"
+        pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False)
+
+    print("✅ Paridad extraer_transiciones_vectorizado() - OK")
+
+
+def test_permanencias_umbral_y_cierre():
+    """Casos de borde: ruido corto, salida a viaje y permanencia al final de los datos."""
+    print("🧪 Probando detectar_permanencias()...")
+
+    t0 = pd.Timestamp("2025-01-15 08:00:00")
+    df = pd.DataFrame({
+        "Nombre del Vehículo": ["Camión_001"] * 6,
+        "Tiempo de evento": [t0 + pd.Timedelta(seconds=s) for s in [0, 30, 90, 100, 200, 400]],
+        "Geocercas": ["Stock", "Stock", "Módulo 1", "", "Botadero", "Botadero"],
+    })
+
+    permanencias = detectar_permanencias(df)
+
+    # Stock: 0 → 90 s (salida hacia Módulo 1); Módulo 1: 10 s (ruido, filtrado);
+    # Botadero: 200 → 400 s (cierra con el último registro del vehículo)
+    assert permanencias["Geocerca"].tolist() == ["Stock", "Botadero"], permanencias
+    assert permanencias["Duracion_s"].tolist() == [90.0, 200.0], permanencias
+
+    trans = extraer_transiciones_vectorizado(df)
+    assert trans[["Origen", "Destino"]].values.tolist() == [["Stock", "Botadero"]]
+
+    vacio = extraer_transiciones_vectorizado(df.iloc[0:0])
+    assert vacio.empty and "Origen" in vacio.columns
+
+    print("✅ Función detectar_permanencias() - OK")
+
+
+def test_codificar_geocercas():
+    """Cada valor distinto se normaliza una sola vez y el resultado es categórico."""
+    print("🧪 Probando codificar_geocercas()...")
+
+    llamadas = []
+
+    def normalizador(geo: str) -> str:
+        llamadas.append(geo)
+        partes = [p.strip() for p in geo.split(";") if p.strip() and not p.strip().startswith("Ruta")]
+        return partes[0] if partes else ""
+
+    geocercas = pd.Series(["Módulo 1", "", "Ruta 5; Módulo 2", "Módulo 1", None, "Ruta 5"] * 1000)
+    resultado = codificar_geocercas(geocercas, normalizador)
+
+    assert isinstance(resultado.dtype, pd.CategoricalDtype), "Error: el resultado debe ser categórico"
+    assert sorted(llamadas) == sorted(["Módulo 1", "", "Ruta 5; Módulo 2", "Ruta 5"]), llamadas
+    esperado = geocercas.fillna("").map(normalizador)
+    assert resultado.astype(str).tolist() == esperado.tolist(), "Error: normalización distinta a la fila a fila"
+
+    # El motor lee los códigos directamente
+    df = generar_flota(semilla=3)
+    df_cat = df.assign(Geocercas=codificar_geocercas(df["Geocercas"], str.strip))
+    pd.testing.assert_frame_equal(
+        extraer_transiciones_vectorizado(df_cat), extraer_transiciones_vectorizado(df), check_dtype=False
+    )
+
+    print("✅ Función codificar_geocercas() - OK")
+
+
+def test_paridad_extraer_viajes():
+    """Los viajes y los contadores DESCONOCIDO coinciden con la búsqueda original."""
+    print("🧪 Probando paridad de extraer_viajes_vectorizado()...")
+
+    for semilla in range(5):
+        df = generar_flota(semilla=semilla)
+        # Un vehículo siempre en viaje: origen y destino desconocidos
+        solo_viaje = pd.DataFrame({
+            "Nombre del Vehículo": "Camión_999",
+            "Tiempo de evento": pd.date_range("2025-07-31 06:00:00", periods=5, freq="1min"),
+            "Geocercas": "",
+        })
+        df = pd.concat([df, solo_viaje], ignore_index=True)
+
+        esperado, casos_esperados = extraer_tiempos_viaje_referencia(df)
+        resultado, casos = extraer_viajes_vectorizado(df)
+
+        assert len(esperado) > 0, "Error: los datos sintéticos no generaron viajes"
+        pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False)
+        assert casos == casos_esperados, f"Error: {casos} != {casos_esperados}"
+        assert casos["ambos"] >= 1, "Error: no se contó el vehículo siempre en viaje"
+
+    print("✅ Paridad extraer_viajes_vectorizado() - OK")
+
+
+def test_paridad_clasificar_procesos():
+    """La clasificación con tabla de dominios coincide con el bucle secuencial original."""
+    print("🧪 Probando paridad de clasificar_procesos_vectorizado()...")
+
+    stocks = {"Stock Central - 30 km hr"}
+    modulos_pilas = {"Módulo 1", "Módulo 2", "Pila Rom 1"}
+    botaderos = {"Botadero Norte"}
+    no_operacionales = {"Casino"}
+
+    for semilla in range(5):
+        trans = extraer_transiciones_vectorizado(generar_flota(semilla=semilla))
+        esperado = clasificar_proceso_referencia(trans, stocks, modulos_pilas, botaderos, no_operacionales)
+
+        # Entrada ya ordenada (salida del motor) y entrada mezclada
+        for entrada in [trans, trans.sample(frac=1, random_state=semilla)]:
+            resultado = clasificar_procesos_vectorizado(entrada, stocks, modulos_pilas, botaderos, no_operacionales)
+            pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False)
+
+        assert (esperado["Proceso"] == "retorno").any(), "Error: los datos sintéticos no generaron retornos"
+
+    print("✅ Paridad clasificar_procesos_vectorizado() - OK")
+
+
+def test_paridad_clasificar_secuencias():
+    """La clasificación por subcadenas de geocercas coincide con el bucle por fila de app7tport."""
+    print("🧪 Probando paridad de clasificar_secuencias_vectorizado()...")
+
+    especificas = {"Módulo", "Stock Central"}
+    excluidas = {"Casino"}
+
+    for semilla in range(5):
+        trans = extraer_transiciones_vectorizado(generar_flota(semilla=semilla))
+        # Auto-transiciones (estadías internas), también hacia una geocerca excluida
+        internas = trans.sample(n=20, random_state=semilla).assign(Destino=lambda t: t["Origen"])
+        internas.loc[internas.index[:3], ["Origen", "Destino"]] = "Casino"
+        trans = pd.concat([trans, internas.assign(Tiempo_entrada=internas["Tiempo_salida"] + pd.Timedelta(milliseconds=1))], ignore_index=True)
+        esperado = clasificar_secuencia_referencia(trans, especificas, excluidas)
+
+        for entrada in [trans, trans.sample(frac=1, random_state=semilla)]:
+            resultado = clasificar_secuencias_vectorizado(entrada, especificas, excluidas)
+            pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False)
+
+        assert set(esperado["Proceso"]) == {"otro", "viaje_parcial", "viaje_especifico", "estadia_interna"}
+
+    assert clasificar_secuencias_vectorizado(trans.iloc[0:0], especificas, excluidas).empty
+
+    print("✅ Paridad clasificar_secuencias_vectorizado() - OK")
+
+
+def test_calendario_turnos():
+    """Turno, fecha de turno y descripción por columnas, con límites configurables."""
+    print("🧪 Probando calendario_turnos()...")
+
+    tiempos = pd.Series(pd.to_datetime([
+        "2025-01-15 08:00:00", "2025-01-15 19:59:59", "2025-01-15 20:00:00",
+        "2025-01-16 07:59:59", "2025-01-16 00:00:00",
+    ]))
+    calendario = calendario_turnos(tiempos)
+
+    assert calendario["Turno"].tolist() == ["dia", "dia", "noche", "noche", "noche"]
+    # La madrugada pertenece al turno noche iniciado el día anterior
+    assert calendario["Fecha_Turno"].dt.strftime("%Y-%m-%d").tolist() == [
+        "2025-01-15", "2025-01-15", "2025-01-15", "2025-01-15", "2025-01-15"
+    ]
+    assert calendario["Descripcion_Turno"].iloc[0] == "Turno Día 15-01-2025 (08:00-19:59)"
+    assert calendario["Descripcion_Turno"].iloc[3] == (
+        "Turno Noche 15-01-2025 (20:00 del 15-01-2025 - 07:59 del 16-01-2025)"
+    )
+
+    # Límites configurables: turnos de 07:00 a 19:00
+    calendario = calendario_turnos(tiempos, inicio_dia=time(7, 0), inicio_noche=time(19, 0))
+    assert calendario["Turno"].tolist() == ["dia", "noche", "noche", "dia", "noche"]
+    assert calendario["Fecha_Turno"].iloc[3] == pd.Timestamp("2025-01-16")
+    assert calendario["Descripcion_Turno"].iloc[1] == (
+        "Turno Noche 15-01-2025 (19:00 del 15-01-2025 - 06:59 del 16-01-2025)"
+    )
+
+    print("✅ Función calendario_turnos() - OK")
+
+
+def test_filtrar_resultados():
+    """Los filtros de la interfaz se aplican por solapamiento sobre tablas ya calculadas."""
+    print("🧪 Probando filtrar_resultados()...")
+
+    tabla = pd.DataFrame({
+        "Nombre del Vehículo": ["Camión_001", "Camión_001", "Camión_002", "Camión_002"],
+        "Tiempo_entrada": pd.to_datetime([
+            "2025-01-14 23:30:00", "2025-01-15 10:00:00", "2025-01-15 21:00:00", "2025-01-16 05:00:00"
+        ]),
+        "Tiempo_salida": pd.to_datetime([
+            "2025-01-15 00:30:00", "2025-01-15 11:00:00", "2025-01-16 09:00:00", "2025-01-16 06:00:00"
+        ]),
+    })
+    tabla = tabla.join(calendario_turnos(tabla["Tiempo_entrada"]))
+
+    def filtrar(**filtros) -> list[int]:
+        return filtrar_resultados(tabla, "Tiempo_entrada", "Tiempo_salida", **filtros).index.tolist()
+
+    # La permanencia que cruza la medianoche pertenece a ambos días
+    assert filtrar(rango_fechas=(pd.Timestamp("2025-01-15").date(),) * 2) == [0, 1, 2]
+    # Franja 08:00-09:59: solo los intervalos que la tocan (el de 21:00 a 09:00 del día siguiente)
+    assert filtrar(rango_horas=(8, 9)) == [2]
+    assert filtrar(rango_horas=(0, 23)) == [0, 1, 2, 3]
+    assert filtrar(vehiculo="Camión_002", turno_tipo="noche") == [2, 3]
+    assert filtrar(turno_tipo="dia") == [1]
+    assert filtrar_resultados(tabla.iloc[0:0], "Tiempo_entrada", "Tiempo_salida", vehiculo="X").empty
+
+    print("✅ Función filtrar_resultados() - OK")
+
+
+def test_compactar_rachas():
+    """Prueba que las rachas compactadas dan las mismas transiciones y viajes"""
+    print("🧪 Probando función compactar_rachas()...")
+
+    df = generar_flota(n_vehiculos=4, n_registros=500, semilla=11)
+    compacto = compactar_rachas(df)
+    assert len(compacto) < len(df) * 0.8, f"Compactación insuficiente: {len(compacto)} de {len(df)}"
+
+    pd.testing.assert_frame_equal(extraer_transiciones_vectorizado(df), extraer_transiciones_vectorizado(compacto))
+    viajes, casos = extraer_viajes_vectorizado(df)
+    viajes_compacto, casos_compacto = extraer_viajes_vectorizado(compacto)
+    pd.testing.assert_frame_equal(viajes, viajes_compacto)
+    assert casos == casos_compacto
+
+    # Compactar la concatenación de dos mitades compactadas une las rachas del corte
+    orden = df.sort_values("Tiempo de evento", kind="stable")
+    mitades = [compactar_rachas(orden.iloc[:1000]), compactar_rachas(orden.iloc[1000:])]
+    pd.testing.assert_frame_equal(compactar_rachas(pd.concat(mitades)), compacto)
+
+    print("✅ Función compactar_rachas() - OK")
+
+
+def test_paridad_detectar_detenciones():
+    """La segmentación vectorizada de detenciones coincide con el bucle original."""
+    print("🧪 Probando paridad de detectar_detenciones()...")
+
+    for semilla in range(3):
+        df = generar_flota(n_vehiculos=4, n_registros=600, semilla=semilla)
+        rng = np.random.default_rng(semilla)
+        df["Latitud"] = -23.1 + rng.normal(0, 1e-4, len(df))
+        df["Longitud"] = -70.4 + rng.normal(0, 1e-4, len(df))
+        df["Velocidad [km/h]"] = rng.choice(["0", "3.5", "12", "", "sin dato"], len(df))
+        df.loc[rng.random(len(df)) < 0.05, "Latitud"] = np.nan
+
+        for velocidad_max, tiempo_min in [(5.0, 10), (15.0, 3)]:
+            esperado = detectar_detenciones_referencia(df, velocidad_max, tiempo_min)
+            obtenido = detectar_detenciones(df, velocidad_max, tiempo_min)
+            assert len(esperado) > 0, "Datos de prueba sin detenciones"
+            pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+
+    # Pocos registros lentos: sin zonas candidatas
+    assert detectar_detenciones(df.head(5)).empty
+
+    print("✅ Paridad de detectar_detenciones() - OK")
+
+
+def test_paridad_detenciones_anomalas():
+    """La detección vectorizada de detenciones anómalas coincide con el bucle original."""
+    print("🧪 Probando paridad de detectar_detenciones_anomalas()...")
+
+    operacionales = {"Stock Central", "Módulo 1", "Pila Rom 1", "Botadero Norte"}
+    tipos = set()
+    for semilla in range(3):
+        df = generar_estadias(n_vehiculos=3, n_estadias=100, semilla=semilla)
+        # Línea base de pocas transiciones: la mayoría de las estadías largas resultan anómalas
+        trans = extraer_transiciones_vectorizado(df).head(40)
+        lineas_base = lineas_base_permanencia(trans, operacionales)
+
+        esperado = analizar_detenciones_anomalas_referencia(df, trans, operacionales)
+        obtenido = detectar_detenciones_anomalas(df, lineas_base, operacionales)
+        assert len(esperado) > 0, "Datos de prueba sin detenciones anómalas"
+        tipos |= set(esperado["Tipo_anomalia"])
+        # Los minutos se suman en segundos exactos: pueden diferir en una décima al redondear
+        pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False, check_exact=False, atol=0.11)
+
+        # Sin columna de velocidad todo el tiempo cuenta como detenido
+        sin_velocidad = df.drop(columns="Velocidad [km/h]")
+        pd.testing.assert_frame_equal(
+            detectar_detenciones_anomalas(sin_velocidad, lineas_base, operacionales),
+            analizar_detenciones_anomalas_referencia(sin_velocidad, trans, operacionales),
+            check_dtype=False, check_exact=False, atol=0.11
+        )
+
+    assert tipos == {"Detención Prolongada", "Velocidad Anómala"}
+    assert detectar_detenciones_anomalas(df.iloc[0:0], lineas_base, operacionales).empty
+
+    # Una velocidad no numérica se trata como dato faltante, sin detener el análisis
+    malformado = df.astype({"Velocidad [km/h]": object})
+    malformado.loc[malformado.index[5], "Velocidad [km/h]"] = "sin dato"
+    faltante = df.copy()
+    faltante.loc[faltante.index[5], "Velocidad [km/h]"] = np.nan
+    pd.testing.assert_frame_equal(
+        detectar_detenciones_anomalas(malformado, lineas_base, operacionales),
+        analizar_detenciones_anomalas_referencia(faltante, trans, operacionales),
+        check_dtype=False, check_exact=False, atol=0.11
+    )
+
+    print("✅ Paridad de detectar_detenciones_anomalas() - OK")
+
+
+def agrupar_por_radio_referencia(lat: np.ndarray, lon: np.ndarray, radio_m: float) -> np.ndarray:
+    """Componentes conexas sobre la matriz completa de distancias (equivale a DBSCAN con min_samples=1)."""
+    vecinos = distancia_haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) <= radio_m
+    etiquetas = np.full(len(lat), -1)
+    grupo = 0
+    for semilla in range(len(lat)):
+        if etiquetas[semilla] >= 0:
+            continue
+        pila = [semilla]
+        etiquetas[semilla] = grupo
+        while pila:
+            nuevos = np.flatnonzero(vecinos[pila.pop()] & (etiquetas < 0))
+            etiquetas[nuevos] = grupo
+            pila.extend(nuevos)
+        grupo += 1
+    return etiquetas
+
+
+def test_agrupar_zonas_cercanas():
+    """Prueba la agrupación por radio contra la matriz completa de distancias"""
+    print("🧪 Probando función agrupar_zonas_cercanas()...")
+
+    rng = np.random.default_rng(3)
+    for lat_base in (-23.1, -53.0):  # Latitud alta: las celdas se angostan en longitud
+        for radio in (5.0, 10.0, 50.0):
+            centros = rng.uniform([lat_base, -70.50], [lat_base + 0.01, -70.49], (40, 2))
+            puntos = centros[rng.integers(40, size=1200)] + rng.normal(0, radio / 111000 * 1.5, (1200, 2))
+            esperado = agrupar_por_radio_referencia(puntos[:, 0], puntos[:, 1], radio)
+            # Lotes pequeños: fuerza varias rondas de unión y celdas evaluadas por partes
+            obtenido = agrupar_por_radio(puntos[:, 0], puntos[:, 1], radio, pares_por_lote=500)
+            assert (obtenido == esperado).all(), f"Grupos distintos (lat {lat_base}, radio {radio})"
+
+    # Dos zonas a ~7 m se agrupan; la tercera, a ~1 km, queda sola
+    zonas = pd.DataFrame({
+        "Nombre del Vehículo": ["C1", "C2", "C3"],
+        "Latitud_Centro": [-23.10000, -23.10006, -23.11],
+        "Longitud_Centro": [-70.40000, -70.40000, -70.40],
+        "Duracion_Minutos": [30.0, 10.0, 15.0],
+        "Registros": [20, 8, 9],
+        "Radio_Aprox_m": [2.0, 3.0, 4.0],
+        "Inicio": pd.to_datetime(["2025-01-15 08:00", "2025-01-15 09:00", "2025-01-15 10:00"]),
+        "Fin": pd.to_datetime(["2025-01-15 08:30", "2025-01-15 09:10", "2025-01-15 10:15"]),
+        "Velocidad_Promedio": [1.0, 3.0, np.nan],
+    })
+    resultado = agrupar_zonas_cercanas(zonas, radio_metros=10)
+    assert resultado["Nombre del Vehículo"].tolist() == ["AGRUPADA (2 zonas)", "C3"]
+    agrupada, sola = resultado.iloc[0], resultado.iloc[1]
+    assert np.isclose(agrupada["Latitud_Centro"], -23.100015)   # Ponderado 30:10
+    assert np.isclose(agrupada["Radio_Aprox_m"], distancia_haversine(-23.100015, -70.4, -23.10006, -70.4))
+    assert (agrupada["Duracion_Minutos"], agrupada["Registros"], agrupada["Velocidad_Promedio"]) == (40.0, 28, 2.0)
+    assert agrupada["Vehiculos_Involucrados"] == ["C1", "C2"] and agrupada["Fin"] == zonas["Fin"][1]
+    assert (sola["Zonas_Agrupadas"], sola["Radio_Aprox_m"], sola["Latitud_Centro"]) == (1, 4.0, -23.11)
+    assert agrupar_zonas_cercanas(zonas.iloc[0:0]).empty
+
+    # Rendimiento: 10⁵ zonas, la mitad concentradas en 200 puntos de detención
+    lat = rng.uniform(-23.3, -22.9, 100_000)
+    lon = rng.uniform(-70.6, -70.2, 100_000)
+    destino = rng.integers(200, size=50_000)
+    lat[:50_000] = rng.uniform(-23.3, -22.9, 200)[destino] + rng.normal(0, 1e-4, 50_000)
+    lon[:50_000] = rng.uniform(-70.6, -70.2, 200)[destino] + rng.normal(0, 1e-4, 50_000)
+    inicio = perf_counter()
+    agrupar_por_radio(lat, lon, 10.0)
+    print(f"   10⁵ zonas en {perf_counter() - inicio:.2f} s")
+
+    print("✅ Función agrupar_zonas_cercanas() - OK")
+
+
+def test_cubo_conteos():
+    """Prueba que los roll-ups del cubo coinciden con los groupby/pivot directos sobre las transiciones"""
+    print("🧪 Probando cubo de conteos de producción...")
+
+    rng = np.random.default_rng(4)
+    n = 20_000
+    entrada = pd.Timestamp("2025-01-15") + pd.to_timedelta(rng.integers(0, 14 * 86400, n), unit="s")
+    trans = pd.DataFrame({
+        "Nombre del Vehículo": rng.choice([f"Camión_{i:03d}" for i in range(12)], n),
+        "Origen": rng.choice(["Stock Central", "Módulo 1", "Pila Rom 1"], n),
+        "Destino": rng.choice(["Módulo 1", "Botadero Norte", "Stock Central"], n),
+        "Proceso": rng.choice(["carga", "descarga", "retorno", "otro"], n),
+        "Tiempo_entrada": entrada,
+    }).join(calendario_turnos(entrada))
+    produccion = trans[trans["Proceso"].isin(["carga", "descarga"])]
+
+    cubo = construir_cubo_conteos(trans)
+    assert cubo["Cantidad"].sum() == len(produccion) and len(cubo) < len(produccion)
+    assert set(cubo["Proceso"]) == {"carga", "descarga"}
+
+    # Matriz origen-destino, por turno y por descripción de turno
+    directa = produccion.pivot_table(index="Origen", columns="Destino", values="Tiempo_entrada",
+                                     aggfunc="count", fill_value=0)
+    assert (enrollar_cubo(cubo, ["Origen"], ["Destino"]).to_numpy() == directa.to_numpy()).all()
+    for dimension in ("Turno", "Descripcion_Turno", "Fecha_Turno", "Nombre del Vehículo"):
+        directa = produccion.groupby([dimension, "Proceso"]).size()
+        assert enrollar_cubo(cubo, [dimension, "Proceso"]).equals(directa.rename("Cantidad")), dimension
+
+    # Hora de entrada y cortes por vehículo
+    por_hora = produccion.groupby(produccion["Tiempo_entrada"].dt.hour).size()
+    assert (enrollar_cubo(cubo, ["Hora"]).to_numpy() == por_hora.to_numpy()).all()
+    veh = produccion[produccion["Nombre del Vehículo"] == "Camión_003"]
+    corte = {"Nombre del Vehículo": "Camión_003"}
+    assert enrollar_cubo(cubo, ["Proceso"], cortes=corte).to_dict() == veh.groupby("Proceso").size().to_dict()
+
+    # Días activos (fechas de turno distintas)
+    assert dias_activos(cubo) == produccion["Fecha_Turno"].nunique()
+    assert dias_activos(cubo, cortes=corte) == veh["Fecha_Turno"].nunique()
+    assert dias_activos(cubo, "Nombre del Vehículo").equals(produccion.groupby("Nombre del Vehículo")["Fecha_Turno"].nunique())
+
+    # Tabla por proceso con total y etiquetas
+    tabla = tabla_por_proceso(cubo, ["Turno"], {"carga": "Cargas", "descarga": "Descargas"})
+    assert tabla.columns.tolist() == ["Turno", "Cargas", "Descargas", "Total"]
+    assert (tabla["Total"] == tabla["Cargas"] + tabla["Descargas"]).all() and tabla["Total"].sum() == len(produccion)
+    solo_carga = tabla_por_proceso(construir_cubo_conteos(trans, ("carga",)), ["Turno"],
+                                   {"carga": "Cargas", "descarga": "Descargas"})
+    assert solo_carga.columns.tolist() == ["Turno", "Cargas", "Total"]
+
+    # Sin filas de producción: cubo vacío con sus columnas
+    vacio = construir_cubo_conteos(trans[trans["Proceso"] == "otro"])
+    assert vacio.empty and "Cantidad" in vacio.columns and dias_activos(vacio) == 0
+
+    # Rendimiento: un cubo por 10⁶ transiciones y diez roll-ups
+    grande = trans.sample(1_000_000, replace=True, random_state=0)
+    inicio = perf_counter()
+    cubo = construir_cubo_conteos(grande)
+    construccion = perf_counter() - inicio
+    inicio = perf_counter()
+    for dimension in ("Origen", "Turno", "Fecha_Turno", "Descripcion_Turno", "Nombre del Vehículo"):
+        tabla_por_proceso(cubo, [dimension], {"carga": "Cargas", "descarga": "Descargas"})
+        dias_activos(cubo, "Nombre del Vehículo")
+    print(f"   10⁶ transiciones: cubo de {len(cubo):,} celdas en {construccion:.2f} s, "
+          f"10 roll-ups en {perf_counter() - inicio:.2f} s")
+
+    print("✅ Cubo de conteos - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de motor_vectorizado.py")
+    print("=" * 50)
+    test_paridad_extraer_transiciones()
+    test_permanencias_umbral_y_cierre()
+    test_codificar_geocercas()
+    test_paridad_extraer_viajes()
+    test_paridad_clasificar_procesos()
+    test_paridad_clasificar_secuencias()
+    test_calendario_turnos()
+    test_filtrar_resultados()
+    test_compactar_rachas()
+    test_paridad_detectar_detenciones()
+    test_paridad_detenciones_anomalas()
+    test_agrupar_zonas_cercanas()
+    test_cubo_conteos()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Script de pruebas automatizadas para reporte_excel.py
+Verifica el contenido del libro generado en modo constant_memory, el avance,
+la división de hojas sobre el límite de Excel y el trabajo en segundo plano
+"""
+
+import os
+import re
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import reporte_excel
+from reporte_excel import ReporteCancelado, TrabajoReporte, escribir_hojas
+
+
+def transiciones_aleatorias(n: int, semilla: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semilla)
+    entrada = pd.Timestamp("2025-01-15 08:00") + pd.to_timedelta(rng.integers(0, 10**6, n), unit="s")
+    return pd.DataFrame({
+        "Nombre del Vehículo": rng.choice(["Camión_001", "Camión_002", "Camión_003"], n),
+        "Origen": rng.choice(["Stock Central", "Módulo 1", "Botadero Norte"], n),
+        "Tiempo_entrada": entrada,
+        "Duracion_s": rng.uniform(0, 5000, n),
+        "Viajes": rng.integers(0, 5, n),
+        "Fecha_Turno": entrada.date,
+    })
+
+
+def leer_libro(ruta: str) -> dict[str, list[dict[str, str]]]:
+    """Lee un .xlsx sin dependencias: hoja → filas como {referencia de celda: valor crudo}"""
+    with zipfile.ZipFile(ruta) as libro:
+        nombres = re.findall(r'<sheet name="([^"]+)"', libro.read("xl/workbook.xml").decode())
+        compartidos = []
+        if "xl/sharedStrings.xml" in libro.namelist():
+            compartidos = re.findall(r"<t[^>]*>([^<]*)</t>", libro.read("xl/sharedStrings.xml").decode())
+        hojas = {}
+        for i, nombre in enumerate(nombres, start=1):
+            xml = libro.read(f"xl/worksheets/sheet{i}.xml").decode()
+            filas = []
+            for fila in re.findall(r"<row [^>]*>(.*?)</row>", xml):
+                celdas = {}
+                for ref, atributos, contenido in re.findall(r'<c r="([A-Z]+)\d+"([^>]*)>(.*?)</c>', fila):
+                    texto = re.search(r"<(?:v|t)[^>]*>([^<]*)</(?:v|t)>", contenido).group(1)
+                    celdas[ref] = compartidos[int(texto)] if 't="s"' in atributos else texto
+                filas.append(celdas)
+            hojas[nombre] = filas
+    return hojas
+
+
+def test_escribir_hojas():
+    """Prueba el contenido de las hojas, los faltantes y las hojas vacías o construidas al vuelo"""
+    print("🧪 Probando función escribir_hojas()...")
+
+    trans = transiciones_aleatorias(1234)
+    trans.loc[3, "Duracion_s"] = np.nan
+    trans.loc[4, "Origen"] = None
+    trans.loc[5, "Origen"] = "=SUM(A1:A9)"
+    trans["Vehiculos"] = [["Camión_001"]] * len(trans)
+    avances = []
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "reporte.xlsx")
+        resumen = escribir_hojas(ruta, {
+            "Transiciones": trans,
+            "TiemposViaje": pd.DataFrame(),
+            "MetricasViaje": lambda: trans.groupby("Origen").size().reset_index(name="Cantidad"),
+        }, al_avanzar=lambda escritas, totales: avances.append((escritas, totales)), filas_por_bloque=500)
+        hojas = leer_libro(ruta)
+
+    assert resumen == {"Transiciones": 1234, "MetricasViaje": 4}
+    assert list(hojas) == ["Transiciones", "MetricasViaje"], list(hojas)
+    filas = hojas["Transiciones"]
+    assert len(filas) == 1235
+    assert list(filas[0].values()) == list(trans.columns)
+
+    # Fechas como número de serie de Excel, números, faltantes en blanco y texto sin fórmulas
+    serie = (trans.loc[0, "Tiempo_entrada"] - pd.Timestamp("1899-12-30")) / pd.Timedelta(days=1)
+    assert np.isclose(float(filas[1]["C"]), serie)
+    assert np.isclose(float(filas[1]["D"]), trans.loc[0, "Duracion_s"])
+    assert int(float(filas[1]["E"])) == trans.loc[0, "Viajes"]
+    assert "D" not in filas[4] and "B" not in filas[5]
+    assert filas[6]["B"] == "=SUM(A1:A9)"
+    assert filas[1]["G"] == "['Camión_001']"
+
+    # Avance por bloque hasta el total de filas
+    assert avances[0] == (0, 1238) and avances[-1] == (1238, 1238)
+    assert [a for a, _ in avances] == sorted(a for a, _ in avances)
+
+    print("✅ Función escribir_hojas() - OK")
+
+
+def test_division_de_hojas():
+    """Prueba que una tabla sobre el límite de filas continúa en hojas numeradas"""
+    print("🧪 Probando división de hojas sobre el límite de Excel...")
+
+    original = reporte_excel.MAX_FILAS_HOJA
+    reporte_excel.MAX_FILAS_HOJA = 400
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "reporte.xlsx")
+            resumen = escribir_hojas(ruta, {"Transiciones": transiciones_aleatorias(1000)}, filas_por_bloque=150)
+            hojas = leer_libro(ruta)
+    finally:
+        reporte_excel.MAX_FILAS_HOJA = original
+
+    assert resumen == {"Transiciones": 400, "Transiciones (2)": 400, "Transiciones (3)": 200}, resumen
+    assert [len(f) for f in hojas.values()] == [401, 401, 201]
+    assert hojas["Transiciones (3)"][0] == hojas["Transiciones"][0]
+
+    print("✅ División de hojas - OK")
+
+
+def test_memoria_constante():
+    """Prueba que la memoria de la escritura no crece con las filas del reporte"""
+    print("🧪 Probando memoria de escritura...")
+
+    picos = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for n in (2_000, 20_000):
+            trans = transiciones_aleatorias(n)
+            tracemalloc.start()
+            escribir_hojas(os.path.join(directorio, f"reporte_{n}.xlsx"), {"Transiciones": trans})
+            picos[n] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    print(f"   Pico: {picos[2_000] / 1e6:.1f} MB con 2.000 filas, {picos[20_000] / 1e6:.1f} MB con 20.000 filas")
+    assert picos[20_000] < picos[2_000] * 2, f"La memoria crece con las filas: {picos}"
+
+    print("✅ Memoria de escritura - OK")
+
+
+def test_trabajo_en_segundo_plano():
+    """Prueba el avance, la lectura y el descarte (con cancelación) del trabajo en segundo plano"""
+    print("🧪 Probando clase TrabajoReporte...")
+
+    trans = transiciones_aleatorias(3000)
+    trabajo = TrabajoReporte({"Transiciones": trans}, clave=("huella", "filtros"), filas_por_bloque=500)
+    assert trabajo.esperar(60) and trabajo.error is None
+    assert trabajo.progreso == 1.0 and trabajo.filas_escritas == 3000
+    contenido = trabajo.leer()
+    assert contenido[:2] == b"PK" and trabajo.clave == ("huella", "filtros")
+    trabajo.descartar()
+    assert not os.path.exists(trabajo.ruta)
+
+    # Descartar a mitad de camino detiene la escritura y no deja el archivo
+    grande = TrabajoReporte({"Transiciones": transiciones_aleatorias(200_000)}, filas_por_bloque=1000)
+    while grande.filas_escritas == 0:
+        grande.esperar(0.01)
+    grande.descartar()
+    assert grande.esperar(30)
+    assert isinstance(grande.error, ReporteCancelado) and grande.filas_escritas < 200_000
+    assert not os.path.exists(grande.ruta)
+    try:
+        grande.leer()
+        raise AssertionError("Debió rechazar la lectura de un reporte cancelado")
+    except RuntimeError:
+        pass
+
+    print("✅ Clase TrabajoReporte - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de reporte_excel.py")
+    print("=" * 50)
+    test_escribir_hojas()
+    test_division_de_hojas()
+    test_memoria_constante()
+    test_trabajo_en_segundo_plano()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Script de pruebas automatizadas para transiciones_streaming.py
+Compara la máquina de estados en línea con el motor por lotes
+"""
+
+import pandas as pd
+import sys
+import os
+import tempfile
+
+# Agregar el directorio actual al path para importar funciones
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from transiciones_streaming import AlmacenTransiciones, MaquinaTransiciones
+from motor_vectorizado import (
+    COLUMNAS_TRANSICIONES, COLUMNAS_VIAJES, extraer_transiciones_vectorizado, extraer_viajes_vectorizado
+)
+from test_motor_vectorizado import generar_flota
+
+
+def eventos_webhook(df: pd.DataFrame) -> list[dict]:
+    """Convierte registros GPS ordenados por tiempo en eventos del webhook."""
+    return [{"imei": v, "event_time": t.isoformat(sep=" "), "geocerca": g, "lat": -23.1, "lon": -70.4}
+            for v, t, g in zip(df["Nombre del Vehículo"], df["Tiempo de evento"], df["Geocercas"])]
+
+
+def ordenar(filas: list[dict], columnas: list[str]) -> pd.DataFrame:
+    df = pd.DataFrame(filas, columns=columnas)
+    for columna in columnas[3:5]:
+        df[columna] = pd.to_datetime(df[columna])
+    return df.sort_values(["Nombre del Vehículo", columnas[3]], kind="stable").reset_index(drop=True)
+
+
+def test_paridad_con_motor_por_lotes():
+    """Prueba que las transiciones y viajes emitidos coinciden con los del motor por lotes"""
+    print("🧪 Probando MaquinaTransiciones contra el motor por lotes...")
+
+    df = generar_flota(n_vehiculos=4, n_registros=600, semilla=5).sort_values("Tiempo de evento", kind="stable")
+    maquina = MaquinaTransiciones()
+    transiciones, viajes = maquina.procesar_eventos(eventos_webhook(df))
+
+    esperadas = extraer_transiciones_vectorizado(df).to_dict("records")
+    assert len(transiciones) > 100, "Datos de prueba sin transiciones suficientes"
+    pd.testing.assert_frame_equal(ordenar(transiciones, COLUMNAS_TRANSICIONES),
+                                  ordenar(esperadas, COLUMNAS_TRANSICIONES), check_dtype=False)
+
+    # Los viajes aún sin destino siguen abiertos en línea
+    viajes_lote, _ = extraer_viajes_vectorizado(df)
+    viajes_lote = viajes_lote[viajes_lote["Destino"] != "DESCONOCIDO"].to_dict("records")
+    pd.testing.assert_frame_equal(ordenar(viajes, COLUMNAS_VIAJES), ordenar(viajes_lote, COLUMNAS_VIAJES),
+                                  check_dtype=False)
+
+    # Eventos fuera de orden, sin tiempo válido o sin geocerca (o no de texto) no alteran el estado
+    descartados = maquina.descartados
+    maquina.procesar_eventos([
+        {"imei": "Camión_000", "event_time": "2025-07-31 06:00:00", "geocerca": "Casino"},
+        {"imei": "Camión_000", "event_time": "no es fecha", "geocerca": "Casino"},
+        {"imei": "Camión_000", "event_time": "2025-08-30 06:00:00"},
+        {"imei": "Camión_000", "event_time": "2025-08-30 06:00:00", "geocerca": 42},
+        {"imei": "Camión_000", "event_time": "2025-08-30 06:00:00", "geocerca": ["Casino"]},
+    ])
+    assert maquina.descartados == descartados + 5
+
+    print("✅ MaquinaTransiciones - OK")
+
+
+def test_punto_de_control():
+    """Prueba que un reinicio retoma el estado y emite lo mismo que una ejecución continua"""
+    print("🧪 Probando AlmacenTransiciones...")
+
+    df = generar_flota(n_vehiculos=3, n_registros=300, semilla=8).sort_values("Tiempo de evento", kind="stable")
+    eventos = eventos_webhook(df)
+    continuas, viajes_continuos = MaquinaTransiciones().procesar_eventos(eventos)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "estado.db")
+        for inicio, fin in [(0, 400), (400, 401), (401, len(eventos))]:
+            # Cada tramo simula un reinicio del servicio
+            almacen = AlmacenTransiciones(ruta)
+            maquina = almacen.cargar(MaquinaTransiciones())
+            transiciones, viajes = maquina.procesar_eventos(eventos[inicio:fin])
+            almacen.guardar(maquina, transiciones, viajes)
+            almacen.cerrar()
+
+        almacen = AlmacenTransiciones(ruta)
+        guardadas = almacen.recientes("transiciones", limite=10_000)
+        assert len(guardadas) == len(continuas)
+        assert len(almacen.recientes("viajes", limite=10_000)) == len(viajes_continuos)
+        ultima = continuas[-1]
+        assert guardadas[0]["origen"] == ultima["Origen"] and guardadas[0]["destino"] == ultima["Destino"]
+        assert guardadas[0]["tiempo_entrada"] == ultima["Tiempo_entrada"].isoformat()
+        assert all(t["vehiculo"] == "Camión_001" for t in almacen.recientes("transiciones", 5, "Camión_001"))
+        almacen.cerrar()
+
+    print("✅ AlmacenTransiciones - OK")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de transiciones_streaming.py")
+    print("=" * 50)
+    test_paridad_con_motor_por_lotes()
+    test_punto_de_control()
+    print("=" * 50)
+    print("🎉 ¡Todas las pruebas pasaron exitosamente!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Transiciones en línea por vehículo - T-Metal
+Máquina de estados que consume los eventos del webhook uno a uno y emite las
+transiciones Origen → Destino y los viajes en cuanto quedan determinados, con
+las mismas reglas que el motor por lotes (`motor_vectorizado`):
+
+- Una permanencia es una racha de eventos del mismo vehículo en la misma
+  geocerca; es real si dura al menos UMBRAL_PERMANENCIA_REAL segundos hasta el
+  evento siguiente. La transición desde la permanencia real anterior se emite
+  apenas llega un evento que confirma la nueva (no hace falta esperar la salida).
+- Un viaje es una racha de eventos sin geocerca; se emite al llegar a la
+  geocerca de destino (los viajes aún sin destino quedan abiertos).
+
+Cada evento cuesta O(1): solo se consulta y actualiza el estado de su vehículo.
+El estado de los vehículos modificados se guarda en SQLite en la misma
+transacción que las transiciones y viajes emitidos, así que un reinicio retoma
+exactamente desde el último evento procesado.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from motor_vectorizado import UMBRAL_PERMANENCIA_REAL
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros globales
+# ─────────────────────────────────────────────────────────────
+RUTA_ESTADO = os.getenv("WEBHOOK_ESTADO_PATH", "estado_transiciones.db")
+DURACION_MIN_VIAJE_S = 30
+REGISTROS_MIN_VIAJE = 2
+DESCONOCIDO = "DESCONOCIDO"
+
+
+def leer_tiempo(valor) -> datetime | None:
+    """Tiempo de evento ISO (con o sin zona; las horas con zona se pasan a UTC sin zona)."""
+    if isinstance(valor, datetime):
+        tiempo = valor
+    else:
+        try:
+            tiempo = datetime.fromisoformat(str(valor))
+        except ValueError:
+            return None
+    if tiempo.tzinfo is not None:
+        tiempo = tiempo.astimezone(timezone.utc).replace(tzinfo=None)
+    return tiempo
+
+
+# ─────────────────────────────────────────────────────────────
+# 1 | Máquina de estados por vehículo
+# ─────────────────────────────────────────────────────────────
+class MaquinaTransiciones:
+    """
+    Estado por vehículo (dict serializable a JSON):
+    - geocerca / inicio / ultimo / puntos: racha actual ("" = en viaje)
+    - confirmada: la racha actual ya cumple el umbral de permanencia
+    - origen_viaje: última geocerca antes del viaje en curso
+    - previa: última permanencia real cerrada (origen de la próxima transición)
+    """
+
+    def __init__(self, umbral_s: float = UMBRAL_PERMANENCIA_REAL,
+                 duracion_min_viaje_s: float = DURACION_MIN_VIAJE_S, registros_min_viaje: int = REGISTROS_MIN_VIAJE):
+        self.umbral_s = umbral_s
+        self.duracion_min_viaje_s = duracion_min_viaje_s
+        self.registros_min_viaje = registros_min_viaje
+        self.vehiculos: dict[str, dict] = {}
+        self.modificados: set[str] = set()
+        self.descartados = 0
+
+    def procesar(self, vehiculo: str, tiempo: datetime, geocerca: str | None,
+                 transiciones: list[dict], viajes: list[dict]) -> None:
+        """Aplica un evento; agrega a `transiciones` y `viajes` lo que quede completo."""
+        geocerca = (geocerca or "").strip()
+        estado = self.vehiculos.get(vehiculo)
+
+        if estado is None:
+            self.vehiculos[vehiculo] = self._nueva_racha(geocerca, tiempo, previa=None, origen_viaje=None)
+            self.modificados.add(vehiculo)
+            return
+        if tiempo < estado["ultimo"]:
+            # Fuera de orden: el motor por lotes lo habría ordenado antes; aquí se descarta
+            self.descartados += 1
+            return
+        self.modificados.add(vehiculo)
+
+        if geocerca == estado["geocerca"]:
+            estado["ultimo"] = tiempo
+            estado["puntos"] += 1
+            if geocerca and not estado["confirmada"]:
+                self._confirmar(vehiculo, estado, tiempo, transiciones)
+            return
+
+        # Cambio de racha: se cierra la actual con salida en este evento
+        previa, origen_viaje = estado["previa"], estado["origen_viaje"]
+        if estado["geocerca"]:
+            if not estado["confirmada"]:
+                self._confirmar(vehiculo, estado, tiempo, transiciones)
+            if estado["confirmada"]:
+                previa = {"geocerca": estado["geocerca"], "entrada": estado["inicio"], "salida": tiempo}
+            origen_viaje = estado["geocerca"]
+        else:
+            duracion_s = (estado["ultimo"] - estado["inicio"]).total_seconds()
+            if estado["puntos"] >= self.registros_min_viaje and duracion_s >= self.duracion_min_viaje_s:
+                viajes.append({
+                    "Nombre del Vehículo": vehiculo,
+                    "Origen": origen_viaje or DESCONOCIDO,
+                    "Destino": geocerca,
+                    "Inicio_viaje": estado["inicio"],
+                    "Fin_viaje": estado["ultimo"],
+                    "Duracion_viaje_s": duracion_s,
+                })
+
+        nueva = self._nueva_racha(geocerca, tiempo, previa, origen_viaje)
+        self.vehiculos[vehiculo] = nueva
+
+    def _nueva_racha(self, geocerca: str, tiempo: datetime, previa: dict | None, origen_viaje: str | None) -> dict:
+        return {"geocerca": geocerca, "inicio": tiempo, "ultimo": tiempo, "puntos": 1,
+                "confirmada": False, "previa": previa, "origen_viaje": origen_viaje}
+
+    def _confirmar(self, vehiculo: str, estado: dict, tiempo: datetime, transiciones: list[dict]) -> None:
+        """Si la permanencia actual ya cumple el umbral, emite la transición desde la permanencia previa."""
+        if (tiempo - estado["inicio"]).total_seconds() < self.umbral_s:
+            return
+        estado["confirmada"] = True
+        previa = estado["previa"]
+        if previa is not None:
+            transiciones.append({
+                "Nombre del Vehículo": vehiculo,
+                "Origen": previa["geocerca"],
+                "Destino": estado["geocerca"],
+                "Tiempo_entrada": previa["entrada"],
+                "Tiempo_salida": previa["salida"],
+                "Duracion_s": (previa["salida"] - previa["entrada"]).total_seconds(),
+            })
+
+    def procesar_eventos(self, eventos: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        Procesa eventos del webhook (`imei` o `vid`, `event_time`, `geocerca`).
+        Los eventos sin vehículo, sin tiempo válido o sin geocerca informada (o que
+        no es texto) se omiten.
+        """
+        transiciones, viajes = [], []
+        for evento in eventos:
+            vehiculo = evento.get("imei") or evento.get("vid")
+            tiempo = leer_tiempo(evento.get("event_time"))
+            geocerca = evento.get("geocerca", 0)
+            if not vehiculo or tiempo is None or not (geocerca is None or isinstance(geocerca, str)):
+                self.descartados += 1
+                continue
+            self.procesar(str(vehiculo), tiempo, geocerca, transiciones, viajes)
+        return transiciones, viajes
+
+    # ─── Serialización del estado ─────────────────────────────
+    @staticmethod
+    def serializar(estado: dict) -> str:
+        return json.dumps(estado, default=datetime.isoformat)
+
+    @staticmethod
+    def deserializar(texto: str) -> dict:
+        estado = json.loads(texto)
+        for campo in ("inicio", "ultimo"):
+            estado[campo] = datetime.fromisoformat(estado[campo])
+        if estado["previa"] is not None:
+            for campo in ("entrada", "salida"):
+                estado["previa"][campo] = datetime.fromisoformat(estado["previa"][campo])
+        return estado
+
+
+# ─────────────────────────────────────────────────────────────
+# 2 | Punto de control y resultados en SQLite
+# ─────────────────────────────────────────────────────────────
+class AlmacenTransiciones:
+    """Guarda el estado por vehículo y las transiciones/viajes emitidos en una sola transacción."""
+
+    def __init__(self, ruta: str = RUTA_ESTADO):
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS estado_vehiculos (vehiculo TEXT PRIMARY KEY, estado TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS transiciones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, vehiculo TEXT, origen TEXT, destino TEXT,
+                tiempo_entrada TEXT, tiempo_salida TEXT, duracion_s REAL);
+            CREATE TABLE IF NOT EXISTS viajes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, vehiculo TEXT, origen TEXT, destino TEXT,
+                inicio_viaje TEXT, fin_viaje TEXT, duracion_viaje_s REAL);
+        """)
+
+    def cargar(self, maquina: MaquinaTransiciones) -> MaquinaTransiciones:
+        """Restaura en `maquina` el estado guardado de todos los vehículos."""
+        with self._lock:
+            filas = self._conexion.execute("SELECT vehiculo, estado FROM estado_vehiculos").fetchall()
+        maquina.vehiculos = {vehiculo: MaquinaTransiciones.deserializar(estado) for vehiculo, estado in filas}
+        maquina.modificados.clear()
+        return maquina
+
+    def guardar(self, maquina: MaquinaTransiciones, transiciones: list[dict], viajes: list[dict]) -> None:
+        """Punto de control: estado de los vehículos modificados + resultados emitidos."""
+        modificados = [(v, MaquinaTransiciones.serializar(maquina.vehiculos[v])) for v in maquina.modificados]
+        with self._lock, self._conexion:
+            self._conexion.execute("BEGIN")
+            self._conexion.executemany("INSERT OR REPLACE INTO estado_vehiculos VALUES (?, ?)", modificados)
+            self._conexion.executemany(
+                "INSERT INTO transiciones (vehiculo, origen, destino, tiempo_entrada, tiempo_salida, duracion_s) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(t["Nombre del Vehículo"], t["Origen"], t["Destino"], t["Tiempo_entrada"].isoformat(),
+                  t["Tiempo_salida"].isoformat(), t["Duracion_s"]) for t in transiciones],
+            )
+            self._conexion.executemany(
+                "INSERT INTO viajes (vehiculo, origen, destino, inicio_viaje, fin_viaje, duracion_viaje_s) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(v["Nombre del Vehículo"], v["Origen"], v["Destino"], v["Inicio_viaje"].isoformat(),
+                  v["Fin_viaje"].isoformat(), v["Duracion_viaje_s"]) for v in viajes],
+            )
+        maquina.modificados.clear()
+
+    def recientes(self, tabla: str, limite: int = 100, vehiculo: str | None = None) -> list[dict]:
+        """Últimas filas de 'transiciones' o 'viajes' (más recientes primero)."""
+        if tabla not in ("transiciones", "viajes"):
+            raise ValueError(f"Tabla desconocida: {tabla}")
+        filtro, parametros = ("WHERE vehiculo = ?", (vehiculo, limite)) if vehiculo else ("", (limite,))
+        with self._lock:
+            cursor = self._conexion.execute(f"SELECT * FROM {tabla} {filtro} ORDER BY id DESC LIMIT ?", parametros)
+            columnas = [c[0] for c in cursor.description]
+            return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conexion.close()